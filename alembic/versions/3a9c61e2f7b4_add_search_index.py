@@ -0,0 +1,60 @@
+"""Add full-text search index
+
+Revision ID: 3a9c61e2f7b4
+Revises: 8fd04557b2c4
+Create Date: 2026-10-18 09:12:44.301552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9c61e2f7b4'
+down_revision: Union[str, Sequence[str], None] = '8fd04557b2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.engine.name == 'postgresql':
+        op.execute("""
+            CREATE TABLE IF NOT EXISTS search_documents (
+                entity_type VARCHAR(20) NOT NULL,
+                entity_id INTEGER NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                body TEXT NOT NULL DEFAULT '',
+                document TSVECTOR NOT NULL,
+                PRIMARY KEY (entity_type, entity_id)
+            )
+        """)
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_document "
+            "ON search_documents USING GIN (document)"
+        )
+    else:
+        # The table is populated on startup by app.services.search_index.init_search_index
+        op.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                entity_type UNINDEXED,
+                entity_id UNINDEXED,
+                title,
+                body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.engine.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_search_documents_document")
+        op.execute("DROP TABLE IF EXISTS search_documents")
+    else:
+        op.execute("DROP TABLE IF EXISTS search_fts")
@@ -0,0 +1,60 @@
+"""Add log entry search and pagination indexes
+
+Revision ID: 5d2b7e91c4a8
+Revises: 3a9c61e2f7b4
+Create Date: 2026-10-18 11:40:17.528903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b7e91c4a8'
+down_revision: Union[str, Sequence[str], None] = '3a9c61e2f7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_log_entries_user_created "
+        "ON log_entries (user_id, created_at)"
+    )
+
+    bind = op.get_bind()
+    if bind.engine.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_log_entries_search ON log_entries USING GIN ("
+            "to_tsvector('simple', coalesce(full_entry, '') || ' ' || "
+            "coalesce(message, '') || ' ' || coalesce(category_name, '')))"
+        )
+    else:
+        # Triggers and backfill are applied by app.services.log_search.ensure_log_search_index
+        op.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS log_entries_fts USING fts5(
+                full_entry,
+                message,
+                category_name,
+                content = 'log_entries',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        op.execute("INSERT INTO log_entries_fts(log_entries_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.engine.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_log_entries_search")
+    else:
+        for trigger in ('log_entries_fts_ai', 'log_entries_fts_ad', 'log_entries_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS log_entries_fts")
+    op.execute("DROP INDEX IF EXISTS ix_log_entries_user_created")
@@ -0,0 +1,40 @@
+"""Add daily AI usage counter
+
+Revision ID: 7c4e1a9d2b63
+Revises: 5d2b7e91c4a8
+Create Date: 2026-10-18 14:05:52.114270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c4e1a9d2b63'
+down_revision: Union[str, Sequence[str], None] = '5d2b7e91c4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ai_usage_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('request_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('token_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ai_usage_daily_id', 'ai_usage_daily', ['id'], unique=False)
+    op.create_index('ix_ai_usage_daily_day', 'ai_usage_daily', ['day'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ai_usage_daily_day', table_name='ai_usage_daily')
+    op.drop_index('ix_ai_usage_daily_id', table_name='ai_usage_daily')
+    op.drop_table('ai_usage_daily')
@@ -0,0 +1,40 @@
+"""Add AI cache eviction and size columns
+
+Revision ID: 9e3f5b8c1a27
+Revises: 7c4e1a9d2b63
+Create Date: 2026-10-18 16:42:10.381904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3f5b8c1a27'
+down_revision: Union[str, Sequence[str], None] = '7c4e1a9d2b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('ai_request_cache') as batch_op:
+        batch_op.add_column(sa.Column('compressed', sa.Boolean(), nullable=False, server_default=sa.false()))
+        batch_op.add_column(sa.Column('size_bytes', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_hit_at', sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE ai_request_cache SET size_bytes = "
+        "length(coalesce(prompt, '')) + length(coalesce(response, ''))"
+    )
+    op.create_index('idx_cache_type_last_hit', 'ai_request_cache', ['request_type', 'last_hit_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_cache_type_last_hit', table_name='ai_request_cache')
+    with op.batch_alter_table('ai_request_cache') as batch_op:
+        batch_op.drop_column('last_hit_at')
+        batch_op.drop_column('size_bytes')
+        batch_op.drop_column('compressed')
@@ -0,0 +1,52 @@
+"""Add updated_at marks and link analysis runs
+
+Revision ID: b5d2e7f3a914
+Revises: 9e3f5b8c1a27
+Create Date: 2026-10-18 18:05:47.220913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e7f3a914'
+down_revision: Union[str, Sequence[str], None] = '9e3f5b8c1a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('customers', 'subscriptions'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+    op.create_table(
+        'link_analysis_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('full', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('customer_mark', sa.DateTime(), nullable=True),
+        sa.Column('subscription_mark', sa.DateTime(), nullable=True),
+        sa.Column('customers_changed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('subscriptions_changed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('links_found', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('links_retired', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_link_analysis_runs_id', 'link_analysis_runs', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_link_analysis_runs_id', table_name='link_analysis_runs')
+    op.drop_table('link_analysis_runs')
+    for table in ('subscriptions', 'customers'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
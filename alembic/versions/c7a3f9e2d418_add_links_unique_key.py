@@ -0,0 +1,36 @@
+"""Add unique (source, target) key on links
+
+Revision ID: c7a3f9e2d418
+Revises: b5d2e7f3a914
+Create Date: 2026-10-18 19:12:03.584120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a3f9e2d418'
+down_revision: Union[str, Sequence[str], None] = 'b5d2e7f3a914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the oldest of any duplicated pair so the unique index can be built
+    op.execute(
+        "DELETE FROM links WHERE id NOT IN ("
+        "SELECT MIN(id) FROM links GROUP BY source_type, source_id, target_type, target_id)"
+    )
+    op.create_index(
+        'uq_links_source_target', 'links',
+        ['source_type', 'source_id', 'target_type', 'target_id'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_links_source_target', table_name='links')
@@ -0,0 +1,60 @@
+"""Add normalized monthly and annual cost columns to subscriptions
+
+Revision ID: d4e8a1c6b203
+Revises: c7a3f9e2d418
+Create Date: 2026-10-18 21:40:17.205931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a1c6b203'
+down_revision: Union[str, Sequence[str], None] = 'c7a3f9e2d418'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly equivalent per billing cycle (enum names as stored); custom cycles
+# use custom_billing_amount/unit, with unknown units counted as months
+MONTHLY_EQUIVALENT = """
+    cost * CASE billing_cycle
+        WHEN 'WEEKLY' THEN 52
+        WHEN 'MONTHLY' THEN 12
+        WHEN 'QUARTERLY' THEN 4
+        WHEN 'BIANNUAL' THEN 2
+        WHEN 'YEARLY' THEN 1
+        ELSE (CASE LOWER(custom_billing_unit)
+                WHEN 'days' THEN 365
+                WHEN 'weeks' THEN 52
+                WHEN 'years' THEN 1
+                ELSE 12
+              END) * 1.0 / (CASE WHEN custom_billing_amount > 0 THEN custom_billing_amount ELSE 1 END)
+    END / 12.0
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('subscriptions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('monthly_equivalent_cost', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('annual_equivalent_cost', sa.Float(), nullable=True))
+
+    op.execute(
+        f"UPDATE subscriptions SET monthly_equivalent_cost = {MONTHLY_EQUIVALENT}, "
+        f"annual_equivalent_cost = ({MONTHLY_EQUIVALENT}) * 12"
+    )
+
+    op.create_index(
+        'ix_subscriptions_status_monthly_cost', 'subscriptions', ['status', 'monthly_equivalent_cost'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_subscriptions_status_monthly_cost', table_name='subscriptions')
+    with op.batch_alter_table('subscriptions', schema=None) as batch_op:
+        batch_op.drop_column('annual_equivalent_cost')
+        batch_op.drop_column('monthly_equivalent_cost')
@@ -0,0 +1,47 @@
+"""Add spend_snapshots table
+
+Revision ID: e9c2b7d5f061
+Revises: d4e8a1c6b203
+Create Date: 2026-10-18 23:05:42.918374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9c2b7d5f061'
+down_revision: Union[str, Sequence[str], None] = 'd4e8a1c6b203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spend_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dimension', sa.String(length=20), nullable=False),
+        sa.Column('dimension_key', sa.String(length=200), nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('subscription_count', sa.Float(), nullable=False),
+        sa.Column('monthly_spend', sa.Float(), nullable=False),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_spend_snapshots_id'), 'spend_snapshots', ['id'], unique=False)
+    op.create_index(
+        'uq_spend_snapshots_series_period', 'spend_snapshots',
+        ['dimension', 'dimension_key', 'period_start', 'granularity'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_spend_snapshots_series_period', table_name='spend_snapshots')
+    op.drop_index(op.f('ix_spend_snapshots_id'), table_name='spend_snapshots')
+    op.drop_table('spend_snapshots')
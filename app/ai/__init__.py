@@ -6,15 +6,18 @@ from app.ai.provider import (
     ServiceUnavailableError, 
     AIProviderError
 )
+from app.ai.circuit_breaker import CircuitOpenError, ai_circuit
 from app.ai.gemini_provider import GeminiProvider, parse_json_from_response
 from app.ai.smart_features import SmartAIFeatures
 from app.ai.cache import (
     generate_cache_key,
     get_cached_response,
+    get_stale_response,
     store_cached_response,
     get_cache_stats,
     clear_expired_cache,
-    clear_all_cache
+    clear_all_cache,
+    flush_hit_counts
 )
 
 __all__ = [
@@ -25,11 +28,15 @@ __all__ = [
     "RateLimitError",
     "ServiceUnavailableError",
     "AIProviderError",
+    "CircuitOpenError",
+    "ai_circuit",
     "parse_json_from_response",
     "generate_cache_key",
     "get_cached_response",
+    "get_stale_response",
     "store_cached_response",
     "get_cache_stats",
     "clear_expired_cache",
-    "clear_all_cache"
+    "clear_all_cache",
+    "flush_hit_counts"
 ]
@@ -1,16 +1,203 @@
-"""AI request caching system to save API quota."""
+"""
+AI request caching system to save API quota.
+
+Responses live in the `ai_request_cache` table, fronted by a per-process LRU
+(`memory_cache`) so repeat hits never touch the database. Hit counts are
+accumulated in memory and written back in batches, and misses are remembered
+for a short window so a burst of lookups for an uncached key costs one query.
+Concurrent misses for the same key share one provider call via `single_flight`.
+
+The table is kept bounded by `evict_cache`, run periodically by
+`cache_sweeper`: long-expired rows are deleted, then the least recently hit
+rows beyond each request type's quota and beyond `ai_cache_max_bytes`.
+Stored prompts are truncated, and prompt/response text can be compressed
+(`ai_cache_compress`).
+"""
+import asyncio
+import base64
 import hashlib
 import json
 import functools
 import logging
-from typing import Optional, Callable, Any
-from datetime import datetime
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from typing import Optional, Callable, Any, Awaitable, Dict, Tuple, TypeVar
+from datetime import datetime, timedelta
+from sqlalchemy import update, bindparam, case, func
 from sqlalchemy.orm import Session
 from app.models.ai_cache import AIRequestCache
 from app.config import settings
+from app.services.background import BackgroundTask
 
 logger = logging.getLogger(__name__)
 
+# Marks a remembered miss in the memory cache
+_MISS = object()
+
+T = TypeVar("T")
+
+# Provider calls currently running, by cache key
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+class MemoryCache:
+    """
+    Thread-safe LRU bounded by entry count and total response bytes.
+
+    Entries carry their own monotonic deadline, so a response never outlives
+    the database row it was read from.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._pending_hits: Counter = Counter()
+        self._last_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, `_MISS` for a remembered miss, or None if unknown."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, deadline, size = entry
+            if deadline <= now:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if value is _MISS:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+                self._pending_hits[key] += 1
+            return value
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        """Insert or replace an entry, evicting least recently used ones to fit."""
+        if ttl <= 0:
+            return
+        size = 0 if value is _MISS else len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def record_hit(self, key: str) -> None:
+        """Count a hit served from the database in the next batch."""
+        with self._lock:
+            self._pending_hits[key] += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._pending_hits.clear()
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def take_pending_hits(self, force: bool = False) -> Dict[str, int]:
+        """
+        Hand over accumulated hit counts once a batch is due.
+
+        A batch is due when enough hits are pending or the flush interval has
+        passed; `force` flushes whatever is pending.
+        """
+        with self._lock:
+            if not self._pending_hits:
+                return {}
+            due = (
+                force
+                or sum(self._pending_hits.values()) >= settings.ai_cache_hit_flush_batch
+                or time.monotonic() - self._last_flush >= settings.ai_cache_hit_flush_interval
+            )
+            if not due:
+                return {}
+            pending = dict(self._pending_hits)
+            self._pending_hits.clear()
+            self._last_flush = time.monotonic()
+            return pending
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            negative = sum(1 for value, _, _ in self._entries.values() if value is _MISS)
+            return {
+                "entries": len(self._entries) - negative,
+                "negative_entries": negative,
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "pending_hit_updates": sum(self._pending_hits.values()),
+            }
+
+
+memory_cache = MemoryCache(
+    max_entries=settings.ai_memory_cache_max_entries,
+    max_bytes=settings.ai_memory_cache_max_bytes,
+)
+
+
+def flush_hit_counts(db: Session, force: bool = False) -> int:
+    """
+    Write accumulated memory-cache hits back to `hit_count` in one batch.
+
+    Returns the number of rows updated.
+    """
+    pending = memory_cache.take_pending_hits(force=force)
+    if not pending:
+        return 0
+    table = AIRequestCache.__table__
+    try:
+        # Core executemany: one statement for the whole batch
+        db.execute(
+            update(table)
+            .where(table.c.request_hash == bindparam("h"))
+            .values(hit_count=table.c.hit_count + bindparam("n"), last_hit_at=datetime.utcnow()),
+            [{"h": key, "n": n} for key, n in pending.items()],
+        )
+        db.commit()
+        return len(pending)
+    except Exception as e:
+        logger.error(f"Error flushing cache hit counts: {str(e)}")
+        db.rollback()
+        return 0
+
+
+def _encode(text: str) -> str:
+    return base64.b64encode(zlib.compress(text.encode("utf-8"), 6)).decode("ascii")
+
+
+def _decode(text: str, compressed: bool) -> str:
+    if not compressed:
+        return text
+    return zlib.decompress(base64.b64decode(text)).decode("utf-8")
+
 
 def generate_cache_key(request_type: str, **params) -> str:
     """
@@ -29,30 +216,88 @@ def generate_cache_key(request_type: str, **params) -> str:
     return hashlib.sha256(cache_string.encode()).hexdigest()
 
 
-def get_cached_response(db: Session, request_hash: str) -> Optional[str]:
+async def single_flight(key: str, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run `call` once for all concurrent callers with the same key.
+    
+    The first caller starts `call` as a task; callers arriving while it is in
+    flight await the same result, or the same exception. The task is shielded,
+    so a caller that is cancelled (e.g. a closed browser tab) does not cancel
+    the call for the others, and its result still reaches the cache. `call`
+    therefore must not write through the first caller's request session;
+    it should open its own.
+    
+    Args:
+        key: Cache key identifying the request
+        call: Zero-argument coroutine factory doing the provider call
+        
+    Returns:
+        The result of the single in-flight call
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(call())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _finish_flight(key, t))
+    else:
+        logger.debug(f"Joining in-flight request for hash {key[:8]}...")
+    return await asyncio.shield(task)
+
+
+def _finish_flight(key: str, task: "asyncio.Future") -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Mark the exception retrieved in case every caller was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+def get_cached_response(db: Session, request_hash: str, min_ttl: float = 0) -> Optional[str]:
     """
     Retrieve a cached response if it exists and hasn't expired.
     
+    The in-process cache is consulted first; the database is only queried
+    for keys it has not seen recently.
+    
     Args:
         db: Database session
         request_hash: The cache key hash
+        min_ttl: Treat entries expiring within this many seconds as missing
+            (used by the background precomputer to refresh ahead of expiry)
         
     Returns:
         Cached response string or None if not found/expired
     """
+    if not min_ttl:
+        cached = memory_cache.get(request_hash)
+        if cached is _MISS:
+            return None
+        if cached is not None:
+            flush_hit_counts(db)
+            return cached
+    
     try:
-        cache_entry = db.query(AIRequestCache).filter(
+        now = datetime.utcnow()
+        cache_entry = db.query(
+            AIRequestCache.response, AIRequestCache.compressed, AIRequestCache.expires_at
+        ).filter(
             AIRequestCache.request_hash == request_hash,
-            AIRequestCache.expires_at > datetime.utcnow()
+            AIRequestCache.expires_at > now + timedelta(seconds=min_ttl)
         ).first()
         
+        if min_ttl:
+            return _decode(cache_entry.response, cache_entry.compressed) if cache_entry else None
+        
         if cache_entry:
-            # Increment hit count
-            cache_entry.hit_count += 1
-            db.commit()
-            logger.info(f"Cache HIT for hash {request_hash[:8]}... (hits: {cache_entry.hit_count})")
-            return cache_entry.response
+            response = _decode(cache_entry.response, cache_entry.compressed)
+            ttl = min((cache_entry.expires_at - now).total_seconds(), settings.ai_cache_ttl)
+            memory_cache.put(request_hash, response, ttl)
+            memory_cache.record_hit(request_hash)
+            flush_hit_counts(db)
+            logger.info(f"Cache HIT for hash {request_hash[:8]}...")
+            return response
         
+        memory_cache.put(request_hash, _MISS, settings.ai_cache_negative_ttl)
         logger.debug(f"Cache MISS for hash {request_hash[:8]}...")
         return None
         
@@ -61,6 +306,24 @@ def get_cached_response(db: Session, request_hash: str) -> Optional[str]:
         return None
 
 
+def get_stale_response(db: Session, request_hash: str) -> Optional[str]:
+    """
+    Retrieve a cached response even if it has expired.
+    
+    Used as a fallback when the AI quota is exhausted: an outdated answer
+    beats no answer. Expired rows are kept for `ai_cache_stale_retention`
+    seconds for this purpose.
+    """
+    try:
+        row = db.query(AIRequestCache.response, AIRequestCache.compressed).filter(
+            AIRequestCache.request_hash == request_hash
+        ).first()
+        return _decode(row.response, row.compressed) if row else None
+    except Exception as e:
+        logger.error(f"Error retrieving stale cache: {str(e)}")
+        return None
+
+
 def store_cached_response(
     db: Session, 
     request_hash: str, 
@@ -83,6 +346,16 @@ def store_cached_response(
     Returns:
         True if stored successfully, False otherwise
     """
+    # The prompt is kept for debugging only
+    stored_prompt = prompt[:settings.ai_cache_prompt_max_chars]
+    stored_response = response
+    compressed = settings.ai_cache_compress and (
+        len(stored_prompt) + len(stored_response) >= settings.ai_cache_compress_min_bytes
+    )
+    if compressed:
+        stored_prompt, stored_response = _encode(stored_prompt), _encode(stored_response)
+    size_bytes = len(stored_prompt.encode("utf-8")) + len(stored_response.encode("utf-8"))
+    
     try:
         # Check if entry already exists (upsert)
         existing = db.query(AIRequestCache).filter(
@@ -91,7 +364,10 @@ def store_cached_response(
         
         if existing:
             # Update existing entry
-            existing.response = response
+            existing.prompt = stored_prompt
+            existing.response = stored_response
+            existing.compressed = compressed
+            existing.size_bytes = size_bytes
             existing.expires_at = AIRequestCache.create_expiry()
             existing.tokens_used = tokens_used
             logger.debug(f"Updated cache entry {request_hash[:8]}...")
@@ -100,8 +376,10 @@ def store_cached_response(
             cache_entry = AIRequestCache(
                 request_hash=request_hash,
                 request_type=request_type,
-                prompt=prompt,
-                response=response,
+                prompt=stored_prompt,
+                response=stored_response,
+                compressed=compressed,
+                size_bytes=size_bytes,
                 tokens_used=tokens_used,
                 expires_at=AIRequestCache.create_expiry()
             )
@@ -109,6 +387,7 @@ def store_cached_response(
             logger.debug(f"Created cache entry {request_hash[:8]}...")
         
         db.commit()
+        memory_cache.put(request_hash, response, settings.ai_cache_ttl)
         return True
         
     except Exception as e:
@@ -121,37 +400,46 @@ def get_cache_stats(db: Session) -> dict:
     """
     Get statistics about the AI cache.
     
+    Computed with one aggregate query grouped by request type.
+    
     Returns:
         Dictionary with cache statistics
     """
+    flush_hit_counts(db, force=True)
     try:
-        total_entries = db.query(AIRequestCache).count()
-        active_entries = db.query(AIRequestCache).filter(
-            AIRequestCache.expires_at > datetime.utcnow()
-        ).count()
-        total_hits = db.query(AIRequestCache).with_entities(
-            db.query(AIRequestCache.hit_count).as_scalar()
-        ).scalar() or 0
-        
-        # Get counts by type
-        from sqlalchemy import func
-        type_counts = db.query(
+        rows = db.query(
             AIRequestCache.request_type,
             func.count(AIRequestCache.id),
-            func.sum(AIRequestCache.hit_count)
+            func.sum(case((AIRequestCache.expires_at > datetime.utcnow(), 1), else_=0)),
+            func.sum(AIRequestCache.hit_count),
+            func.sum(AIRequestCache.size_bytes),
+            func.sum(case((AIRequestCache.compressed.is_(True), 1), else_=0)),
         ).group_by(AIRequestCache.request_type).all()
         
         by_type = {
-            row[0]: {"count": row[1], "hits": row[2] or 0}
-            for row in type_counts
+            request_type: {
+                "count": count,
+                "active": active or 0,
+                "hits": hits or 0,
+                "bytes": size or 0,
+                "compressed": compressed or 0,
+                "quota": _type_quota(request_type),
+            }
+            for request_type, count, active, hits, size, compressed in rows
         }
+        total_entries = sum(t["count"] for t in by_type.values())
+        active_entries = sum(t["active"] for t in by_type.values())
         
         return {
             "total_entries": total_entries,
             "active_entries": active_entries,
             "expired_entries": total_entries - active_entries,
+            "total_hits": sum(t["hits"] for t in by_type.values()),
+            "total_bytes": sum(t["bytes"] for t in by_type.values()),
+            "max_bytes": settings.ai_cache_max_bytes,
             "by_type": by_type,
-            "cache_ttl_hours": settings.ai_cache_ttl / 3600
+            "cache_ttl_hours": settings.ai_cache_ttl / 3600,
+            "memory": memory_cache.stats()
         }
         
     except Exception as e:
@@ -159,6 +447,97 @@ def get_cache_stats(db: Session) -> dict:
         return {"error": str(e)}
 
 
+def _type_quota(request_type: str) -> int:
+    return settings.ai_cache_type_quotas.get(request_type, settings.ai_cache_max_entries_per_type)
+
+
+def _delete_ids(db: Session, ids) -> int:
+    deleted = 0
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        deleted += db.query(AIRequestCache).filter(
+            AIRequestCache.id.in_(ids[start:start + 500])
+        ).delete(synchronize_session=False)
+    return deleted
+
+
+def evict_cache(db: Session) -> Dict[str, int]:
+    """
+    Bound the cache table.
+    
+    Deletes, in order: rows expired longer than `ai_cache_stale_retention`;
+    the least recently hit rows beyond each request type's quota
+    (`ai_cache_type_quotas`, default `ai_cache_max_entries_per_type`); and
+    least recently hit rows until the stored bytes fit `ai_cache_max_bytes`.
+    
+    Returns:
+        Number of rows deleted by each rule
+    """
+    flush_hit_counts(db, force=True)
+    removed = {"expired": 0, "quota": 0, "size": 0}
+    last_used = func.coalesce(AIRequestCache.last_hit_at, AIRequestCache.created_at)
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.ai_cache_stale_retention)
+        removed["expired"] = db.query(AIRequestCache).filter(
+            AIRequestCache.expires_at <= cutoff
+        ).delete(synchronize_session=False)
+        
+        counts = db.query(
+            AIRequestCache.request_type, func.count(AIRequestCache.id)
+        ).group_by(AIRequestCache.request_type).all()
+        for request_type, count in counts:
+            quota = _type_quota(request_type)
+            if count <= quota:
+                continue
+            overflow = db.query(AIRequestCache.id).filter(
+                AIRequestCache.request_type == request_type
+            ).order_by(last_used.desc(), AIRequestCache.id.desc()).offset(quota).all()
+            removed["quota"] += _delete_ids(db, [row.id for row in overflow])
+        
+        total = db.query(func.coalesce(func.sum(AIRequestCache.size_bytes), 0)).scalar()
+        if total > settings.ai_cache_max_bytes:
+            excess = total - settings.ai_cache_max_bytes
+            victims = []
+            for row in db.query(AIRequestCache.id, AIRequestCache.size_bytes).order_by(
+                last_used, AIRequestCache.id
+            ).yield_per(500):
+                if excess <= 0:
+                    break
+                victims.append(row.id)
+                excess -= row.size_bytes or 0
+            removed["size"] = _delete_ids(db, victims)
+        
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error evicting cache entries: {str(e)}")
+        db.rollback()
+        return removed
+    
+    if any(removed.values()):
+        memory_cache.clear()
+        logger.info(f"Evicted AI cache entries: {removed}")
+    return removed
+
+
+class CacheSweeper(BackgroundTask):
+    """Runs `evict_cache` every `ai_cache_sweep_interval` seconds in the background."""
+    
+    def sweep(self) -> Dict[str, int]:
+        db = self._session()
+        try:
+            return evict_cache(db)
+        finally:
+            db.close()
+    
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.to_thread(self.sweep)
+            await asyncio.sleep(settings.ai_cache_sweep_interval)
+    
+
+cache_sweeper = CacheSweeper()
+
+
 def clear_expired_cache(db: Session) -> int:
     """
     Clear expired cache entries.
@@ -166,11 +545,13 @@ def clear_expired_cache(db: Session) -> int:
     Returns:
         Number of entries deleted
     """
+    flush_hit_counts(db, force=True)
     try:
         deleted = db.query(AIRequestCache).filter(
             AIRequestCache.expires_at <= datetime.utcnow()
         ).delete()
         db.commit()
+        memory_cache.clear()
         logger.info(f"Cleared {deleted} expired cache entries")
         return deleted
     except Exception as e:
@@ -189,6 +570,7 @@ def clear_all_cache(db: Session) -> int:
     try:
         deleted = db.query(AIRequestCache).delete()
         db.commit()
+        memory_cache.clear()
         logger.info(f"Cleared all {deleted} cache entries")
         return deleted
     except Exception as e:
@@ -0,0 +1,119 @@
+"""
+Cached data summary for the chat assistant's system prompt.
+
+The summary is built with a handful of aggregate queries and reused across
+messages and users until the data revision changes
+(`app.services.data_revision`), or `ai_chat_context_ttl` passes so writes made
+by other worker processes are picked up too.
+"""
+import logging
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Category, Subscription
+from app.models.subscription import SubscriptionStatus
+from app.services.data_revision import current_revision
+
+logger = logging.getLogger(__name__)
+
+UPCOMING_RENEWAL_DAYS = 30
+
+_lock = threading.Lock()
+_cached: Optional[Tuple[int, float, str]] = None  # (revision, built_at, summary)
+
+
+def _cycle(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def build_chat_context(db: Session) -> str:
+    """Render the data summary from the database (uncached)."""
+    status_counts = dict(
+        db.query(Subscription.status, func.count(Subscription.id)).group_by(Subscription.status).all()
+    )
+    total_subs = sum(status_counts.values())
+    active_subs = status_counts.get(SubscriptionStatus.ACTIVE, 0)
+
+    # Active monthly-equivalent spend per category in one grouped query
+    spend_rows = db.query(
+        Category.name, func.sum(Subscription.monthly_equivalent_cost)
+    ).outerjoin(Category, Subscription.category_id == Category.id).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE
+    ).group_by(Category.name).all()
+
+    by_category = {}
+    for category_name, monthly in spend_rows:
+        key = category_name or "Uncategorized"
+        by_category[key] = by_category.get(key, 0.0) + float(monthly or 0)
+    monthly_equivalent = sum(by_category.values())
+
+    category_names = [name for (name,) in db.query(Category.name).order_by(Category.name).all()]
+
+    top_subs = db.query(
+        Subscription.vendor_name, Subscription.cost, Subscription.billing_cycle
+    ).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE
+    ).order_by(Subscription.monthly_equivalent_cost.desc()).limit(5).all()
+
+    today = date.today()
+    upcoming = db.query(
+        Subscription.vendor_name, Subscription.cost, Subscription.next_renewal_date
+    ).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE,
+        Subscription.next_renewal_date >= today,
+        Subscription.next_renewal_date <= today + timedelta(days=UPCOMING_RENEWAL_DAYS)
+    ).order_by(Subscription.next_renewal_date).limit(10).all()
+
+    top_subs_info = ", ".join(f"{s.vendor_name} (${s.cost}/{_cycle(s.billing_cycle)})" for s in top_subs)
+    category_spend = ", ".join(
+        f"{name} ${amount:.2f}/mo"
+        for name, amount in sorted(by_category.items(), key=lambda item: -item[1])
+    )
+    upcoming_info = ", ".join(
+        f"{s.vendor_name} ${s.cost} on {s.next_renewal_date.isoformat()}" for s in upcoming
+    )
+
+    return "\n".join([
+        f"- Total subscriptions: {total_subs}",
+        f"- Active subscriptions: {active_subs}",
+        f"- Estimated monthly spend: ${monthly_equivalent:.2f}",
+        f"- Categories: {', '.join(category_names) if category_names else 'None set up yet'}",
+        f"- Monthly spend by category: {category_spend or 'N/A'}",
+        f"- Top subscriptions: {top_subs_info or 'N/A'}",
+        f"- Renewals in the next {UPCOMING_RENEWAL_DAYS} days: {upcoming_info or 'None'}",
+    ])
+
+
+def get_chat_context(db: Session) -> str:
+    """Return the data summary, rebuilding it only when the data has changed."""
+    global _cached
+    revision = current_revision()
+    now = time.monotonic()
+    cached = _cached
+    if cached and cached[0] == revision and now - cached[1] < settings.ai_chat_context_ttl:
+        return cached[2]
+
+    with _lock:
+        # Another request may have rebuilt it while we waited
+        cached = _cached
+        if cached and cached[0] == revision and now - cached[1] < settings.ai_chat_context_ttl:
+            return cached[2]
+        try:
+            summary = build_chat_context(db)
+        except Exception as e:
+            logger.error(f"Could not build chat context: {e}")
+            return "- Subscription data is currently unavailable"
+        _cached = (revision, time.monotonic(), summary)
+        return summary
+
+
+def invalidate_chat_context() -> None:
+    """Drop the cached summary."""
+    global _cached
+    _cached = None
@@ -0,0 +1,233 @@
+"""
+Circuit breaker for AI provider calls.
+
+While the provider is healthy the circuit is *closed* and calls pass
+through. Outcomes are tracked over a rolling window
+(`ai_circuit_window` seconds); once at least `ai_circuit_min_calls` calls
+were made and the failure rate reaches `ai_circuit_failure_rate`, the
+circuit *opens*. Open circuits fail calls immediately with
+`CircuitOpenError`, so features fall back to their rule-based output or a
+stale cached response in milliseconds instead of waiting out timeouts.
+
+After `ai_circuit_open_seconds` the circuit is *half-open* and lets a single
+probe call through: success closes it, failure opens it again with the
+open period doubled (up to `ai_circuit_max_open_seconds`).
+
+Only provider faults count as failures: timeouts, connection errors, 5xx
+and unexpected responses. Errors carrying a 4xx `status_code` (bad or
+blocked prompts, bad credentials) are caused by the request, and rate
+limiting is handled by `app.ai.scheduler`; neither trips the circuit.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.ai.provider import AIProvider, AIProviderError, RateLimitError, ServiceUnavailableError
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised instead of calling the provider while the circuit is open."""
+
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Whether an exception from a provider call should count against the circuit."""
+    if isinstance(error, (RateLimitError, CircuitOpenError)):
+        return False
+    # Rejected requests (bad or blocked prompts, credentials) say nothing about provider health
+    status_code = getattr(error, "status_code", None)
+    if isinstance(error, AIProviderError) and status_code is not None and 400 <= status_code < 500:
+        return False
+    return isinstance(error, (ServiceUnavailableError, AIProviderError, asyncio.TimeoutError, OSError))
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with half-open probing."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._open_seconds = float(settings.ai_circuit_open_seconds)
+        self._probe_in_flight = False
+        self.short_circuited = 0
+
+    def _trim(self, now: float) -> None:
+        horizon = now - settings.ai_circuit_window
+        while self._outcomes and self._outcomes[0][0] < horizon:
+            self._outcomes.popleft()
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self._open_seconds - now)
+
+    def allow(self) -> bool:
+        """
+        Reserve the right to make one call.
+
+        Returns False while open, and for all but one caller while half-open.
+        A caller that got True must report the outcome with
+        `record_success` or `record_failure`.
+        """
+        now = self._clock()
+        if self.state == OPEN and self._retry_after(now) <= 0:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+            logger.info("AI circuit half-open; probing provider")
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        now = self._clock()
+        if self.state == HALF_OPEN:
+            logger.info("AI circuit closed; provider recovered")
+            self.state = CLOSED
+            self._outcomes.clear()
+            self._open_seconds = float(settings.ai_circuit_open_seconds)
+            self._probe_in_flight = False
+            return
+        self._outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self) -> None:
+        now = self._clock()
+        if self.state == HALF_OPEN:
+            self._open_seconds = min(self._open_seconds * 2, float(settings.ai_circuit_max_open_seconds))
+            self._open(now)
+            return
+        self._outcomes.append((now, False))
+        self._trim(now)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if (
+            self.state == CLOSED
+            and len(self._outcomes) >= settings.ai_circuit_min_calls
+            and failures / len(self._outcomes) >= settings.ai_circuit_failure_rate
+        ):
+            self._open(now)
+
+    def release(self) -> None:
+        """Give back a reservation whose call ended without a verdict (e.g. rate limited)."""
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        logger.warning(f"AI circuit open for {self._open_seconds:.0f}s after provider failures")
+
+    def reject(self) -> CircuitOpenError:
+        retry_after = self._retry_after(self._clock())
+        return CircuitOpenError(
+            f"AI service is temporarily unavailable. Retrying in {int(retry_after) + 1} seconds.",
+            retry_after=retry_after
+        )
+
+    async def call(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call` through the breaker, raising `CircuitOpenError` when open."""
+        if not self.allow():
+            raise self.reject()
+        try:
+            result = await call()
+        except BaseException as e:
+            if is_provider_failure(e):
+                self.record_failure()
+            else:
+                self.release()
+            raise
+        self.record_success()
+        return result
+
+    def reset(self) -> None:
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._open_seconds = float(settings.ai_circuit_open_seconds)
+        self._probe_in_flight = False
+
+    def status(self) -> Dict[str, Any]:
+        now = self._clock()
+        self._trim(now)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {
+            "circuit": self.state,
+            "circuit_retry_after": round(self._retry_after(now), 1) if self.state == OPEN else 0,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": failures,
+            "short_circuited": self.short_circuited,
+        }
+
+
+ai_circuit = CircuitBreaker()
+
+
+class CircuitBreakerProvider(AIProvider):
+    """Wraps a provider so completions go through a `CircuitBreaker` (by default `ai_circuit`)."""
+
+    def __init__(self, provider: AIProvider, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.breaker = breaker or ai_circuit
+
+    async def generate_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> str:
+        return await self.breaker.call(
+            lambda: self.provider.generate_completion(
+                prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens
+            )
+        )
+
+    async def stream_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        if not self.breaker.allow():
+            raise self.breaker.reject()
+        try:
+            async for fragment in self.provider.stream_completion(
+                prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens
+            ):
+                yield fragment
+        except BaseException as e:
+            # Includes GeneratorExit when the consumer stops reading early
+            if is_provider_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def __getattr__(self, name):
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
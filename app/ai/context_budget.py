@@ -0,0 +1,198 @@
+"""
+Fitting subscription data into a prompt token budget.
+
+Features that describe every subscription to the model (cost optimization,
+duplicate detection, the budget surgeon) build their data section here:
+
+- Rows are rendered as a compact pipe-separated table instead of indented
+  JSON, which roughly halves the tokens per row.
+- `aggregate_rows` summarises spend per vendor or category in a few lines.
+- `compress_rows` keeps the whole table when it fits the budget, and
+  otherwise falls back to the aggregates plus a representative sample.
+- `chunk_rows` splits the table into budget-sized chunks for map-reduce
+  when every row has to be seen (e.g. to find duplicates). Rows are grouped
+  by normalized vendor, so a vendor filed under several categories still
+  lands in one chunk. Rows beyond the chunk cap are counted and summarised
+  rather than silently dropped.
+
+Token counts use the same estimate as `app.ai.scheduler`.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Sequence
+
+from app.ai.scheduler import estimate_tokens
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return "" if value is None else str(value).replace("|", "/")
+
+
+def render_rows(rows: Sequence[Dict[str, Any]], fields: Sequence[str]) -> str:
+    """Render rows as a header line plus one `a|b|c` line per row."""
+    lines = ["|".join(fields)]
+    lines.extend("|".join(_cell(row.get(field)) for field in fields) for row in rows)
+    return "\n".join(lines)
+
+
+def aggregate_rows(
+    rows: Sequence[Dict[str, Any]],
+    key: str,
+    amount_field: str = "monthly_cost",
+    limit: int = 15,
+) -> str:
+    """One line per `key` value with row count and summed amount, largest first."""
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    for row in rows:
+        bucket = totals[row.get(key) or "Unknown"]
+        bucket[0] += 1
+        bucket[1] += float(row.get(amount_field) or 0)
+    ranked = sorted(totals.items(), key=lambda item: -item[1][1])
+    lines = [f"- {name}: {int(count)} subscriptions, ${amount:.2f}/mo" for name, (count, amount) in ranked[:limit]]
+    if len(ranked) > limit:
+        rest = ranked[limit:]
+        lines.append(
+            f"- {len(rest)} more: {int(sum(c for _, (c, _) in rest))} subscriptions, "
+            f"${sum(a for _, (_, a) in rest):.2f}/mo"
+        )
+    return "\n".join(lines)
+
+
+def sample_rows(
+    rows: Sequence[Dict[str, Any]],
+    count: int,
+    amount_field: str = "monthly_cost",
+    group_field: str = "category",
+    vendor_field: str = "vendor",
+) -> List[Dict[str, Any]]:
+    """
+    Pick `count` representative rows.
+
+    The costliest row of each group comes first, then rows of vendors that
+    appear more than once (candidate duplicates), then the remaining rows by
+    amount.
+    """
+    by_amount = sorted(rows, key=lambda row: -float(row.get(amount_field) or 0))
+    vendor_counts: Dict[Any, int] = defaultdict(int)
+    for row in rows:
+        vendor_counts[str(row.get(vendor_field, "")).lower()] += 1
+
+    picked: List[Dict[str, Any]] = []
+    seen_ids = set()
+
+    def take(row):
+        if id(row) not in seen_ids and len(picked) < count:
+            seen_ids.add(id(row))
+            picked.append(row)
+
+    seen_groups = set()
+    for row in by_amount:
+        if row.get(group_field) not in seen_groups:
+            seen_groups.add(row.get(group_field))
+            take(row)
+    for row in by_amount:
+        if vendor_counts[str(row.get(vendor_field, "")).lower()] > 1:
+            take(row)
+    for row in by_amount:
+        take(row)
+    return picked
+
+
+def compress_rows(
+    rows: Sequence[Dict[str, Any]],
+    fields: Sequence[str],
+    budget_tokens: int = None,
+    amount_field: str = "monthly_cost",
+) -> Dict[str, Any]:
+    """
+    Data section for a prompt that does not need every row.
+
+    Returns `text`, `sampled` (False when the full table fit) and
+    `rows_shown`. Sampled output starts with per-category and per-vendor
+    aggregates so totals stay accurate.
+    """
+    budget = budget_tokens or settings.ai_context_token_budget
+    table = render_rows(rows, fields)
+    if estimate_tokens(table) <= budget:
+        return {"text": table, "sampled": False, "rows_shown": len(rows)}
+
+    summary = (
+        f"Spend by category:\n{aggregate_rows(rows, 'category', amount_field)}\n\n"
+        f"Spend by vendor:\n{aggregate_rows(rows, 'vendor', amount_field)}"
+    )
+    remaining = budget - estimate_tokens(summary) - estimate_tokens(render_rows([], fields))
+    per_row = max(1, estimate_tokens(table) // max(1, len(rows)))
+    count = max(0, remaining // per_row)
+    sample = sample_rows(rows, count, amount_field)
+    # Trim in case the sampled rows are longer than average
+    while sample and estimate_tokens(render_rows(sample, fields)) > remaining:
+        sample.pop()
+    text = f"{summary}\n\nRepresentative subscriptions ({len(sample)} of {len(rows)}):\n{render_rows(sample, fields)}"
+    return {"text": text, "sampled": True, "rows_shown": len(sample)}
+
+
+def _vendor_key(row: Dict[str, Any]) -> str:
+    return " ".join(str(row.get("vendor") or "").lower().split())
+
+
+def chunk_rows(
+    rows: Sequence[Dict[str, Any]],
+    fields: Sequence[str],
+    budget_tokens: int = None,
+    max_chunks: int = None,
+    amount_field: str = "monthly_cost",
+) -> Dict[str, Any]:
+    """
+    Split rows into rendered tables that each fit `budget_tokens`.
+
+    Rows are grouped by normalized vendor (then category), and a vendor's
+    rows are never split across chunks unless they alone exceed the budget.
+    If more than `max_chunks` chunks are needed, the chunks carrying the
+    least spend are left out.
+
+    Returns `chunks`, `rows_shown` and `rows_omitted`, plus `omitted_summary`
+    (per-vendor aggregates of the left-out rows, empty when none were).
+    """
+    budget = budget_tokens or settings.ai_context_token_budget
+    limit = max_chunks or settings.ai_context_max_chunks
+    header_tokens = estimate_tokens(render_rows([], fields))
+
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in sorted(rows, key=lambda row: (_vendor_key(row), str(row.get("category") or ""))):
+        groups[_vendor_key(row)].append(row)
+
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    used = header_tokens
+    for group in groups.values():
+        group_tokens = [estimate_tokens(render_rows([row], fields)) - header_tokens + 1 for row in group]
+        # Start a fresh chunk rather than split the vendor across two
+        if current and used + sum(group_tokens) > budget:
+            chunks.append(current)
+            current, used = [], header_tokens
+        for row, row_tokens in zip(group, group_tokens):
+            if current and used + row_tokens > budget:
+                chunks.append(current)
+                current, used = [], header_tokens
+            current.append(row)
+            used += row_tokens
+    if current:
+        chunks.append(current)
+
+    omitted: List[Dict[str, Any]] = []
+    if len(chunks) > limit:
+        chunks.sort(key=lambda chunk: -sum(float(row.get(amount_field) or 0) for row in chunk))
+        omitted = [row for chunk in chunks[limit:] for row in chunk]
+        chunks = chunks[:limit]
+        logger.warning(f"Prompt data needs more than {limit} chunks; {len(omitted)} rows left out")
+    return {
+        "chunks": [render_rows(chunk, fields) for chunk in chunks],
+        "rows_shown": len(rows) - len(omitted),
+        "rows_omitted": len(omitted),
+        "omitted_summary": aggregate_rows(omitted, "vendor", amount_field) if omitted else "",
+    }
@@ -1,12 +1,20 @@
 """Comprehensive AI features for SubTrack."""
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session, contains_eager, joinedload
 from datetime import date, timedelta
 from app.models import Subscription, Customer, Category, Group
 from app.ai.provider import get_ai_provider
 from app.ai.json_parser import safe_json_parse
+from app.ai.context_budget import compress_rows, chunk_rows
+from app.ai.query_parser import parse_search_query, describe_search_query
+from app.config import settings
+import asyncio
 import json
 
+# Columns rendered for each subscription in cost prompts
+SUBSCRIPTION_FIELDS = ["vendor", "plan", "cost", "cycle", "monthly_cost", "category"]
+
 
 class AIFeatures:
     """Comprehensive AI-powered features for subscription management."""
@@ -54,7 +62,9 @@ Respond with JSON only:
         Analyze spending patterns and suggest ways to reduce costs.
         """
         try:
-            query = self.db.query(Subscription).filter(Subscription.status == "active")
+            query = self.db.query(Subscription).options(joinedload(Subscription.category)).filter(
+                Subscription.status == "active"
+            )
             if customer_id:
                 query = query.filter(Subscription.customer_id == customer_id)
             
@@ -64,14 +74,15 @@ Respond with JSON only:
             sub_data = []
             total_monthly = 0
             for sub in subscriptions:
-                monthly_cost = self._normalize_to_monthly(sub.cost, sub.billing_cycle.value)
+                monthly_cost = sub.monthly_equivalent_cost
                 total_monthly += monthly_cost
                 sub_data.append({
                     "vendor": sub.vendor_name,
                     "plan": sub.plan_name,
                     "cost": sub.cost,
                     "cycle": sub.billing_cycle.value,
-                    "monthly_equivalent": monthly_cost
+                    "monthly_cost": monthly_cost,
+                    "category": sub.category.name if sub.category else "Uncategorized"
                 })
             
             if not self.provider.is_available():
@@ -82,11 +93,14 @@ Respond with JSON only:
                     "message": "AI provider not available"
                 }
             
+            # Whole table when it fits the token budget, else aggregates plus a sample
+            context = compress_rows(sub_data, SUBSCRIPTION_FIELDS)
+            
             prompt = f"""Analyze these subscriptions and provide cost optimization suggestions:
 
-Total monthly cost: ${total_monthly:.2f}
+Total monthly cost: ${total_monthly:.2f} across {len(sub_data)} subscriptions
 Subscriptions:
-{json.dumps(sub_data, indent=2)}
+{context["text"]}
 
 Respond with JSON only:
 {{
@@ -183,27 +197,62 @@ Respond with JSON only:
         except Exception as e:
             return []
     
-    async def duplicate_detection(self) -> List[Dict[str, Any]]:
+    async def duplicate_detection(self) -> Dict[str, Any]:
         """
         Feature 4: Duplicate Detection
         Find potential duplicate or overlapping subscriptions.
+        
+        Returns `duplicates` and `rows_omitted`, the number of subscriptions
+        that did not fit the chunk cap and were not analyzed.
         """
         try:
-            subscriptions = self.db.query(Subscription).filter(
+            subscriptions = self.db.query(Subscription).options(joinedload(Subscription.category)).filter(
                 Subscription.status == "active"
             ).all()
             
             if not self.provider.is_available():
-                return []
+                return {"duplicates": [], "rows_omitted": 0}
             
-            sub_list = [
-                f"{sub.id}: {sub.vendor_name} - {sub.plan_name or 'Standard'} (${sub.cost}/{sub.billing_cycle.value})"
+            sub_rows = [
+                {
+                    "id": sub.id,
+                    "vendor": sub.vendor_name,
+                    "plan": sub.plan_name or "Standard",
+                    "cost": sub.cost,
+                    "cycle": sub.billing_cycle.value,
+                    "monthly_cost": sub.monthly_equivalent_cost,
+                    "category": sub.category.name if sub.category else "Uncategorized"
+                }
                 for sub in subscriptions
             ]
             
-            prompt = f"""Analyze these subscriptions and identify potential duplicates or overlaps:
+            # Every row has to be seen, so large lists are analyzed in
+            # budget-sized chunks (map) and the findings merged (reduce)
+            chunked = chunk_rows(sub_rows, ["id", "vendor", "plan", "cost", "cycle", "category"])
+            responses = await asyncio.gather(
+                *[self._detect_duplicates_in(chunk) for chunk in chunked["chunks"]], return_exceptions=True
+            )
+            
+            merged = {}
+            for duplicates in responses:
+                if isinstance(duplicates, Exception):
+                    continue
+                for duplicate in duplicates:
+                    key = tuple(sorted(duplicate.get("subscription_ids") or []))
+                    if key and (key not in merged or duplicate.get("confidence", 0) > merged[key].get("confidence", 0)):
+                        merged[key] = duplicate
+            return {
+                "duplicates": sorted(merged.values(), key=lambda d: d.get("confidence", 0), reverse=True),
+                "rows_omitted": chunked["rows_omitted"],
+            }
+        except Exception:
+            return {"duplicates": [], "rows_omitted": 0}
+    
+    async def _detect_duplicates_in(self, table: str) -> List[Dict[str, Any]]:
+        """Ask the model for duplicates within one rendered chunk of subscriptions."""
+        prompt = f"""Analyze these subscriptions and identify potential duplicates or overlaps:
 
-{chr(10).join(sub_list)}
+{table}
 
 Look for:
 - Same vendor with multiple subscriptions
@@ -221,12 +270,10 @@ Respond with JSON only:
         }}
     ]
 }}"""
-            
-            response = await self.provider.generate_completion(prompt, max_tokens=600)
-            result = safe_json_parse(response, {"duplicates": []})
-            return result.get("duplicates", [])
-        except Exception:
-            return []
+        
+        response = await self.provider.generate_completion(prompt, max_tokens=600)
+        result = safe_json_parse(response, {"duplicates": []})
+        return result.get("duplicates", [])
     
     async def usage_pattern_analysis(self, customer_id: int) -> Dict[str, Any]:
         """
@@ -241,8 +288,7 @@ Respond with JSON only:
             # Calculate statistics
             active_count = len([s for s in subscriptions if s.status.value == "active"])
             cancelled_count = len([s for s in subscriptions if s.status.value == "cancelled"])
-            monthly_costs = [self._normalize_to_monthly(s.cost, s.billing_cycle.value) 
-                            for s in subscriptions if s.status.value == "active"]
+            monthly_costs = [s.monthly_equivalent_cost for s in subscriptions if s.status.value == "active"]
             total_monthly = sum(monthly_costs)
             
             base_result = {
@@ -307,10 +353,9 @@ Respond with JSON only:
                 Subscription.status == "active"
             ).all()
             
-            monthly_base = sum(
-                self._normalize_to_monthly(s.cost, s.billing_cycle.value)
-                for s in active_subs
-            )
+            monthly_base = self.db.query(
+                func.coalesce(func.sum(Subscription.monthly_equivalent_cost), 0.0)
+            ).filter(Subscription.status == "active").scalar()
             
             # Simple linear forecast as fallback
             forecast = [{"month": i, "estimated_cost": monthly_base, "confidence": 50} 
@@ -329,7 +374,7 @@ Respond with JSON only:
             sub_details = [
                 {
                     "vendor": s.vendor_name,
-                    "monthly_cost": self._normalize_to_monthly(s.cost, s.billing_cycle.value),
+                    "monthly_cost": s.monthly_equivalent_cost,
                     "billing_cycle": s.billing_cycle.value,
                     "next_renewal": str(s.next_renewal_date)
                 }
@@ -420,35 +465,34 @@ Respond with JSON only:
         """
         Feature 8: Natural Language Search
         Search subscriptions using natural language queries.
+        
+        Cycles, statuses, cost ranges, renewal windows and vendor/plan/category
+        words are extracted by `app.ai.query_parser` and run as SQL. The model
+        is only asked when some words match nothing, and then only sees the
+        rows passing the structured filters (at most `ai_search_candidate_limit`,
+        local text matches first). Local matches the model does not return
+        are appended to its answer.
         """
         try:
-            all_subs = self.db.query(Subscription).all()
-            
-            if not self.provider.is_available():
-                # Simple keyword search fallback
-                query_lower = query.lower()
-                matches = []
-                for s in all_subs:
-                    score = 0
-                    if query_lower in s.vendor_name.lower():
-                        score += 80
-                    if s.plan_name and query_lower in s.plan_name.lower():
-                        score += 60
-                    if s.category and query_lower in s.category.name.lower():
-                        score += 40
-                    
-                    if score > 0:
-                        matches.append({
-                            "subscription_id": s.id,
-                            "vendor": s.vendor_name,
-                            "cost": s.cost,
-                            "relevance_score": min(score, 100),
-                            "match_reason": "Keyword match"
-                        })
-                
-                matches.sort(key=lambda x: x["relevance_score"], reverse=True)
-                return {"matches": matches[:10], "query_interpretation": query}
-            
+            parsed = parse_search_query(query)
+            interpretation = describe_search_query(parsed)
+            candidates = self._search_candidates(parsed, with_terms=True)
+            matches, unmatched_terms = self._rank_search_matches(candidates, parsed)
+            
+            if not unmatched_terms or not self.provider.is_available():
+                return {"matches": matches[:10], "query_interpretation": interpretation}
+            
+            # Some words weren't names we know ("streaming", "design tools"):
+            # let the model judge the rows that pass the structured filters,
+            # with the local text matches first so the limit never drops them
+            term_ids = {s.id for s in candidates}
+            candidates = candidates + [
+                s for s in self._search_candidates(parsed, with_terms=False) if s.id not in term_ids
+            ]
+            candidates = candidates[:max(settings.ai_search_candidate_limit, len(term_ids))]
+            if not candidates:
+                return {"matches": [], "query_interpretation": interpretation}
+            by_id = {s.id: s for s in candidates}
             sub_list = [
                 {
                     "id": s.id,
@@ -459,13 +503,13 @@ Respond with JSON only:
                     "status": s.status.value,
                     "category": s.category.name if s.category else "Unknown"
                 }
-                for s in all_subs
+                for s in candidates
             ]
             
             prompt = f"""User query: "{query}"
 
 Find matching subscriptions from this list:
-{json.dumps(sub_list, indent=2)}
+{json.dumps(sub_list, separators=(",", ":"))}
 
 Respond with JSON only:
 {{
@@ -480,18 +524,103 @@ Respond with JSON only:
 }}"""
             
             response = await self.provider.generate_completion(prompt, max_tokens=600)
-            fallback = {"matches": [], "query_interpretation": query}
+            fallback = {"matches": matches[:10], "query_interpretation": interpretation}
             result = safe_json_parse(response, fallback)
-            # Enhance with full subscription data
+            # Enhance with full subscription data; ids outside the candidates are dropped
+            enriched = []
             for match in result.get("matches", []):
-                sub = next((s for s in all_subs if s.id == match.get("subscription_id")), None)
+                sub = by_id.get(match.get("subscription_id"))
                 if sub:
                     match["vendor"] = sub.vendor_name
                     match["cost"] = sub.cost
+                    enriched.append(match)
+            # Local matches the model left out are kept after its own
+            enriched_ids = {match["subscription_id"] for match in enriched}
+            enriched.extend(match for match in matches[:10] if match["subscription_id"] not in enriched_ids)
+            result["matches"] = enriched
             return result
         except Exception:
             return {"matches": [], "query_interpretation": query}
     
+    def _search_candidates(self, parsed: Dict[str, Any], with_terms: bool) -> List[Subscription]:
+        """Rows passing the parsed filters, optionally also matching any text term."""
+        query = self.db.query(Subscription).outerjoin(
+            Category, Subscription.category_id == Category.id
+        ).options(contains_eager(Subscription.category))
+        
+        if parsed["statuses"]:
+            query = query.filter(Subscription.status.in_(parsed["statuses"]))
+        if parsed["cycles"]:
+            query = query.filter(Subscription.billing_cycle.in_(parsed["cycles"]))
+        if parsed["min_cost"] is not None:
+            query = query.filter(Subscription.cost >= parsed["min_cost"])
+        if parsed["max_cost"] is not None:
+            query = query.filter(Subscription.cost <= parsed["max_cost"])
+        if parsed["renewal_from"] is not None:
+            query = query.filter(Subscription.next_renewal_date >= parsed["renewal_from"])
+        if parsed["renewal_to"] is not None:
+            query = query.filter(Subscription.next_renewal_date <= parsed["renewal_to"])
+        if with_terms and parsed["terms"]:
+            query = query.filter(or_(*[
+                or_(
+                    Subscription.vendor_name.ilike(f"%{term}%"),
+                    Subscription.plan_name.ilike(f"%{term}%"),
+                    Category.name.ilike(f"%{term}%"),
+                )
+                for term in parsed["terms"]
+            ]))
+        
+        order = []
+        if with_terms and parsed["terms"]:
+            # Same weights as _rank_search_matches, so the limit keeps the best
+            # text matches (a cheap exact vendor match beats costly category hits)
+            relevance = sum(
+                case(
+                    (Subscription.vendor_name.ilike(f"%{term}%"), 80),
+                    (Subscription.plan_name.ilike(f"%{term}%"), 60),
+                    (Category.name.ilike(f"%{term}%"), 40),
+                    else_=0,
+                )
+                for term in parsed["terms"]
+            )
+            order.append(relevance.desc())
+        if parsed["renewal_from"] or parsed["renewal_to"]:
+            order.append(Subscription.next_renewal_date)
+        else:
+            order.append(Subscription.cost.desc())
+        return query.order_by(*order, Subscription.id).limit(settings.ai_search_candidate_limit).all()
+    
+    def _rank_search_matches(self, candidates: List[Subscription], parsed: Dict[str, Any]):
+        """Score candidates against the text terms; returns (matches, terms that matched nothing)."""
+        terms = parsed["terms"]
+        matched_terms = set()
+        matches = []
+        for s in candidates:
+            score = 0
+            for term in terms:
+                term_score = 0
+                if term in s.vendor_name.lower():
+                    term_score = 80
+                elif s.plan_name and term in s.plan_name.lower():
+                    term_score = 60
+                elif s.category and term in s.category.name.lower():
+                    term_score = 40
+                if term_score:
+                    matched_terms.add(term)
+                    score += term_score
+            if terms and not score:
+                continue
+            matches.append({
+                "subscription_id": s.id,
+                "vendor": s.vendor_name,
+                "cost": s.cost,
+                "relevance_score": min(score, 100) if terms else 100,
+                "match_reason": "Keyword match" if terms else "Matches filters"
+            })
+        
+        matches.sort(key=lambda x: x["relevance_score"], reverse=True)
+        return matches, [t for t in terms if t not in matched_terms]
+    
     async def subscription_health_score(self, subscription_id: int) -> Dict[str, Any]:
         """
         Feature 10: Subscription Health Scoring
@@ -503,7 +632,7 @@ Respond with JSON only:
                 return {"error": "Subscription not found"}
             
             days_until_renewal = (sub.next_renewal_date - date.today()).days
-            monthly_cost = self._normalize_to_monthly(sub.cost, sub.billing_cycle.value)
+            monthly_cost = sub.monthly_equivalent_cost
             
             # Basic health score calculation
             base_score = 70
@@ -560,14 +689,3 @@ Respond with JSON only:
                 "recommendations": [],
                 "warnings": []
             }
-    
-    def _normalize_to_monthly(self, cost: float, cycle: str) -> float:
-        """Convert any billing cycle to monthly cost."""
-        multipliers = {
-            "weekly": 4.33,
-            "monthly": 1,
-            "quarterly": 1/3,
-            "biannual": 1/6,
-            "yearly": 1/12
-        }
-        return cost * multipliers.get(cycle, 1)
@@ -1,5 +1,5 @@
 """Google Gemini AI provider implementation using REST API."""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from app.ai.provider import AIProvider, RateLimitError, ServiceUnavailableError, AIProviderError
 from app.config import settings
 import httpx
@@ -10,6 +10,87 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Process-wide pooled client, bound to the event loop that created it
+_shared_client: Optional[httpx.AsyncClient] = None
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+# Closes of replaced clients still in flight (keeps the tasks referenced)
+_closing: set = set()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build a keep-alive pooled client from the ai_http_* settings."""
+    http2 = settings.ai_http2 and _http2_available()
+    if settings.ai_http2 and not http2:
+        logger.warning("AI_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(float(settings.ai_request_timeout), connect=settings.ai_http_connect_timeout),
+        limits=httpx.Limits(
+            max_connections=settings.ai_http_max_connections,
+            max_keepalive_connections=settings.ai_http_max_keepalive_connections,
+            keepalive_expiry=settings.ai_http_keepalive_expiry,
+        ),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared AI HTTP client, creating it on first use.
+
+    A pool cannot be shared across event loops, so a client created under a
+    different (e.g. already closed) loop is replaced and the old one closed.
+    """
+    global _shared_client, _shared_loop
+    loop = asyncio.get_running_loop()
+    if _shared_client is None or _shared_client.is_closed or _shared_loop is not loop:
+        if _shared_client is not None and not _shared_client.is_closed:
+            _schedule_close(_shared_client, _shared_loop)
+        _shared_client = create_http_client()
+        _shared_loop = loop
+    return _shared_client
+
+
+async def _close_quietly(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except Exception as e:
+        logger.debug(f"Closing replaced AI HTTP client failed: {e}")
+
+
+def _schedule_close(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a replaced client on its own loop if that loop still runs, else on the current one."""
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(_close_quietly(client), loop)
+        return
+    task = asyncio.get_running_loop().create_task(_close_quietly(client))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def _retry_delay_of(error: Dict[str, Any]) -> Optional[int]:
+    """Seconds from a RetryInfo detail (retryDelay like "15s"), if the error has one."""
+    for detail in error.get("details", []):
+        if detail.get("@type", "").endswith("RetryInfo"):
+            match = re.search(r'\d+', detail.get("retryDelay", "15s"))
+            return int(match.group()) if match else 15
+    return None
+
+
+async def close_http_client() -> None:
+    """Close the shared AI HTTP client (called from the app lifespan on shutdown)."""
+    global _shared_client, _shared_loop
+    client, _shared_client, _shared_loop = _shared_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
 
 class GeminiProvider(AIProvider):
     """
@@ -17,13 +98,17 @@ class GeminiProvider(AIProvider):
     
     Uses the REST API directly for maximum compatibility.
     Free tier includes generous limits for Gemini models.
+    
+    Requests go through a pooled keep-alive client shared by all provider
+    instances unless one is passed in explicitly.
     """
     
     def __init__(
         self, 
         api_key: str,
         model: str = "gemini-2.0-flash",
-        base_url: str = "https://generativelanguage.googleapis.com/v1beta"
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta",
+        client: Optional[httpx.AsyncClient] = None
     ):
         self.api_key = api_key
         self.model = model
@@ -31,6 +116,10 @@ class GeminiProvider(AIProvider):
         self.timeout = settings.ai_request_timeout
         self._retry_delay = 2  # seconds between retries
         self._max_retries = 3
+        self._client = client
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else get_http_client()
         
     async def generate_completion(
         self, 
@@ -57,25 +146,7 @@ class GeminiProvider(AIProvider):
             AIProviderError: For other API errors
         """
         endpoint = f"{self.base_url}/models/{self.model}:generateContent?key={self.api_key}"
-        
-        # Build the prompt - combine system prompt if provided
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"{system_prompt}\n\n{prompt}"
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": full_prompt}
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": temperature,
-                "maxOutputTokens": max_tokens
-            }
-        }
+        data = self._request_body(prompt, system_prompt, temperature, max_tokens)
         
         # Retry logic for rate limits
         last_error = None
@@ -83,68 +154,61 @@ class GeminiProvider(AIProvider):
             try:
                 logger.info(f"🤖 Calling Gemini API: model={self.model}, prompt_length={len(prompt)}, attempt={attempt+1}")
                 
-                async with httpx.AsyncClient(timeout=float(self.timeout)) as client:
-                    response = await client.post(endpoint, json=data)
-                    logger.info(f"Gemini API response: status={response.status_code}")
+                client = self._get_client()
+                response = await client.post(endpoint, json=data)
+                logger.info(f"Gemini API response: status={response.status_code}")
                     
-                    if response.status_code == 200:
-                        result = response.json()
+                if response.status_code == 200:
+                    result = response.json()
                         
-                        # Extract text from response
-                        if "candidates" in result and len(result["candidates"]) > 0:
-                            candidate = result["candidates"][0]
-                            if "content" in candidate and "parts" in candidate["content"]:
-                                text = candidate["content"]["parts"][0].get("text", "")
-                                logger.info(f"✅ Gemini success: {len(text)} chars returned")
-                                return text
+                    # Extract text from response
+                    if "candidates" in result and len(result["candidates"]) > 0:
+                        candidate = result["candidates"][0]
+                        if "content" in candidate and "parts" in candidate["content"]:
+                            text = candidate["content"]["parts"][0].get("text", "")
+                            logger.info(f"✅ Gemini success: {len(text)} chars returned")
+                            return text
                         
-                        # Check for blocked content
-                        if "promptFeedback" in result:
-                            feedback = result["promptFeedback"]
-                            if feedback.get("blockReason"):
-                                raise AIProviderError(f"Content blocked: {feedback.get('blockReason')}")
+                    # Check for blocked content
+                    if "promptFeedback" in result:
+                        feedback = result["promptFeedback"]
+                        if feedback.get("blockReason"):
+                            raise AIProviderError(f"Content blocked: {feedback.get('blockReason')}", status_code=400)
                         
-                        raise AIProviderError(f"Unexpected response format: {result}")
+                    raise AIProviderError(f"Unexpected response format: {result}")
                     
-                    elif response.status_code == 429:
-                        # Rate limit - wait and retry
-                        error_data = response.json().get("error", {})
-                        retry_info = None
-                        for detail in error_data.get("details", []):
-                            if detail.get("@type", "").endswith("RetryInfo"):
-                                retry_delay_str = detail.get("retryDelay", "15s")
-                                retry_info = int(re.search(r'\d+', retry_delay_str).group()) if re.search(r'\d+', retry_delay_str) else 15
-                                break
-                        
-                        wait_time = retry_info or (self._retry_delay * (attempt + 1))
-                        logger.warning(f"Gemini rate limit (429), waiting {wait_time}s before retry...")
-                        
-                        if attempt < self._max_retries - 1:
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            raise RateLimitError(
-                                f"Rate limit exceeded. Please wait {wait_time} seconds and try again."
-                            )
+                elif response.status_code == 429:
+                    # Rate limit - report the server's retry delay; the caller
+                    # (app.ai.scheduler) pauses and retries instead of sleeping here
+                    retry_info = _retry_delay_of(response.json().get("error", {}))
+                    wait_time = retry_info or (self._retry_delay * (attempt + 1))
+                    logger.warning(f"Gemini rate limit (429), retry after {wait_time}s")
+                    raise RateLimitError(
+                        f"Rate limit exceeded. Please wait {wait_time} seconds and try again.",
+                        retry_after=wait_time
+                    )
                     
-                    elif response.status_code == 503:
-                        logger.error("Gemini service unavailable (503)")
-                        raise ServiceUnavailableError(
-                            "Google AI service is temporarily unavailable. Please try again later."
-                        )
+                elif response.status_code == 503:
+                    logger.error("Gemini service unavailable (503)")
+                    raise ServiceUnavailableError(
+                        "Google AI service is temporarily unavailable. Please try again later."
+                    )
                     
-                    elif response.status_code == 400:
-                        error_data = response.json().get("error", {})
-                        raise AIProviderError(f"Bad request: {error_data.get('message', 'Unknown error')}")
+                elif response.status_code == 400:
+                    error_data = response.json().get("error", {})
+                    raise AIProviderError(
+                        f"Bad request: {error_data.get('message', 'Unknown error')}", status_code=400
+                    )
                     
-                    elif response.status_code == 401 or response.status_code == 403:
-                        logger.error(f"Gemini authentication failed ({response.status_code})")
-                        raise AIProviderError(
-                            "Invalid API key. Please check your SUBTRACK_AI_API_KEY."
-                        )
+                elif response.status_code == 401 or response.status_code == 403:
+                    logger.error(f"Gemini authentication failed ({response.status_code})")
+                    raise AIProviderError(
+                        "Invalid API key. Please check your SUBTRACK_AI_API_KEY.",
+                        status_code=response.status_code
+                    )
                     
-                    else:
-                        response.raise_for_status()
+                else:
+                    response.raise_for_status()
                         
             except httpx.TimeoutException:
                 logger.error(f"Gemini request timed out after {self.timeout}s")
@@ -161,7 +225,7 @@ class GeminiProvider(AIProvider):
                 
             except httpx.HTTPStatusError as e:
                 logger.error(f"Gemini HTTP error: {e.response.status_code}")
-                raise AIProviderError(f"HTTP error: {e.response.status_code}")
+                raise AIProviderError(f"HTTP error: {e.response.status_code}", status_code=e.response.status_code)
                 
             except Exception as e:
                 logger.error(f"Gemini unexpected error: {str(e)}")
@@ -173,6 +237,99 @@ class GeminiProvider(AIProvider):
         
         raise last_error or AIProviderError("Failed after all retries")
     
+    def _request_body(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        # Build the prompt - combine system prompt if provided
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        
+        return {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": full_prompt}
+                    ]
+                }
+            ],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_tokens
+            }
+        }
+    
+    async def stream_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion using Gemini's streamGenerateContent (SSE).
+        
+        Yields text fragments as they arrive. Closing the iterator (e.g. when
+        the HTTP client disconnects) closes the upstream request.
+        
+        Raises:
+            RateLimitError: When rate limit is exceeded (before any text)
+            ServiceUnavailableError: When API is down
+            AIProviderError: For other API errors
+        """
+        endpoint = f"{self.base_url}/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        data = self._request_body(prompt, system_prompt, temperature, max_tokens)
+        logger.info(f"🤖 Streaming Gemini API: model={self.model}, prompt_length={len(prompt)}")
+        
+        try:
+            async with self._get_client().stream("POST", endpoint, json=data) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    try:
+                        error_data = response.json().get("error", {})
+                    except ValueError:
+                        error_data = {"message": response.text[:200]}
+                    message = error_data.get("message", "Unknown error")
+                    if response.status_code == 429:
+                        wait_time = _retry_delay_of(error_data) or self._retry_delay
+                        raise RateLimitError(
+                            f"Rate limit exceeded. Please wait {wait_time} seconds and try again.",
+                            retry_after=wait_time
+                        )
+                    if response.status_code == 503:
+                        raise ServiceUnavailableError(
+                            "Google AI service is temporarily unavailable. Please try again later."
+                        )
+                    if response.status_code in (401, 403):
+                        raise AIProviderError(
+                            "Invalid API key. Please check your SUBTRACK_AI_API_KEY.",
+                            status_code=response.status_code
+                        )
+                    raise AIProviderError(f"HTTP error {response.status_code}: {message}", status_code=response.status_code)
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        chunk = json.loads(line[5:].strip())
+                    except json.JSONDecodeError:
+                        continue
+                    feedback = chunk.get("promptFeedback", {})
+                    if feedback.get("blockReason"):
+                        raise AIProviderError(f"Content blocked: {feedback.get('blockReason')}", status_code=400)
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+        except httpx.TimeoutException:
+            raise AIProviderError(f"Request timed out after {self.timeout} seconds. Please try again.")
+        except httpx.TransportError as e:
+            raise AIProviderError(f"Connection error: {str(e)}")
+    
     def is_available(self) -> bool:
         """Check if the provider is configured with an API key."""
         return bool(self.api_key)
@@ -184,6 +341,8 @@ class GeminiProvider(AIProvider):
             "model": self.model,
             "base_url": self.base_url,
             "timeout": self.timeout,
+            "http2": settings.ai_http2 and _http2_available(),
+            "max_connections": settings.ai_http_max_connections,
             "pricing": "Free tier available"
         }
 
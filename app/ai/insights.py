@@ -1,5 +1,5 @@
 """AI-powered insights generation."""
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import date, timedelta
@@ -7,6 +7,10 @@ from app.models import Category, Group, Customer, Subscription
 from app.models.subscription import SubscriptionStatus
 from app.ai.provider import AIProvider
 from app.ai.json_parser import safe_json_parse
+from app.ai.cache import generate_cache_key, get_cached_response, store_cached_response
+from app.config import settings
+from app.services.hot_dataset import subscription_columns
+import json
 
 
 class InsightsAnalyzer:
@@ -21,9 +25,16 @@ class InsightsAnalyzer:
         category_id: Optional[int] = None,
         group_id: Optional[int] = None,
         customer_id: Optional[int] = None,
-        threshold_days: int = 30
+        threshold_days: int = 30,
+        min_ttl: int = 0
     ) -> Dict[str, Any]:
-        """Generate comprehensive insights."""
+        """
+        Generate comprehensive insights.
+        
+        The AI part is cached in `ai_request_cache` keyed by the scope and the
+        metrics it was generated from; `min_ttl` regenerates entries expiring
+        within that many seconds (used by `app.ai.precompute`).
+        """
         
         # Get deterministic data
         deterministic = self._get_deterministic_insights(
@@ -33,7 +44,22 @@ class InsightsAnalyzer:
         # Generate AI-powered insights if available
         ai_insights = None
         if self.ai_provider.is_available():
-            ai_insights = await self._generate_ai_insights(deterministic)
+            cache_key = generate_cache_key(
+                "insights",
+                scope=[category_id, group_id, customer_id, threshold_days],
+                total=deterministic['total_active_subscriptions'],
+                cost=round(deterministic['total_monthly_cost'], 2),
+                overdue=len(deterministic['overdue']),
+                expiring=len(deterministic['expiring_soon']),
+                top_vendors=deterministic['top_vendors']
+            )
+            cached = get_cached_response(self.db, cache_key, min_ttl)
+            if cached:
+                ai_insights = {**json.loads(cached), 'cached': True}
+            else:
+                ai_insights = await self._generate_ai_insights(deterministic)
+                if not ai_insights.get('fallback'):
+                    store_cached_response(self.db, cache_key, "insights", "insights", json.dumps(ai_insights))
         
         return {
             **deterministic,
@@ -50,19 +76,11 @@ class InsightsAnalyzer:
     ) -> Dict[str, Any]:
         """Get deterministic insights from data."""
         
-        # Build query based on scope
-        query = self.db.query(Subscription).filter(
-            Subscription.status == SubscriptionStatus.ACTIVE
-        )
-        
-        if customer_id:
-            query = query.filter(Subscription.customer_id == customer_id)
-        elif group_id:
-            query = query.join(Customer).filter(Customer.group_id == group_id)
-        elif category_id:
-            query = query.filter(Subscription.category_id == category_id)
-        
-        subscriptions = query.all()
+        if settings.hot_dataset_enabled:
+            renewals, vendor_costs, category_costs = self._scope_from_columns(category_id, group_id, customer_id)
+        else:
+            renewals, vendor_costs, category_costs = self._scope_from_database(category_id, group_id, customer_id)
+        total_cost = sum(category_costs.values())
         
         # Calculate metrics
         today = date.today()
@@ -70,37 +88,29 @@ class InsightsAnalyzer:
         
         expiring_soon = []
         overdue = []
-        total_cost = 0.0
-        vendor_costs = {}
-        category_costs = {}
-        
-        for sub in subscriptions:
-            # Cost calculations
-            total_cost += sub.cost
-            vendor_costs[sub.vendor_name] = vendor_costs.get(sub.vendor_name, 0) + sub.cost
-            category_costs[sub.category_id] = category_costs.get(sub.category_id, 0) + sub.cost
-            
+        
+        for sub_id, vendor, sub_customer_id, cost, currency, next_renewal_date in renewals:
             # Expiry checks
-            if sub.next_renewal_date:
-                if sub.next_renewal_date < today:
+            if next_renewal_date:
+                if next_renewal_date < today:
                     overdue.append({
-                        'id': sub.id,
-                        'vendor': sub.vendor_name,
-                        'customer_id': sub.customer_id,
-                        'cost': sub.cost,
-                        'currency': sub.currency,
-                        'days_overdue': (today - sub.next_renewal_date).days,
-                        'next_renewal_date': sub.next_renewal_date.isoformat()
+                        'id': sub_id,
+                        'vendor': vendor,
+                        'customer_id': sub_customer_id,
+                        'cost': cost,
+                        'currency': currency,
+                        'days_overdue': (today - next_renewal_date).days,
+                        'next_renewal_date': next_renewal_date.isoformat()
                     })
-                elif sub.next_renewal_date <= threshold_date:
+                elif next_renewal_date <= threshold_date:
                     expiring_soon.append({
-                        'id': sub.id,
-                        'vendor': sub.vendor_name,
-                        'customer_id': sub.customer_id,
-                        'cost': sub.cost,
-                        'currency': sub.currency,
-                        'days_until_renewal': (sub.next_renewal_date - today).days,
-                        'next_renewal_date': sub.next_renewal_date.isoformat()
+                        'id': sub_id,
+                        'vendor': vendor,
+                        'customer_id': sub_customer_id,
+                        'cost': cost,
+                        'currency': currency,
+                        'days_until_renewal': (next_renewal_date - today).days,
+                        'next_renewal_date': next_renewal_date.isoformat()
                     })
         
         # Sort by urgency
@@ -111,8 +121,8 @@ class InsightsAnalyzer:
         top_vendors = sorted(vendor_costs.items(), key=lambda x: x[1], reverse=True)[:5]
         
         return {
-            'total_active_subscriptions': len(subscriptions),
-            'total_monthly_cost': total_cost,  # Simplified - should normalize by cycle
+            'total_active_subscriptions': len(renewals),
+            'total_monthly_cost': total_cost,
             'expiring_soon': expiring_soon,
             'overdue': overdue,
             'top_vendors': [{'vendor': v, 'cost': c} for v, c in top_vendors],
@@ -122,6 +132,72 @@ class InsightsAnalyzer:
             ]
         }
     
+    def _scope_from_database(
+        self,
+        category_id: Optional[int],
+        group_id: Optional[int],
+        customer_id: Optional[int]
+    ) -> Tuple[List[tuple], Dict[Any, float], Dict[Any, float]]:
+        """Active rows in scope plus monthly spend per vendor and category, from SQL."""
+        query = self.db.query(Subscription).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE
+        )
+        
+        if customer_id:
+            query = query.filter(Subscription.customer_id == customer_id)
+        elif group_id:
+            query = query.join(Customer).filter(Customer.group_id == group_id)
+        elif category_id:
+            query = query.filter(Subscription.category_id == category_id)
+        
+        renewals = query.with_entities(
+            Subscription.id, Subscription.vendor_name, Subscription.customer_id,
+            Subscription.cost, Subscription.currency, Subscription.next_renewal_date
+        ).all()
+        
+        # Monthly-equivalent spend per vendor and category, summed in SQL
+        monthly = func.coalesce(func.sum(Subscription.monthly_equivalent_cost), 0.0)
+        vendor_costs = dict(
+            query.with_entities(Subscription.vendor_name, monthly).group_by(Subscription.vendor_name).all()
+        )
+        category_costs = dict(
+            query.with_entities(Subscription.category_id, monthly).group_by(Subscription.category_id).all()
+        )
+        return renewals, vendor_costs, category_costs
+    
+    def _scope_from_columns(
+        self,
+        category_id: Optional[int],
+        group_id: Optional[int],
+        customer_id: Optional[int]
+    ) -> Tuple[List[tuple], Dict[Any, float], Dict[Any, float]]:
+        """Same as `_scope_from_database`, read from the in-memory hot dataset."""
+        customer_ids = None
+        if not customer_id and group_id:
+            customer_ids = {cid for cid, in self.db.query(Customer.id).filter(Customer.group_id == group_id)}
+        
+        with subscription_columns(self.db) as columns:
+            rows = columns.select(
+                status=SubscriptionStatus.ACTIVE,
+                customer_id=customer_id or None,
+                customer_ids=customer_ids,
+                category_id=None if customer_id or group_id else category_id or None
+            )
+            vendors, currencies = columns.vendors.values, columns.currencies.values
+            renewals = [
+                (
+                    columns.id[i], vendors[columns.vendor[i]], columns.customer_id[i], columns.cost[i],
+                    currencies[columns.currency[i]],
+                    date.fromordinal(columns.renewal[i]) if columns.renewal[i] else None
+                )
+                for i in rows
+            ]
+            vendor_costs = {vendor: spend for vendor, (_, spend) in columns.group_by("vendor", rows).items()}
+            category_costs = {
+                category: spend for category, (_, spend) in sorted(columns.group_by("category_id", rows).items())
+            }
+        return renewals, vendor_costs, category_costs
+    
     async def _generate_ai_insights(self, deterministic_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate AI-powered insights and recommendations."""
         try:
@@ -167,40 +243,59 @@ Provide 3-5 specific, actionable recommendations as a JSON array of strings."""
                 # If not valid JSON, split by newlines
                 recommendations = [r.strip() for r in recommendations_text.split('\n') if r.strip()]
             
-            # Identify risk flags
-            risk_flags = []
-            if len(deterministic_data['overdue']) > 0:
-                risk_flags.append({
-                    'severity': 'high',
-                    'message': f"{len(deterministic_data['overdue'])} overdue subscriptions require immediate attention"
-                })
-            if len(deterministic_data['expiring_soon']) > 10:
-                risk_flags.append({
-                    'severity': 'medium',
-                    'message': f"High volume of upcoming renewals ({len(deterministic_data['expiring_soon'])}) in next 30 days"
-                })
-            if deterministic_data['total_monthly_cost'] > 10000:
-                risk_flags.append({
-                    'severity': 'low',
-                    'message': f"High monthly spend (${deterministic_data['total_monthly_cost']:.2f}) - review for optimization"
-                })
-            
             return {
                 'summary': summary,
                 'recommendations': recommendations[:5],  # Limit to 5
-                'risk_flags': risk_flags,
+                'risk_flags': self._risk_flags(deterministic_data),
                 'next_best_actions': self._generate_next_actions(deterministic_data)
             }
             
         except Exception as e:
+            # Provider down or circuit open: answer from the data alone
             return {
-                'summary': 'AI analysis unavailable',
+                'summary': self._rule_based_summary(deterministic_data),
                 'recommendations': [],
-                'risk_flags': [],
+                'risk_flags': self._risk_flags(deterministic_data),
                 'next_best_actions': self._generate_next_actions(deterministic_data),
+                'fallback': True,
                 'error': str(e)
             }
     
+    def _risk_flags(self, deterministic_data: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Identify risk flags from the deterministic metrics."""
+        risk_flags = []
+        if len(deterministic_data['overdue']) > 0:
+            risk_flags.append({
+                'severity': 'high',
+                'message': f"{len(deterministic_data['overdue'])} overdue subscriptions require immediate attention"
+            })
+        if len(deterministic_data['expiring_soon']) > 10:
+            risk_flags.append({
+                'severity': 'medium',
+                'message': f"High volume of upcoming renewals ({len(deterministic_data['expiring_soon'])}) in next 30 days"
+            })
+        if deterministic_data['total_monthly_cost'] > 10000:
+            risk_flags.append({
+                'severity': 'low',
+                'message': f"High monthly spend (${deterministic_data['total_monthly_cost']:.2f}) - review for optimization"
+            })
+        return risk_flags
+    
+    def _rule_based_summary(self, deterministic_data: Dict[str, Any]) -> str:
+        """Plain summary used when the AI summary can't be generated."""
+        parts = [
+            f"{deterministic_data['total_active_subscriptions']} active subscriptions costing "
+            f"${deterministic_data['total_monthly_cost']:.2f}."
+        ]
+        if deterministic_data['overdue']:
+            parts.append(f"{len(deterministic_data['overdue'])} are overdue for renewal.")
+        if deterministic_data['expiring_soon']:
+            parts.append(f"{len(deterministic_data['expiring_soon'])} renew soon.")
+        if deterministic_data['top_vendors']:
+            top = deterministic_data['top_vendors'][0]
+            parts.append(f"Largest vendor: {top['vendor']} (${top['cost']:.2f}).")
+        return " ".join(parts)
+    
     def _generate_next_actions(self, deterministic_data: Dict[str, Any]) -> List[str]:
         """Generate next best actions based on data."""
         actions = []
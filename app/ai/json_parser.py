@@ -1,7 +1,7 @@
 """Helper to extract and parse JSON from AI responses."""
 import json
 import re
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 
 def extract_json_from_response(response: str) -> Optional[dict]:
@@ -60,3 +60,26 @@ def safe_json_parse(response: str, fallback: dict) -> dict:
     """
     result = extract_json_from_response(response)
     return result if result is not None else fallback
+
+
+def extract_json_array(response: str) -> Optional[List[Any]]:
+    """
+    Extract a JSON array from an AI response that might contain extra text.
+    
+    Returns None if no array can be parsed.
+    """
+    result = extract_json_from_response(response)
+    if isinstance(result, list):
+        return result
+    
+    # Outermost [...] span, e.g. after an introductory sentence
+    match = re.search(r'\[.*\]', response, re.DOTALL)
+    if match:
+        try:
+            result = json.loads(match.group(0))
+            if isinstance(result, list):
+                return result
+        except json.JSONDecodeError:
+            pass
+    
+    return None
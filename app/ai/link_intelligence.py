@@ -1,12 +1,80 @@
-"""Relationship intelligence and link analysis."""
-from typing import List, Dict, Any, Tuple
-from sqlalchemy.orm import Session
-from app.models import Category, Group, Customer, Subscription, Link
+"""
+Relationship intelligence and link analysis.
+
+Pairs are not compared exhaustively. A blocking stage first files every
+entity under a few cheap keys (email domain, phone, shared tag, group or
+country plus name LSH bucket for customers; vendor or owning customer for
+subscriptions) and only pairs sharing a key are scored. The pair scorers
+do not depend on how candidates were found, so a candidate gets the same
+confidence as under exhaustive comparison. Name similarity and name
+buckets come from `app.services.name_similarity`.
+
+Runs are incremental by default. Each run is recorded in
+`link_analysis_runs` with the newest `updated_at` of customers and
+subscriptions at its start; the next run only scores pairs where at least
+one side was updated after those marks, and skips loading a table that has
+no changes at all. Links to deleted entities are retired on every run.
+`full=True` rescans everything.
+
+Large candidate sets are scored in parallel: the fields the scorers read
+are snapshotted into named tuples and chunks of pairs are sent to a
+process pool (`ai_link_workers`). Below `ai_link_parallel_min_pairs`
+pairs, or with a single worker, scoring stays in-process. The pool is
+created on first use, kept for the life of the process and shut down
+from the app lifespan (`shutdown_scoring_pool`); async callers await it
+through the `*_async` variants so the event loop is not blocked.
+
+`save_new_links` persists results with one existence query and one
+multi-row insert that ignores conflicts on the links unique key.
+"""
+import os
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, lazyload
+from app.models import Category, Group, Customer, Subscription, Link, LinkAnalysisRun
 from app.models.link import EntityType
 from app.ai.provider import AIProvider
-from difflib import SequenceMatcher
+from app.ai.json_parser import extract_json_array
+from app.ai.scheduler import estimate_tokens
+from app.config import settings
+from app.services.name_similarity import name_lsh_keys, name_similarity
+import asyncio
+import json
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+REFINE_SYSTEM_PROMPT = "You are an expert at analyzing business relationships and subscription patterns."
+
+# Response tokens budgeted per link in a batch (id, confidence, ~40-word explanation)
+REFINE_TOKENS_PER_LINK = 80
+
+# Mark used when a table had no timestamped rows at the previous run
+EPOCH = datetime(1970, 1, 1)
+
+# Columns of the links unique key
+LINK_KEY_COLUMNS = ('source_type', 'source_id', 'target_type', 'target_id')
+
+# Picklable copies of the fields read by the pair scorers
+CustomerSnapshot = namedtuple(
+    'CustomerSnapshot', ['id', 'name', 'email', 'phone', 'country', 'tags', 'category_id', 'group_id']
+)
+SubscriptionSnapshot = namedtuple(
+    'SubscriptionSnapshot',
+    ['id', 'customer_id', 'category_id', 'vendor_name', 'plan_name', 'cost', 'currency',
+     'billing_cycle', 'country', 'next_renewal_date']
+)
+
+# Chunks per worker, so one slow chunk does not leave the others idle
+CHUNKS_PER_WORKER = 4
+
 
 def extract_domain(email: str) -> str:
     """Extract domain from email address."""
@@ -19,7 +87,7 @@ def calculate_name_similarity(name1: str, name2: str) -> float:
     """Calculate similarity between two names."""
     if not name1 or not name2:
         return 0.0
-    return SequenceMatcher(None, name1.lower(), name2.lower()).ratio()
+    return name_similarity(name1, name2)
 
 
 def extract_keywords(text: str) -> set:
@@ -33,6 +101,234 @@ def extract_keywords(text: str) -> set:
     return {w for w in words if len(w) > 2 and w not in stop_words}
 
 
+def customer_blocking_keys(customer: Customer) -> Set[Hashable]:
+    """Keys under which a customer is filed for candidate generation."""
+    keys: Set[Hashable] = set()
+    domain = extract_domain(customer.email)
+    if domain:
+        keys.add(('domain', domain))
+    if customer.phone:
+        keys.add(('phone', customer.phone))
+    if customer.tags:
+        keys.update(('tag', tag.strip().lower()) for tag in customer.tags.split(',') if tag.strip())
+    if customer.group_id:
+        keys.add(('group', customer.group_id))
+    country = (customer.country or '').lower()
+    keys.update(('name', country, band) for band in name_lsh_keys(customer.name))
+    return keys
+
+
+def subscription_blocking_keys(subscription: Subscription) -> Set[Hashable]:
+    """Keys under which a subscription is filed for candidate generation."""
+    keys: Set[Hashable] = {('customer', subscription.customer_id)}
+    if subscription.vendor_name:
+        keys.add(('vendor', subscription.vendor_name.lower()))
+    return keys
+
+
+def candidate_pairs(
+    items: Sequence[Any],
+    key_func: Callable[[Any], Iterable[Hashable]],
+    max_block_size: int = None,
+    changed: Optional[Set[int]] = None
+) -> List[Tuple[int, int]]:
+    """
+    Index pairs (i < j) of items sharing at least one blocking key, sorted.
+
+    Blocks larger than `max_block_size` (a free-mail domain, a tag on every
+    customer) are skipped: they carry little signal and would bring back
+    quadratic work. With `changed`, only pairs including one of those
+    indexes are returned.
+    """
+    if max_block_size is None:
+        max_block_size = settings.ai_link_max_block_size
+    blocks: Dict[Hashable, List[int]] = defaultdict(list)
+    for index, item in enumerate(items):
+        for key in key_func(item):
+            blocks[key].append(index)
+
+    pairs: Set[Tuple[int, int]] = set()
+    skipped = 0
+    for key, members in blocks.items():
+        if len(members) < 2:
+            continue
+        if changed is not None and changed.isdisjoint(members):
+            continue
+        if len(members) > max_block_size:
+            skipped += 1
+            continue
+        for offset, i in enumerate(members):
+            for j in members[offset + 1:]:
+                if changed is None or i in changed or j in changed:
+                    pairs.add((i, j))
+    if skipped:
+        logger.info(f"Skipped {skipped} blocking keys shared by more than {max_block_size} entities")
+    return sorted(pairs)
+
+
+def snapshot(item: Any, snapshot_type) -> tuple:
+    """Copy the snapshot's fields off an ORM row."""
+    return snapshot_type(*(getattr(item, field) for field in snapshot_type._fields))
+
+
+def link_workers() -> int:
+    """Configured scoring processes; 0 means one per CPU."""
+    return settings.ai_link_workers or os.cpu_count() or 1
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def scoring_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared scoring pool, created on first use or when the worker count changes."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool, _pool_workers = ProcessPoolExecutor(max_workers=workers), workers
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool that failed so the next run starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_scoring_pool() -> None:
+    """Stop the scoring processes (called from the app lifespan on shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _score_chunk(scorer: Callable, threshold: float, items, pairs: Sequence[Tuple[int, int]]) -> List[Tuple]:
+    """(i, j, confidence, evidence) for pairs scoring above `threshold`; `items` is indexable by i and j."""
+    results = []
+    for i, j in pairs:
+        confidence, evidence = scorer(items[i], items[j])
+        if confidence > threshold:
+            results.append((i, j, confidence, evidence))
+    return results
+
+
+def _parallel_jobs(
+    items: Sequence[Any],
+    pairs: List[Tuple[int, int]],
+    snapshot_type,
+    workers: Optional[int]
+) -> Tuple[int, List[Tuple[Dict[int, tuple], List[Tuple[int, int]]]]]:
+    """
+    (workers, [(snapshots, chunk), ...]) for a pool run, or no jobs when the
+    pairs should be scored in-process. Each chunk only carries the
+    snapshots its pairs reference.
+    """
+    workers = link_workers() if workers is None else workers
+    if workers <= 1 or len(pairs) < settings.ai_link_parallel_min_pairs:
+        return workers, []
+    snapshots = [snapshot(item, snapshot_type) for item in items]
+    size = -(-len(pairs) // (workers * CHUNKS_PER_WORKER))
+    chunks = [pairs[start:start + size] for start in range(0, len(pairs), size)]
+    return workers, [({i: snapshots[i] for pair in chunk for i in pair}, chunk) for chunk in chunks]
+
+
+def score_pairs(
+    items: Sequence[Any],
+    pairs: List[Tuple[int, int]],
+    scorer: Callable,
+    threshold: float,
+    snapshot_type,
+    workers: Optional[int] = None
+) -> List[Tuple]:
+    """
+    Score candidate pairs, in the process pool when there are enough of them.
+    
+    Results come back in pair order either way. If the pool cannot be used
+    (e.g. no process support in a sandbox) scoring falls back to this process.
+    """
+    workers, jobs = _parallel_jobs(items, pairs, snapshot_type, workers)
+    if not jobs:
+        return _score_chunk(scorer, threshold, items, pairs)
+    try:
+        pool = scoring_pool(workers)
+        futures = [pool.submit(_score_chunk, scorer, threshold, snapshots, chunk) for snapshots, chunk in jobs]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+    except (OSError, RuntimeError) as e:
+        # BrokenProcessPool is a RuntimeError
+        logger.warning(f"Parallel link scoring unavailable, scoring in-process: {e}")
+        if _pool is not None:
+            _discard_pool(_pool)
+        return _score_chunk(scorer, threshold, items, pairs)
+    logger.info(f"Scored {len(pairs)} link candidates across {workers} processes")
+    return results
+
+
+async def score_pairs_async(
+    items: Sequence[Any],
+    pairs: List[Tuple[int, int]],
+    scorer: Callable,
+    threshold: float,
+    snapshot_type,
+    workers: Optional[int] = None
+) -> List[Tuple]:
+    """`score_pairs` for async callers: pool chunks are awaited via `run_in_executor`."""
+    workers, jobs = _parallel_jobs(items, pairs, snapshot_type, workers)
+    if not jobs:
+        return _score_chunk(scorer, threshold, items, pairs)
+    loop = asyncio.get_running_loop()
+    try:
+        pool = scoring_pool(workers)
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(pool, _score_chunk, scorer, threshold, snapshots, chunk)
+            for snapshots, chunk in jobs
+        ))
+    except (OSError, RuntimeError) as e:
+        logger.warning(f"Parallel link scoring unavailable, scoring in-process: {e}")
+        if _pool is not None:
+            _discard_pool(_pool)
+        return _score_chunk(scorer, threshold, items, pairs)
+    logger.info(f"Scored {len(pairs)} link candidates across {workers} processes")
+    return [result for chunk in chunks for result in chunk]
+
+
+def save_new_links(db: Session, links: List[Dict[str, Any]]) -> List[Link]:
+    """
+    Insert links whose (source, target) key is not stored yet; returns the new rows.
+    
+    Existing keys are loaded with one query and the rest go in as one
+    multi-row INSERT .. ON CONFLICT DO NOTHING, so a concurrent run cannot
+    create duplicates. The caller commits.
+    """
+    existing = {tuple(row) for row in db.query(*(getattr(Link, column) for column in LINK_KEY_COLUMNS))}
+    rows = []
+    for link in links:
+        key = tuple(link[column] for column in LINK_KEY_COLUMNS)
+        if key in existing:
+            continue
+        existing.add(key)
+        rows.append({
+            **{column: link[column] for column in LINK_KEY_COLUMNS},
+            'confidence': link['confidence'],
+            'evidence_text': link['evidence_text'],
+        })
+    if not rows:
+        return []
+    
+    insert = postgresql_insert if db.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    statement = insert(Link).on_conflict_do_nothing(index_elements=list(LINK_KEY_COLUMNS)).returning(Link)
+    return list(db.scalars(statement, rows))
+
+
 class LinkAnalyzer:
     """Analyzer for discovering relationships between entities."""
     
@@ -40,27 +336,99 @@ class LinkAnalyzer:
         self.db = db
         self.ai_provider = ai_provider
     
-    def analyze_customer_links(self) -> List[Dict[str, Any]]:
-        """Find potential links between customers."""
+    def plan_run(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Decide what a run has to rescore.
+        
+        `customers_since` / `subscriptions_since` are None for a full scan.
+        The new marks are read before scanning, so rows written while the
+        run is in progress are picked up again by the next one.
+        """
+        previous = None
+        if not full:
+            previous = self.db.query(LinkAnalysisRun).order_by(LinkAnalysisRun.id.desc()).first()
+        plan = {
+            'full': previous is None,
+            'customers_since': (previous.customer_mark or EPOCH) if previous else None,
+            'subscriptions_since': (previous.subscription_mark or EPOCH) if previous else None,
+            'customer_mark': self.db.query(func.max(Customer.updated_at)).scalar(),
+            'subscription_mark': self.db.query(func.max(Subscription.updated_at)).scalar(),
+        }
+        plan['customers_changed'] = self._count_changed(Customer, plan['customers_since'])
+        plan['subscriptions_changed'] = self._count_changed(Subscription, plan['subscriptions_since'])
+        return plan
+    
+    def _count_changed(self, model, since: Optional[datetime]) -> int:
+        query = self.db.query(func.count(model.id))
+        if since is not None:
+            query = query.filter(model.updated_at > since)
+        return query.scalar() or 0
+    
+    def _load_changed(self, model, since: Optional[datetime]) -> Tuple[List[Any], Optional[Set[int]]]:
+        """All rows of `model` by id plus the indexes updated after `since` (None: all)."""
+        if since is not None and not self._count_changed(model, since):
+            return [], set()
+        rows = self.db.query(model).options(lazyload('*')).order_by(model.id).all()
+        if since is None:
+            return rows, None
+        return rows, {i for i, row in enumerate(rows) if row.updated_at is not None and row.updated_at > since}
+    
+    def record_run(self, plan: Dict[str, Any], links_found: int, links_retired: int) -> LinkAnalysisRun:
+        """Store the run and its high-water marks; the caller commits."""
+        run = LinkAnalysisRun(
+            full=plan['full'],
+            customer_mark=plan['customer_mark'],
+            subscription_mark=plan['subscription_mark'],
+            customers_changed=plan['customers_changed'],
+            subscriptions_changed=plan['subscriptions_changed'],
+            links_found=links_found,
+            links_retired=links_retired,
+        )
+        self.db.add(run)
+        return run
+    
+    def retire_deleted_links(self) -> int:
+        """Delete links whose customer or subscription no longer exists; the caller commits."""
+        retired = 0
+        for entity_type, model in ((EntityType.CUSTOMER, Customer), (EntityType.SUBSCRIPTION, Subscription)):
+            existing = select(model.id)
+            for side_type, side_id in ((Link.source_type, Link.source_id), (Link.target_type, Link.target_id)):
+                retired += self.db.query(Link).filter(
+                    side_type == entity_type, side_id.not_in(existing)
+                ).delete(synchronize_session=False)
+        return retired
+    
+    def analyze_customer_links(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Find potential links between customers, optionally only for those updated after `since`."""
+        customers, pairs = self._customer_candidates(since)
+        return self._customer_links(customers, score_pairs(customers, pairs, *CUSTOMER_SCORING))
+    
+    async def analyze_customer_links_async(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """`analyze_customer_links`, awaiting the scoring pool."""
+        customers, pairs = self._customer_candidates(since)
+        return self._customer_links(customers, await score_pairs_async(customers, pairs, *CUSTOMER_SCORING))
+    
+    def _customer_candidates(self, since: Optional[datetime]) -> Tuple[List[Customer], List[Tuple[int, int]]]:
+        customers, changed = self._load_changed(Customer, since)
+        return customers, candidate_pairs(customers, customer_blocking_keys, changed=changed)
+    
+    @staticmethod
+    def _customer_links(customers: List[Customer], scored: List[Tuple]) -> List[Dict[str, Any]]:
         links = []
-        customers = self.db.query(Customer).all()
-        
-        for i, customer1 in enumerate(customers):
-            for customer2 in customers[i+1:]:
-                confidence, evidence = self._analyze_customer_pair(customer1, customer2)
-                if confidence > 0.15:  # Lowered threshold for better detection
-                    links.append({
-                        'source_type': EntityType.CUSTOMER,
-                        'source_id': customer1.id,
-                        'target_type': EntityType.CUSTOMER,
-                        'target_id': customer2.id,
-                        'confidence': confidence,
-                        'evidence_text': evidence
-                    })
+        for i, j, confidence, evidence in scored:
+            links.append({
+                'source_type': EntityType.CUSTOMER,
+                'source_id': customers[i].id,
+                'target_type': EntityType.CUSTOMER,
+                'target_id': customers[j].id,
+                'confidence': confidence,
+                'evidence_text': evidence
+            })
         
         return links
     
-    def _analyze_customer_pair(self, c1: Customer, c2: Customer) -> Tuple[float, str]:
+    @staticmethod
+    def _analyze_customer_pair(c1: Customer, c2: Customer) -> Tuple[float, str]:
         """Analyze a pair of customers for potential links."""
         evidence_parts = []
         confidence = 0.0
@@ -113,28 +481,40 @@ class LinkAnalyzer:
         
         return confidence, '; '.join(evidence_parts) if evidence_parts else "No strong evidence"
     
-    def analyze_subscription_links(self) -> List[Dict[str, Any]]:
-        """Find potential links between subscriptions."""
+    def analyze_subscription_links(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Find potential links between subscriptions, optionally only for those updated after `since`."""
+        subscriptions, pairs = self._subscription_candidates(since)
+        return self._subscription_links(subscriptions, score_pairs(subscriptions, pairs, *SUBSCRIPTION_SCORING))
+    
+    async def analyze_subscription_links_async(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """`analyze_subscription_links`, awaiting the scoring pool."""
+        subscriptions, pairs = self._subscription_candidates(since)
+        return self._subscription_links(
+            subscriptions, await score_pairs_async(subscriptions, pairs, *SUBSCRIPTION_SCORING)
+        )
+    
+    def _subscription_candidates(self, since: Optional[datetime]) -> Tuple[List[Subscription], List[Tuple[int, int]]]:
+        subscriptions, changed = self._load_changed(Subscription, since)
+        # Can link same or different customers
+        return subscriptions, candidate_pairs(subscriptions, subscription_blocking_keys, changed=changed)
+    
+    @staticmethod
+    def _subscription_links(subscriptions: List[Subscription], scored: List[Tuple]) -> List[Dict[str, Any]]:
         links = []
-        subscriptions = self.db.query(Subscription).all()
-        
-        for i, sub1 in enumerate(subscriptions):
-            for sub2 in subscriptions[i+1:]:
-                # Can link same or different customers
-                confidence, evidence = self._analyze_subscription_pair(sub1, sub2)
-                if confidence > 0.2:  # Lowered threshold
-                    links.append({
-                        'source_type': EntityType.SUBSCRIPTION,
-                        'source_id': sub1.id,
-                        'target_type': EntityType.SUBSCRIPTION,
-                        'target_id': sub2.id,
-                        'confidence': confidence,
-                        'evidence_text': evidence
-                    })
+        for i, j, confidence, evidence in scored:
+            links.append({
+                'source_type': EntityType.SUBSCRIPTION,
+                'source_id': subscriptions[i].id,
+                'target_type': EntityType.SUBSCRIPTION,
+                'target_id': subscriptions[j].id,
+                'confidence': confidence,
+                'evidence_text': evidence
+            })
         
         return links
     
-    def _analyze_subscription_pair(self, s1: Subscription, s2: Subscription) -> Tuple[float, str]:
+    @staticmethod
+    def _analyze_subscription_pair(s1: Subscription, s2: Subscription) -> Tuple[float, str]:
         """Analyze a pair of subscriptions for potential links."""
         evidence_parts = []
         confidence = 0.0
@@ -183,10 +563,11 @@ class LinkAnalyzer:
         
         return confidence, '; '.join(evidence_parts) if evidence_parts else "No strong evidence"
     
-    def analyze_cross_category_links(self) -> List[Dict[str, Any]]:
+    def analyze_cross_category_links(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """Find links between customers across different categories."""
         links = []
-        customers = self.db.query(Customer).all()
+        customers, changed = self._load_changed(Customer, since)
+        changed_ids = None if changed is None else {customers[i].id for i in changed}
         
         # Group by email domain
         domain_customers = {}
@@ -205,6 +586,8 @@ class LinkAnalyzer:
                 if len(categories_in_group) > 1:  # Cross-category
                     for i, c1 in enumerate(customers_list):
                         for c2 in customers_list[i+1:]:
+                            if changed_ids is not None and c1.id not in changed_ids and c2.id not in changed_ids:
+                                continue
                             if c1.category_id != c2.category_id:
                                 links.append({
                                     'source_type': EntityType.CUSTOMER,
@@ -217,13 +600,119 @@ class LinkAnalyzer:
         
         return links
     
-    async def refine_with_ai(self, links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Use AI to refine confidence scores and evidence."""
+    async def refine_with_ai(self, links: List[Dict[str, Any]], batch: bool = True) -> List[Dict[str, Any]]:
+        """
+        Use AI to refine confidence scores and evidence.
+        
+        In batch mode (the default) candidates are packed into as few prompts
+        as the token budget allows, each answered with a JSON array, and the
+        chunks run with bounded concurrency. `batch=False` keeps the original
+        one-call-per-link behaviour for the first five links.
+        """
         if not self.ai_provider.is_available() or not links:
             return links
+        if not batch:
+            return await self._refine_each(links)
+        
+        # Highest-confidence candidates first in case the cap cuts the list
+        candidates = sorted(range(len(links)), key=lambda i: -links[i]['confidence'])
+        candidates = candidates[:settings.ai_link_refine_max_links]
+        
+        chunks = self._chunk_for_refinement(links, candidates)
+        semaphore = asyncio.Semaphore(settings.ai_link_refine_concurrency)
+        
+        async def run(chunk):
+            async with semaphore:
+                return await self._refine_chunk(links, chunk)
+        
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks), return_exceptions=True)
+        
+        refined = 0
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                # A failed chunk leaves its links unrefined
+                logger.warning(f"Link refinement chunk of {len(chunk)} failed: {result}")
+                continue
+            refined += self._merge_refinements(links, set(chunk), result)
+        logger.info(f"AI refined {refined}/{len(links)} links in {len(chunks)} batched calls")
+        
+        return links
+    
+    def _chunk_for_refinement(self, links: List[Dict[str, Any]], indexes: List[int]) -> List[List[int]]:
+        """Split link indexes into chunks whose prompt and response fit the token budget."""
+        budget = settings.ai_link_refine_chunk_tokens
+        chunks: List[List[int]] = []
+        current: List[int] = []
+        used = 0
+        for i in indexes:
+            cost = estimate_tokens(links[i]['evidence_text'], max_tokens=REFINE_TOKENS_PER_LINK) + 10
+            if current and used + cost > budget:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += cost
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    async def _refine_chunk(self, links: List[Dict[str, Any]], chunk: List[int]) -> List[Dict[str, Any]]:
+        """Refine one chunk of links with a single AI call; returns the parsed array."""
+        items = [
+            {"id": i, "evidence": links[i]['evidence_text'], "confidence": round(links[i]['confidence'], 2)}
+            for i in chunk
+        ]
+        prompt = f"""Analyze these potential relationships between entities in a subscription tracker.
+
+For each item, judge how meaningful the relationship is from its evidence, give a
+confidence between 0 and 1, and a brief explanation (max 40 words).
+
+Items:
+{json.dumps(items)}
+
+Respond with a JSON array only, one object per item, keeping the ids:
+[{{"id": 0, "confidence": 0.0, "explanation": "..."}}]"""
         
-        # For demo purposes, we'll just enhance the evidence text
-        # In production, you might batch these requests
+        response = await self.ai_provider.generate_completion(
+            prompt=prompt,
+            system_prompt=REFINE_SYSTEM_PROMPT,
+            temperature=0.3,
+            max_tokens=REFINE_TOKENS_PER_LINK * len(chunk)
+        )
+        parsed = extract_json_array(response)
+        if parsed is None:
+            raise ValueError("AI response was not a JSON array")
+        return parsed
+    
+    @staticmethod
+    def _merge_refinements(links: List[Dict[str, Any]], chunk: set, refinements: List[Any]) -> int:
+        """Apply AI refinements to links by id; unknown ids and malformed items are ignored."""
+        merged = 0
+        for item in refinements:
+            if not isinstance(item, dict):
+                continue
+            try:
+                # Models often answer with string ids ("3")
+                link_id = int(item['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if link_id not in chunk:
+                continue
+            link = links[link_id]
+            explanation = str(item.get('explanation') or '').strip()
+            if explanation:
+                link['evidence_text'] += f" | AI: {explanation}"
+            try:
+                ai_confidence = float(item['confidence'])
+            except (KeyError, TypeError, ValueError):
+                ai_confidence = None
+            if ai_confidence is not None and 0.0 <= ai_confidence <= 1.0:
+                # Blend rather than replace: the rule-based score stays half the signal
+                link['confidence'] = round((link['confidence'] + ai_confidence) / 2, 4)
+            merged += 1
+        return merged
+    
+    async def _refine_each(self, links: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Refine up to five links with one AI call each."""
         try:
             for link in links[:5]:  # Limit to avoid too many API calls
                 prompt = f"""Analyze this potential relationship:
@@ -234,7 +723,7 @@ Provide a brief explanation (max 50 words) of why this relationship might be mea
                 
                 explanation = await self.ai_provider.generate_completion(
                     prompt=prompt,
-                    system_prompt="You are an expert at analyzing business relationships and subscription patterns.",
+                    system_prompt=REFINE_SYSTEM_PROMPT,
                     temperature=0.5,
                     max_tokens=100
                 )
@@ -245,3 +734,8 @@ Provide a brief explanation (max 50 words) of why this relationship might be mea
             pass
         
         return links
+
+
+# (scorer, threshold, snapshot type) per link kind; thresholds lowered for better detection
+CUSTOMER_SCORING = (LinkAnalyzer._analyze_customer_pair, 0.15, CustomerSnapshot)
+SUBSCRIPTION_SCORING = (LinkAnalyzer._analyze_subscription_pair, 0.2, SubscriptionSnapshot)
@@ -0,0 +1,133 @@
+"""
+Background precomputation of AI insights.
+
+Budget surgeon, renewal forecast and insights results are generated on
+demand and cached in `ai_request_cache`. `InsightPrecomputer` regenerates
+them in the background before they expire, so page loads find a warm
+cache instead of waiting on the model:
+
+- Every `ai_precompute_interval` seconds, and sooner (after
+  `ai_precompute_debounce` seconds) when the data revision changes, each
+  target scope is refreshed. Targets are the global scope plus the
+  `ai_precompute_top_customers` customers with the most active
+  subscriptions. The renewal forecast is global and is only prewarmed
+  for the `ai_precompute_forecast_months` horizons (the forecast pages
+  request 12); other horizons are generated on demand.
+- A target that fails is logged and skipped; the rest of the cycle
+  still runs.
+- Entries that stay valid for more than `ai_precompute_refresh_ahead`
+  seconds are left alone, so an unchanged scope costs no AI calls.
+- Calls run in the "background" scheduler lane, and a cycle is skipped
+  when fewer than `ai_precompute_min_remaining` requests are left in the
+  daily quota or the circuit breaker is open.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import func
+
+from app.ai.circuit_breaker import CLOSED, ai_circuit
+from app.ai.insights import InsightsAnalyzer
+from app.ai.provider import get_ai_provider
+from app.ai.scheduler import ai_scheduler
+from app.ai.smart_features import SmartAIFeatures
+from app.config import settings
+from app.models import Subscription
+from app.models.subscription import SubscriptionStatus
+from app.services.background import BackgroundTask
+from app.services.data_revision import current_revision
+
+logger = logging.getLogger(__name__)
+
+
+def precompute_targets(db) -> List[Optional[int]]:
+    """The global scope (None) followed by the busiest customer ids."""
+    busiest = db.query(Subscription.customer_id).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE
+    ).group_by(Subscription.customer_id).order_by(
+        func.count(Subscription.id).desc(), Subscription.customer_id
+    ).limit(settings.ai_precompute_top_customers).all()
+    return [None] + [customer_id for (customer_id,) in busiest]
+
+
+class InsightPrecomputer(BackgroundTask):
+    """Periodic refresher for cached AI insights."""
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        super().__init__(session_factory)
+        self._last_run = 0.0
+        self._last_revision: Optional[int] = None
+        self.runs = 0
+        self.refreshed = 0
+
+    def _can_spend(self) -> bool:
+        if ai_circuit.state != CLOSED:
+            logger.info("Skipping AI precompute: circuit not closed")
+            return False
+        if ai_scheduler.remaining_today() < settings.ai_precompute_min_remaining:
+            logger.info("Skipping AI precompute: daily quota reserved for interactive use")
+            return False
+        return True
+
+    async def run_once(self) -> int:
+        """Refresh every target scope; returns the number of scopes processed."""
+        self._last_run = time.monotonic()
+        self._last_revision = current_revision()
+        self.runs += 1
+        await ai_scheduler.sync_usage()
+        if not self._can_spend():
+            return 0
+
+        ahead = settings.ai_precompute_refresh_ahead
+        provider = get_ai_provider("background")
+        db = self._session()
+        processed = 0
+        try:
+            targets = precompute_targets(db)
+            features = SmartAIFeatures(db)
+            features.provider = provider
+            for months in settings.ai_precompute_forecast_months:
+                try:
+                    await features.forecast_renewals(months, min_ttl=ahead)
+                except Exception as e:
+                    logger.error(f"AI precompute failed for the {months}-month forecast: {e}")
+                    db.rollback()
+            for customer_id in targets:
+                if not self._can_spend():
+                    break
+                try:
+                    await features.analyze_budget(customer_id, min_ttl=ahead)
+                    await InsightsAnalyzer(db, provider).generate_insights(customer_id=customer_id, min_ttl=ahead)
+                    processed += 1
+                except Exception as e:
+                    logger.error(f"AI precompute failed for scope {customer_id or 'global'}: {e}")
+                    db.rollback()
+        except Exception as e:
+            logger.error(f"AI precompute failed: {e}")
+        finally:
+            db.close()
+        self.refreshed += processed
+        return processed
+
+    def _due(self) -> bool:
+        since = time.monotonic() - self._last_run
+        if since >= settings.ai_precompute_interval:
+            return True
+        return since >= settings.ai_precompute_debounce and current_revision() != self._last_revision
+
+    async def _loop(self) -> None:
+        # Let startup finish before the first cycle
+        await asyncio.sleep(settings.ai_precompute_debounce)
+        while True:
+            if self._due():
+                await self.run_once()
+            await asyncio.sleep(settings.ai_precompute_poll)
+
+    def enabled(self) -> bool:
+        """False when AI or precompute is disabled."""
+        return bool(settings.ai_precompute_enabled and settings.subtrack_ai_api_key)
+
+
+insight_precomputer = InsightPrecomputer()
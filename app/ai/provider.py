@@ -1,13 +1,19 @@
 """AI provider interface - Powered by Google Gemini."""
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from app.config import settings
 
 
 # Generic AI error classes
 class RateLimitError(Exception):
-    """Raised when API returns 429 (rate limited)."""
-    pass
+    """Raised when API returns 429 (rate limited).
+    
+    `retry_after` is the server-suggested wait in seconds, when known.
+    """
+    
+    def __init__(self, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 
 class ServiceUnavailableError(Exception):
@@ -16,8 +22,16 @@ class ServiceUnavailableError(Exception):
 
 
 class AIProviderError(Exception):
-    """General AI provider error."""
-    pass
+    """General AI provider error.
+    
+    `status_code` is the HTTP status behind the error, when there was one;
+    4xx codes mean the request itself was rejected (bad or blocked prompt,
+    bad credentials) rather than a provider fault.
+    """
+    
+    def __init__(self, message: str = "", status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class AIProvider(ABC):
@@ -34,6 +48,22 @@ class AIProvider(ABC):
         """Generate a text completion."""
         pass
     
+    async def stream_completion(
+        self, 
+        prompt: str, 
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        """Stream a text completion in fragments.
+        
+        Providers without native streaming yield the buffered completion
+        as a single fragment.
+        """
+        yield await self.generate_completion(
+            prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens
+        )
+    
     @abstractmethod
     def is_available(self) -> bool:
         """Check if the AI provider is available."""
@@ -58,10 +88,13 @@ class DummyAIProvider(AIProvider):
         return False
 
 
-def get_ai_provider() -> AIProvider:
+def get_ai_provider(lane: str = "default") -> AIProvider:
     """Get the configured AI provider.
 
-    SubTrack currently supports Google Gemini.
+    SubTrack currently supports Google Gemini. Calls are scheduled through
+    `app.ai.scheduler` in the given priority lane ("interactive", "default"
+    or "background"), behind the circuit breaker in `app.ai.circuit_breaker`
+    so an open circuit fails fast without waiting for a slot.
 
     This function also hardens configuration to avoid common misconfigurations
     (e.g., pointing Gemini at an OpenAI base URL, which results in HTTP 405).
@@ -81,10 +114,18 @@ def get_ai_provider() -> AIProvider:
         if not model or model.lower().startswith("gpt-"):
             model = "gemini-2.0-flash"
 
-        return GeminiProvider(
-            api_key=settings.subtrack_ai_api_key,
-            model=model,
-            base_url=base_url,
+        from app.ai.scheduler import ScheduledProvider
+        from app.ai.circuit_breaker import CircuitBreakerProvider
+
+        return CircuitBreakerProvider(
+            ScheduledProvider(
+                GeminiProvider(
+                    api_key=settings.subtrack_ai_api_key,
+                    model=model,
+                    base_url=base_url,
+                ),
+                lane=lane,
+            )
         )
 
     return DummyAIProvider()
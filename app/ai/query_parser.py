@@ -0,0 +1,168 @@
+"""
+Rule-based understanding of natural-language subscription searches.
+
+`parse_search_query` pulls structured filters out of queries such as
+"active monthly adobe plans over $50 renewing next month": billing cycles,
+statuses, cost ranges, renewal date windows, and the leftover words as text
+terms. The result is a plain dict that can be turned into SQL, so most
+searches never need the AI model.
+"""
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from app.models.subscription import BillingCycle, SubscriptionStatus
+
+CYCLE_WORDS = {
+    "weekly": BillingCycle.WEEKLY,
+    "monthly": BillingCycle.MONTHLY,
+    "quarterly": BillingCycle.QUARTERLY,
+    "biannual": BillingCycle.BIANNUAL,
+    "semiannual": BillingCycle.BIANNUAL,
+    "yearly": BillingCycle.YEARLY,
+    "annual": BillingCycle.YEARLY,
+    "annually": BillingCycle.YEARLY,
+}
+
+CYCLE_PHRASES = [
+    (r"\b(?:per|a|each|every)\s+week\b", BillingCycle.WEEKLY),
+    (r"\b(?:per|a|each|every)\s+month\b|/\s*mo(?:nth)?\b", BillingCycle.MONTHLY),
+    (r"\b(?:per|a|each|every)\s+quarter\b", BillingCycle.QUARTERLY),
+    (r"\b(?:per|a|each|every)\s+year\b|/\s*yr\b", BillingCycle.YEARLY),
+    (r"\bsemi-annual(?:ly)?\b|\bevery\s+six\s+months\b", BillingCycle.BIANNUAL),
+]
+
+STATUS_WORDS = {
+    "active": SubscriptionStatus.ACTIVE,
+    "cancelled": SubscriptionStatus.CANCELLED,
+    "canceled": SubscriptionStatus.CANCELLED,
+    "paused": SubscriptionStatus.PAUSED,
+    "expired": SubscriptionStatus.EXPIRED,
+}
+
+STOP_WORDS = {
+    "show", "me", "my", "our", "all", "any", "find", "list", "get", "search", "for", "the", "a", "an",
+    "that", "which", "who", "are", "is", "be", "with", "of", "in", "on", "and", "or", "to", "from",
+    "subscriptions", "subscription", "subs", "sub", "plans", "services", "service", "tools", "tool",
+    "cost", "costs", "costing", "priced", "price", "paying", "pay", "spend", "spending", "than",
+    "renew", "renews", "renewing", "renewal", "renewals", "due", "expiring", "expire", "expires",
+    "billed", "billing", "charged", "what", "do", "we", "have", "i", "please", "dollars", "usd",
+}
+
+_NUMBER = r"\$?\s*(\d+(?:\.\d+)?)"
+
+COST_RULES = [
+    (rf"\bbetween\s+{_NUMBER}\s+(?:and|to|-)\s+{_NUMBER}", "range"),
+    (rf"\$\s*(\d+(?:\.\d+)?)\s*(?:-|to)\s*{_NUMBER}", "range"),
+    (rf"(?:\bover|\babove|\bmore\s+than|\bgreater\s+than|\bat\s+least|>=?)\s*{_NUMBER}", "min"),
+    (rf"(?:\bunder|\bbelow|\bless\s+than|\bcheaper\s+than|\bat\s+most|\bup\s+to|<=?)\s*{_NUMBER}", "max"),
+]
+
+
+def _month_bounds(year: int, month: int):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _date_window(text: str, today: date):
+    """Return (start, end, remaining_text) for a renewal window phrase, if any."""
+    rules = [
+        (r"\boverdue\b|\bpast\s+due\b", lambda m: (None, today - timedelta(days=1))),
+        (r"\btoday\b", lambda m: (today, today)),
+        (r"\btomorrow\b", lambda m: (today + timedelta(days=1), today + timedelta(days=1))),
+        (r"\bthis\s+week\b", lambda m: (today, today + timedelta(days=6 - today.weekday()))),
+        (r"\bnext\s+week\b", lambda m: (
+            today + timedelta(days=7 - today.weekday()), today + timedelta(days=13 - today.weekday())
+        )),
+        (r"\bthis\s+month\b", lambda m: (today, _month_bounds(today.year, today.month)[1])),
+        (r"\bnext\s+month\b", lambda m: _month_bounds(
+            today.year + (today.month == 12), today.month % 12 + 1
+        )),
+        (r"\b(?:in\s+the\s+next|within(?:\s+the\s+next)?|next)\s+(\d+)\s+days?\b",
+         lambda m: (today, today + timedelta(days=int(m.group(1))))),
+        (r"\bsoon\b", lambda m: (today, today + timedelta(days=30))),
+    ]
+    for pattern, window in rules:
+        match = re.search(pattern, text)
+        if match:
+            start, end = window(match)
+            return start, end, text[:match.start()] + " " + text[match.end():]
+    return None, None, text
+
+
+def parse_search_query(query: str, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Extract structured filters from a natural-language search.
+
+    Returns a dict with `cycles`, `statuses`, `min_cost`, `max_cost`,
+    `renewal_from`, `renewal_to` and `terms` (leftover words to match
+    against vendor, plan and category names). `structured` tells whether any
+    filter besides text terms was recognised.
+    """
+    today = today or date.today()
+    text = (query or "").lower()
+    parsed: Dict[str, Any] = {
+        "cycles": [], "statuses": [], "min_cost": None, "max_cost": None,
+        "renewal_from": None, "renewal_to": None, "terms": [],
+    }
+
+    for pattern, kind in COST_RULES:
+        match = re.search(pattern, text)
+        if not match:
+            continue
+        if kind == "range":
+            low, high = sorted(float(v) for v in match.groups())
+            parsed["min_cost"], parsed["max_cost"] = low, high
+        elif kind == "min" and parsed["min_cost"] is None:
+            parsed["min_cost"] = float(match.group(1))
+        elif kind == "max" and parsed["max_cost"] is None:
+            parsed["max_cost"] = float(match.group(1))
+        text = text[:match.start()] + " " + text[match.end():]
+
+    parsed["renewal_from"], parsed["renewal_to"], text = _date_window(text, today)
+
+    for pattern, cycle in CYCLE_PHRASES:
+        if re.search(pattern, text):
+            parsed["cycles"].append(cycle)
+            text = re.sub(pattern, " ", text)
+
+    for word in re.findall(r"[\w.+&'-]+", text):
+        word = word.strip(".'-")
+        if word in CYCLE_WORDS:
+            if CYCLE_WORDS[word] not in parsed["cycles"]:
+                parsed["cycles"].append(CYCLE_WORDS[word])
+        elif word in STATUS_WORDS:
+            if STATUS_WORDS[word] not in parsed["statuses"]:
+                parsed["statuses"].append(STATUS_WORDS[word])
+        elif len(word) >= 2 and word not in STOP_WORDS and not word.replace(".", "").isdigit():
+            parsed["terms"].append(word)
+
+    parsed["structured"] = bool(
+        parsed["cycles"] or parsed["statuses"]
+        or parsed["min_cost"] is not None or parsed["max_cost"] is not None
+        or parsed["renewal_from"] is not None or parsed["renewal_to"] is not None
+    )
+    return parsed
+
+
+def describe_search_query(parsed: Dict[str, Any]) -> str:
+    """Human-readable summary of the recognised filters."""
+    parts = []
+    if parsed["statuses"]:
+        parts.append("/".join(s.value for s in parsed["statuses"]))
+    if parsed["cycles"]:
+        parts.append("/".join(c.value for c in parsed["cycles"]))
+    parts.append("subscriptions")
+    if parsed["terms"]:
+        parts.append("matching " + ", ".join(f"'{t}'" for t in parsed["terms"]))
+    if parsed["min_cost"] is not None and parsed["max_cost"] is not None:
+        parts.append(f"costing ${parsed['min_cost']:g}-${parsed['max_cost']:g}")
+    elif parsed["min_cost"] is not None:
+        parts.append(f"costing over ${parsed['min_cost']:g}")
+    elif parsed["max_cost"] is not None:
+        parts.append(f"costing under ${parsed['max_cost']:g}")
+    if parsed["renewal_from"] and parsed["renewal_to"]:
+        parts.append(f"renewing {parsed['renewal_from'].isoformat()} to {parsed['renewal_to'].isoformat()}")
+    elif parsed["renewal_to"]:
+        parts.append(f"renewal due before {(parsed['renewal_to'] + timedelta(days=1)).isoformat()}")
+    return " ".join(parts)
@@ -0,0 +1,440 @@
+"""
+Quota-aware scheduling of AI provider calls.
+
+Every call made through `get_ai_provider()` passes through the process-wide
+`ai_scheduler`, which enforces:
+
+- Per-minute token buckets for requests and estimated tokens
+  (`ai_requests_per_minute`, `ai_tokens_per_minute`).
+- The daily request quota (`ai_daily_limit`), counted in the
+  `ai_usage_daily` table so it survives restarts and is shared by workers.
+  Granted calls are added to the day's row with an atomic upsert in a
+  background thread (batched while a write is in flight), and the row is
+  re-read at most every `ai_usage_sync_seconds` before granting, so other
+  workers' calls are seen within that window.
+- Priority lanes: queued interactive calls (chat) are granted before
+  default feature calls, which go before background work (link refinement).
+- Deadlines: a call that cannot start before its lane deadline fails fast
+  with `RateLimitError` instead of holding the request open.
+
+Provider 429s put the whole scheduler into a cooldown for the server's
+`retry_after`, and the call is retried if its deadline allows.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import update
+
+from app.ai.provider import AIProvider, RateLimitError
+from app.config import settings
+from app.models.ai_usage import AIUsageDaily
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower value is served first
+LANES = {"interactive": 0, "default": 1, "background": 2}
+
+
+def lane_deadline(lane: str) -> float:
+    """Seconds a call in `lane` may wait for a slot (ai_<lane>_deadline setting)."""
+    return float(getattr(settings, f"ai_{lane}_deadline"))
+
+
+class QuotaExceededError(RateLimitError):
+    """Raised when the daily AI quota is used up."""
+    pass
+
+
+def estimate_tokens(*texts: Optional[str], max_tokens: int = 0) -> int:
+    """Rough token estimate (about 4 characters per token) plus the response budget."""
+    return sum(len(t) for t in texts if t) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most `per_minute` units."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def available(self, now: float) -> int:
+        self._refill(now)
+        return int(self.level)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "deadline", "future", "lane")
+
+    def __init__(self, priority, seq, tokens, deadline, future, lane):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.deadline = deadline
+        self.future = future
+        self.lane = lane
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AIScheduler:
+    """Grants AI calls in priority order within rate and daily limits."""
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+        self._requests = TokenBucket(settings.ai_requests_per_minute)
+        self._tokens = TokenBucket(settings.ai_tokens_per_minute)
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cooldown_until = 0.0
+        self._day: Optional[date] = None
+        self._synced_requests = self._synced_tokens = 0
+        self._inflight_requests = self._inflight_tokens = 0
+        self._pending_requests = self._pending_tokens = 0
+        self._synced_at = 0.0
+        self._sync_task: Optional[asyncio.Future] = None
+        self.rejected = 0
+
+    # ------------------------------------------------------------------ quota
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.database import SessionLocal
+        return SessionLocal()
+
+    def _roll_day(self) -> None:
+        """Reset the counters when the UTC day changes."""
+        today = datetime.utcnow().date()
+        if self._day == today:
+            return
+        self._day = today
+        self._synced_requests = self._synced_tokens = 0
+        self._pending_requests = self._pending_tokens = 0
+        self._synced_at = 0.0
+
+    def _write_usage(self, day: date, requests: int, tokens: int):
+        """
+        Add `requests`/`tokens` to the day's row with one atomic upsert and
+        return the row's totals, including other workers' calls.
+        """
+        db = self._session()
+        try:
+            if not requests and not tokens:
+                row = db.query(AIUsageDaily.request_count, AIUsageDaily.token_count).filter(
+                    AIUsageDaily.day == day
+                ).first()
+                return tuple(row) if row else (0, 0)
+            if db.get_bind().dialect.name == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            now = datetime.utcnow()
+            stmt = insert(AIUsageDaily).values(day=day, request_count=requests, token_count=tokens, updated_at=now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[AIUsageDaily.day],
+                set_={
+                    "request_count": AIUsageDaily.request_count + stmt.excluded.request_count,
+                    "token_count": AIUsageDaily.token_count + stmt.excluded.token_count,
+                    "updated_at": now,
+                },
+            ).returning(AIUsageDaily.request_count, AIUsageDaily.token_count)
+            totals = tuple(db.execute(stmt).one())
+            db.commit()
+            return totals
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _sync_once(self) -> None:
+        self._roll_day()
+        day, requests, tokens = self._day, self._pending_requests, self._pending_tokens
+        self._pending_requests = self._pending_tokens = 0
+        self._inflight_requests, self._inflight_tokens = requests, tokens
+        try:
+            totals = await asyncio.to_thread(self._write_usage, day, requests, tokens)
+        except Exception as e:
+            logger.error(f"Could not sync AI usage counters: {e}")
+            if self._day == day:
+                # Retried with the next sync
+                self._pending_requests += requests
+                self._pending_tokens += tokens
+            return
+        finally:
+            self._inflight_requests = self._inflight_tokens = 0
+        if self._day == day:
+            self._synced_requests, self._synced_tokens = totals
+            self._synced_at = time.monotonic()
+
+    async def sync_usage(self) -> None:
+        """
+        Write locally granted calls to `ai_usage_daily` and re-read the day's
+        totals, off the event loop. Concurrent callers share one sync.
+        """
+        while self._sync_task is not None and not self._sync_task.done():
+            await asyncio.shield(self._sync_task)
+        self._sync_task = asyncio.ensure_future(self._sync_once())
+        self._sync_task.add_done_callback(self._after_sync)
+        await asyncio.shield(self._sync_task)
+
+    def _schedule_sync(self) -> None:
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = self._loop.create_task(self._sync_once())
+            self._sync_task.add_done_callback(self._after_sync)
+
+    def _after_sync(self, task: asyncio.Task) -> None:
+        # Calls granted while the write was in flight go out in the next batch
+        if self._pending_requests and self._loop is not None and not self._loop.is_closed():
+            self._schedule_sync()
+
+    def _record_usage(self, tokens: int) -> None:
+        """Count one granted call; it is written to the database in the background."""
+        self._pending_requests += 1
+        self._pending_tokens += tokens
+        self._schedule_sync()
+
+    def _used_today(self) -> int:
+        self._roll_day()
+        return self._synced_requests + self._inflight_requests + self._pending_requests
+
+    def remaining_today(self) -> int:
+        """Remaining daily quota as of the last sync plus this process's calls since."""
+        return max(0, settings.ai_daily_limit - self._used_today())
+
+    # -------------------------------------------------------------- granting
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        return max(
+            self._cooldown_until - now,
+            self._requests.wait_time(1, now),
+            self._tokens.wait_time(tokens, now),
+            0.0,
+        )
+
+    def _dispatch(self) -> None:
+        """Grant queued calls in priority order while the buckets allow."""
+        self._timer = None
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if self.remaining_today() <= 0:
+                heapq.heappop(self._waiters)
+                head.future.set_exception(QuotaExceededError("Daily AI limit reached. Try again tomorrow."))
+                continue
+            wait = self._wait_time(head.tokens, now)
+            if wait > 0:
+                if now + wait > head.deadline:
+                    heapq.heappop(self._waiters)
+                    self.rejected += 1
+                    head.future.set_exception(RateLimitError(
+                        f"AI is busy. Please try again in {int(wait) + 1} seconds."
+                    ))
+                    continue
+                self._timer = self._loop.call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._requests.take(1, now)
+            self._tokens.take(head.tokens, now)
+            self._record_usage(head.tokens)
+            head.future.set_result(None)
+
+    async def acquire(self, lane: str = "default", tokens: int = 0, deadline: Optional[float] = None) -> None:
+        """
+        Wait for a slot to make one provider call.
+
+        Raises:
+            QuotaExceededError: The daily quota is used up
+            RateLimitError: The call could not start before `deadline`
+                (a `time.monotonic()` value)
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown AI lane: {lane}")
+        if deadline is None:
+            deadline = time.monotonic() + lane_deadline(lane)
+        self._roll_day()
+        if time.monotonic() - self._synced_at >= settings.ai_usage_sync_seconds:
+            # Pick up calls made by other workers before deciding
+            await self.sync_usage()
+        if self.remaining_today() <= 0:
+            self.rejected += 1
+            raise QuotaExceededError("Daily AI limit reached. Try again tomorrow.")
+
+        now = time.monotonic()
+        wait = self._wait_time(tokens, now)
+        if now + wait > deadline:
+            self.rejected += 1
+            raise RateLimitError(f"AI is busy. Please try again in {int(wait) + 1} seconds.")
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters and timers from a previous (closed) loop are void
+            self._loop = loop
+            self._waiters = []
+            self._timer = None
+            self._sync_task = None
+        waiter = _Waiter(LANES[lane], next(self._seq), tokens, deadline, loop.create_future(), lane)
+        heapq.heappush(self._waiters, waiter)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            waiter.future.cancel()
+            self.rejected += 1
+            raise RateLimitError("AI is busy. Please try again shortly.")
+        except asyncio.CancelledError:
+            waiter.future.cancel()
+            raise
+
+    def note_rate_limited(self, retry_after: float) -> float:
+        """Pause all lanes after a provider 429; returns when calls may resume."""
+        resume = time.monotonic() + retry_after
+        self._cooldown_until = max(self._cooldown_until, resume)
+        logger.warning(f"AI provider rate limited; pausing all lanes for {retry_after}s")
+        return resume
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        lane: str = "default",
+        tokens: int = 0,
+    ) -> T:
+        """
+        Run one provider call under the scheduler.
+
+        A provider 429 carrying `retry_after` pauses all lanes for that long;
+        the call is retried once the pause is over if its deadline allows.
+        """
+        deadline = time.monotonic() + lane_deadline(lane)
+        while True:
+            await self.acquire(lane, tokens, deadline)
+            try:
+                return await call()
+            except QuotaExceededError:
+                raise
+            except RateLimitError as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None:
+                    raise
+                resume = self.note_rate_limited(retry_after)
+                if resume >= deadline:
+                    raise
+
+    def status(self) -> Dict[str, Any]:
+        """Current limits, remaining budget and queue depth."""
+        now = time.monotonic()
+        remaining = self.remaining_today()
+        used = self._used_today()
+        queued = {lane: 0 for lane in LANES}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                queued[waiter.lane] += 1
+        tomorrow = datetime.combine(self._day + timedelta(days=1), datetime.min.time())
+        return {
+            "daily_limit": settings.ai_daily_limit,
+            "daily_used": used,
+            "daily_remaining": remaining,
+            "daily_tokens_used": self._synced_tokens + self._inflight_tokens + self._pending_tokens,
+            "resets_at": tomorrow.isoformat() + "Z",
+            "requests_per_minute": settings.ai_requests_per_minute,
+            "requests_available": self._requests.available(now),
+            "tokens_per_minute": settings.ai_tokens_per_minute,
+            "tokens_available": self._tokens.available(now),
+            "cooldown_seconds": round(max(0.0, self._cooldown_until - now), 1),
+            "queued": queued,
+            "rejected": self.rejected,
+            "exhausted": remaining <= 0,
+        }
+
+
+ai_scheduler = AIScheduler()
+
+
+class ScheduledProvider(AIProvider):
+    """Wraps a provider so each completion goes through `ai_scheduler` in one lane."""
+
+    def __init__(self, provider: AIProvider, lane: str = "default", scheduler: Optional[AIScheduler] = None):
+        if lane not in LANES:
+            raise ValueError(f"Unknown AI lane: {lane}")
+        self.provider = provider
+        self.lane = lane
+        self.scheduler = scheduler or ai_scheduler
+
+    async def generate_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> str:
+        return await self.scheduler.run(
+            lambda: self.provider.generate_completion(
+                prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens
+            ),
+            lane=self.lane,
+            tokens=estimate_tokens(prompt, system_prompt, max_tokens=max_tokens),
+        )
+
+    async def stream_completion(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500
+    ) -> AsyncIterator[str]:
+        # A partially streamed answer can't be retried, so only the slot is scheduled
+        await self.scheduler.acquire(
+            self.lane, estimate_tokens(prompt, system_prompt, max_tokens=max_tokens)
+        )
+        try:
+            async for fragment in self.provider.stream_completion(
+                prompt, system_prompt=system_prompt, temperature=temperature, max_tokens=max_tokens
+            ):
+                yield fragment
+        except RateLimitError as e:
+            if getattr(e, "retry_after", None) is not None:
+                self.scheduler.note_rate_limited(e.retry_after)
+            raise
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def __getattr__(self, name):
+        if name == "provider":
+            raise AttributeError(name)
+        # Expose model, base_url, get_model_info() etc. of the wrapped provider
+        return getattr(self.provider, name)
@@ -9,20 +9,32 @@ This module provides 4 AI-powered features:
 
 All features include caching to optimize API usage.
 """
+import asyncio
 import json
 import re
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import date, timedelta, datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func
 
+from app.database import SessionLocal
 from app.models import Subscription, Customer, Category, Group
 from app.ai.provider import get_ai_provider, RateLimitError, ServiceUnavailableError, AIProviderError
-from app.ai.cache import generate_cache_key, get_cached_response, store_cached_response
+from app.ai.context_budget import aggregate_rows, chunk_rows
+from app.services.renewal_projection import RenewalProjection
+from app.ai.cache import (
+    generate_cache_key, get_cached_response, get_stale_response, store_cached_response, single_flight
+)
 
 logger = logging.getLogger(__name__)
 
+# Columns rendered for each subscription in the budget surgeon prompt
+BUDGET_FIELDS = ["id", "vendor", "plan", "cost", "cycle", "monthly_cost", "category"]
+
+# Largest renewals listed per month in the renewal forecast
+FORECAST_TOP_RENEWALS = 5
+
 
 def _parse_json_response(response: str) -> Dict[str, Any]:
     """
@@ -74,6 +86,46 @@ class SmartAIFeatures:
         self.db = db
         self.provider = get_ai_provider()
     
+    async def _complete_once(
+        self,
+        cache_key: str,
+        request_type: str,
+        prompt: str,
+        **kwargs
+    ) -> str:
+        """
+        Call the provider once per cache key across concurrent requests.
+        
+        Parseable responses are cached by whichever request made the call,
+        so callers that joined it don't write the same entry again. When the
+        AI budget is exhausted or the provider is unavailable (including an
+        open circuit breaker), an expired cache entry is returned instead if
+        one exists.
+        """
+        bind = self.db.get_bind()
+        
+        async def call() -> str:
+            response = await self.provider.generate_completion(prompt, **kwargs)
+            if _parse_json_response(response):
+                # The caller that started the flight may have been cancelled and
+                # its request session closed by now, so write with a session of
+                # the flight's own
+                db = SessionLocal(bind=bind)
+                try:
+                    store_cached_response(db, cache_key, request_type, prompt, response)
+                finally:
+                    db.close()
+            return response
+        
+        try:
+            return await single_flight(cache_key, call)
+        except (RateLimitError, ServiceUnavailableError) as e:
+            stale = get_stale_response(self.db, cache_key)
+            if stale is None:
+                raise
+            logger.info(f"AI unavailable ({type(e).__name__}); serving stale {request_type} response")
+            return stale
+    
     # =========================================================================
     # FEATURE 1: SMART LINK INTELLIGENCE
     # =========================================================================
@@ -140,7 +192,9 @@ Respond with JSON only:
 }}"""
 
         try:
-            response = await self.provider.generate_completion(
+            response = await self._complete_once(
+                cache_key,
+                request_type,
                 prompt,
                 system_prompt=system_prompt,
                 temperature=0.3,
@@ -152,11 +206,6 @@ Respond with JSON only:
                 result["cached"] = False
                 result["url"] = url
                 
-                # Store in cache
-                store_cached_response(
-                    self.db, cache_key, request_type, prompt, response
-                )
-                
                 return result
             else:
                 return {
@@ -196,7 +245,7 @@ Respond with JSON only:
     # FEATURE 2: BUDGET SURGEON
     # =========================================================================
     
-    async def analyze_budget(self, customer_id: Optional[int] = None) -> Dict[str, Any]:
+    async def analyze_budget(self, customer_id: Optional[int] = None, min_ttl: int = 0) -> Dict[str, Any]:
         """
         Identify duplicate or redundant spending across subscriptions.
         
@@ -208,6 +257,7 @@ Respond with JSON only:
         
         Args:
             customer_id: Optional - analyze specific customer or all
+            min_ttl: Regenerate cached results expiring within this many seconds
             
         Returns:
             Dictionary with savings recommendations
@@ -215,7 +265,9 @@ Respond with JSON only:
         request_type = "budget_surgeon"
         
         # Get subscriptions
-        query = self.db.query(Subscription).filter(Subscription.status == "active")
+        query = self.db.query(Subscription).options(joinedload(Subscription.category)).filter(
+            Subscription.status == "active"
+        )
         if customer_id:
             query = query.filter(Subscription.customer_id == customer_id)
         
@@ -235,7 +287,7 @@ Respond with JSON only:
         total_monthly = 0
         
         for sub in subscriptions:
-            monthly_cost = self._normalize_to_monthly(sub.cost, sub.billing_cycle.value)
+            monthly_cost = sub.monthly_equivalent_cost
             total_monthly += monthly_cost
             
             category_name = sub.category.name if sub.category else "Uncategorized"
@@ -254,9 +306,10 @@ Respond with JSON only:
         cache_key = generate_cache_key(
             request_type, 
             customer_id=customer_id,
-            sub_hash=hash(json.dumps(sub_data, sort_keys=True))
+            # Hashed by generate_cache_key; hash() is salted per process
+            subscriptions=sub_data
         )
-        cached = get_cached_response(self.db, cache_key)
+        cached = get_cached_response(self.db, cache_key, min_ttl)
         if cached:
             result = _parse_json_response(cached)
             result["cached"] = True
@@ -272,59 +325,40 @@ Respond with JSON only:
                 "cached": False
             }
         
-        system_prompt = """You are a subscription cost optimization expert.
-Analyze subscriptions to find duplicates, redundancies, and savings opportunities.
-Be specific and actionable. Always respond with valid JSON only."""
-
-        prompt = f"""Analyze these subscriptions for cost-saving opportunities:
-
-Current Monthly Total: ${total_monthly:.2f}
-
-Subscriptions:
-{json.dumps(sub_data, indent=2)}
-
-Find:
-1. Duplicate vendors (same company, multiple subscriptions)
-2. Overlapping services (different vendors, similar functionality)
-3. Downgrade opportunities (premium plans that could be basic)
-4. Bundle opportunities (services that could be combined)
-
-Respond with JSON only:
-{{
-    "duplicates": [
-        {{
-            "type": "duplicate_vendor" | "overlapping_service" | "downgrade_opportunity" | "bundle_available",
-            "subscriptions": ["vendor1", "vendor2"],
-            "subscription_ids": [1, 2],
-            "potential_savings": 0.00,
-            "recommendation": "Specific action to take",
-            "reasoning": "Why this saves money",
-            "priority": "high" | "medium" | "low"
-        }}
-    ],
-    "total_potential_savings": 0.00,
-    "savings_percentage": 0,
-    "summary": "Brief overview of findings"
-}}"""
-
+        # The whole table in one call when it fits the token budget; otherwise
+        # each chunk is analyzed separately and the findings merged
+        chunked = chunk_rows(sub_data, BUDGET_FIELDS)
+        chunks = chunked["chunks"]
+        overview = aggregate_rows(sub_data, "category") if len(chunks) > 1 else None
+        
         try:
-            response = await self.provider.generate_completion(
-                prompt,
-                system_prompt=system_prompt,
-                temperature=0.5,
-                max_tokens=1000
-            )
+            if len(chunks) == 1:
+                result = await self._analyze_budget_chunk(
+                    cache_key, request_type, chunks[0], total_monthly, len(sub_data)
+                )
+            else:
+                parts = await asyncio.gather(*[
+                    self._analyze_budget_chunk(
+                        generate_cache_key(request_type, customer_id=customer_id, chunk=chunk),
+                        request_type, chunk, total_monthly, len(sub_data), overview
+                    )
+                    for chunk in chunks
+                ], return_exceptions=True)
+                errors = [part for part in parts if isinstance(part, Exception)]
+                results = [part for part in parts if isinstance(part, dict) and part]
+                if not results and errors:
+                    raise errors[0]
+                result = self._merge_budget_results(results, total_monthly) if results else {}
+                if result:
+                    store_cached_response(self.db, cache_key, request_type, f"{len(chunks)} chunks", json.dumps(result))
             
-            result = _parse_json_response(response)
             if result:
                 result["cached"] = False
                 result["current_monthly_total"] = round(total_monthly, 2)
                 result["subscription_count"] = len(subscriptions)
-                
-                # Store in cache
-                store_cached_response(
-                    self.db, cache_key, request_type, prompt, response
-                )
+                result["rows_omitted"] = chunked["rows_omitted"]
+                if chunked["rows_omitted"]:
+                    result["omitted_summary"] = chunked["omitted_summary"]
                 
                 return result
             else:
@@ -355,11 +389,87 @@ Respond with JSON only:
                 "cached": False
             }
     
+    async def _analyze_budget_chunk(
+        self,
+        cache_key: str,
+        request_type: str,
+        table: str,
+        total_monthly: float,
+        subscription_count: int,
+        overview: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Run the budget surgeon prompt over one rendered table of subscriptions."""
+        system_prompt = """You are a subscription cost optimization expert.
+Analyze subscriptions to find duplicates, redundancies, and savings opportunities.
+Be specific and actionable. Always respond with valid JSON only."""
+        
+        scope = "Subscriptions:"
+        if overview:
+            scope = f"""Monthly spend by category (all {subscription_count} subscriptions):
+{overview}
+
+This is one part of the list; only report findings for these subscriptions:"""
+
+        prompt = f"""Analyze these subscriptions for cost-saving opportunities:
+
+Current Monthly Total: ${total_monthly:.2f}
+
+{scope}
+{table}
+
+Find:
+1. Duplicate vendors (same company, multiple subscriptions)
+2. Overlapping services (different vendors, similar functionality)
+3. Downgrade opportunities (premium plans that could be basic)
+4. Bundle opportunities (services that could be combined)
+
+Respond with JSON only:
+{{
+    "duplicates": [
+        {{
+            "type": "duplicate_vendor" | "overlapping_service" | "downgrade_opportunity" | "bundle_available",
+            "subscriptions": ["vendor1", "vendor2"],
+            "subscription_ids": [1, 2],
+            "potential_savings": 0.00,
+            "recommendation": "Specific action to take",
+            "reasoning": "Why this saves money",
+            "priority": "high" | "medium" | "low"
+        }}
+    ],
+    "total_potential_savings": 0.00,
+    "savings_percentage": 0,
+    "summary": "Brief overview of findings"
+}}"""
+
+        response = await self._complete_once(
+            cache_key,
+            request_type,
+            prompt,
+            system_prompt=system_prompt,
+            temperature=0.5,
+            max_tokens=1000
+        )
+        return _parse_json_response(response)
+    
+    def _merge_budget_results(self, results: List[Dict[str, Any]], total_monthly: float) -> Dict[str, Any]:
+        """Combine per-chunk budget surgeon findings into one result."""
+        findings = [finding for result in results for finding in result.get("duplicates", [])]
+        findings.sort(key=lambda finding: finding.get("potential_savings") or 0, reverse=True)
+        savings = sum(float(result.get("total_potential_savings") or 0) for result in results)
+        summaries = [result["summary"] for result in results if result.get("summary")]
+        return {
+            "duplicates": findings,
+            "total_potential_savings": round(savings, 2),
+            "savings_percentage": round(savings / total_monthly * 100) if total_monthly else 0,
+            "summary": " ".join(summaries),
+            "chunks": len(results)
+        }
+    
     # =========================================================================
     # FEATURE 3: RENEWAL FORECASTER
     # =========================================================================
     
-    async def forecast_renewals(self, months_ahead: int = 12) -> Dict[str, Any]:
+    async def forecast_renewals(self, months_ahead: int = 12, min_ttl: int = 0) -> Dict[str, Any]:
         """
         Predict upcoming subscription costs for the next N months.
         
@@ -371,18 +481,24 @@ Respond with JSON only:
         
         Args:
             months_ahead: Number of months to forecast (default: 12)
+            min_ttl: Regenerate cached insights expiring within this many seconds
             
         Returns:
             Dictionary with forecast data and insights
         """
         request_type = "renewal_forecaster"
         
-        # Get all active subscriptions
-        subscriptions = self.db.query(Subscription).filter(
-            Subscription.status == "active"
-        ).all()
-        
-        if not subscriptions:
+        # Get all active subscriptions as plain columns
+        rows = self.db.query(
+            Subscription.vendor_name,
+            Subscription.cost,
+            Subscription.billing_cycle,
+            Subscription.custom_billing_amount,
+            Subscription.custom_billing_unit,
+            Subscription.next_renewal_date
+        ).filter(Subscription.status == "active").all()
+        
+        if not rows:
             return {
                 "message": "No active subscriptions to forecast",
                 "forecast": [],
@@ -390,71 +506,53 @@ Respond with JSON only:
                 "cached": False
             }
         
-        # Calculate forecast based on renewal dates
-        today = date.today()
-        forecast = {}
-        
-        for i in range(months_ahead):
-            forecast_date = today + timedelta(days=30 * i)
-            month_key = forecast_date.strftime("%Y-%m")
-            forecast[month_key] = {
-                "month": month_key,
-                "month_name": forecast_date.strftime("%B %Y"),
-                "cost": 0,
-                "subscriptions": [],
-                "renewal_count": 0
+        # Expand every renewal across the horizon, whatever the billing cycle
+        projection = RenewalProjection(date.today(), months_ahead)
+        for vendor, cost, cycle, custom_amount, custom_unit, next_renewal in rows:
+            cycle = cycle.value if hasattr(cycle, "value") else cycle
+            projection.add(cost, cycle, custom_amount, custom_unit, next_renewal, label=(vendor, cycle))
+        buckets = projection.project()
+        top = projection.top_renewals(buckets["month_subscriptions"], FORECAST_TOP_RENEWALS)
+        
+        forecast_list = [
+            {
+                "month": month_start.strftime("%Y-%m"),
+                "month_name": month_start.strftime("%B %Y"),
+                "cost": round(buckets["month_cost"][i], 2),
+                "subscriptions": [
+                    {"vendor": vendor, "cost": cost, "cycle": cycle} for (vendor, cycle), cost in top[i]
+                ],
+                "renewal_count": buckets["month_renewals"][i]
             }
+            for i, month_start in enumerate(projection.month_starts)
+        ]
+        weekly_list = [
+            {
+                "week_start": week_start.isoformat(),
+                "cost": round(buckets["week_cost"][i], 2),
+                "renewal_count": buckets["week_renewals"][i]
+            }
+            for i, week_start in enumerate(projection.week_starts())
+        ]
         
-        # Calculate costs for each subscription
-        for sub in subscriptions:
-            monthly_cost = self._normalize_to_monthly(sub.cost, sub.billing_cycle.value)
-            
-            # Determine which months this subscription affects
-            for i in range(months_ahead):
-                forecast_date = today + timedelta(days=30 * i)
-                month_key = forecast_date.strftime("%Y-%m")
-                
-                # Check if renewal falls in this month
-                if self._is_renewal_in_month(sub, forecast_date):
-                    forecast[month_key]["cost"] += sub.cost
-                    forecast[month_key]["subscriptions"].append({
-                        "vendor": sub.vendor_name,
-                        "cost": sub.cost,
-                        "cycle": sub.billing_cycle.value
-                    })
-                    forecast[month_key]["renewal_count"] += 1
-                elif sub.billing_cycle.value == "monthly":
-                    # Monthly subscriptions charge every month
-                    forecast[month_key]["cost"] += sub.cost
-                    forecast[month_key]["subscriptions"].append({
-                        "vendor": sub.vendor_name,
-                        "cost": sub.cost,
-                        "cycle": "monthly"
-                    })
-        
-        # Convert to list and calculate totals
-        forecast_list = list(forecast.values())
-        total_yearly = sum(m["cost"] for m in forecast_list[:12])
+        # Calculate totals
+        total_yearly = sum(buckets["month_cost"][:12])
         
         # Find peak spending
         peak_month = max(forecast_list, key=lambda x: x["cost"])
         lowest_month = min(forecast_list, key=lambda x: x["cost"])
         avg_monthly = total_yearly / 12 if forecast_list else 0
         
-        # Round all costs
-        for month in forecast_list:
-            month["cost"] = round(month["cost"], 2)
-        
         # Check cache for AI insights
         cache_key = generate_cache_key(
             request_type,
             months=months_ahead,
-            sub_count=len(subscriptions),
+            sub_count=len(rows),
             total=round(total_yearly, 2)
         )
         
         ai_insights = None
-        cached = get_cached_response(self.db, cache_key)
+        cached = get_cached_response(self.db, cache_key, min_ttl)
         
         if cached:
             ai_insights = _parse_json_response(cached)
@@ -470,7 +568,7 @@ Total Yearly Cost: ${total_yearly:.2f}
 Average Monthly: ${avg_monthly:.2f}
 Peak Month: {peak_month['month_name']} (${peak_month['cost']:.2f})
 Lowest Month: {lowest_month['month_name']} (${lowest_month['cost']:.2f})
-Total Subscriptions: {len(subscriptions)}
+Total Subscriptions: {len(rows)}
 
 Monthly Breakdown:
 {json.dumps(forecast_list[:6], indent=2)}
@@ -484,7 +582,9 @@ Provide insights in JSON:
     "optimization_tip": "One key tip to optimize spending"
 }}"""
 
-                response = await self.provider.generate_completion(
+                response = await self._complete_once(
+                    cache_key,
+                    request_type,
                     prompt,
                     system_prompt=system_prompt,
                     temperature=0.6,
@@ -492,16 +592,13 @@ Provide insights in JSON:
                 )
                 
                 ai_insights = _parse_json_response(response)
-                if ai_insights:
-                    store_cached_response(
-                        self.db, cache_key, request_type, prompt, response
-                    )
-                    
+                
             except Exception as e:
                 logger.error(f"Error getting forecast insights: {e}")
         
         return {
             "forecast": forecast_list,
+            "weekly_forecast": weekly_list,
             "total_yearly_cost": round(total_yearly, 2),
             "average_monthly_cost": round(avg_monthly, 2),
             "peak_spending": {
@@ -512,7 +609,7 @@ Provide insights in JSON:
                 "month": lowest_month["month_name"],
                 "amount": round(lowest_month["cost"], 2)
             },
-            "subscription_count": len(subscriptions),
+            "subscription_count": len(rows),
             "ai_insights": ai_insights,
             "cached": cached is not None
         }
@@ -611,7 +708,9 @@ Respond with JSON only:
 }}"""
 
         try:
-            response = await self.provider.generate_completion(
+            response = await self._complete_once(
+                cache_key,
+                request_type,
                 prompt,
                 system_prompt=system_prompt,
                 temperature=0.3,
@@ -639,11 +738,6 @@ Respond with JSON only:
                     result["suggested_category_id"] = categories[0].id
                     result["confidence"] = max(0, result.get("confidence", 0) - 30)
                 
-                # Store in cache
-                store_cached_response(
-                    self.db, cache_key, request_type, prompt, response
-                )
-                
                 return result
             else:
                 return {
@@ -676,28 +770,3 @@ Respond with JSON only:
                 "alternatives": [],
                 "cached": False
             }
-    
-    # =========================================================================
-    # HELPER METHODS
-    # =========================================================================
-    
-    def _normalize_to_monthly(self, cost: float, cycle: str) -> float:
-        """Convert any billing cycle cost to monthly equivalent."""
-        cycle_multipliers = {
-            "weekly": 4.33,
-            "monthly": 1,
-            "quarterly": 1/3,
-            "biannual": 1/6,
-            "yearly": 1/12
-        }
-        return cost * cycle_multipliers.get(cycle, 1)
-    
-    def _is_renewal_in_month(self, sub: Subscription, target_date: date) -> bool:
-        """Check if a subscription renews in the target month."""
-        if not sub.next_renewal_date:
-            return False
-        
-        return (
-            sub.next_renewal_date.year == target_date.year and
-            sub.next_renewal_date.month == target_date.month
-        )
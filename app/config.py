@@ -1,6 +1,6 @@
 """Application configuration."""
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -47,7 +47,77 @@ class Settings(BaseSettings):
     ai_cache_ttl: int = 86400  # 24 hours in seconds
     ai_request_timeout: int = 30  # seconds
     ai_max_retries: int = 2
-    ai_daily_limit: int = 1000  # Daily request limit (GitHub Models: unlimited)
+    ai_http_connect_timeout: float = 5.0  # seconds
+    ai_http_max_connections: int = 20
+    ai_http_max_keepalive_connections: int = 10
+    ai_http_keepalive_expiry: float = 60.0  # seconds an idle connection is kept
+    ai_http2: bool = False  # requires the 'h2' package
+    ai_daily_limit: int = 1000  # Daily request limit, enforced by app.ai.scheduler
+    ai_usage_sync_seconds: float = 2.0  # Max age of the shared daily counter before re-reading it
+    ai_requests_per_minute: int = 15
+    ai_tokens_per_minute: int = 1000000
+    # Seconds a call may wait for a slot before failing fast, per priority lane
+    ai_interactive_deadline: float = 10.0
+    ai_default_deadline: float = 30.0
+    ai_background_deadline: float = 120.0
+    # Circuit breaker around provider calls (app.ai.circuit_breaker)
+    ai_circuit_failure_rate: float = 0.5  # failure share over the window that opens the circuit
+    ai_circuit_min_calls: int = 4  # calls in the window before the rate is trusted
+    ai_circuit_window: int = 60  # seconds
+    ai_circuit_open_seconds: int = 30  # before the first half-open probe
+    ai_circuit_max_open_seconds: int = 300  # open period doubles after failed probes up to this
+    
+    ai_chat_context_ttl: int = 300  # seconds; bounds staleness from other workers' writes
+    ai_context_token_budget: int = 6000  # estimated prompt tokens for subscription tables
+    ai_context_max_chunks: int = 8  # map-reduce calls per request when a table doesn't fit
+    # Background refresh of cached AI insights (app.ai.precompute)
+    ai_precompute_enabled: bool = True
+    ai_precompute_interval: int = 3600  # seconds between full refresh cycles
+    ai_precompute_debounce: int = 120  # seconds after a data change before refreshing early
+    ai_precompute_poll: int = 30  # seconds between checks for due work
+    ai_precompute_refresh_ahead: int = 4 * 3600  # regenerate entries expiring within this
+    ai_precompute_top_customers: int = 5
+    ai_precompute_min_remaining: int = 100  # daily requests kept for interactive use
+    ai_precompute_forecast_months: List[int] = [12]  # forecast horizons prewarmed; others are generated on demand
+    ai_search_candidate_limit: int = 50  # rows natural-language search may send to the model
+    
+    # Batched link refinement (LinkAnalyzer.refine_with_ai)
+    ai_link_refine_chunk_tokens: int = 8000  # prompt + response budget per call
+    ai_link_refine_concurrency: int = 3
+    ai_link_refine_max_links: int = 500
+    ai_link_max_block_size: int = 500  # blocking keys shared by more entities are ignored
+    ai_link_workers: int = 0  # processes scoring link candidates; 0 = one per CPU
+    ai_link_parallel_min_pairs: int = 20000  # fewer candidates are scored in-process
+    # Link-graph clusters (app.services.link_graph)
+    link_cluster_min_confidence: float = 0.7  # undecided links at least this confident join clusters
+    link_cluster_ttl: int = 300  # seconds; bounds staleness from other workers' writes
+    # Daily spend snapshots for trend analytics (app.services.spend_history)
+    spend_history_enabled: bool = True
+    spend_history_poll: int = 3600  # seconds between checks for a missing daily snapshot
+    spend_history_daily_days: int = 90  # older daily rows are averaged into weeks
+    spend_history_weekly_days: int = 730  # older weekly rows are averaged into months
+    spend_history_retention_days: int = 3650  # older monthly rows are deleted
+    # In-process columnar copy of subscriptions for analytics (app.services.hot_dataset)
+    hot_dataset_enabled: bool = False
+    hot_dataset_ttl: int = 300  # seconds; reload to pick up other workers' writes (0 = never)
+    # Near-duplicate name matching (app.services.name_similarity)
+    name_minhash_permutations: int = 60
+    name_lsh_bands: int = 20  # 3 rows per band: pairs above ~0.4 Jaccard usually share a bucket
+    name_duplicate_threshold: float = 0.85  # similarity reported as a likely duplicate
+    ai_memory_cache_max_entries: int = 512  # In-process cache in front of ai_request_cache
+    ai_memory_cache_max_bytes: int = 8 * 1024 * 1024
+    ai_cache_negative_ttl: int = 30  # seconds a cache miss is remembered
+    ai_cache_hit_flush_batch: int = 50  # pending hit_count updates before a flush
+    ai_cache_hit_flush_interval: int = 60  # seconds between hit_count flushes
+    # Bounds on the ai_request_cache table, enforced by the cache sweeper
+    ai_cache_max_bytes: int = 64 * 1024 * 1024  # stored prompt + response bytes
+    ai_cache_max_entries_per_type: int = 1000
+    ai_cache_type_quotas: Dict[str, int] = {}  # per request_type overrides, e.g. {"insights": 200}
+    ai_cache_stale_retention: int = 7 * 86400  # seconds expired rows stay available as stale fallbacks
+    ai_cache_sweep_interval: int = 900  # seconds
+    ai_cache_prompt_max_chars: int = 2000  # stored prompts are for debugging only
+    ai_cache_compress: bool = False  # zlib-compress stored prompt/response text
+    ai_cache_compress_min_bytes: int = 1024
     
     # App
     debug: bool = True
@@ -51,7 +51,6 @@ def export_all_data(db: Session) -> dict:
     from app.models.log_entry import LogEntry
     from app.models.check_category import CheckCategory
     from app.models.subscription_template import SubscriptionTemplate
-    from app.models.ai_cache import AIRequestCache
     from sqlalchemy import text
     
     data = {
@@ -68,7 +67,6 @@ def export_all_data(db: Session) -> dict:
         "log_entries": [],
         "check_categories": [],
         "subscription_templates": [],
-        "ai_request_caches": [],
         "many_to_many": {
             "subscription_categories": [],
             "customer_categories": [],
@@ -274,23 +272,6 @@ def export_all_data(db: Session) -> dict:
     except Exception as e:
         print(f"[DataPersistence] Error exporting subscription templates: {e}")
 
-    # Export AI Caches
-    try:
-        for aic in db.query(AIRequestCache).all():
-            data["ai_request_caches"].append({
-                "id": aic.id,
-                "request_hash": aic.request_hash,
-                "request_type": aic.request_type,
-                "prompt": aic.prompt,
-                "response": aic.response,
-                "tokens_used": aic.tokens_used,
-                "hit_count": aic.hit_count,
-                "created_at": aic.created_at.isoformat() if aic.created_at else None,
-                "expires_at": aic.expires_at.isoformat() if aic.expires_at else None
-            })
-    except Exception as e:
-        print(f"[DataPersistence] Error exporting AI caches: {e}")
-
     # Export many-to-many relationships
     try:
         # Subscription-Category relationships
@@ -442,7 +423,6 @@ def import_data_to_db(db: Session, data: dict, return_details: bool = False):
     from app.models.log_entry import LogEntry
     from app.models.check_category import CheckCategory
     from app.models.subscription_template import SubscriptionTemplate
-    from app.models.ai_cache import AIRequestCache
     from sqlalchemy.exc import IntegrityError
     
     _importing = True
@@ -461,8 +441,7 @@ def import_data_to_db(db: Session, data: dict, return_details: bool = False):
             "renewal_notices": 0,
             "log_entries": 0,
             "check_categories": 0,
-            "subscription_templates": 0,
-            "ai_request_caches": 0
+            "subscription_templates": 0
         }
         warnings = []
         
@@ -929,38 +908,8 @@ def import_data_to_db(db: Session, data: dict, return_details: bool = False):
                 warnings.append(f"ActivityLog {log_data.get('id')} skipped: {str(e)}")
                 db.rollback()
 
-        # Import AI Request Caches
-        for aic_data in data.get("ai_request_caches", []):
-            try:
-                existing = db.query(AIRequestCache).filter(AIRequestCache.id == aic_data["id"]).first()
-                if existing:
-                    existing.request_hash = aic_data["request_hash"]
-                    existing.request_type = aic_data["request_type"]
-                    existing.prompt = aic_data["prompt"]
-                    existing.response = aic_data["response"]
-                    existing.tokens_used = aic_data.get("tokens_used", 0)
-                    existing.hit_count = aic_data.get("hit_count", 0)
-                else:
-                    aic = AIRequestCache(
-                        id=aic_data["id"],
-                        request_hash=aic_data["request_hash"],
-                        request_type=aic_data["request_type"],
-                        prompt=aic_data["prompt"],
-                        response=aic_data["response"],
-                        tokens_used=aic_data.get("tokens_used", 0),
-                        hit_count=aic_data.get("hit_count", 0)
-                    )
-                    if aic_data.get("created_at"):
-                        aic.created_at = datetime.fromisoformat(aic_data["created_at"])
-                    if aic_data.get("expires_at"):
-                        aic.expires_at = datetime.fromisoformat(aic_data["expires_at"])
-                    db.add(aic)
-                imported_counts["ai_request_caches"] += 1
-                db.commit()
-            except Exception as e:
-                warnings.append(f"AIRequestCache {aic_data.get('id')} skipped: {str(e)}")
-                db.rollback()
-
+        # AI request caches are disposable and not restored; older backups may still carry them
+        
         # Import many-to-many relationships
         from sqlalchemy import text
         many_to_many = data.get("many_to_many", {})
@@ -1021,6 +970,10 @@ def import_data_to_db(db: Session, data: dict, return_details: bool = False):
         
         db.commit()
         
+        # Imported rows bypass the write routes, so reindex everything at once
+        from app.services.search_index import rebuild_search_index
+        rebuild_search_index(db)
+        
         print(f"[DataPersistence] Imported data: {imported_counts['categories']} categories, "
               f"{imported_counts['customers']} customers, {imported_counts['subscriptions']} subscriptions")
         
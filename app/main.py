@@ -8,7 +8,7 @@ from contextlib import asynccontextmanager
 from app.config import settings
 from app.routers import categories, groups, customers, subscriptions, ai_routes, search, search_routes
 from app.routers import web_routes, export_routes, auth_routes, users, saved_reports_routes, email_routes, log_check_routes, admin_routes
-from app.routers import activity_routes
+from app.routers import activity_routes, analytics_routes
 from app.routers.auth_routes import get_session
 
 
@@ -41,17 +41,58 @@ async def lifespan(app: FastAPI):
                 conn.execute(text("ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS custom_billing_amount INTEGER"))
                 conn.execute(text("ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS custom_billing_unit VARCHAR(20)"))
                 conn.execute(text("ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS user_id INTEGER"))
+                conn.execute(text("ALTER TABLE ai_request_cache ADD COLUMN IF NOT EXISTS compressed BOOLEAN NOT NULL DEFAULT FALSE"))
+                conn.execute(text("ALTER TABLE ai_request_cache ADD COLUMN IF NOT EXISTS size_bytes INTEGER NOT NULL DEFAULT 0"))
+                conn.execute(text("ALTER TABLE ai_request_cache ADD COLUMN IF NOT EXISTS last_hit_at TIMESTAMP"))
+                conn.execute(text("ALTER TABLE customers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+                conn.execute(text("ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP"))
+                conn.execute(text("ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS monthly_equivalent_cost DOUBLE PRECISION"))
+                conn.execute(text("ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS annual_equivalent_cost DOUBLE PRECISION"))
             else:
                 # SQLite fallback
                 for col_query in [
                     "ALTER TABLE subscriptions ADD COLUMN custom_billing_amount INTEGER",
                     "ALTER TABLE subscriptions ADD COLUMN custom_billing_unit VARCHAR(20)",
-                    "ALTER TABLE log_entries ADD COLUMN user_id INTEGER"
+                    "ALTER TABLE log_entries ADD COLUMN user_id INTEGER",
+                    "ALTER TABLE ai_request_cache ADD COLUMN compressed BOOLEAN NOT NULL DEFAULT 0",
+                    "ALTER TABLE ai_request_cache ADD COLUMN size_bytes INTEGER NOT NULL DEFAULT 0",
+                    "ALTER TABLE ai_request_cache ADD COLUMN last_hit_at DATETIME",
+                    "ALTER TABLE customers ADD COLUMN updated_at DATETIME",
+                    "ALTER TABLE subscriptions ADD COLUMN updated_at DATETIME",
+                    "ALTER TABLE subscriptions ADD COLUMN monthly_equivalent_cost FLOAT",
+                    "ALTER TABLE subscriptions ADD COLUMN annual_equivalent_cost FLOAT"
                 ]:
                     try:
                         conn.execute(text(col_query))
                     except Exception:
                         pass
+            
+            for index_query in [
+                "CREATE INDEX IF NOT EXISTS ix_customers_updated_at ON customers (updated_at)",
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_updated_at ON subscriptions (updated_at)",
+                # Duplicated link pairs would block the unique key
+                "DELETE FROM links WHERE id NOT IN (SELECT MIN(id) FROM links "
+                "GROUP BY source_type, source_id, target_type, target_id)",
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_links_source_target "
+                "ON links (source_type, source_id, target_type, target_id)",
+                "CREATE INDEX IF NOT EXISTS ix_subscriptions_status_monthly_cost "
+                "ON subscriptions (status, monthly_equivalent_cost)"
+            ]:
+                conn.execute(text(index_query))
+            
+            # Mark rows written before updated_at existed, as the migration does
+            for table in ("customers", "subscriptions"):
+                conn.execute(text(f"UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+            
+            # Backfill normalized costs for rows written before the columns existed
+            from sqlalchemy import update
+            from app.models.subscription import Subscription, monthly_equivalent_case
+            monthly = monthly_equivalent_case()
+            conn.execute(
+                update(Subscription)
+                .where(Subscription.monthly_equivalent_cost.is_(None))
+                .values(monthly_equivalent_cost=monthly, annual_equivalent_cost=monthly * 12)
+            )
                         
         if engine.name == 'postgresql':
             import sqlalchemy as sa
@@ -70,8 +111,44 @@ async def lifespan(app: FastAPI):
     init_data_persistence()
     print("[Startup] Data persistence initialized")
     
+    from app.services.search_index import init_search_index
+    print("[Startup] Initializing search index...")
+    init_search_index()
+    print("[Startup] Search index ready")
+    
+    from app.services.log_search import ensure_log_search_index
+    ensure_log_search_index(engine)
+    
+    from app.services.typeahead_index import init_typeahead_index
+    init_typeahead_index()
+    
+    from app.services.name_similarity import init_name_index
+    init_name_index()
+    
+    from app.services.hot_dataset import init_hot_dataset
+    init_hot_dataset()
+    
+    from app.ai.cache import cache_sweeper
+    cache_sweeper.start()
+    
+    from app.ai.precompute import insight_precomputer
+    if insight_precomputer.start():
+        print("[Startup] AI insight precompute scheduled")
+    
+    from app.services.spend_history import spend_snapshotter
+    spend_snapshotter.start()
+    
     yield
     
+    await spend_snapshotter.stop()
+    await insight_precomputer.stop()
+    await cache_sweeper.stop()
+    from app.ai.link_intelligence import shutdown_scoring_pool
+    shutdown_scoring_pool()
+    # Write AI calls granted since the last usage sync
+    from app.ai.scheduler import ai_scheduler
+    await ai_scheduler.sync_usage()
+    
     # Shutdown: Final data save
     from app.data_persistence import auto_save
     from app.database import SessionLocal
@@ -80,8 +157,15 @@ async def lifespan(app: FastAPI):
     try:
         auto_save(db)
         print("[Shutdown] Final data save complete")
+        
+        # Persist hit counts still held by the in-memory AI cache
+        from app.ai.cache import flush_hit_counts
+        flush_hit_counts(db, force=True)
     finally:
         db.close()
+    
+    from app.ai.gemini_provider import close_http_client
+    await close_http_client()
 
 
 # Create FastAPI app
@@ -162,6 +246,7 @@ app.include_router(saved_reports_routes.router, prefix="/api", tags=["saved-repo
 app.include_router(email_routes.router, prefix="/api/email", tags=["email"])
 app.include_router(log_check_routes.router, tags=["log-check"])
 app.include_router(activity_routes.router, tags=["activity"])
+app.include_router(analytics_routes.router, tags=["analytics"])
 app.include_router(admin_routes.router)
 
 
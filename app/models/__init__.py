@@ -3,13 +3,16 @@ from app.models.category import Category
 from app.models.group import Group
 from app.models.customer import Customer
 from app.models.subscription import Subscription
-from app.models.link import Link
+from app.models.link import Link, LinkAnalysisRun
 from app.models.user import User
 from app.models.saved_report import SavedReport
 from app.models.ai_cache import AIRequestCache
+from app.models.ai_usage import AIUsageDaily
 from app.models.renewal_notice import RenewalNotice
 from app.models.activity_log import ActivityLog
 from app.models.log_entry import LogEntry
 from app.models.check_category import CheckCategory
+from app.models.subscription_template import SubscriptionTemplate
+from app.models.spend_snapshot import SpendSnapshot
 
-__all__ = ["Category", "Group", "Customer", "Subscription", "Link", "User", "SavedReport", "AIRequestCache", "RenewalNotice", "ActivityLog", "LogEntry", "CheckCategory", "SubscriptionTemplate"]
+__all__ = ["Category", "Group", "Customer", "Subscription", "Link", "LinkAnalysisRun", "User", "SavedReport", "AIRequestCache", "AIUsageDaily", "RenewalNotice", "ActivityLog", "LogEntry", "CheckCategory", "SubscriptionTemplate", "SpendSnapshot"]
@@ -1,5 +1,5 @@
 """AI Request Cache model for storing cached AI responses."""
-from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index
 from datetime import datetime, timedelta
 from app.database import Base
 from app.config import settings
@@ -13,16 +13,20 @@ class AIRequestCache(Base):
     id = Column(Integer, primary_key=True, index=True)
     request_hash = Column(String(64), unique=True, nullable=False, index=True)
     request_type = Column(String(50), nullable=False, index=True)  # link_intelligence, budget_surgeon, etc.
-    prompt = Column(Text, nullable=False)
+    prompt = Column(Text, nullable=False)  # truncated to ai_cache_prompt_max_chars
     response = Column(Text, nullable=False)
+    compressed = Column(Boolean, nullable=False, default=False)  # prompt/response are zlib + base64
+    size_bytes = Column(Integer, nullable=False, default=0)  # stored prompt + response size
     tokens_used = Column(Integer, default=0)
     hit_count = Column(Integer, default=1)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = Column(DateTime, nullable=True)  # eviction is LRU by coalesce(last_hit_at, created_at)
     expires_at = Column(DateTime, nullable=False, index=True)
     
     # Create composite index for efficient cache lookups
     __table_args__ = (
         Index('idx_cache_hash_expires', 'request_hash', 'expires_at'),
+        Index('idx_cache_type_last_hit', 'request_type', 'last_hit_at'),
     )
     
     def __repr__(self):
@@ -0,0 +1,23 @@
+"""Daily AI usage counter model."""
+from sqlalchemy import Column, Integer, Date, DateTime
+from datetime import datetime
+from app.database import Base
+
+
+class AIUsageDaily(Base):
+    """Requests and estimated tokens sent to the AI provider per UTC day.
+    
+    Persisting the counter keeps the daily quota enforced across restarts
+    and shared between worker processes.
+    """
+    
+    __tablename__ = "ai_usage_daily"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, unique=True, nullable=False, index=True)
+    request_count = Column(Integer, nullable=False, default=0)
+    token_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<AIUsageDaily(day={self.day}, requests={self.request_count})>"
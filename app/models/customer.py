@@ -1,6 +1,7 @@
 """Customer model."""
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.database import Base
 
 # Import association tables for many-to-many relationships
@@ -28,6 +29,8 @@ class Customer(Base):
     country = Column(String(100), nullable=True, index=True)
     tags = Column(Text, nullable=True)  # Comma-separated tags
     notes = Column(Text, nullable=True)
+    # High-water mark for incremental link analysis
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Primary category relationship (legacy / backward compatible)
     category = relationship("Category", foreign_keys=[category_id], viewonly=True)
@@ -1,5 +1,5 @@
 """Link model for AI-discovered relationships."""
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Enum, Boolean, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 import enum
@@ -24,6 +24,10 @@ class Link(Base):
     """Link model for tracking relationships between entities."""
     
     __tablename__ = "links"
+    __table_args__ = (
+        # One link per ordered pair; analysis reruns insert with conflict-ignore
+        Index('uq_links_source_target', 'source_type', 'source_id', 'target_type', 'target_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     source_type = Column(Enum(EntityType), nullable=False, index=True)
@@ -37,3 +41,27 @@ class Link(Base):
     
     def __repr__(self):
         return f"<Link(id={self.id}, {self.source_type}:{self.source_id} -> {self.target_type}:{self.target_id}, confidence={self.confidence})>"
+
+
+class LinkAnalysisRun(Base):
+    """One link analysis pass.
+    
+    The latest run's marks are the high-water marks for the next
+    incremental pass: only customers and subscriptions updated after them
+    are rescored.
+    """
+    
+    __tablename__ = "link_analysis_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    full = Column(Boolean, nullable=False, default=False)
+    customer_mark = Column(DateTime, nullable=True)  # max(customers.updated_at) when the run started
+    subscription_mark = Column(DateTime, nullable=True)
+    customers_changed = Column(Integer, nullable=False, default=0)
+    subscriptions_changed = Column(Integer, nullable=False, default=0)
+    links_found = Column(Integer, nullable=False, default=0)
+    links_retired = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<LinkAnalysisRun(id={self.id}, full={self.full}, started_at={self.started_at})>"
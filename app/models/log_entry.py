@@ -1,5 +1,5 @@
 """Log entry model for log check functionality."""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -10,6 +10,10 @@ class LogEntry(Base):
     """Log entry model for storing generated log checks."""
     
     __tablename__ = "log_entries"
+    __table_args__ = (
+        # Backs newest-first history pages (keyset on created_at, id)
+        Index('ix_log_entries_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
@@ -0,0 +1,38 @@
+"""Spend snapshot model."""
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index
+from datetime import datetime
+from app.database import Base
+
+
+class SpendSnapshot(Base):
+    """Active monthly-equivalent spend and subscription count for one
+    dimension value over one period.
+    
+    Rows are written daily and downsampled to weekly, then monthly,
+    averages as they age (app.services.spend_history).
+    """
+    
+    __tablename__ = "spend_snapshots"
+    __table_args__ = (
+        # One row per series and period; also serves trend range scans
+        Index(
+            'uq_spend_snapshots_series_period',
+            'dimension', 'dimension_key', 'period_start', 'granularity', unique=True
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    dimension = Column(String(20), nullable=False)  # total, category, country, currency
+    dimension_key = Column(String(200), nullable=False, default="")
+    granularity = Column(String(10), nullable=False, default="day")  # day, week, month
+    period_start = Column(Date, nullable=False)
+    subscription_count = Column(Float, nullable=False, default=0)  # averaged once downsampled
+    monthly_spend = Column(Float, nullable=False, default=0)
+    samples = Column(Integer, nullable=False, default=1)  # daily snapshots averaged into the row
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return (
+            f"<SpendSnapshot({self.dimension}={self.dimension_key!r}, "
+            f"{self.granularity} {self.period_start}, spend={self.monthly_spend})>"
+        )
@@ -1,10 +1,14 @@
 """Subscription model."""
-from sqlalchemy import Column, Integer, String, Text, Float, Date, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from typing import Optional
+
+from sqlalchemy import (
+    Column, Integer, String, Text, Float, Date, DateTime, ForeignKey, Enum, Index, case, event, func, select, update
+)
+from sqlalchemy.orm import Session, relationship
 
 # Import association table for many-to-many categories
 from app.models.associations import subscription_categories
-from datetime import date
+from datetime import date, datetime
 import enum
 from app.database import Base
 
@@ -27,10 +31,52 @@ class BillingCycle(str, enum.Enum):
     CUSTOM = "custom"
 
 
+# Renewals per year for each fixed billing cycle
+CYCLES_PER_YEAR = {
+    BillingCycle.WEEKLY: 52,
+    BillingCycle.MONTHLY: 12,
+    BillingCycle.QUARTERLY: 4,
+    BillingCycle.BIANNUAL: 2,
+    BillingCycle.YEARLY: 1,
+}
+# Custom cycle units per year; unknown units count as months, like renewals do
+CUSTOM_UNITS_PER_YEAR = {"days": 365, "weeks": 52, "months": 12, "years": 1}
+
+
+def annual_equivalent(
+    cost: Optional[float],
+    cycle,
+    custom_amount: Optional[int] = None,
+    custom_unit: Optional[str] = None
+) -> float:
+    """Yearly cost of a subscription billed `cost` every `cycle`."""
+    cycle = BillingCycle(cycle.value if hasattr(cycle, "value") else cycle or BillingCycle.MONTHLY)
+    if cycle == BillingCycle.CUSTOM:
+        amount = custom_amount if custom_amount and custom_amount > 0 else 1
+        per_year = CUSTOM_UNITS_PER_YEAR.get((custom_unit or "months").lower(), 12) / amount
+    else:
+        per_year = CYCLES_PER_YEAR[cycle]
+    return float(cost or 0) * per_year
+
+
+def monthly_equivalent(
+    cost: Optional[float],
+    cycle,
+    custom_amount: Optional[int] = None,
+    custom_unit: Optional[str] = None
+) -> float:
+    """Monthly cost of a subscription billed `cost` every `cycle`."""
+    return annual_equivalent(cost, cycle, custom_amount, custom_unit) / 12
+
+
 class Subscription(Base):
     """Subscription model for tracking recurring services."""
     
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Covers SUM(monthly_equivalent_cost) over active subscriptions
+        Index('ix_subscriptions_status_monthly_cost', 'status', 'monthly_equivalent_cost'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False, index=True)
@@ -47,6 +93,11 @@ class Subscription(Base):
     status = Column(Enum(SubscriptionStatus), nullable=False, default=SubscriptionStatus.ACTIVE, index=True)
     country = Column(String(100), nullable=True, index=True)
     notes = Column(Text, nullable=True)
+    # Cost normalized across billing cycles, kept current on insert/update
+    monthly_equivalent_cost = Column(Float, nullable=True)
+    annual_equivalent_cost = Column(Float, nullable=True)
+    # High-water mark for incremental link analysis
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     customer = relationship("Customer", back_populates="subscriptions")
@@ -65,6 +116,12 @@ class Subscription(Base):
     def __repr__(self):
         return f"<Subscription(id={self.id}, vendor='{self.vendor_name}', customer_id={self.customer_id})>"
     
+    def refresh_equivalent_costs(self) -> None:
+        """Recompute the normalized cost columns from cost and billing cycle."""
+        annual = annual_equivalent(self.cost, self.billing_cycle, self.custom_billing_amount, self.custom_billing_unit)
+        self.annual_equivalent_cost = annual
+        self.monthly_equivalent_cost = annual / 12
+    
     def days_until_renewal(self) -> int:
         """Calculate days until next renewal."""
         if not self.next_renewal_date:
@@ -79,3 +136,44 @@ class Subscription(Base):
     def is_overdue(self) -> bool:
         """Check if subscription is overdue."""
         return self.days_until_renewal() < 0
+
+
+@event.listens_for(Subscription, "before_insert")
+@event.listens_for(Subscription, "before_update")
+def _refresh_equivalent_costs(mapper, connection, target):
+    target.refresh_equivalent_costs()
+
+
+def monthly_equivalent_case():
+    """SQL expression for the monthly equivalent, used to backfill the column."""
+    custom_per_year = case(
+        *[(func.lower(Subscription.custom_billing_unit) == unit, per_year) for unit, per_year in CUSTOM_UNITS_PER_YEAR.items()],
+        else_=12
+    )
+    custom_amount = case((Subscription.custom_billing_amount > 0, Subscription.custom_billing_amount), else_=1)
+    per_year = case(
+        *[(Subscription.billing_cycle == cycle, per_year) for cycle, per_year in CYCLES_PER_YEAR.items()],
+        else_=custom_per_year * 1.0 / custom_amount
+    )
+    return Subscription.cost * per_year / 12.0
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _refresh_bulk_equivalent_costs(orm_execute_state):
+    # query.update() skips the mapper events, so recompute the rows it touched
+    if not orm_execute_state.is_update or orm_execute_state.bind_mapper is not Subscription.__mapper__:
+        return None
+    if orm_execute_state.execution_options.get("equivalent_costs_refresh"):
+        return None
+    session = orm_execute_state.session
+    where = orm_execute_state.statement.whereclause
+    # Matched up front: the update may change the columns it filters on
+    ids = session.scalars(select(Subscription.id).where(where)).all() if where is not None else None
+    result = orm_execute_state.invoke_statement()
+
+    monthly = monthly_equivalent_case()
+    refresh = update(Subscription).values(monthly_equivalent_cost=monthly, annual_equivalent_cost=monthly * 12)
+    if ids is not None:
+        refresh = refresh.where(Subscription.id.in_(ids))
+    session.execute(refresh.execution_options(equivalent_costs_refresh=True, synchronize_session="fetch"))
+    return result
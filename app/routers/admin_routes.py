@@ -87,3 +87,26 @@ def fix_database_schema(
         "message": "Schema fix procedures executed.",
         "details": results
     }
+
+
+@router.post("/rebuild-search-index")
+def rebuild_search(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(check_admin)
+) -> Dict[str, Any]:
+    """Rebuild the global full-text search index from the entity tables."""
+    from app.services.search_index import ensure_search_index, rebuild_search_index
+    
+    if not ensure_search_index(engine):
+        return {
+            "success": False,
+            "message": "Full-text search is not available on this database",
+            "indexed": 0
+        }
+    
+    indexed = rebuild_search_index(db)
+    return {
+        "success": True,
+        "message": f"Indexed {indexed} records",
+        "indexed": indexed
+    }
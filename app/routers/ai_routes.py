@@ -1,4 +1,5 @@
 """AI-powered routes."""
+import json
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -6,10 +7,13 @@ from pydantic import BaseModel
 from app.database import get_db
 from app.ai.provider import get_ai_provider
 from app.ai.insights import InsightsAnalyzer
-from app.ai.link_intelligence import LinkAnalyzer
+from app.ai.link_intelligence import LinkAnalyzer, save_new_links
 from app.ai.features import AIFeatures
 from app.ai.smart_features import SmartAIFeatures
 from app.ai.cache import get_cache_stats, clear_expired_cache
+from app.ai.chat_context import get_chat_context
+from app.ai.circuit_breaker import CircuitOpenError, ai_circuit
+from app.services.link_graph import cluster_summaries
 from app.models import Link
 from app.models.link import UserDecision
 from app.schemas import LinkResponse, LinkDecision
@@ -28,6 +32,7 @@ class InsightsRequest(BaseModel):
 class LinkAnalyzeRequest(BaseModel):
     """Request schema for link analysis."""
     run_ai_refinement: bool = True
+    full_rerun: bool = False  # rescore every pair instead of only changed entities
 
 
 @router.post("/insights")
@@ -50,17 +55,19 @@ async def get_insights(request: InsightsRequest, db: Session = Depends(get_db)):
 @router.post("/analyze-links")
 async def analyze_links(request: LinkAnalyzeRequest = None, db: Session = Depends(get_db)):
     """Analyze and discover relationships between entities."""
-    ai_provider = get_ai_provider()
+    # Refinement is background work; it must not starve interactive calls
+    ai_provider = get_ai_provider("background")
     analyzer = LinkAnalyzer(db, ai_provider)
     
     # Default request if none provided
     if request is None:
         request = LinkAnalyzeRequest(run_ai_refinement=False)
     
-    # Run all link analyses
-    customer_links = analyzer.analyze_customer_links()
-    subscription_links = analyzer.analyze_subscription_links()
-    cross_category_links = analyzer.analyze_cross_category_links()
+    # Only entities changed since the last run are rescored unless a full rerun is asked for
+    plan = analyzer.plan_run(full=request.full_rerun)
+    customer_links = await analyzer.analyze_customer_links_async(since=plan['customers_since'])
+    subscription_links = await analyzer.analyze_subscription_links_async(since=plan['subscriptions_since'])
+    cross_category_links = analyzer.analyze_cross_category_links(since=plan['customers_since'])
     
     # Combine all links
     all_links = customer_links + subscription_links + cross_category_links
@@ -70,31 +77,23 @@ async def analyze_links(request: LinkAnalyzeRequest = None, db: Session = Depend
         all_links = await analyzer.refine_with_ai(all_links)
     
     # Store links in database (only new ones)
-    new_links = []
-    for link_data in all_links:
-        # Check if link already exists
-        existing = db.query(Link).filter(
-            Link.source_type == link_data['source_type'],
-            Link.source_id == link_data['source_id'],
-            Link.target_type == link_data['target_type'],
-            Link.target_id == link_data['target_id']
-        ).first()
-        
-        if not existing:
-            db_link = Link(**link_data)
-            db.add(db_link)
-            new_links.append(db_link)
+    new_links = save_new_links(db, all_links)
+    # Serialize before the commit expires the inserted rows
+    link_responses = [LinkResponse.model_validate(link) for link in new_links]
     
-    if new_links:
-        db.commit()
-        for link in new_links:
-            db.refresh(link)
+    links_retired = analyzer.retire_deleted_links()
+    analyzer.record_run(plan, len(new_links), links_retired)
+    db.commit()
     
     return {
+        'mode': 'full' if plan['full'] else 'incremental',
+        'customers_changed': plan['customers_changed'],
+        'subscriptions_changed': plan['subscriptions_changed'],
+        'links_retired': links_retired,
         'total_analyzed': len(all_links),
         'new_links_found': len(new_links),
         'links_found': len(new_links),
-        'links': [LinkResponse.model_validate(link) for link in new_links]
+        'links': link_responses
     }
 
 
@@ -125,6 +124,12 @@ def get_links(
     return [LinkResponse.model_validate(link) for link in links]
 
 
+@router.get("/link-clusters")
+def get_link_clusters(min_size: int = 2, limit: int = 100, db: Session = Depends(get_db)):
+    """Groups of entities connected by accepted or high-confidence links, with their spend."""
+    return cluster_summaries(db, min_size=max(min_size, 1), limit=max(limit, 0))
+
+
 @router.post("/links/{link_id}/decide")
 def decide_on_link(link_id: int, decision: LinkDecision, db: Session = Depends(get_db)):
     """Accept or reject a link suggestion."""
@@ -184,8 +189,7 @@ async def renewal_reminders(days_ahead: int = 30, db: Session = Depends(get_db))
 async def detect_duplicates(db: Session = Depends(get_db)):
     """Detect duplicate or overlapping subscriptions."""
     ai_features = AIFeatures(db)
-    duplicates = await ai_features.duplicate_detection()
-    return {"duplicates": duplicates}
+    return await ai_features.duplicate_detection()
 
 
 @router.get("/usage-patterns/{customer_id}")
@@ -604,7 +608,7 @@ async def get_ai_cache_stats(db: Session = Depends(get_db)):
             by_type_html += f"""
             <div class="cache-stat-item">
                 <span class="cache-stat-label">{req_type.replace('_', ' ').title()}:</span>
-                <span class="cache-stat-value">{data['count']} entries ({data['hits']} hits)</span>
+                <span class="cache-stat-value">{data['count']}/{data['quota']} entries ({data['hits']} hits, {data['bytes'] / 1024:.0f} KB)</span>
             </div>
             """
     
@@ -623,6 +627,10 @@ async def get_ai_cache_stats(db: Session = Depends(get_db)):
                 <div class="cache-stat-number">{stats.get('expired_entries', 0)}</div>
                 <div class="cache-stat-text">Expired</div>
             </div>
+            <div class="cache-stat-card">
+                <div class="cache-stat-number">{stats.get('total_bytes', 0) / (1024 * 1024):.1f} MB</div>
+                <div class="cache-stat-text">Stored (max {stats.get('max_bytes', 0) / (1024 * 1024):.0f} MB)</div>
+            </div>
             <div class="cache-stat-card">
                 <div class="cache-stat-number">{stats.get('cache_ttl_hours', 24):.0f}h</div>
                 <div class="cache-stat-text">Cache TTL</div>
@@ -632,7 +640,7 @@ async def get_ai_cache_stats(db: Session = Depends(get_db)):
     </div>
     <style>
     .cache-stats-container {{ margin-top: 1rem; }}
-    .cache-stat-grid {{ display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem; }}
+    .cache-stat-grid {{ display: grid; grid-template-columns: repeat(5, 1fr); gap: 1rem; }}
     .cache-stat-card {{ text-align: center; padding: 1rem; background: var(--color-background); border-radius: var(--border-radius); border: 1px solid var(--color-border); }}
     .cache-stat-number {{ font-size: 1.75rem; font-weight: 700; color: var(--color-primary); }}
     .cache-stat-text {{ font-size: 0.75rem; color: var(--color-text-secondary); margin-top: 0.25rem; }}
@@ -668,7 +676,7 @@ async def clear_ai_expired_cache(db: Session = Depends(get_db)):
             by_type_html += f"""
             <div class="cache-stat-item">
                 <span class="cache-stat-label">{req_type.replace('_', ' ').title()}:</span>
-                <span class="cache-stat-value">{data['count']} entries ({data['hits']} hits)</span>
+                <span class="cache-stat-value">{data['count']}/{data['quota']} entries ({data['hits']} hits, {data['bytes'] / 1024:.0f} KB)</span>
             </div>
             """
     
@@ -688,6 +696,10 @@ async def clear_ai_expired_cache(db: Session = Depends(get_db)):
                 <div class="cache-stat-number">{stats.get('expired_entries', 0)}</div>
                 <div class="cache-stat-text">Expired</div>
             </div>
+            <div class="cache-stat-card">
+                <div class="cache-stat-number">{stats.get('total_bytes', 0) / (1024 * 1024):.1f} MB</div>
+                <div class="cache-stat-text">Stored (max {stats.get('max_bytes', 0) / (1024 * 1024):.0f} MB)</div>
+            </div>
             <div class="cache-stat-card">
                 <div class="cache-stat-number">{stats.get('cache_ttl_hours', 24):.0f}h</div>
                 <div class="cache-stat-text">Cache TTL</div>
@@ -697,7 +709,7 @@ async def clear_ai_expired_cache(db: Session = Depends(get_db)):
     </div>
     <style>
     .cache-stats-container {{ margin-top: 1rem; }}
-    .cache-stat-grid {{ display: grid; grid-template-columns: repeat(4, 1fr); gap: 1rem; }}
+    .cache-stat-grid {{ display: grid; grid-template-columns: repeat(5, 1fr); gap: 1rem; }}
     .cache-stat-card {{ text-align: center; padding: 1rem; background: var(--color-background); border-radius: var(--border-radius); border: 1px solid var(--color-border); }}
     .cache-stat-number {{ font-size: 1.75rem; font-weight: 700; color: var(--color-primary); }}
     .cache-stat-text {{ font-size: 0.75rem; color: var(--color-text-secondary); margin-top: 0.25rem; }}
@@ -715,23 +727,42 @@ async def clear_ai_expired_cache(db: Session = Depends(get_db)):
 
 
 @router.get("/status")
-async def get_ai_status():
+async def get_ai_status(request: Request):
     """
-    Get AI provider status and configuration.
-    Returns HTML for HTMX integration.
+    Get AI provider status, configuration and remaining quota.
+    Returns HTML for HTMX integration, or JSON when requested via Accept.
     """
-    from fastapi.responses import HTMLResponse
+    from fastapi.responses import HTMLResponse, JSONResponse
     from app.config import settings
     from app.ai.provider import get_ai_provider
+    from app.ai.scheduler import ai_scheduler
     
     provider = get_ai_provider()
     is_available = provider.is_available()
+    await ai_scheduler.sync_usage()
+    quota = ai_scheduler.status()
+    circuit = ai_circuit.status()
+    
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(content={
+            "provider": settings.subtrack_ai_provider,
+            "available": is_available,
+            **quota,
+            **circuit
+        })
+    
+    if quota["exhausted"]:
+        state = "Quota used"
+    elif is_available and circuit["circuit"] != "closed":
+        state = "Degraded"
+    else:
+        state = "Online" if is_available else "Offline"
     
     html = f"""
-    <div class="ai-status-badge {'ai-online' if is_available else 'ai-offline'}">
+    <div class="ai-status-badge {'ai-online' if is_available and not quota['exhausted'] else 'ai-offline'}">
         <span>{'✓' if is_available else '✗'}</span>
-        <span>{settings.subtrack_ai_provider.title()} - {'Online' if is_available else 'Offline'}</span>
-        <span style="opacity: 0.7; font-size: 0.7rem;">({settings.ai_daily_limit} req/day)</span>
+        <span>{settings.subtrack_ai_provider.title()} - {state}</span>
+        <span style="opacity: 0.7; font-size: 0.7rem;">({quota['daily_remaining']}/{quota['daily_limit']} req left today)</span>
     </div>
     """
     
@@ -794,65 +825,15 @@ class ChatMessage(BaseModel):
     message: str
 
 
-@router.post("/chat")
-async def ai_chat(request: ChatMessage, db: Session = Depends(get_db)):
-    """
-    🤖 AI Chatbot
-    
-    Chat with an AI assistant that knows about SubTrack and your subscription data.
-    """
-    from fastapi.responses import JSONResponse
-    from app.ai.provider import get_ai_provider
-    from app.models import Subscription, Customer, Category
-    from sqlalchemy import func
-    
-    provider = get_ai_provider()
-    
-    if not provider.is_available():
-        return JSONResponse(content={
-            "response": "AI is not currently available. Please check your API configuration.",
-            "error": True
-        })
-    
-    # Gather context about the user's data
-    try:
-        # Get subscription stats
-        total_subs = db.query(func.count(Subscription.id)).scalar() or 0
-        active_subs = db.query(func.count(Subscription.id)).filter(
-            Subscription.status == "active"
-        ).scalar() or 0
-        
-        total_monthly = db.query(func.sum(Subscription.cost)).filter(
-            Subscription.status == "active",
-            Subscription.billing_cycle == "monthly"
-        ).scalar() or 0
-        
-        total_yearly = db.query(func.sum(Subscription.cost)).filter(
-            Subscription.status == "active",
-            Subscription.billing_cycle == "yearly"
-        ).scalar() or 0
-        
-        monthly_equivalent = float(total_monthly) + (float(total_yearly) / 12)
-        
-        categories = db.query(Category).all()
-        category_names = [c.name for c in categories]
-        
-        # Get top subscriptions by cost
-        top_subs = db.query(Subscription).filter(
-            Subscription.status == "active"
-        ).order_by(Subscription.cost.desc()).limit(5).all()
-        
-        top_subs_info = ", ".join([f"{s.vendor_name} (${s.cost}/{s.billing_cycle.value if hasattr(s.billing_cycle, 'value') else s.billing_cycle})" for s in top_subs])
-        
-    except Exception as e:
-        # Fallback if database query fails
-        total_subs = 0
-        active_subs = 0
-        monthly_equivalent = 0
-        category_names = []
-        top_subs_info = "N/A"
+CHAT_UNAVAILABLE = "AI is not currently available. Please check your API configuration."
+CHAT_FAILED = "Sorry — the AI service is not responding correctly right now. Please try again in a moment."
+
+
+def _chat_system_prompt(db: Session) -> str:
+    """Build the chat assistant's system prompt with a summary of the user's data."""
+    data_summary = get_chat_context(db)
     
-    system_prompt = f"""You are SubTrack Assistant, a helpful AI assistant for the SubTrack subscription management application.
+    return f"""You are SubTrack Assistant, a helpful AI assistant for the SubTrack subscription management application.
 
 ABOUT SUBTRACK:
 - SubTrack helps users track and manage their subscriptions
@@ -861,11 +842,7 @@ ABOUT SUBTRACK:
 - Users can organize subscriptions by categories, groups, and customers
 
 USER'S CURRENT DATA:
-- Total subscriptions: {total_subs}
-- Active subscriptions: {active_subs}
-- Estimated monthly spend: ${monthly_equivalent:.2f}
-- Categories: {', '.join(category_names) if category_names else 'None set up yet'}
-- Top subscriptions: {top_subs_info}
+{data_summary}
 
 GUIDELINES:
 - Be helpful, friendly, and concise
@@ -876,6 +853,27 @@ GUIDELINES:
 - For technical issues, suggest checking settings or contacting support
 - Keep responses under 150 words unless more detail is needed"""
 
+
+@router.post("/chat")
+async def ai_chat(request: ChatMessage, db: Session = Depends(get_db)):
+    """
+    🤖 AI Chatbot
+    
+    Chat with an AI assistant that knows about SubTrack and your subscription data.
+    """
+    from fastapi.responses import JSONResponse
+    from app.ai.provider import get_ai_provider, RateLimitError
+    
+    provider = get_ai_provider("interactive")
+    
+    if not provider.is_available():
+        return JSONResponse(content={
+            "response": CHAT_UNAVAILABLE,
+            "error": True
+        })
+    
+    system_prompt = _chat_system_prompt(db)
+
     try:
         response = await provider.generate_completion(
             prompt=request.message,
@@ -889,9 +887,76 @@ GUIDELINES:
             "error": False
         })
         
+    except RateLimitError as e:
+        return JSONResponse(content={
+            "response": f"The AI assistant is at its usage limit right now. {e}",
+            "error": True
+        })
+    except CircuitOpenError as e:
+        return JSONResponse(content={
+            "response": str(e),
+            "error": True
+        })
     except Exception:
         # Don't leak low-level provider errors (e.g., HTTP 405) to end users.
         return JSONResponse(content={
-            "response": "Sorry — the AI service is not responding correctly right now. Please try again in a moment.",
+            "response": CHAT_FAILED,
             "error": True
         })
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+@router.post("/chat/stream")
+async def ai_chat_stream(request: ChatMessage, http_request: Request, db: Session = Depends(get_db)):
+    """
+    🤖 AI Chatbot (streaming)
+    
+    Same assistant as /chat, sent as Server-Sent Events while it is generated:
+    `delta` events carry text fragments, then a final `done` (or `error`)
+    event. Generation stops when the client disconnects. Providers without
+    native streaming send their whole answer as one `delta`.
+    """
+    from fastapi.responses import StreamingResponse
+    from app.ai.provider import get_ai_provider, RateLimitError
+    
+    provider = get_ai_provider("interactive")
+    # Built before streaming starts; the request's DB session closes with the handler
+    system_prompt = _chat_system_prompt(db) if provider.is_available() else None
+    
+    async def events():
+        if system_prompt is None:
+            yield _sse("error", {"message": CHAT_UNAVAILABLE})
+            return
+        
+        fragments = provider.stream_completion(
+            prompt=request.message,
+            system_prompt=system_prompt,
+            temperature=0.7,
+            max_tokens=300
+        )
+        try:
+            async for fragment in fragments:
+                if await http_request.is_disconnected():
+                    break
+                yield _sse("delta", {"text": fragment})
+            else:
+                yield _sse("done", {})
+        except RateLimitError as e:
+            yield _sse("error", {"message": f"The AI assistant is at its usage limit right now. {e}"})
+        except CircuitOpenError as e:
+            yield _sse("error", {"message": str(e)})
+        except Exception:
+            # Don't leak low-level provider errors to end users.
+            yield _sse("error", {"message": CHAT_FAILED})
+        finally:
+            # Closes the upstream Gemini request if we stopped early
+            await fragments.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,60 @@
+"""Analytics routes for trend charts and in-memory summaries."""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_db
+from app.services.hot_dataset import analytics_summary, hot_dataset, subscription_columns
+from app.services.spend_history import spend_trend
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+
+@router.get("/spend-trend")
+def get_spend_trend(
+    dimension: str = "total",
+    days: int = Query(365, ge=1, le=3650),
+    granularity: Optional[str] = None,
+    key: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Monthly-equivalent spend and subscription count over time.
+    
+    Args:
+        dimension: total, category, country or currency
+        days: How far back to look
+        granularity: Re-bucket to day, week or month (coarser rows are kept)
+        key: Only these dimension values (e.g. category ids); repeatable
+    """
+    try:
+        return spend_trend(db, dimension=dimension, days=days, granularity=granularity, keys=key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/summary")
+def get_analytics_summary(
+    expiring_days: int = Query(30, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    """
+    Subscription counts and active spend by category, cycle, country,
+    currency and vendor.
+    
+    Served from the in-memory hot dataset when `hot_dataset_enabled` is set.
+    """
+    with subscription_columns(db) as columns:
+        summary = analytics_summary(columns, expiring_days=expiring_days)
+    summary["source"] = "memory" if settings.hot_dataset_enabled else "database"
+    return summary
+
+
+@router.get("/hot-dataset")
+def hot_dataset_stats():
+    """Report size and memory footprint of the in-memory hot dataset."""
+    stats = hot_dataset.stats()
+    stats["memory_mb"] = round(stats["memory_bytes"] / (1024 * 1024), 2)
+    return stats
@@ -7,6 +7,7 @@ from app.models import Category
 from app.models.activity_log import ActivityLog
 from app.schemas import CategoryCreate, CategoryUpdate, CategoryResponse
 from app.data_persistence import auto_save
+from app.services.search_index import index_entity, remove_entity
 
 router = APIRouter()
 
@@ -54,6 +55,9 @@ def create_category(category: CategoryCreate, background_tasks: BackgroundTasks,
         entity_name=db_category.name
     )
     
+    # Keep global search index in sync
+    index_entity(db, db_category)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -109,6 +113,9 @@ def update_category(category_id: int, category: CategoryUpdate, background_tasks
             changes=changes
         )
     
+    # Keep global search index in sync
+    index_entity(db, db_category)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -144,6 +151,9 @@ def delete_category(category_id: int, background_tasks: BackgroundTasks, db: Ses
         entity_name=category_name
     )
     
+    # Keep global search index in sync
+    remove_entity(db, "category", cat_id)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -11,6 +11,8 @@ from app.models import Customer, Category, Group
 from app.models.activity_log import ActivityLog
 from app.schemas import CustomerCreate, CustomerUpdate, CustomerResponse
 from app.data_persistence import auto_save
+from app.services.search_index import index_entity, remove_entity
+from app.services.name_similarity import name_index
 
 # Set up logging for debugging
 logger = logging.getLogger(__name__)
@@ -38,6 +40,16 @@ def log_activity(db: Session, action_type: str, entity_type: str, description: s
         logger.error(f"Activity logging error: {e}")
 
 
+def find_similar_customers(db: Session, name: str, exclude_id: int = None) -> List[dict]:
+    """Existing customers whose names are near-duplicates of `name`."""
+    name_index.ensure(db)
+    return [
+        {"id": key[1], "name": match_name, "similarity": score}
+        for key, match_name, score in name_index.similar(name, scope="customer")
+        if key[1] != exclude_id
+    ]
+
+
 def validate_email_format(email: str) -> bool:
     """Validate email format using regex."""
     if not email:
@@ -122,6 +134,11 @@ def create_customer(customer: CustomerCreate, background_tasks: BackgroundTasks,
     
 
     
+    # Warn about likely duplicates; creation still goes ahead
+    possible_duplicates = find_similar_customers(db, customer.name)
+    if possible_duplicates:
+        logger.info(f"Customer '{customer.name}' resembles existing customers: {possible_duplicates}")
+    
     try:
         # Create customer with basic fields
         customer_data = customer.model_dump(exclude={'category_id', 'group_id', 'category_ids', 'group_ids'})
@@ -160,9 +177,13 @@ def create_customer(customer: CustomerCreate, background_tasks: BackgroundTasks,
             extra_data={"email": db_customer.email, "country": db_customer.country, "category": cat_name, "groups": group_names}
         )
         
+        # Keep global search index in sync
+        index_entity(db, db_customer)
+
         # Auto-save data to file
         background_tasks.add_task(auto_save, db)
         
+        setattr(db_customer, "possible_duplicates", possible_duplicates)
         return db_customer
         
     except IntegrityError as e:
@@ -191,6 +212,14 @@ def get_unique_countries(db: Session = Depends(get_db)):
     return sorted([c[0] for c in countries if c[0]])
 
 
+@router.get("/similar", response_model=List[dict])
+def get_similar_customers(name: str, exclude_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Find customers whose names are near-duplicates of `name` (for duplicate hints while typing)."""
+    if not name.strip():
+        return []
+    return find_similar_customers(db, name, exclude_id)
+
+
 @router.get("", response_model=List[CustomerResponse])
 def list_customers(
     category_id: Optional[int] = None,
@@ -345,6 +374,9 @@ def update_customer(customer_id: int, customer: CustomerUpdate, background_tasks
             changes=changes
         )
     
+    # Keep global search index in sync
+    index_entity(db, db_customer)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -378,6 +410,9 @@ def delete_customer(customer_id: int, background_tasks: BackgroundTasks, db: Ses
         extra_data={"email": customer_email, "category": category_name}
     )
     
+    # Keep global search index in sync
+    remove_entity(db, "customer", cust_id)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
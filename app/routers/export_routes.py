@@ -1,5 +1,6 @@
 """Export routes for generating reports."""
 from fastapi import APIRouter, Depends, Response, UploadFile, File
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from datetime import date, datetime, timedelta
 from collections import defaultdict
@@ -11,6 +12,15 @@ import csv
 router = APIRouter()
 
 
+def _active_monthly_spend(db: Session, *group_by):
+    """Active subscription count and monthly-equivalent spend, optionally grouped."""
+    return db.query(
+        *group_by,
+        func.count(Subscription.id),
+        func.coalesce(func.sum(Subscription.monthly_equivalent_cost), 0.0)
+    ).filter(Subscription.status == "active").group_by(*group_by)
+
+
 @router.get("/export/subscriptions/excel")
 async def export_subscriptions_excel(db: Session = Depends(get_db)):
     """Export subscriptions to Excel format."""
@@ -137,20 +147,18 @@ async def export_analytics_excel(db: Session = Depends(get_db)):
         ws_summary.title = "Summary"
         
         # Get data
-        active_subs = db.query(Subscription).filter(Subscription.status == "active").all()
-        all_subs = db.query(Subscription).all()
-        
-        total_cost = sum(s.cost for s in active_subs)
+        active_count, total_cost = _active_monthly_spend(db).one()
+        all_count = db.query(func.count(Subscription.id)).scalar()
         
         # Summary data
         ws_summary.append(["SubTrack Analytics Report"])
         ws_summary.append([f"Generated: {date.today().isoformat()}"])
         ws_summary.append([])
         ws_summary.append(["Metric", "Value"])
-        ws_summary.append(["Total Active Subscriptions", len(active_subs)])
+        ws_summary.append(["Total Active Subscriptions", active_count])
         ws_summary.append(["Total Monthly Cost", f"${total_cost:.2f}"])
-        ws_summary.append(["Average Cost per Subscription", f"${total_cost/len(active_subs):.2f}" if active_subs else "$0.00"])
-        ws_summary.append(["Total Subscriptions (All Status)", len(all_subs)])
+        ws_summary.append(["Average Cost per Subscription", f"${total_cost/active_count:.2f}" if active_count else "$0.00"])
+        ws_summary.append(["Total Subscriptions (All Status)", all_count])
         
         # Style summary
         ws_summary['A1'].font = Font(size=16, bold=True)
@@ -164,13 +172,15 @@ async def export_analytics_excel(db: Session = Depends(get_db)):
         
         # By Category sheet
         ws_category = wb.create_sheet("By Category")
-        ws_category.append(["Category", "Count", "Total Cost"])
+        ws_category.append(["Category", "Count", "Monthly Cost"])
         
+        category_spend = {
+            category_id: (count, cost) for category_id, count, cost in _active_monthly_spend(db, Subscription.category_id)
+        }
         categories = db.query(Category).all()
         for cat in categories:
-            cat_subs = [s for s in active_subs if s.category_id == cat.id]
-            cat_cost = sum(s.cost for s in cat_subs)
-            ws_category.append([cat.name, len(cat_subs), cat_cost])
+            cat_count, cat_cost = category_spend.get(cat.id, (0, 0.0))
+            ws_category.append([cat.name, cat_count, cat_cost])
         
         # Style headers
         for cell in ws_category[1]:
@@ -180,16 +190,13 @@ async def export_analytics_excel(db: Session = Depends(get_db)):
         
         # By Vendor sheet
         ws_vendor = wb.create_sheet("By Vendor")
-        ws_vendor.append(["Vendor", "Count", "Total Cost"])
-        
-        from collections import defaultdict
-        vendor_stats = defaultdict(lambda: {"count": 0, "total": 0})
-        for sub in active_subs:
-            vendor_stats[sub.vendor_name]["count"] += 1
-            vendor_stats[sub.vendor_name]["total"] += sub.cost
+        ws_vendor.append(["Vendor", "Count", "Monthly Cost"])
         
-        for vendor, stats in sorted(vendor_stats.items(), key=lambda x: x[1]["total"], reverse=True):
-            ws_vendor.append([vendor, stats["count"], stats["total"]])
+        vendor_spend = _active_monthly_spend(db, Subscription.vendor_name).order_by(
+            func.sum(Subscription.monthly_equivalent_cost).desc()
+        )
+        for vendor, count, cost in vendor_spend:
+            ws_vendor.append([vendor, count, cost])
         
         # Style headers
         for cell in ws_vendor[1]:
@@ -216,11 +223,10 @@ async def export_analytics_excel(db: Session = Depends(get_db)):
         writer.writerow([f"Generated: {date.today().isoformat()}"])
         writer.writerow([])
         
-        active_subs = db.query(Subscription).filter(Subscription.status == "active").all()
-        total_cost = sum(s.cost for s in active_subs)
+        active_count, total_cost = _active_monthly_spend(db).one()
         
         writer.writerow(["Metric", "Value"])
-        writer.writerow(["Total Active Subscriptions", len(active_subs)])
+        writer.writerow(["Total Active Subscriptions", active_count])
         writer.writerow(["Total Monthly Cost", f"${total_cost:.2f}"])
         
         output.seek(0)
@@ -820,6 +826,9 @@ async def clear_all_records(db: Session = Depends(get_db)):
         
         db.commit()
         
+        from app.services.search_index import rebuild_search_index
+        rebuild_search_index(db)
+        
         from app.data_persistence import save_data_to_file
         save_data_to_file({
             "exported_at": datetime.now().isoformat(),
@@ -834,8 +843,7 @@ async def clear_all_records(db: Session = Depends(get_db)):
             "renewal_notices": [],
             "log_entries": [],
             "check_categories": [],
-            "subscription_templates": [],
-            "ai_request_caches": []
+            "subscription_templates": []
         })
         
         return {
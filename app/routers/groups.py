@@ -6,6 +6,7 @@ from app.models import Group, Category
 from app.models.activity_log import ActivityLog
 from app.schemas import GroupCreate, GroupUpdate, GroupResponse
 from app.data_persistence import auto_save
+from app.services.search_index import index_entity, remove_entity
 
 router = APIRouter()
 
@@ -54,6 +55,9 @@ def create_group(group: GroupCreate, background_tasks: BackgroundTasks, db: Sess
         extra_data={"category_name": category.name}
     )
     
+    # Keep global search index in sync
+    index_entity(db, db_group)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -120,6 +124,9 @@ def update_group(group_id: int, group: GroupUpdate, background_tasks: Background
             changes=changes
         )
     
+    # Keep global search index in sync
+    index_entity(db, db_group)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -152,6 +159,9 @@ def delete_group(group_id: int, background_tasks: BackgroundTasks, db: Session =
         extra_data={"category_name": category_name}
     )
     
+    # Keep global search index in sync
+    remove_entity(db, "group", grp_id)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
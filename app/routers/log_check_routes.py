@@ -14,10 +14,14 @@ from app.models.log_entry import LogEntry
 from app.models.check_category import CheckCategory
 from app.models.user import User
 from app.routers.auth_routes import get_current_user, require_auth
+from app.services.log_search import page_logs, query_logs
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
+# Entries rendered on the history page before "Load more"
+HISTORY_PAGE_SIZE = 50
+
 # Default log messages (from desktop app)
 LOG_MESSAGES = {
     'service': "Logged onto Servers. Checked system logs, DNS and DHCP entries, disk health and usage. Checked ESET logs. Checked volume shadow copies.",
@@ -167,7 +171,8 @@ async def log_check_page(request: Request, db: Session = Depends(get_db), user:
 @router.get("/log-check/history", response_class=HTMLResponse)
 async def log_history_page(request: Request, db: Session = Depends(get_db), user: User = Depends(require_auth)):
     """Render log history page."""
-    logs = db.query(LogEntry).filter(LogEntry.user_id == user.id).order_by(desc(LogEntry.created_at)).all()
+    # Only the first page is rendered; the rest is fetched from /api/log-check/logs
+    logs, next_cursor = page_logs(db, user.id, limit=HISTORY_PAGE_SIZE)
     
     # Need to fetch categories for filtering dropdown in history if needed
     categories = db.query(CheckCategory).filter(
@@ -177,6 +182,8 @@ async def log_history_page(request: Request, db: Session = Depends(get_db), user
     return templates.TemplateResponse("log_history.html", {
         "request": request,
         "logs": logs,
+        "next_cursor": next_cursor,
+        "page_size": HISTORY_PAGE_SIZE,
         "check_categories": categories,
         "user": user
     })
@@ -281,22 +288,29 @@ async def get_logs(
     check_type: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    before: Optional[str] = None,
+    include_total: bool = True,
     db: Session = Depends(get_db),
     user: User = Depends(require_auth)
 ):
-    """Get log entries with optional filters."""
-    query = db.query(LogEntry).filter(LogEntry.user_id == user.id)
-    
-    if search:
-        query = query.filter(LogEntry.full_entry.ilike(f"%{search}%"))
-    if check_type:
-        query = query.filter(LogEntry.check_type == check_type)
-    
-    total = query.count()
-    logs = query.order_by(desc(LogEntry.created_at)).offset(offset).limit(limit).all()
+    """
+    Get log entries with optional filters, newest first.
+
+    Pass the returned `next_cursor` as `before` to fetch the next page.
+    Pass `include_total=false` to skip counting `total` when paging.
+    """
+    limit = max(1, min(limit, 200))
+    try:
+        logs, next_cursor = page_logs(
+            db, user.id, search=search, check_type=check_type,
+            before=before, limit=limit, offset=offset
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    return {
-        "total": total,
+    result = {
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
         "logs": [
             {
                 "id": log.id,
@@ -310,6 +324,9 @@ async def get_logs(
             for log in logs
         ]
     }
+    if include_total:
+        result["total"] = query_logs(db, user.id, search, check_type).count()
+    return result
 
 
 @router.put("/api/log-check/logs/{log_id}")
@@ -1,53 +1,30 @@
 """Search API routes."""
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import List, Dict, Any
+from typing import Dict, Any
 from app.database import get_db
-from app.models import Category, Group, Customer, Subscription
+from app.services.search_index import search_entities
+from app.services.typeahead_index import typeahead_index
 
 router = APIRouter()
 
 
+@router.get("/diagnostics")
+def search_diagnostics() -> Dict[str, Any]:
+    """Report size and build time of the in-memory typeahead index."""
+    stats = typeahead_index.stats()
+    stats['memory_mb'] = round(stats['memory_bytes'] / (1024 * 1024), 2)
+    return stats
+
+
 @router.get("")
 def search(q: str = Query(..., min_length=1), db: Session = Depends(get_db)) -> Dict[str, Any]:
     """Global search across all entities."""
-    search_term = f"%{q.lower()}%"
-    
-    # Search categories
-    categories = db.query(Category).filter(
-        or_(
-            func.lower(Category.name).like(search_term),
-            func.lower(Category.description).like(search_term)
-        )
-    ).limit(10).all()
-    
-    # Search groups
-    groups = db.query(Group).filter(
-        or_(
-            func.lower(Group.name).like(search_term),
-            func.lower(Group.notes).like(search_term)
-        )
-    ).limit(10).all()
-    
-    # Search customers
-    customers = db.query(Customer).filter(
-        or_(
-            func.lower(Customer.name).like(search_term),
-            func.lower(Customer.email).like(search_term),
-            func.lower(Customer.tags).like(search_term),
-            func.lower(Customer.notes).like(search_term)
-        )
-    ).limit(10).all()
-    
-    # Search subscriptions
-    subscriptions = db.query(Subscription).filter(
-        or_(
-            func.lower(Subscription.vendor_name).like(search_term),
-            func.lower(Subscription.plan_name).like(search_term),
-            func.lower(Subscription.notes).like(search_term)
-        )
-    ).limit(10).all()
+    results = search_entities(db, q, limit=10)
+    categories = results['categories']
+    groups = results['groups']
+    customers = results['customers']
+    subscriptions = results['subscriptions']
     
     return {
         'query': q,
@@ -5,13 +5,33 @@ from typing import List, Optional
 from datetime import date
 from app.database import get_db
 from app.models import Subscription, Customer, Category
+from app.models.subscription import BillingCycle
 from app.models.subscription_template import SubscriptionTemplate
 from app.models.activity_log import ActivityLog
 from app.schemas import SubscriptionCreate, SubscriptionUpdate, SubscriptionResponse
 from app.data_persistence import auto_save
+from app.services.search_index import index_entity, remove_entity
+from app.services.name_similarity import name_index, template_label
 
 router = APIRouter()
 
+# Looser than the duplicate threshold: search input may be a partial or misspelt name
+TEMPLATE_SEARCH_THRESHOLD = 0.5
+
+
+def find_matching_template(db: Session, vendor_name: str, plan_name: Optional[str]) -> Optional[SubscriptionTemplate]:
+    """An existing template for the same vendor/plan, tolerating case, spacing and small typos."""
+    existing = db.query(SubscriptionTemplate).filter(
+        SubscriptionTemplate.vendor_name == vendor_name,
+        SubscriptionTemplate.plan_name == plan_name
+    ).first()
+    if existing:
+        return existing
+    name_index.ensure(db)
+    for key, _, _ in name_index.similar(template_label(vendor_name, plan_name), scope="template", limit=1):
+        return db.query(SubscriptionTemplate).filter(SubscriptionTemplate.id == key[1]).first()
+    return None
+
 
 def log_activity(db: Session, action_type: str, entity_type: str, description: str,
                  entity_id: int = None, entity_name: str = None, changes: dict = None,
@@ -86,6 +106,9 @@ def create_subscription(subscription: SubscriptionCreate, background_tasks: Back
         }
     )
 
+    # Keep global search index in sync
+    index_entity(db, db_subscription)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
 
@@ -93,10 +116,7 @@ def create_subscription(subscription: SubscriptionCreate, background_tasks: Back
     if subscription.save_template:
         try:
             # Check if template already exists to avoid duplicates
-            existing = db.query(SubscriptionTemplate).filter(
-                SubscriptionTemplate.vendor_name == db_subscription.vendor_name,
-                SubscriptionTemplate.plan_name == db_subscription.plan_name
-            ).first()
+            existing = find_matching_template(db, db_subscription.vendor_name, db_subscription.plan_name)
             
             if not existing:
                 template = SubscriptionTemplate(
@@ -109,6 +129,8 @@ def create_subscription(subscription: SubscriptionCreate, background_tasks: Back
                 )
                 db.add(template)
                 db.commit()
+                name_index.upsert(("template", template.id), template_label(template.vendor_name, template.plan_name),
+                                  scope="template")
                 print(f"Template auto-saved for {db_subscription.vendor_name}")
         except Exception as e:
             print(f"Error saving template: {e}")
@@ -219,6 +241,9 @@ def update_subscription(subscription_id: int, subscription: SubscriptionUpdate,
             changes=changes
         )
 
+    # Keep global search index in sync
+    index_entity(db, db_subscription)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
 
@@ -252,6 +277,9 @@ def delete_subscription(subscription_id: int, background_tasks: BackgroundTasks,
         extra_data={"customer_name": customer_name}
     )
     
+    # Keep global search index in sync
+    remove_entity(db, "subscription", sub_id)
+
     # Auto-save data to file
     background_tasks.add_task(auto_save, db)
     
@@ -349,6 +377,14 @@ def get_subscription_templates(search: Optional[str] = None, db: Session = Depen
             
         templates = query.order_by(SubscriptionTemplate.vendor_name).all()
         
+        if search and not templates:
+            # Nothing contains the text; fall back to near matches for typos ("slak")
+            name_index.ensure(db)
+            matches = name_index.similar(search, scope="template", threshold=TEMPLATE_SEARCH_THRESHOLD, limit=10)
+            ids = [key[1] for key, _, _ in matches]
+            by_id = {t.id: t for t in db.query(SubscriptionTemplate).filter(SubscriptionTemplate.id.in_(ids))}
+            templates = [by_id[i] for i in ids if i in by_id]
+        
         # Format as expected by frontend
         results = []
         for t in templates:
@@ -7,6 +7,7 @@ from datetime import datetime
 from app.database import get_db
 from app.models.subscription_template import SubscriptionTemplate
 from app.models.subscription import BillingCycle
+from app.services.name_similarity import name_index, template_label
 
 router = APIRouter()
 
@@ -58,6 +59,8 @@ def create_template(template: TemplateCreate, db: Session = Depends(get_db)):
     db.add(db_template)
     db.commit()
     db.refresh(db_template)
+    name_index.upsert(("template", db_template.id), template_label(db_template.vendor_name, db_template.plan_name),
+                      scope="template")
     return db_template
 
 @router.put("/{template_id}", response_model=TemplateResponse)
@@ -72,6 +75,8 @@ def update_template(template_id: int, template: TemplateCreate, db: Session = De
     
     db.commit()
     db.refresh(db_template)
+    name_index.upsert(("template", db_template.id), template_label(db_template.vendor_name, db_template.plan_name),
+                      scope="template")
     return db_template
 
 @router.delete("/{template_id}", status_code=204)
@@ -83,4 +88,5 @@ def delete_template(template_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_template)
     db.commit()
+    name_index.remove(("template", template_id))
     return None
@@ -5,10 +5,12 @@ from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import date, timedelta
+from app.config import settings
 from app.database import get_db
 from app.models import Category, Group, Customer, Subscription, Link, User
 from app.models.subscription import SubscriptionStatus
 from app.routers.auth_routes import get_current_user
+from app.services.hot_dataset import subscription_columns
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -21,47 +23,44 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
     # Get categories for sidebar
     categories = db.query(Category).all()
     
-    # Get stats
-    total_active = db.query(Subscription).filter(
-        Subscription.status == SubscriptionStatus.ACTIVE
-    ).count()
-    
-    # Calculate monthly cost and annual revenue
-    subscriptions = db.query(Subscription).filter(
-        Subscription.status == SubscriptionStatus.ACTIVE
-    ).all()
-    monthly_cost = sum(sub.cost for sub in subscriptions)
-    
-    # Calculate annual revenue based on billing cycles
-    annual_revenue = 0
-    for sub in subscriptions:
-        if sub.billing_cycle.value == 'monthly':
-            annual_revenue += sub.cost * 12
-        elif sub.billing_cycle.value == 'yearly':
-            annual_revenue += sub.cost
-        elif sub.billing_cycle.value == 'quarterly':
-            annual_revenue += sub.cost * 4
-        elif sub.billing_cycle.value == 'weekly':
-            annual_revenue += sub.cost * 52
-        elif sub.billing_cycle.value == 'biannual':
-            annual_revenue += sub.cost * 2
-        else:
-            annual_revenue += sub.cost * 12  # Default to monthly
-    
-    # Get expiring soon
     today = date.today()
     threshold_date = today + timedelta(days=30)
-    expiring_soon = db.query(Subscription).filter(
-        Subscription.status == SubscriptionStatus.ACTIVE,
-        Subscription.next_renewal_date <= threshold_date,
-        Subscription.next_renewal_date >= today
-    ).all()
-    
-    # Get overdue
-    overdue = db.query(Subscription).filter(
-        Subscription.status == SubscriptionStatus.ACTIVE,
-        Subscription.next_renewal_date < today
-    ).all()
+    if settings.hot_dataset_enabled:
+        # Stats from the in-memory columns; only the listed rows are loaded
+        with subscription_columns(db) as columns:
+            active = columns.select(status=SubscriptionStatus.ACTIVE)
+            total_active = len(active)
+            monthly_cost = sum(columns.monthly_cost[i] for i in active)
+            annual_revenue = monthly_cost * 12
+            expiring_ids = [columns.id[i] for i in columns.select(active, renewal_from=today, renewal_to=threshold_date)]
+            overdue_ids = [columns.id[i] for i in columns.select(active, renewal_to=today - timedelta(days=1))]
+        expiring_soon = db.query(Subscription).filter(Subscription.id.in_(expiring_ids)).all() if expiring_ids else []
+        overdue = db.query(Subscription).filter(Subscription.id.in_(overdue_ids)).all() if overdue_ids else []
+    else:
+        total_active = db.query(Subscription).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE
+        ).count()
+        
+        # Monthly cost and annual revenue, normalized across billing cycles
+        monthly_cost, annual_revenue = db.query(
+            func.coalesce(func.sum(Subscription.monthly_equivalent_cost), 0.0),
+            func.coalesce(func.sum(Subscription.annual_equivalent_cost), 0.0)
+        ).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE
+        ).one()
+        
+        # Get expiring soon
+        expiring_soon = db.query(Subscription).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.next_renewal_date <= threshold_date,
+            Subscription.next_renewal_date >= today
+        ).all()
+        
+        # Get overdue
+        overdue = db.query(Subscription).filter(
+            Subscription.status == SubscriptionStatus.ACTIVE,
+            Subscription.next_renewal_date < today
+        ).all()
     
     # Get all active subscriptions for the modal
     all_active = db.query(Subscription).filter(
@@ -128,7 +127,13 @@ async def subscriptions_page(request: Request, db: Session = Depends(get_db)):
     cancelled_count = len([s for s in subscriptions if s.status == SubscriptionStatus.CANCELLED])
     expired_count = len([s for s in subscriptions if s.status == SubscriptionStatus.EXPIRED])
     
-    monthly_cost = sum(s.cost for s in active_subs)
+    # Monthly-equivalent spend of active subscriptions, overall and per category
+    active_spend = dict(db.query(
+        Subscription.category_id, func.sum(Subscription.monthly_equivalent_cost)
+    ).filter(
+        Subscription.status == SubscriptionStatus.ACTIVE
+    ).group_by(Subscription.category_id).all())
+    monthly_cost = sum(spend or 0 for spend in active_spend.values())
     
     # Expiring and overdue
     today = date.today()
@@ -141,8 +146,8 @@ async def subscriptions_page(request: Request, db: Session = Depends(get_db)):
     cat_data = defaultdict(lambda: {'count': 0, 'monthly_cost': 0})
     for s in subscriptions:
         cat_data[s.category_id]['count'] += 1
-        if s.status == SubscriptionStatus.ACTIVE:
-            cat_data[s.category_id]['monthly_cost'] += s.cost
+    for category_id, spend in active_spend.items():
+        cat_data[category_id]['monthly_cost'] = spend or 0
     
     category_stats = []
     for cat in categories:
@@ -433,56 +438,49 @@ async def analytics_page(request: Request, period: str = "30", db: Session = Dep
         except ValueError:
             start_date = today - timedelta(days=30)
     
-    # Get all active subscriptions (optionally filtered by start_date)
-    query = db.query(Subscription).filter(Subscription.status == "active")
-    if start_date:
-        query = query.filter(Subscription.start_date >= start_date)
-    active_subs = query.all()
-    
-    # Also get all active subs for total counts
-    all_active_subs = db.query(Subscription).filter(Subscription.status == "active").all()
-    
-    # Calculate totals
-    total_spend = sum(s.cost for s in active_subs)
-    active_count = len(active_subs)
-    avg_cost = total_spend / active_count if active_count > 0 else 0
-    
-    # Get upcoming renewals (next 30 days)
-    upcoming = [s for s in all_active_subs if s.next_renewal_date and (s.next_renewal_date - today).days <= 30 and (s.next_renewal_date - today).days >= 0]
-    upcoming_renewals = len(upcoming)
-    renewal_value = sum(s.cost for s in upcoming)
+    # Aggregates over the columnar subscriptions (the hot dataset when
+    # enabled, otherwise one column query) instead of ORM rows
+    with subscription_columns(db) as columns:
+        all_active = columns.select(status=SubscriptionStatus.ACTIVE)
+        active = columns.select(all_active, start_from=start_date) if start_date else all_active
+        monthly_cost = columns.monthly_cost
+        
+        # Spend figures are monthly equivalents so mixed billing cycles add up
+        total_spend = sum(monthly_cost[i] for i in active)
+        active_count = len(active)
+        avg_cost = total_spend / active_count if active_count > 0 else 0
+        
+        # Get upcoming renewals (next 30 days)
+        upcoming = columns.select(all_active, renewal_from=today, renewal_to=today + timedelta(days=30))
+        upcoming_renewals = len(upcoming)
+        # Deliberately raw cost: the amount actually charged at these renewals
+        cost = columns.cost
+        renewal_value = sum(cost[i] for i in upcoming)
+        
+        category_totals = columns.group_by("category_id", active)
+        vendor_stats = columns.group_by("vendor", active)
+        cycle_stats = columns.group_by("cycle", active)
+        status_stats = columns.group_by("status")
     
     # Category breakdown
     categories = db.query(Category).all()
     for cat in categories:
-        cat_subs = [s for s in active_subs if s.category_id == cat.id]
-        cat.total = sum(s.cost for s in cat_subs)
+        cat.total = category_totals.get(cat.id, (0, 0))[1]
     
     # Top vendors
-    from collections import defaultdict
-    vendor_stats = defaultdict(lambda: {"count": 0, "total": 0})
-    for sub in active_subs:
-        vendor_stats[sub.vendor_name]["count"] += 1
-        vendor_stats[sub.vendor_name]["total"] += sub.cost
-    top_vendors = [{"name": k, "count": v["count"], "total": v["total"]} 
-                   for k, v in sorted(vendor_stats.items(), key=lambda x: x[1]["total"], reverse=True)[:5]]
+    top_vendors = [{"name": k, "count": count, "total": total}
+                   for k, (count, total) in sorted(vendor_stats.items(), key=lambda x: x[1][1], reverse=True)[:5]]
     
     # Billing cycles
-    cycle_stats = defaultdict(int)
-    for sub in active_subs:
-        cycle_stats[sub.billing_cycle.value] += 1
     billing_cycles = [
         {"name": k.capitalize(), "count": v, "percentage": int(v/active_count*100) if active_count > 0 else 0,
          "icon": {"monthly": "📅", "yearly": "📆", "quarterly": "🗓️", "weekly": "📋"}.get(k, "📄")}
-        for k, v in cycle_stats.items()
+        for k, (v, _) in cycle_stats.items()
     ]
     
     # Status counts
-    all_subs = db.query(Subscription).all()
     status_counts = {
-        "active": len([s for s in all_subs if s.status.value == "active"]),
-        "paused": len([s for s in all_subs if s.status.value == "paused"]),
-        "cancelled": len([s for s in all_subs if s.status.value == "cancelled"])
+        status: status_stats.get(status, (0, 0))[0] for status in ("active", "paused", "cancelled")
     }
     
     return templates.TemplateResponse("analytics.html", {
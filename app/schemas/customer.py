@@ -89,6 +89,9 @@ class CustomerResponse(BaseModel):
     category_names: Optional[str] = ""
     group_names: Optional[str] = ""
     
+    # Existing customers with near-identical names, set on create
+    possible_duplicates: Optional[List[dict]] = None
+    
     class Config:
         from_attributes = True
     
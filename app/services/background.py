@@ -0,0 +1,47 @@
+"""
+Base class for periodic background jobs run from the app lifespan.
+
+Subclasses implement `_loop()` (and `enabled()` when the job can be
+switched off). `start()` schedules the loop on the running event loop,
+`stop()` cancels it and waits for it to finish. `_session()` opens a
+session from the factory passed in (tests) or `SessionLocal`.
+"""
+import asyncio
+from typing import Callable, Optional
+
+
+class BackgroundTask:
+    """An asyncio loop started and stopped with the app."""
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from app.database import SessionLocal
+        return SessionLocal()
+
+    def enabled(self) -> bool:
+        return True
+
+    async def _loop(self) -> None:
+        raise NotImplementedError
+
+    def start(self) -> bool:
+        """Start the background loop; returns False when disabled."""
+        if not self.enabled():
+            return False
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return True
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
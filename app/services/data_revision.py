@@ -0,0 +1,92 @@
+"""
+Process-wide revision counter for subscription data.
+
+Caches derived from subscriptions, customers, categories and groups (e.g. the
+chat context summary) key themselves on `current_revision()`. The counter is
+bumped after any committed ORM write to those tables, so every write path —
+routes, imports, bulk updates — invalidates them without explicit calls.
+
+A second counter, `current_link_revision()`, does the same for the
+`links` table (link-graph clusters key on it).
+
+The counters are per process; caches that must also notice writes made by
+other workers should combine them with a short TTL.
+"""
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+TRACKED_TABLES = frozenset({
+    "subscriptions", "customers", "categories", "groups",
+    "subscription_categories", "customer_categories", "customer_groups",
+})
+LINK_TABLES = frozenset({"links"})
+
+_lock = threading.Lock()
+_revision = 0
+_link_revision = 0
+
+
+def current_revision() -> int:
+    """Return the current data revision."""
+    return _revision
+
+
+def bump_revision() -> int:
+    """Invalidate revision-keyed caches; returns the new revision."""
+    global _revision
+    with _lock:
+        _revision += 1
+        return _revision
+
+
+def current_link_revision() -> int:
+    """Return the current revision of the links table."""
+    return _link_revision
+
+
+def bump_link_revision() -> int:
+    """Invalidate link-keyed caches; returns the new revision."""
+    global _link_revision
+    with _lock:
+        _link_revision += 1
+        return _link_revision
+
+
+def _mark_changed(session, table) -> None:
+    if table in TRACKED_TABLES:
+        session.info["data_changed"] = True
+    elif table in LINK_TABLES:
+        session.info["links_changed"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _mark_changed(session, getattr(obj, "__tablename__", None))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("data_changed", False):
+        bump_revision()
+    if session.info.pop("links_changed", False):
+        bump_link_revision()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    # A savepoint rollback leaves earlier writes of the outer transaction pending
+    if previous_transaction.parent is None:
+        session.info.pop("data_changed", None)
+        session.info.pop("links_changed", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_orm_execute(orm_execute_state):
+    # query.update()/delete() and bulk statements skip the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _mark_changed(orm_execute_state.session, mapper.local_table.name)
@@ -0,0 +1,464 @@
+"""
+In-process columnar copy of the subscriptions table for read-heavy analytics.
+
+When `hot_dataset_enabled` is set, subscriptions are loaded at startup into
+typed arrays (`array`): id, cost, monthly-equivalent cost, cycle and status
+codes, renewal/start dates as ordinals and customer/category ids, with
+vendor, country and currency strings interned into per-column tables and
+stored as codes. Filters and group-bys run directly over these arrays, so
+the dashboard stats, the analytics page, AI insights and
+`/api/analytics/summary` answer without loading ORM objects or querying
+the subscriptions table. Renewal forecasts and exports still read the
+database.
+
+The copy is patched on every committed write: inserted, updated and
+deleted subscriptions are captured in `after_flush` and applied in
+`after_commit` (dropped on rollback; a savepoint rollback forces a reload). Bulk `query.update()`/`delete()`
+statements mark it stale and it reloads on the next read, as it does after
+`hot_dataset_ttl` seconds to pick up writes made by other workers.
+
+Readers get an immutable snapshot: commits patch a copy of the arrays and
+swap it in, and reloads scan the table without holding the lock, so a
+read never waits on another thread's reload (it is served the previous
+snapshot meanwhile) and a snapshot never changes while it is iterated.
+`stats()` reports the memory footprint, including bytes per 100k rows.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Subscription
+from app.models.subscription import BillingCycle, SubscriptionStatus
+
+logger = logging.getLogger(__name__)
+
+CYCLES = list(BillingCycle)
+STATUSES = list(SubscriptionStatus)
+CYCLE_CODES = {cycle: code for code, cycle in enumerate(CYCLES)}
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+# Columns loaded per row, in `Row` order
+LOAD_COLUMNS = (
+    Subscription.id, Subscription.cost, Subscription.monthly_equivalent_cost, Subscription.billing_cycle,
+    Subscription.status, Subscription.next_renewal_date, Subscription.start_date, Subscription.customer_id,
+    Subscription.category_id, Subscription.vendor_name, Subscription.country, Subscription.currency,
+)
+Row = Tuple[int, float, Optional[float], Any, Any, Optional[date], Optional[date], int, int, str, Optional[str], str]
+
+GROUP_COLUMNS = ("category_id", "customer_id", "cycle", "status", "vendor", "country", "currency")
+
+
+class StringTable:
+    """Interned strings for one column; rows store the code."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Optional[str]) -> Optional[int]:
+        return self._codes.get(value)
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.values) + sys.getsizeof(self._codes) + sum(
+            sys.getsizeof(value) for value in self.values
+        )
+
+
+def _ordinal(day: Optional[date]) -> int:
+    return day.toordinal() if day else 0
+
+
+class SubscriptionColumns:
+    """Subscriptions as parallel typed arrays; rows are kept dense by swap-removal."""
+
+    def __init__(self):
+        self.id = array("q")
+        self.cost = array("d")
+        self.monthly_cost = array("d")
+        self.cycle = array("b")
+        self.status = array("b")
+        self.renewal = array("i")  # date ordinals, 0 when unset
+        self.start = array("i")
+        self.customer_id = array("i")
+        self.category_id = array("i")
+        self.vendor = array("i")
+        self.country = array("i")
+        self.currency = array("i")
+        self.vendors = StringTable()
+        self.countries = StringTable()
+        self.currencies = StringTable()
+        self._position: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.id)
+
+    def _arrays(self) -> List[array]:
+        return [
+            self.id, self.cost, self.monthly_cost, self.cycle, self.status, self.renewal, self.start,
+            self.customer_id, self.category_id, self.vendor, self.country, self.currency,
+        ]
+
+    def _encode(self, row: Row) -> List:
+        (sub_id, cost, monthly, cycle, status, renewal, start, customer_id, category_id,
+         vendor, country, currency) = row
+        cycle, status = BillingCycle(cycle), SubscriptionStatus(status)
+        return [
+            sub_id, float(cost or 0), float(monthly or 0), CYCLE_CODES[cycle], STATUS_CODES[status],
+            _ordinal(renewal), _ordinal(start), customer_id or 0, category_id or 0,
+            self.vendors.code(vendor), self.countries.code(country), self.currencies.code(currency),
+        ]
+
+    def upsert(self, row: Row) -> None:
+        """Insert or overwrite the row with this id."""
+        values = self._encode(row)
+        position = self._position.get(values[0])
+        if position is None:
+            self._position[values[0]] = len(self.id)
+            for column, value in zip(self._arrays(), values):
+                column.append(value)
+        else:
+            for column, value in zip(self._arrays(), values):
+                column[position] = value
+
+    def apply(self, changes: Dict[int, Optional[Row]]) -> None:
+        """Patch changes in: a row per upserted id, None for deletions."""
+        for sub_id, row in changes.items():
+            if row is None:
+                self.remove(sub_id)
+            else:
+                self.upsert(row)
+
+    def copy(self) -> "SubscriptionColumns":
+        """Independent copy of the arrays, string tables and id lookup."""
+        columns = SubscriptionColumns()
+        for name in ("id", "cost", "monthly_cost", "cycle", "status", "renewal", "start",
+                     "customer_id", "category_id", "vendor", "country", "currency"):
+            setattr(columns, name, getattr(self, name)[:])
+        for name in ("vendors", "countries", "currencies"):
+            table, clone = getattr(self, name), StringTable()
+            clone.values, clone._codes = list(table.values), dict(table._codes)
+            setattr(columns, name, clone)
+        columns._position = dict(self._position)
+        return columns
+
+    def remove(self, sub_id: int) -> None:
+        position = self._position.pop(sub_id, None)
+        if position is None:
+            return
+        last = len(self.id) - 1
+        if position != last:
+            self._position[self.id[last]] = position
+            for column in self._arrays():
+                column[position] = column[last]
+        for column in self._arrays():
+            column.pop()
+
+    @classmethod
+    def load(cls, db: Session, batch_size: int = 5000) -> "SubscriptionColumns":
+        """Read every subscription with one column query."""
+        columns = cls()
+        for row in db.query(*LOAD_COLUMNS).yield_per(batch_size):
+            columns.upsert(tuple(row))
+        return columns
+
+    # -- Filters and group-bys ---------------------------------------------
+
+    def select(
+        self,
+        rows: Optional[Iterable[int]] = None,
+        status: Optional[SubscriptionStatus] = None,
+        category_id: Optional[int] = None,
+        customer_id: Optional[int] = None,
+        renewal_from: Optional[date] = None,
+        renewal_to: Optional[date] = None,
+        customer_ids: Optional[Collection[int]] = None,
+        start_from: Optional[date] = None
+    ) -> List[int]:
+        """Row positions (among `rows`, default all) matching every given criterion."""
+        if rows is None:
+            rows = range(len(self.id))
+        if status is not None:
+            code, column = STATUS_CODES[SubscriptionStatus(status)], self.status
+            rows = [i for i in rows if column[i] == code]
+        if category_id is not None:
+            column = self.category_id
+            rows = [i for i in rows if column[i] == category_id]
+        if customer_id is not None:
+            column = self.customer_id
+            rows = [i for i in rows if column[i] == customer_id]
+        if customer_ids is not None:
+            column = self.customer_id
+            rows = [i for i in rows if column[i] in customer_ids]
+        if start_from is not None:
+            low, column = start_from.toordinal(), self.start
+            rows = [i for i in rows if column[i] >= low]
+        if renewal_from is not None or renewal_to is not None:
+            low = renewal_from.toordinal() if renewal_from else 1
+            high = renewal_to.toordinal() if renewal_to else date.max.toordinal()
+            column = self.renewal
+            rows = [i for i in rows if column[i] and low <= column[i] <= high]
+        return rows if isinstance(rows, list) else list(rows)
+
+    def group_by(
+        self,
+        key: str,
+        rows: Optional[Iterable[int]] = None,
+        amount: str = "monthly_cost"
+    ) -> Dict[Any, Tuple[int, float]]:
+        """(count, summed `amount`) per value of a `GROUP_COLUMNS` column; `amount` is monthly_cost or cost."""
+        if key not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by '{key}'")
+        if amount not in ("monthly_cost", "cost"):
+            raise ValueError(f"Cannot sum '{amount}'")
+        codes = getattr(self, key)
+        amounts = getattr(self, amount)
+        counts: Dict[int, int] = defaultdict(int)
+        sums: Dict[int, float] = defaultdict(float)
+        if rows is None:
+            for code, value in zip(codes, amounts):
+                counts[code] += 1
+                sums[code] += value
+        else:
+            for i in rows:
+                code = codes[i]
+                counts[code] += 1
+                sums[code] += amounts[i]
+        decode = self._decoder(key)
+        return {decode(code): (counts[code], sums[code]) for code in counts}
+
+    def _decoder(self, key: str) -> Callable[[int], Any]:
+        if key == "cycle":
+            return lambda code: CYCLES[code].value
+        if key == "status":
+            return lambda code: STATUSES[code].value
+        table = {"vendor": self.vendors, "country": self.countries, "currency": self.currencies}.get(key)
+        if table is not None:
+            return table.values.__getitem__
+        return lambda code: code
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns, string tables and id lookup."""
+        arrays = sum(column.itemsize * len(column) for column in self._arrays())
+        position = sys.getsizeof(self._position) + sum(sys.getsizeof(sub_id) for sub_id in self._position)
+        strings = self.vendors.nbytes() + self.countries.nbytes() + self.currencies.nbytes()
+        return arrays + position + strings
+
+
+def _row_of(sub: Subscription) -> Row:
+    return tuple(getattr(sub, column.key) for column in LOAD_COLUMNS)
+
+
+class HotDataset:
+    """The process-wide columnar copy, reloaded when stale."""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # guards swaps only, never a table scan
+        self._reload_lock = threading.Lock()
+        self._replay: Optional[List[Dict[int, Optional[Row]]]] = None
+        self.columns: Optional[SubscriptionColumns] = None
+        self.loaded_at = 0.0
+        self.load_seconds = 0.0
+        self.stale = False
+
+    @property
+    def ready(self) -> bool:
+        return self.columns is not None
+
+    def load(self, db: Session) -> int:
+        started = time.perf_counter()
+        with self._lock:
+            self._replay = []
+        try:
+            columns = SubscriptionColumns.load(db)
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            # Commits applied while scanning may be missing from the scan
+            for changes in self._replay:
+                columns.apply(changes)
+            self._replay = None
+            self.columns = columns
+            self.loaded_at = time.monotonic()
+            self.load_seconds = time.perf_counter() - started
+            self.stale = False
+        logger.info(f"Hot dataset loaded: {len(columns)} subscriptions in {self.load_seconds * 1000:.1f} ms")
+        return len(columns)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.columns = None
+
+    def _expired(self) -> bool:
+        ttl = settings.hot_dataset_ttl
+        return self.stale or (ttl > 0 and time.monotonic() - self.loaded_at >= ttl)
+
+    def get(self, db: Session) -> SubscriptionColumns:
+        """
+        Current snapshot, loading it when missing, stale or expired. While
+        another thread reloads, the previous snapshot is returned.
+        """
+        columns = self.columns
+        if columns is not None and not self._expired():
+            return columns
+        if not self._reload_lock.acquire(blocking=columns is None):
+            return columns
+        try:
+            if self.columns is None or self._expired():
+                self.load(db)
+            return self.columns
+        finally:
+            self._reload_lock.release()
+
+    def apply(self, changes: Dict[int, Optional[Row]]) -> None:
+        """Swap in a copy of the columns with committed changes patched in."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(changes)
+            if self.columns is None:
+                return
+            columns = self.columns.copy()
+            columns.apply(changes)
+            self.columns = columns
+
+    def mark_stale(self) -> None:
+        self.stale = True
+
+    def stats(self) -> Dict[str, object]:
+        """Row count and approximate memory footprint."""
+        columns = self.columns
+        rows = len(columns) if columns is not None else 0
+        memory = columns.nbytes() if columns is not None else 0
+        return {
+            "enabled": settings.hot_dataset_enabled,
+            "ready": columns is not None,
+            "rows": rows,
+            "vendors": len(columns.vendors.values) if columns is not None else 0,
+            "memory_bytes": memory,
+            "bytes_per_100k_rows": round(memory / rows * 100000) if rows else 0,
+            "load_ms": round(self.load_seconds * 1000, 2),
+            "stale": self.stale,
+        }
+
+
+hot_dataset = HotDataset()
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_changes(session, flush_context):
+    if not hot_dataset.ready:
+        return
+    pending = session.info.setdefault("hot_dataset_changes", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Subscription):
+            pending[obj.id] = _row_of(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Subscription):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop("hot_dataset_changes", None)
+    if session.info.pop("hot_dataset_stale", False):
+        hot_dataset.mark_stale()
+    elif changes:
+        hot_dataset.apply(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop("hot_dataset_changes", None)
+        session.info.pop("hot_dataset_stale", None)
+    elif session.info.get("hot_dataset_changes"):
+        # Captured rows may hold values the savepoint undid; reload after commit
+        session.info["hot_dataset_stale"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_bulk_write(orm_execute_state):
+    # query.update()/delete() skip the flush, so the copy is reloaded instead
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and (
+        orm_execute_state.bind_mapper is Subscription.__mapper__
+    ):
+        orm_execute_state.session.info["hot_dataset_stale"] = True
+
+
+@contextmanager
+def subscription_columns(db: Session) -> Iterator[SubscriptionColumns]:
+    """
+    Columns to read from: a hot dataset snapshot, which later commits do not
+    modify, when enabled, otherwise a one-off columnar load.
+    """
+    if not settings.hot_dataset_enabled:
+        yield SubscriptionColumns.load(db)
+        return
+    yield hot_dataset.get(db)
+
+
+def _ranked(groups: Dict[Any, Tuple[int, float]], key_name: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    ranked = sorted(groups.items(), key=lambda item: (-item[1][1], str(item[0])))
+    return [
+        {key_name: key, "count": count, "monthly_spend": round(spend, 2)}
+        for key, (count, spend) in ranked[:limit]
+    ]
+
+
+def analytics_summary(
+    columns: SubscriptionColumns,
+    today: Optional[date] = None,
+    expiring_days: int = 30,
+    top_vendors: int = 10
+) -> Dict[str, Any]:
+    """Status counts, active spend breakdowns and renewal counts from the columns."""
+    today = today or date.today()
+    active = columns.select(status=SubscriptionStatus.ACTIVE)
+    monthly = columns.monthly_cost
+    active_spend = sum(monthly[i] for i in active)
+    return {
+        "total_subscriptions": len(columns),
+        "status_counts": {status: count for status, (count, _) in columns.group_by("status").items()},
+        "active_monthly_spend": round(active_spend, 2),
+        "active_annual_spend": round(active_spend * 12, 2),
+        "expiring_soon": len(columns.select(active, renewal_from=today, renewal_to=today + timedelta(days=expiring_days))),
+        "overdue": len(columns.select(active, renewal_to=today - timedelta(days=1))),
+        "by_category": _ranked(columns.group_by("category_id", active), "category_id"),
+        "by_cycle": _ranked(columns.group_by("cycle", active), "billing_cycle"),
+        "by_country": _ranked(columns.group_by("country", active), "country"),
+        "by_currency": _ranked(columns.group_by("currency", active), "currency"),
+        "top_vendors": _ranked(columns.group_by("vendor", active), "vendor", top_vendors),
+    }
+
+
+def init_hot_dataset() -> None:
+    """Load the hot dataset on startup when enabled."""
+    if not settings.hot_dataset_enabled:
+        return
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        hot_dataset.load(db)
+    except Exception as e:
+        logger.error(f"Hot dataset load failed: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,198 @@
+"""
+Clusters of linked customers and subscriptions.
+
+Links form a graph; its connected components are the clusters ("these 40
+customers are one organization"). Only strong edges count: links the user
+accepted, plus undecided links with confidence of at least
+`link_cluster_min_confidence`. Rejected links never join clusters.
+
+Components are found with union-find (path halving, union by size), so a
+build is near-linear in the number of links. Membership is cached per
+process and keyed on the link-table revision
+(`app.services.data_revision.current_link_revision`), with
+`link_cluster_ttl` bounding staleness from other workers' writes. Spend
+totals are added per request from one pass over active subscriptions.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Customer, Link, Subscription
+from app.models.link import EntityType, UserDecision
+from app.models.subscription import SubscriptionStatus
+from app.services.data_revision import current_link_revision
+
+logger = logging.getLogger(__name__)
+
+Node = Tuple[str, int]  # (entity_type, entity_id)
+
+_lock = threading.Lock()
+_cached: Optional[Tuple[int, float, List[Dict[str, Any]]]] = None  # (link revision, built_at, clusters)
+
+
+class UnionFind:
+    """Disjoint sets over hashable nodes."""
+
+    def __init__(self):
+        self._parent: Dict[Any, Any] = {}
+        self._size: Dict[Any, int] = {}
+
+    def find(self, node):
+        parent = self._parent
+        if node not in parent:
+            parent[node] = node
+            self._size[node] = 1
+            return node
+        while parent[node] != node:
+            # Path halving: point every other node at its grandparent
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a, b) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+
+    def groups(self) -> Dict[Any, List[Any]]:
+        """Members per root."""
+        members: Dict[Any, List[Any]] = defaultdict(list)
+        for node in self._parent:
+            members[self.find(node)].append(node)
+        return members
+
+
+def _type_value(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def build_clusters(db: Session) -> List[Dict[str, Any]]:
+    """Connected components of strong links (uncached), largest first."""
+    edges = db.query(
+        Link.source_type, Link.source_id, Link.target_type, Link.target_id
+    ).filter(
+        or_(
+            Link.user_decision == UserDecision.ACCEPTED,
+            (Link.user_decision.is_(None)) & (Link.confidence >= settings.link_cluster_min_confidence)
+        )
+    )
+
+    forest = UnionFind()
+    edge_counts: Dict[Node, int] = defaultdict(int)
+    edge_list = []
+    for source_type, source_id, target_type, target_id in edges:
+        source = (_type_value(source_type), source_id)
+        target = (_type_value(target_type), target_id)
+        forest.union(source, target)
+        edge_list.append(source)
+
+    for source in edge_list:
+        edge_counts[forest.find(source)] += 1
+
+    clusters = []
+    for root, members in forest.groups().items():
+        members.sort()
+        clusters.append({
+            "id": f"{members[0][0]}:{members[0][1]}",
+            "size": len(members),
+            "links": edge_counts[root],
+            "members": members,
+        })
+    clusters.sort(key=lambda cluster: (-cluster["size"], cluster["id"]))
+    return clusters
+
+
+def get_clusters(db: Session) -> List[Dict[str, Any]]:
+    """Cluster membership, rebuilt only when the links table has changed."""
+    global _cached
+    revision = current_link_revision()
+    cached = _cached
+    if cached and cached[0] == revision and time.monotonic() - cached[1] < settings.link_cluster_ttl:
+        return cached[2]
+
+    with _lock:
+        cached = _cached
+        if cached and cached[0] == revision and time.monotonic() - cached[1] < settings.link_cluster_ttl:
+            return cached[2]
+        started = time.perf_counter()
+        clusters = build_clusters(db)
+        _cached = (revision, time.monotonic(), clusters)
+        logger.info(f"Link clusters built: {len(clusters)} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return clusters
+
+
+def invalidate_clusters() -> None:
+    """Drop the cached membership."""
+    global _cached
+    _cached = None
+
+
+def _monthly_spend(db: Session) -> Tuple[Dict[int, float], Dict[int, float]]:
+    """Monthly-equivalent active spend per customer id and per subscription id."""
+    by_customer: Dict[int, float] = defaultdict(float)
+    by_subscription: Dict[int, float] = {}
+    rows = db.query(
+        Subscription.id, Subscription.customer_id, Subscription.monthly_equivalent_cost
+    ).filter(Subscription.status == SubscriptionStatus.ACTIVE)
+    for sub_id, customer_id, monthly in rows:
+        monthly = float(monthly or 0)
+        by_subscription[sub_id] = monthly
+        by_customer[customer_id] += monthly
+    return by_customer, by_subscription
+
+
+def cluster_summaries(db: Session, min_size: int = 2, limit: int = 100) -> Dict[str, Any]:
+    """Clusters with member names and aggregate spend, for `/api/ai/link-clusters`."""
+    clusters = [cluster for cluster in get_clusters(db) if cluster["size"] >= min_size]
+    shown = clusters[:limit]
+
+    by_customer, by_subscription = _monthly_spend(db)
+    customer_ids = {node_id for c in shown for node_type, node_id in c["members"] if node_type == EntityType.CUSTOMER.value}
+    subscription_ids = {
+        node_id for c in shown for node_type, node_id in c["members"] if node_type == EntityType.SUBSCRIPTION.value
+    }
+    names: Dict[Node, str] = {}
+    if customer_ids:
+        for customer_id, name in db.query(Customer.id, Customer.name).filter(Customer.id.in_(customer_ids)):
+            names[(EntityType.CUSTOMER.value, customer_id)] = name
+    if subscription_ids:
+        for sub_id, vendor in db.query(Subscription.id, Subscription.vendor_name).filter(
+            Subscription.id.in_(subscription_ids)
+        ):
+            names[(EntityType.SUBSCRIPTION.value, sub_id)] = vendor
+
+    results = []
+    for cluster in shown:
+        monthly = 0.0
+        members = []
+        for node_type, node_id in cluster["members"]:
+            if node_type == EntityType.CUSTOMER.value:
+                monthly += by_customer.get(node_id, 0.0)
+            elif node_type == EntityType.SUBSCRIPTION.value:
+                monthly += by_subscription.get(node_id, 0.0)
+            members.append({"type": node_type, "id": node_id, "name": names.get((node_type, node_id))})
+        results.append({
+            "id": cluster["id"],
+            "size": cluster["size"],
+            "links": cluster["links"],
+            "monthly_spend": round(monthly, 2),
+            "annual_spend": round(monthly * 12, 2),
+            "members": members,
+        })
+
+    return {
+        "total_clusters": len(clusters),
+        "clustered_entities": sum(cluster["size"] for cluster in clusters),
+        "link_revision": current_link_revision(),
+        "clusters": results,
+    }
@@ -0,0 +1,189 @@
+"""
+Indexed search and keyset pagination for log-check history.
+
+`full_entry`, `message` and `category_name` are searchable through:
+
+- SQLite: an external-content FTS5 table (`log_entries_fts`) whose rowid is
+  `log_entries.id`, kept in sync by triggers on `log_entries`.
+- PostgreSQL: a GIN expression index over the same three columns.
+
+Because both are maintained by the database itself, the log-check routes do
+not need explicit sync hooks. History pages are read newest-first with a
+`(created_at, id)` cursor backed by the `(user_id, created_at)` index on
+`log_entries`, so deep pages cost the same as the first one.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text, or_, and_, desc
+from sqlalchemy.orm import Session
+
+from app.models.log_entry import LogEntry
+from app.services.search_index import build_match_query
+
+logger = logging.getLogger(__name__)
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS log_entries_fts USING fts5(
+        full_entry,
+        message,
+        category_name,
+        content = 'log_entries',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS log_entries_fts_ai AFTER INSERT ON log_entries BEGIN
+        INSERT INTO log_entries_fts(rowid, full_entry, message, category_name)
+        VALUES (new.id, new.full_entry, new.message, new.category_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS log_entries_fts_ad AFTER DELETE ON log_entries BEGIN
+        INSERT INTO log_entries_fts(log_entries_fts, rowid, full_entry, message, category_name)
+        VALUES ('delete', old.id, old.full_entry, old.message, old.category_name);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS log_entries_fts_au AFTER UPDATE ON log_entries BEGIN
+        INSERT INTO log_entries_fts(log_entries_fts, rowid, full_entry, message, category_name)
+        VALUES ('delete', old.id, old.full_entry, old.message, old.category_name);
+        INSERT INTO log_entries_fts(rowid, full_entry, message, category_name)
+        VALUES (new.id, new.full_entry, new.message, new.category_name);
+    END
+    """,
+]
+
+# Must match the expression used in queries for PostgreSQL to use the index
+POSTGRES_DOCUMENT = (
+    "to_tsvector('simple', coalesce(full_entry, '') || ' ' || "
+    "coalesce(message, '') || ' ' || coalesce(category_name, ''))"
+)
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_log_entries_search ON log_entries USING GIN ({POSTGRES_DOCUMENT})",
+]
+
+_available: Dict[str, bool] = {}
+
+
+def ensure_log_search_index(engine) -> bool:
+    """
+    Create the log search index if missing, backfilling existing rows.
+
+    Returns True if indexed log search is available on this database.
+    """
+    key = str(engine.url)
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                for statement in POSTGRES_DDL:
+                    conn.execute(text(statement))
+        elif engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                existed = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'log_entries_fts'"
+                )).first() is not None
+                for statement in SQLITE_DDL:
+                    conn.execute(text(statement))
+                if not existed:
+                    conn.execute(text("INSERT INTO log_entries_fts(log_entries_fts) VALUES ('rebuild')"))
+        else:
+            _available[key] = False
+            return False
+        _available[key] = True
+    except Exception as e:
+        logger.warning(f"Indexed log search unavailable: {e}")
+        _available[key] = False
+    return _available[key]
+
+
+def _is_available(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        if bind.dialect.name == "postgresql":
+            _available[key] = True
+        else:
+            try:
+                db.execute(text("SELECT 1 FROM log_entries_fts LIMIT 1"))
+                _available[key] = True
+            except Exception:
+                db.rollback()
+                _available[key] = False
+    return _available[key]
+
+
+def encode_cursor(entry: LogEntry) -> str:
+    """Opaque cursor pointing just past `entry` in newest-first order."""
+    return f"{entry.created_at.isoformat()}_{entry.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of `encode_cursor`. Raises ValueError on malformed input."""
+    created_at, _, entry_id = cursor.rpartition("_")
+    return datetime.fromisoformat(created_at), int(entry_id)
+
+
+def _search_filter(db: Session, search: str):
+    """Filter clause for a search term, using the index when available."""
+    dialect = db.get_bind().dialect.name
+    match = build_match_query(search, dialect)
+    if match is None or not _is_available(db):
+        return LogEntry.full_entry.ilike(f"%{search}%")
+    if dialect == "postgresql":
+        return text(f"{POSTGRES_DOCUMENT} @@ to_tsquery('simple', :log_match)").bindparams(log_match=match)
+    return LogEntry.id.in_(
+        text("SELECT rowid FROM log_entries_fts WHERE log_entries_fts MATCH :log_match").bindparams(log_match=match)
+    )
+
+
+def query_logs(
+    db: Session,
+    user_id: int,
+    search: Optional[str] = None,
+    check_type: Optional[str] = None,
+):
+    """Base query for one user's log entries with optional search and type filters."""
+    query = db.query(LogEntry).filter(LogEntry.user_id == user_id)
+    if search:
+        query = query.filter(_search_filter(db, search))
+    if check_type:
+        query = query.filter(LogEntry.check_type == check_type)
+    return query
+
+
+def page_logs(
+    db: Session,
+    user_id: int,
+    search: Optional[str] = None,
+    check_type: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> Tuple[List[LogEntry], Optional[str]]:
+    """
+    Return one newest-first page of log entries and the cursor for the next.
+
+    `before` is a cursor from a previous page; `offset` is kept for older
+    clients and ignored when a cursor is given. The next cursor is None on
+    the last page.
+    """
+    query = query_logs(db, user_id, search, check_type)
+    if before:
+        created_at, entry_id = decode_cursor(before)
+        query = query.filter(or_(
+            LogEntry.created_at < created_at,
+            and_(LogEntry.created_at == created_at, LogEntry.id < entry_id)
+        ))
+    elif offset:
+        query = query.offset(offset)
+
+    rows = query.order_by(desc(LogEntry.created_at), desc(LogEntry.id)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]) if has_more and rows else None
@@ -0,0 +1,252 @@
+"""
+Near-duplicate name matching with MinHash and locality-sensitive hashing.
+
+Names are normalized and broken into padded character trigrams (the same
+shingles as the typeahead index). Each shingle set gets a MinHash
+signature of `name_minhash_permutations` values; the signature is cut into
+`name_lsh_bands` bands and every band is a bucket key. Two names land in a
+shared bucket with high probability when their shingle sets overlap a lot,
+so near-duplicates are found by looking up a handful of buckets instead of
+comparing against every stored name.
+
+`name_similarity` is the exact score used once a candidate is found: the
+Dice coefficient of the two shingle sets, which sits on the same 0..1 scale
+as the `difflib` ratio it replaced.
+
+Used by link intelligence (blocking keys and name scores), customer
+duplicate hints on create and subscription template matching. `name_index`
+holds customers and templates and is kept current by the write routes,
+like the typeahead index.
+"""
+import logging
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.typeahead_index import normalize, trigrams
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime for the universal hash family h(x) = (a * x + b) mod p
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+Signature = Tuple[int, ...]
+
+
+@lru_cache(maxsize=65536)
+def name_shingles(name: str) -> FrozenSet[str]:
+    """Padded trigrams of a normalized name."""
+    return frozenset(trigrams(name or ""))
+
+
+def name_similarity(name1: str, name2: str) -> float:
+    """Dice coefficient of the two names' shingle sets (1.0 for identical names)."""
+    shingles1, shingles2 = name_shingles(name1), name_shingles(name2)
+    if not shingles1 or not shingles2:
+        return 0.0
+    return 2 * len(shingles1 & shingles2) / (len(shingles1) + len(shingles2))
+
+
+class MinHasher:
+    """MinHash signatures and LSH band keys for shingle sets."""
+
+    def __init__(self, permutations: Optional[int] = None, bands: Optional[int] = None, seed: int = 1):
+        permutations = permutations or settings.name_minhash_permutations
+        bands = bands or settings.name_lsh_bands
+        if permutations % bands:
+            raise ValueError("MinHash permutations must be a multiple of the LSH band count")
+        self.permutations = permutations
+        self.bands = bands
+        self.rows = permutations // bands
+        # Seeded so signatures agree across processes and restarts
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(permutations)
+        ]
+        self._rows: Dict[str, Tuple[int, ...]] = {}
+
+    def signature(self, shingles: FrozenSet[str]) -> Signature:
+        """One minimum per hash function; empty sets get an all-max signature."""
+        if not shingles:
+            return (_MAX_HASH,) * self.permutations
+        return tuple(map(min, zip(*(self._shingle_hashes(shingle) for shingle in shingles))))
+
+    def _shingle_hashes(self, shingle: str) -> Tuple[int, ...]:
+        # The shingle vocabulary is small, so each row is computed once
+        row = self._rows.get(shingle)
+        if row is None:
+            h = zlib.crc32(shingle.encode("utf-8"))
+            row = tuple(((a * h + b) % _PRIME) & _MAX_HASH for a, b in self._coefficients)
+            if len(self._rows) < 200000:
+                self._rows[shingle] = row
+        return row
+
+    def band_keys(self, signature: Signature) -> List[Tuple[int, Tuple[int, ...]]]:
+        """Bucket keys, one per band of `rows` signature values."""
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def name_keys(self, name: str) -> List[Tuple[int, Tuple[int, ...]]]:
+        """LSH bucket keys for a name; empty for blank names."""
+        shingles = name_shingles(name)
+        if not shingles:
+            return []
+        return self.band_keys(self.signature(shingles))
+
+    @staticmethod
+    def estimate(signature1: Signature, signature2: Signature) -> float:
+        """Estimated Jaccard similarity of the sets behind two signatures."""
+        return sum(1 for x, y in zip(signature1, signature2) if x == y) / len(signature1)
+
+
+_default_hasher: Optional[MinHasher] = None
+
+
+def default_hasher() -> MinHasher:
+    """Shared hasher built from settings on first use."""
+    global _default_hasher
+    if _default_hasher is None:
+        _default_hasher = MinHasher()
+    return _default_hasher
+
+
+@lru_cache(maxsize=65536)
+def name_lsh_keys(name: str) -> Tuple[Tuple[int, Tuple[int, ...]], ...]:
+    """LSH bucket keys for a name using the shared hasher."""
+    return tuple(default_hasher().name_keys(name))
+
+
+class NameIndex:
+    """Thread-safe LSH index of names keyed by arbitrary hashable keys."""
+
+    def __init__(self, hasher: Optional[MinHasher] = None):
+        self._hasher = hasher
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple, Set[Hashable]] = defaultdict(set)
+        self._names: Dict[Hashable, Tuple[str, List[Tuple]]] = {}
+        self.ready = False
+        self.build_seconds = 0.0
+
+    @property
+    def hasher(self) -> MinHasher:
+        if self._hasher is None:
+            self._hasher = default_hasher()
+        return self._hasher
+
+    def __len__(self):
+        return len(self._names)
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._names.pop(key, None)
+        if entry is None:
+            return
+        for bucket_key in entry[1]:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def upsert(self, key: Hashable, name: str, scope: Hashable = None) -> None:
+        """
+        Add or replace a name.
+
+        Names only match within the same `scope` (e.g. "customer" vs
+        "template"), which is folded into the bucket keys.
+        """
+        bucket_keys = [(scope, band_key) for band_key in self.hasher.name_keys(name)]
+        with self._lock:
+            self._discard(key)
+            if not bucket_keys:
+                return
+            self._names[key] = (name, bucket_keys)
+            for bucket_key in bucket_keys:
+                self._buckets[bucket_key].add(key)
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._names.clear()
+
+    def candidates(self, name: str, scope: Hashable = None) -> Set[Hashable]:
+        """Keys sharing at least one LSH bucket with `name`."""
+        found: Set[Hashable] = set()
+        with self._lock:
+            for band_key in self.hasher.name_keys(name):
+                found |= self._buckets.get((scope, band_key), set())
+        return found
+
+    def similar(
+        self,
+        name: str,
+        scope: Hashable = None,
+        threshold: Optional[float] = None,
+        limit: int = 5
+    ) -> List[Tuple[Hashable, str, float]]:
+        """(key, stored name, similarity) of near-duplicates, best first."""
+        if threshold is None:
+            threshold = settings.name_duplicate_threshold
+        matches = []
+        for key in self.candidates(name, scope):
+            entry = self._names.get(key)
+            if entry is None:
+                continue
+            score = name_similarity(name, entry[0])
+            if score >= threshold:
+                matches.append((key, entry[0], round(score, 3)))
+        matches.sort(key=lambda match: (-match[2], str(match[0])))
+        return matches[:limit]
+
+    def ensure(self, db: Session) -> None:
+        """Build from the database if startup has not done so yet."""
+        if not self.ready:
+            self.rebuild(db)
+
+    def rebuild(self, db: Session) -> int:
+        """Load customer and subscription template names from the database."""
+        from app.models import Customer
+        from app.models.subscription_template import SubscriptionTemplate
+
+        started = time.perf_counter()
+        self.clear()
+        for row in db.query(Customer.id, Customer.name):
+            self.upsert(("customer", row.id), row.name, scope="customer")
+        for row in db.query(SubscriptionTemplate.id, SubscriptionTemplate.vendor_name, SubscriptionTemplate.plan_name):
+            self.upsert(("template", row.id), template_label(row.vendor_name, row.plan_name), scope="template")
+        self.ready = True
+        self.build_seconds = time.perf_counter() - started
+        logger.info(f"Name index built: {len(self)} names in {self.build_seconds * 1000:.1f} ms")
+        return len(self)
+
+
+def template_label(vendor_name: str, plan_name: Optional[str]) -> str:
+    """Name a subscription template is matched on."""
+    return normalize(f"{vendor_name or ''} {plan_name or ''}")
+
+
+name_index = NameIndex()
+
+
+def init_name_index() -> None:
+    """Build the name index on startup."""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        name_index.rebuild(db)
+    except Exception as e:
+        logger.error(f"Name index build failed: {e}")
+    finally:
+        db.close()
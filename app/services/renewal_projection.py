@@ -0,0 +1,223 @@
+"""
+Projection of future renewal charges across every billing cycle.
+
+Each active subscription renews from its `next_renewal_date` every step of
+its billing cycle: 7 days for weekly, 1/3/6/12 months for monthly,
+quarterly, biannual and yearly, and `custom_billing_amount` days, weeks,
+months or years for custom cycles. Month steps keep the anchor day and
+clamp it to short months (Jan 31 -> Feb 28 -> Mar 31), like the renew
+route's `relativedelta`. Renewal dates already in the past roll forward to
+their first occurrence on or after the start date; subscriptions without a
+renewal date are treated as renewing on the start date.
+
+The horizon runs from the start date to the end of the last calendar month.
+`RenewalProjection` keeps subscriptions as typed columns (`array`), folds
+them into cohorts that share a step and a first renewal, and expands each
+cohort once, so expansion cost depends on the horizon rather than on the
+number of subscriptions. Monthly and weekly buckets are filled in the same
+expansion pass.
+"""
+import calendar
+from array import array
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Calendar-month steps per billing cycle
+MONTH_STEPS = {"monthly": 1, "quarterly": 3, "biannual": 6, "yearly": 12}
+# Fixed-day steps per billing cycle
+DAY_STEPS = {"weekly": 7}
+# Custom cycle units as (months, days) per unit; unknown units count as months
+CUSTOM_UNITS = {"days": (0, 1), "weeks": (0, 7), "months": (1, 0), "years": (12, 0)}
+
+
+@lru_cache(maxsize=1024)
+def cycle_step(cycle: str, custom_amount: Optional[int] = None, custom_unit: Optional[str] = None) -> Tuple[int, int]:
+    """(months, days) between renewals; exactly one of the two is non-zero."""
+    if cycle in MONTH_STEPS:
+        return MONTH_STEPS[cycle], 0
+    if cycle in DAY_STEPS:
+        return 0, DAY_STEPS[cycle]
+    if cycle == "custom":
+        amount = custom_amount if custom_amount and custom_amount > 0 else 1
+        months, days = CUSTOM_UNITS.get((custom_unit or "months").lower(), (1, 0))
+        return months * amount, days * amount
+    return 1, 0
+
+
+def _cycle_value(cycle) -> str:
+    return cycle.value if hasattr(cycle, "value") else str(cycle or "monthly")
+
+
+class RenewalProjection:
+    """Columnar set of subscriptions projected over `months` calendar months from `start`."""
+
+    def __init__(self, start: date, months: int):
+        self.start = start
+        self.months = max(int(months), 0)
+        self._start_ordinal = start.toordinal()
+        self._start_month = start.year * 12 + start.month - 1
+
+        # Per horizon month: first day (as an offset from start, may be negative
+        # for month 0) and its length
+        self.month_starts: List[date] = []
+        self._month_offset = array("l")
+        self._month_days = array("B")
+        for index in range(self.months):
+            year, month = divmod(self._start_month + index, 12)
+            first = date(year, month + 1, 1)
+            self.month_starts.append(first)
+            self._month_offset.append(first.toordinal() - self._start_ordinal)
+            self._month_days.append(calendar.monthrange(year, month + 1)[1])
+        if self.months:
+            year, month = divmod(self._start_month + self.months, 12)
+            self.days = date(year, month + 1, 1).toordinal() - self._start_ordinal
+        else:
+            self.days = 0
+        self.weeks = -(-self.days // 7)
+
+        # Horizon day offset -> month index
+        self._day_month = array("H")
+        for index in range(self.months):
+            end = self._month_offset[index + 1] if index + 1 < self.months else self.days
+            self._day_month.extend([index] * (end - max(self._month_offset[index], 0)))
+
+        # Subscription columns
+        self.cost = array("d")
+        self.step_months = array("l")
+        self.step_days = array("l")
+        self.first = array("l")  # first renewal: month index, or day offset for day steps
+        self.day = array("B")  # anchor day of month for month steps
+        self.labels: List[Any] = []
+        self.cohorts_expanded = 0  # set by project()
+
+    def __len__(self):
+        return len(self.cost)
+
+    def _clamped_offset(self, month_index: int, day: int) -> int:
+        return self._month_offset[month_index] + min(day, self._month_days[month_index]) - 1
+
+    def add(
+        self,
+        cost: float,
+        cycle,
+        custom_amount: Optional[int] = None,
+        custom_unit: Optional[str] = None,
+        next_renewal: Optional[date] = None,
+        label: Any = None
+    ) -> None:
+        """Append one subscription; `label` is returned by `top_renewals`."""
+        step_months, step_days = cycle_step(_cycle_value(cycle), custom_amount, custom_unit)
+        anchor = next_renewal or self.start
+        if step_days:
+            first = anchor.toordinal() - self._start_ordinal
+            if first < 0:
+                first %= step_days
+            day = 0
+        else:
+            first = anchor.year * 12 + anchor.month - 1 - self._start_month
+            day = anchor.day
+            if first < 0:
+                first %= step_months
+            if first == 0 and day < self.start.day:
+                first += step_months
+        self.cost.append(float(cost or 0))
+        self.step_months.append(step_months)
+        self.step_days.append(step_days)
+        self.first.append(first)
+        self.day.append(day)
+        self.labels.append(label)
+
+    def project(self) -> Dict[str, array]:
+        """
+        Renewal totals per horizon month and per 7-day week from the start date.
+
+        Returns `month_cost`/`month_renewals`/`month_subscriptions` (distinct
+        subscriptions renewing in the month) and `week_cost`/`week_renewals`.
+        """
+        months, days = self.months, self.days
+        month_cost = array("d", [0.0]) * months
+        month_renewals = array("l", [0]) * months
+        month_subscriptions = array("l", [0]) * months
+        week_cost = array("d", [0.0]) * self.weeks
+        week_renewals = array("l", [0]) * self.weeks
+
+        # Fold subscriptions into cohorts with the same schedule
+        cohorts: Dict[Tuple[int, int, int, int], List] = defaultdict(lambda: [0.0, 0])
+        for cohort_key, cost in zip(zip(self.step_months, self.step_days, self.first, self.day), self.cost):
+            cohort = cohorts[cohort_key]
+            cohort[0] += cost
+            cohort[1] += 1
+        self.cohorts_expanded = len(cohorts)
+
+        day_month = self._day_month
+        for (step_months, step_days, first, day), (cost, count) in cohorts.items():
+            if step_days:
+                last_month = -1
+                for offset in range(first, days, step_days):
+                    month = day_month[offset]
+                    month_cost[month] += cost
+                    month_renewals[month] += count
+                    if month != last_month:
+                        month_subscriptions[month] += count
+                        last_month = month
+                    week = offset // 7
+                    week_cost[week] += cost
+                    week_renewals[week] += count
+            else:
+                for month in range(first, months, step_months):
+                    week = self._clamped_offset(month, day) // 7
+                    month_cost[month] += cost
+                    month_renewals[month] += count
+                    month_subscriptions[month] += count
+                    week_cost[week] += cost
+                    week_renewals[week] += count
+
+        return {
+            "month_cost": month_cost,
+            "month_renewals": month_renewals,
+            "month_subscriptions": month_subscriptions,
+            "week_cost": week_cost,
+            "week_renewals": week_renewals,
+        }
+
+    def renewal_months(self, row: int) -> List[int]:
+        """Distinct horizon month indices in which subscription `row` renews."""
+        first, step_months, step_days = self.first[row], self.step_months[row], self.step_days[row]
+        if step_months:
+            return list(range(first, self.months, step_months))
+        seen = []
+        for offset in range(first, self.days, step_days):
+            month = self._day_month[offset]
+            if not seen or seen[-1] != month:
+                seen.append(month)
+        return seen
+
+    def top_renewals(self, month_subscriptions: array, limit: int = 5) -> List[List[Tuple[Any, float]]]:
+        """
+        Per horizon month, the `limit` most expensive renewing subscriptions
+        as (label, cost per renewal).
+
+        Walks subscriptions from the most expensive down and stops once every
+        month is filled, so only the head of the cost order is expanded.
+        """
+        top: List[List[Tuple[Any, float]]] = [[] for _ in range(self.months)]
+        wanted = [min(limit, count) for count in month_subscriptions]
+        open_months = sum(1 for count in wanted if count)
+        if not open_months:
+            return top
+        cost = self.cost
+        for row in sorted(range(len(cost)), key=cost.__getitem__, reverse=True):
+            for month in self.renewal_months(row):
+                entries = top[month]
+                if len(entries) < wanted[month]:
+                    entries.append((self.labels[row], cost[row]))
+                    if len(entries) == wanted[month]:
+                        open_months -= 1
+            if not open_months:
+                break
+        return top
+
+    def week_starts(self) -> List[date]:
+        return [self.start + timedelta(days=7 * week) for week in range(self.weeks)]
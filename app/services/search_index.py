@@ -0,0 +1,406 @@
+"""
+Full-text search index for global search.
+
+Categories, groups, customers and subscriptions are mirrored into a single
+search table so that `/api/search` and the HTMX `/search` box can use an index
+instead of `lower(col) LIKE '%term%'` scans:
+
+- SQLite: an FTS5 virtual table (`search_fts`) ranked with bm25.
+- PostgreSQL: a `search_documents` table with a weighted `tsvector` column
+  backed by a GIN index, ranked with ts_rank.
+
+Every query term is treated as a prefix so results update while typing.
+Write routes call `index_entity` / `remove_entity` after committing, which
+also keep the in-memory typeahead index (`app.services.typeahead_index`)
+and customer names in `app.services.name_similarity` current, and
+`rebuild_search_index` repopulates all of them from scratch (see
+`rebuild_search_index.py` and `POST /api/admin/rebuild-search-index`).
+Rows removed by ORM cascades (e.g. the subscriptions of a deleted customer)
+are dropped by a session listener, so routes only remove the parent.
+
+If the index is unavailable (e.g. SQLite without FTS5), `search_entities`
+falls back to the original LIKE queries.
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, text, or_, func
+from sqlalchemy.orm import Session, lazyload
+
+from app.models import Category, Group, Customer, Subscription
+from app.services.typeahead_index import typeahead_index, fields_for as typeahead_fields
+from app.services.name_similarity import name_index
+
+logger = logging.getLogger(__name__)
+
+ENTITY_MODELS = {
+    "category": Category,
+    "group": Group,
+    "customer": Customer,
+    "subscription": Subscription,
+}
+
+_PLURALS = {
+    "category": "categories",
+    "group": "groups",
+    "customer": "customers",
+    "subscription": "subscriptions",
+}
+
+# SQLite rowids encode (entity_type, entity_id) so updates and deletes hit the
+# rowid b-tree instead of scanning the UNINDEXED columns.
+_TYPE_CODES = {"category": 0, "group": 1, "customer": 2, "subscription": 3}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        entity_type UNINDEXED,
+        entity_id UNINDEXED,
+        title,
+        body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        entity_type VARCHAR(20) NOT NULL,
+        entity_id INTEGER NOT NULL,
+        title TEXT NOT NULL DEFAULT '',
+        body TEXT NOT NULL DEFAULT '',
+        document TSVECTOR NOT NULL,
+        PRIMARY KEY (entity_type, entity_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)",
+]
+
+_available: Dict[str, bool] = {}
+
+
+def _dialect(db_or_engine) -> str:
+    bind = db_or_engine.get_bind() if isinstance(db_or_engine, Session) else db_or_engine
+    return bind.dialect.name
+
+
+def _document_for(entity) -> Tuple[str, str, str]:
+    """Return (entity_type, title, body) for an indexable model instance."""
+    if isinstance(entity, Category):
+        return "category", entity.name or "", entity.description or ""
+    if isinstance(entity, Group):
+        return "group", entity.name or "", entity.notes or ""
+    if isinstance(entity, Customer):
+        title = entity.name or ""
+        body = " ".join(filter(None, [entity.email, (entity.tags or "").replace(",", " "), entity.notes]))
+        return "customer", title, body
+    if isinstance(entity, Subscription):
+        title = " ".join(filter(None, [entity.vendor_name, entity.plan_name]))
+        return "subscription", title, entity.notes or ""
+    raise ValueError(f"Unsupported entity for search index: {type(entity).__name__}")
+
+
+def build_match_query(q: str, dialect: str = "sqlite") -> Optional[str]:
+    """
+    Turn free text into a prefix query for the active backend.
+
+    "acme cor" becomes `"acme"* "cor"*` for FTS5 and `acme:* & cor:*` for
+    PostgreSQL. Returns None if the text has no searchable tokens.
+    """
+    tokens = [t.lower() for t in _TOKEN_RE.findall(q or "")]
+    if not tokens:
+        return None
+    if dialect == "postgresql":
+        return " & ".join(f"{t}:*" for t in tokens)
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def ensure_search_index(engine) -> bool:
+    """
+    Create the search table for the engine's dialect if it is missing.
+
+    Returns True if full-text search is available on this database.
+    """
+    dialect = engine.dialect.name
+    ddl = POSTGRES_DDL if dialect == "postgresql" else SQLITE_DDL if dialect == "sqlite" else None
+    if ddl is None:
+        _available[str(engine.url)] = False
+        return False
+
+    try:
+        with engine.begin() as conn:
+            for statement in ddl:
+                conn.execute(text(statement))
+        _available[str(engine.url)] = True
+    except Exception as e:
+        logger.warning(f"Full-text search index unavailable: {e}")
+        _available[str(engine.url)] = False
+    return _available[str(engine.url)]
+
+
+def is_available(db: Session) -> bool:
+    """Check (once per engine) whether the search table exists."""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        table = "search_documents" if bind.dialect.name == "postgresql" else "search_fts"
+        try:
+            db.execute(text(f"SELECT 1 FROM {table} LIMIT 1"))
+            _available[key] = True
+        except Exception:
+            db.rollback()
+            _available[key] = False
+    return _available[key]
+
+
+def _upsert(db: Session, entity_type: str, entity_id: int, title: str, body: str) -> None:
+    params = {"entity_type": entity_type, "entity_id": entity_id, "title": title, "body": body}
+    if _dialect(db) == "postgresql":
+        db.execute(text("""
+            INSERT INTO search_documents (entity_type, entity_id, title, body, document)
+            VALUES (:entity_type, :entity_id, :title, :body,
+                    setweight(to_tsvector('simple', :title), 'A') ||
+                    setweight(to_tsvector('simple', :body), 'B'))
+            ON CONFLICT (entity_type, entity_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                body = EXCLUDED.body,
+                document = EXCLUDED.document
+        """), params)
+    else:
+        params["rowid"] = entity_id * len(_TYPE_CODES) + _TYPE_CODES[entity_type]
+        db.execute(text("DELETE FROM search_fts WHERE rowid = :rowid"), params)
+        db.execute(text("""
+            INSERT INTO search_fts (rowid, entity_type, entity_id, title, body)
+            VALUES (:rowid, :entity_type, :entity_id, :title, :body)
+        """), params)
+
+
+def index_entity(db: Session, entity) -> None:
+    """Add or refresh an entity in the search indexes. Never raises."""
+    try:
+        entity_type, fields = typeahead_fields(entity)
+        typeahead_index.upsert(entity_type, entity.id, fields)
+    except Exception as e:
+        logger.error(f"Typeahead index update failed: {e}")
+    if isinstance(entity, Customer):
+        name_index.upsert(("customer", entity.id), entity.name, scope="customer")
+    if not is_available(db):
+        return
+    try:
+        entity_type, title, body = _document_for(entity)
+        _upsert(db, entity_type, entity.id, title, body)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Search index update failed: {e}")
+        db.rollback()
+
+
+def _delete_document(db, dialect: str, entity_type: str, entity_id: int) -> None:
+    if dialect == "postgresql":
+        db.execute(
+            text("DELETE FROM search_documents WHERE entity_type = :t AND entity_id = :id"),
+            {"t": entity_type, "id": entity_id}
+        )
+    else:
+        db.execute(
+            text("DELETE FROM search_fts WHERE rowid = :rowid"),
+            {"rowid": entity_id * len(_TYPE_CODES) + _TYPE_CODES[entity_type]}
+        )
+
+
+def remove_entity(db: Session, entity_type: str, entity_id: int) -> None:
+    """Drop an entity from the search indexes. Never raises."""
+    typeahead_index.remove(entity_type, entity_id)
+    name_index.remove((entity_type, entity_id))
+    if not is_available(db):
+        return
+    try:
+        _delete_document(db, _dialect(db), entity_type, entity_id)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Search index delete failed: {e}")
+        db.rollback()
+
+
+def _entity_type(obj) -> Optional[str]:
+    for entity_type, model in ENTITY_MODELS.items():
+        if isinstance(obj, model):
+            return entity_type
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_deletions(session, flush_context):
+    """Drop deleted rows, cascades included, from the full-text table in the same transaction."""
+    removed = [(_entity_type(obj), obj.id) for obj in session.deleted if _entity_type(obj)]
+    if not removed:
+        return
+    savepoint = session.get_nested_transaction()
+    session.info.setdefault("search_removed", []).extend((savepoint, item) for item in removed)
+    bind = session.get_bind()
+    # Only touch the table once availability is known; probing here could roll back the flush.
+    if _available.get(str(bind.url)):
+        connection = session.connection()
+        for entity_type, entity_id in removed:
+            _delete_document(connection, bind.dialect.name, entity_type, entity_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_deletions(session):
+    """Remove committed deletions from the in-memory indexes."""
+    for _, (entity_type, entity_id) in session.info.pop("search_removed", []):
+        typeahead_index.remove(entity_type, entity_id)
+        name_index.remove((entity_type, entity_id))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_deletions(session, previous_transaction):
+    """Forget deletions undone by a rollback; a savepoint only undoes its own."""
+    removed = session.info.get("search_removed")
+    if not removed:
+        return
+    if previous_transaction.parent is None:
+        session.info.pop("search_removed", None)
+    else:
+        removed[:] = [(savepoint, item) for savepoint, item in removed if savepoint is not previous_transaction]
+
+
+def rebuild_search_index(db: Session) -> int:
+    """
+    Repopulate the search index from the entity tables.
+
+    The in-memory typeahead index is rebuilt as well. Returns the number of
+    indexed documents, or 0 if the full-text index is unavailable.
+    """
+    if typeahead_index.ready:
+        typeahead_index.rebuild(db)
+    if name_index.ready:
+        name_index.rebuild(db)
+    if not ensure_search_index(db.get_bind()):
+        return 0
+
+    table = "search_documents" if _dialect(db) == "postgresql" else "search_fts"
+    db.execute(text(f"DELETE FROM {table}"))
+
+    count = 0
+    for model in ENTITY_MODELS.values():
+        for entity in db.query(model).options(lazyload("*")).yield_per(1000):
+            entity_type, title, body = _document_for(entity)
+            _upsert(db, entity_type, entity.id, title, body)
+            count += 1
+
+    if _dialect(db) == "sqlite":
+        db.execute(text("INSERT INTO search_fts(search_fts) VALUES ('optimize')"))
+    db.commit()
+    logger.info(f"Rebuilt search index with {count} documents")
+    return count
+
+
+def init_search_index() -> None:
+    """Create the search index on startup and populate it if it is empty."""
+    from app.database import SessionLocal, engine
+
+    if not ensure_search_index(engine):
+        return
+
+    table = "search_documents" if engine.dialect.name == "postgresql" else "search_fts"
+    db = SessionLocal()
+    try:
+        if db.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() is None:
+            rebuild_search_index(db)
+    finally:
+        db.close()
+
+
+def search_ids(db: Session, q: str, limit: int = 10) -> Optional[Dict[str, List[int]]]:
+    """
+    Run a ranked prefix search and return entity ids per type, best first.
+
+    Returns None if the index is unavailable or the query has no tokens.
+    """
+    if not is_available(db):
+        return None
+    dialect = _dialect(db)
+    match = build_match_query(q, dialect)
+    if match is None:
+        return None
+
+    if dialect == "postgresql":
+        sql = text("""
+            SELECT entity_id FROM search_documents
+            WHERE entity_type = :t AND document @@ to_tsquery('simple', :q)
+            ORDER BY ts_rank(document, to_tsquery('simple', :q)) DESC
+            LIMIT :limit
+        """)
+    else:
+        # bm25 column weights: entity_type, entity_id, title, body
+        sql = text("""
+            SELECT entity_id FROM search_fts
+            WHERE search_fts MATCH :q AND entity_type = :t
+            ORDER BY bm25(search_fts, 0.0, 0.0, 10.0, 1.0)
+            LIMIT :limit
+        """)
+
+    try:
+        return {
+            entity_type: [row[0] for row in db.execute(sql, {"q": match, "t": entity_type, "limit": limit})]
+            for entity_type in ENTITY_MODELS
+        }
+    except Exception as e:
+        logger.error(f"Full-text search failed, falling back: {e}")
+        db.rollback()
+        return None
+
+
+def like_search(db: Session, q: str, limit: int = 10) -> Dict[str, list]:
+    """Unindexed substring search, used when full-text search is unavailable."""
+    search_term = f"%{q.lower()}%"
+    columns = {
+        "category": [Category.name, Category.description],
+        "group": [Group.name, Group.notes],
+        "customer": [Customer.name, Customer.email, Customer.tags, Customer.notes],
+        "subscription": [Subscription.vendor_name, Subscription.plan_name, Subscription.notes],
+    }
+    return {
+        _PLURALS[entity_type]: db.query(model).filter(
+            or_(*[func.lower(col).like(search_term) for col in columns[entity_type]])
+        ).limit(limit).all()
+        for entity_type, model in ENTITY_MODELS.items()
+    }
+
+
+def search_entities(db: Session, q: str, limit: int = 10) -> Dict[str, list]:
+    """
+    Global search returning model instances keyed by plural entity name
+    ('categories', 'groups', 'customers', 'subscriptions'), best match first.
+
+    Fuzzy matches on names, vendors, emails and tags come from the in-memory
+    typeahead index. The full-text index is only queried to top up types with
+    fewer than `limit` hits (e.g. matches in notes or descriptions); without
+    either index this falls back to `like_search`. Rows are then loaded by
+    primary key, and ids whose rows no longer exist are skipped.
+    """
+    ids = typeahead_index.search(q, limit)
+    if ids is None or any(len(found) < limit for found in ids.values()):
+        fts_ids = search_ids(db, q, limit)
+        if ids is None and fts_ids is None:
+            return like_search(db, q, limit)
+        if ids is None:
+            ids = fts_ids
+        elif fts_ids is not None:
+            for entity_type, found in ids.items():
+                extra = [i for i in fts_ids[entity_type] if i not in found]
+                found.extend(extra[:limit - len(found)])
+
+    results = {}
+    for entity_type, model in ENTITY_MODELS.items():
+        wanted = ids[entity_type]
+        rows = db.query(model).filter(model.id.in_(wanted)).all() if wanted else []
+        by_id = {row.id: row for row in rows}
+        results[_PLURALS[entity_type]] = [by_id[i] for i in wanted if i in by_id]
+    return results
@@ -0,0 +1,268 @@
+"""
+Spend history for trend analytics.
+
+Analytics otherwise only sees current subscription state. Once a day
+`SpendSnapshotter` records the active monthly-equivalent spend and
+subscription count in `spend_snapshots`: one row for the total and one per
+category, country and currency, each computed with a single GROUP BY.
+
+Rows are downsampled as they age, so a series holds at most a few hundred
+rows however long the app has been running:
+
+- daily rows older than `spend_history_daily_days` are averaged into weeks
+  (starting Monday),
+- weekly rows older than `spend_history_weekly_days` are averaged into
+  calendar months (a week belongs to the month it starts in),
+- monthly rows older than `spend_history_retention_days` are deleted.
+
+Only whole periods are rolled up. Values are averages of the daily levels,
+weighted by `samples`, the number of daily snapshots behind each row.
+`spend_trend` serves charts from these rows, optionally re-bucketed to a
+coarser granularity.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Category, SpendSnapshot, Subscription
+from app.models.subscription import SubscriptionStatus
+from app.services.background import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+# Grouping column per snapshot dimension; "total" is the ungrouped sum
+DIMENSIONS = {
+    "category": Subscription.category_id,
+    "country": Subscription.country,
+    "currency": Subscription.currency,
+}
+GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(day: date, granularity: str) -> date:
+    """First day of the period containing `day`."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _coarser(a: str, b: str) -> str:
+    return max(a, b, key=GRANULARITIES.index)
+
+
+def snapshot_rows(db: Session, day: date) -> List[Dict[str, Any]]:
+    """Daily snapshot rows for the current active subscriptions."""
+    count = func.count(Subscription.id)
+    spend = func.coalesce(func.sum(Subscription.monthly_equivalent_cost), 0.0)
+    active = Subscription.status == SubscriptionStatus.ACTIVE
+
+    groups: List[Tuple[str, Iterable]] = [
+        ("total", ((None, c, s) for c, s in db.query(count, spend).filter(active)))
+    ]
+    for dimension, column in DIMENSIONS.items():
+        groups.append((dimension, db.query(column, count, spend).filter(active).group_by(column)))
+
+    rows = []
+    for dimension, results in groups:
+        for key, subscription_count, monthly_spend in results:
+            rows.append({
+                "dimension": dimension,
+                "dimension_key": "" if key is None else str(key),
+                "granularity": "day",
+                "period_start": day,
+                "subscription_count": subscription_count,
+                "monthly_spend": float(monthly_spend or 0),
+                "samples": 1,
+            })
+    return rows
+
+
+def take_snapshot(db: Session, day: Optional[date] = None) -> int:
+    """Write (or rewrite) the daily snapshot for `day`; returns rows written."""
+    day = day or date.today()
+    rows = snapshot_rows(db, day)
+    db.query(SpendSnapshot).filter(
+        SpendSnapshot.granularity == "day", SpendSnapshot.period_start == day
+    ).delete(synchronize_session=False)
+    if rows:
+        db.execute(insert(SpendSnapshot), rows)
+    db.commit()
+    return len(rows)
+
+
+def _rollup(db: Session, source: str, target: str, cutoff: date) -> int:
+    """Average whole `target` periods of `source` rows before `cutoff` into `target` rows."""
+    boundary = period_start(cutoff, target)
+    old = db.query(SpendSnapshot).filter(
+        SpendSnapshot.granularity == source, SpendSnapshot.period_start < boundary
+    ).all()
+    if not old:
+        return 0
+
+    merged: Dict[Tuple[str, str, date], List[float]] = {}
+    for row in old:
+        key = (row.dimension, row.dimension_key, period_start(row.period_start, target))
+        totals = merged.setdefault(key, [0.0, 0.0, 0])
+        totals[0] += row.monthly_spend * row.samples
+        totals[1] += row.subscription_count * row.samples
+        totals[2] += row.samples
+
+    # Fold into target rows already written by an earlier run
+    starts = {key[2] for key in merged}
+    for row in db.query(SpendSnapshot).filter(
+        SpendSnapshot.granularity == target, SpendSnapshot.period_start.in_(starts)
+    ):
+        totals = merged.get((row.dimension, row.dimension_key, row.period_start))
+        if totals is not None:
+            totals[0] += row.monthly_spend * row.samples
+            totals[1] += row.subscription_count * row.samples
+            totals[2] += row.samples
+            db.delete(row)
+    db.flush()
+
+    db.query(SpendSnapshot).filter(
+        SpendSnapshot.granularity == source, SpendSnapshot.period_start < boundary
+    ).delete(synchronize_session=False)
+    db.execute(insert(SpendSnapshot), [
+        {
+            "dimension": dimension,
+            "dimension_key": key,
+            "granularity": target,
+            "period_start": start,
+            "monthly_spend": spend / samples,
+            "subscription_count": count / samples,
+            "samples": samples,
+        }
+        for (dimension, key, start), (spend, count, samples) in merged.items()
+    ])
+    return len(old)
+
+
+def downsample(db: Session, today: Optional[date] = None) -> Dict[str, int]:
+    """Apply the daily -> weekly -> monthly rollups and retention; returns rows affected."""
+    today = today or date.today()
+    result = {
+        "days_rolled_up": _rollup(db, "day", "week", today - timedelta(days=settings.spend_history_daily_days)),
+        "weeks_rolled_up": _rollup(db, "week", "month", today - timedelta(days=settings.spend_history_weekly_days)),
+    }
+    result["months_deleted"] = db.query(SpendSnapshot).filter(
+        SpendSnapshot.granularity == "month",
+        SpendSnapshot.period_start < today - timedelta(days=settings.spend_history_retention_days)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return result
+
+
+def _labels(db: Session, dimension: str, keys: Iterable[str]) -> Dict[str, str]:
+    if dimension == "category":
+        ids = [int(key) for key in keys if key.isdigit()]
+        return {str(cid): name for cid, name in db.query(Category.id, Category.name).filter(Category.id.in_(ids))}
+    if dimension == "total":
+        return {"": "All subscriptions"}
+    return {"": "Not Specified"}
+
+
+def spend_trend(
+    db: Session,
+    dimension: str = "total",
+    days: int = 365,
+    granularity: Optional[str] = None,
+    keys: Optional[List[str]] = None,
+    today: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    Spend series for trend charts.
+
+    Points keep the granularity they are stored at (recent days, then
+    weeks, then months) unless `granularity` asks for coarser buckets.
+    """
+    if dimension != "total" and dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    if granularity is not None and granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'")
+
+    today = today or date.today()
+    query = db.query(
+        SpendSnapshot.dimension_key, SpendSnapshot.granularity, SpendSnapshot.period_start,
+        SpendSnapshot.monthly_spend, SpendSnapshot.subscription_count, SpendSnapshot.samples
+    ).filter(
+        SpendSnapshot.dimension == dimension,
+        SpendSnapshot.period_start >= today - timedelta(days=days)
+    )
+    if keys:
+        query = query.filter(SpendSnapshot.dimension_key.in_(keys))
+    rows = query.order_by(SpendSnapshot.dimension_key, SpendSnapshot.period_start).all()
+
+    series: Dict[str, Dict[Tuple[date, str], List[float]]] = {}
+    for key, row_granularity, start, spend, count, samples in rows:
+        bucket_granularity = _coarser(row_granularity, granularity) if granularity else row_granularity
+        bucket = (period_start(start, bucket_granularity), bucket_granularity)
+        totals = series.setdefault(key, {}).setdefault(bucket, [0.0, 0.0, 0])
+        totals[0] += spend * samples
+        totals[1] += count * samples
+        totals[2] += samples
+
+    labels = _labels(db, dimension, series)
+    return {
+        "dimension": dimension,
+        "granularity": granularity,
+        "rows_read": len(rows),
+        "series": [
+            {
+                "key": key,
+                "label": labels.get(key, key),
+                "points": [
+                    {
+                        "period_start": start.isoformat(),
+                        "granularity": bucket_granularity,
+                        "monthly_spend": round(spend / samples, 2),
+                        "subscription_count": round(count / samples, 1),
+                    }
+                    for (start, bucket_granularity), (spend, count, samples) in sorted(points.items())
+                ],
+            }
+            for key, points in series.items()
+        ],
+    }
+
+
+class SpendSnapshotter(BackgroundTask):
+    """Takes the daily snapshot and downsamples history in the background."""
+
+    def run_once(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Snapshot `today` if it is missing, then downsample."""
+        today = today or date.today()
+        db = self._session()
+        try:
+            result = {"snapshot_rows": 0}
+            exists = db.query(SpendSnapshot.id).filter(
+                SpendSnapshot.granularity == "day", SpendSnapshot.period_start == today
+            ).first()
+            if exists is None:
+                result["snapshot_rows"] = take_snapshot(db, today)
+            result.update(downsample(db, today))
+            return result
+        except Exception as e:
+            logger.error(f"Spend snapshot failed: {e}")
+            db.rollback()
+            return {}
+        finally:
+            db.close()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.to_thread(self.run_once)
+            await asyncio.sleep(settings.spend_history_poll)
+
+    def enabled(self) -> bool:
+        return settings.spend_history_enabled
+
+
+spend_snapshotter = SpendSnapshotter()
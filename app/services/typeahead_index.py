@@ -0,0 +1,230 @@
+"""
+In-process trigram index for the header typeahead search.
+
+Entity names, vendor and plan names, customer emails and tags are broken into
+trigrams (pg_trgm style, words padded with two leading spaces) and kept in an
+inverted index in memory. A query is matched by counting shared trigrams, so
+partial words and small typos ("adobee", "acme corp") still find results
+without touching the database.
+
+The index is built on startup, kept current by `app.services.search_index`
+(`index_entity` / `remove_entity`, called from the write routes), and its size
+and build time are reported by `GET /api/search/diagnostics`.
+"""
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Category, Group, Customer, Subscription
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TYPES = ("category", "group", "customer", "subscription")
+
+# A document is a candidate when it shares at least this share of the query's trigrams
+MIN_COVERAGE = 0.5
+
+_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+DocKey = Tuple[str, int]
+
+
+def normalize(value: str) -> str:
+    """Lowercase and collapse punctuation to single spaces."""
+    return _WORD_RE.sub(" ", (value or "").lower()).strip()
+
+
+def trigrams(value: str, partial_last_word: bool = False) -> set:
+    """
+    Return the trigram set of a string.
+
+    With `partial_last_word`, the last word gets no trailing pad so a prefix
+    that is still being typed ("ado") is not penalized against "adobe".
+    """
+    words = normalize(value).split()
+    grams = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if partial_last_word and i == len(words) - 1 else f"  {word} "
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+def fields_for(entity) -> Tuple[str, List[str]]:
+    """Return (entity_type, searchable fields) for a model instance."""
+    if isinstance(entity, Category):
+        return "category", [entity.name]
+    if isinstance(entity, Group):
+        return "group", [entity.name]
+    if isinstance(entity, Customer):
+        tags = [t.strip() for t in (entity.tags or "").split(",")]
+        return "customer", [entity.name, entity.email] + tags
+    if isinstance(entity, Subscription):
+        return "subscription", [entity.vendor_name, entity.plan_name]
+    raise ValueError(f"Unsupported entity for typeahead index: {type(entity).__name__}")
+
+
+class TrigramIndex:
+    """Thread-safe in-memory trigram index keyed by (entity_type, entity_id)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, set] = {}
+        self._docs: Dict[DocKey, Tuple[Tuple[str, ...], int]] = {}
+        self.ready = False
+        self.build_seconds = 0.0
+        self.built_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _add(self, postings: Dict[str, set], docs: dict, key: DocKey, fields: List[str]) -> None:
+        normalized = tuple(f for f in (normalize(v) for v in fields if v) if f)
+        if not normalized:
+            return
+        grams = set()
+        for value in normalized:
+            grams |= trigrams(value)
+        for gram in grams:
+            postings.setdefault(gram, set()).add(key)
+        docs[key] = (normalized, len(grams))
+
+    def _discard(self, key: DocKey) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for value in doc[0]:
+            for gram in trigrams(value):
+                bucket = self._postings.get(gram)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._postings[gram]
+
+    def upsert(self, entity_type: str, entity_id: int, fields: List[str]) -> None:
+        """Add or replace one entity."""
+        key = (entity_type, entity_id)
+        with self._lock:
+            self._discard(key)
+            self._add(self._postings, self._docs, key, fields)
+
+    def remove(self, entity_type: str, entity_id: int) -> None:
+        """Remove one entity if present."""
+        with self._lock:
+            self._discard((entity_type, entity_id))
+
+    def rebuild(self, db: Session) -> int:
+        """Load every searchable entity from the database and swap the index in."""
+        started = time.perf_counter()
+        postings: Dict[str, set] = {}
+        docs: dict = {}
+
+        for row in db.query(Category.id, Category.name):
+            self._add(postings, docs, ("category", row.id), [row.name])
+        for row in db.query(Group.id, Group.name):
+            self._add(postings, docs, ("group", row.id), [row.name])
+        for row in db.query(Customer.id, Customer.name, Customer.email, Customer.tags):
+            tags = [t.strip() for t in (row.tags or "").split(",")]
+            self._add(postings, docs, ("customer", row.id), [row.name, row.email] + tags)
+        for row in db.query(Subscription.id, Subscription.vendor_name, Subscription.plan_name):
+            self._add(postings, docs, ("subscription", row.id), [row.vendor_name, row.plan_name])
+
+        with self._lock:
+            self._postings = postings
+            self._docs = docs
+            self.ready = True
+            self.build_seconds = time.perf_counter() - started
+            self.built_at = time.time()
+
+        logger.info(f"Typeahead index built: {len(docs)} entities in {self.build_seconds * 1000:.1f} ms")
+        return len(docs)
+
+    def search(self, q: str, limit: int = 10) -> Optional[Dict[str, List[int]]]:
+        """
+        Fuzzy search returning entity ids per type, best first.
+
+        Returns None if the index has not been built yet.
+        """
+        if not self.ready:
+            return None
+        query_grams = trigrams(q, partial_last_word=True)
+        results = {entity_type: [] for entity_type in ENTITY_TYPES}
+        if not query_grams:
+            return results
+        # Short queries have no room for typos, so they must match every trigram
+        if len(query_grams) <= 3:
+            needed = len(query_grams)
+        else:
+            needed = int(len(query_grams) * MIN_COVERAGE + 0.999)
+        query_norm = normalize(q)
+        last_word = query_norm.split()[-1]
+
+        with self._lock:
+            counts = Counter()
+            for gram in query_grams:
+                bucket = self._postings.get(gram)
+                if bucket:
+                    counts.update(bucket)
+
+            scored = []
+            for key, shared in counts.items():
+                if shared < needed:
+                    continue
+                values, doc_grams = self._docs[key]
+                # Coverage of the query dominates; overlap with the document
+                # breaks ties in favour of shorter, closer names.
+                score = shared / len(query_grams) + 0.25 * shared / (len(query_grams) + doc_grams - shared)
+                if any(v.startswith(query_norm) for v in values):
+                    score += 0.5
+                elif any(w.startswith(last_word) for v in values for w in v.split()):
+                    score += 0.2
+                scored.append((score, key))
+
+        scored.sort(key=lambda item: (-item[0], item[1][1]))
+        for score, (entity_type, entity_id) in scored:
+            if len(results[entity_type]) < limit:
+                results[entity_type].append(entity_id)
+        return results
+
+    def stats(self) -> Dict[str, object]:
+        """Approximate memory footprint and build metrics."""
+        with self._lock:
+            postings_bytes = sys.getsizeof(self._postings) + sum(
+                sys.getsizeof(gram) + sys.getsizeof(bucket) for gram, bucket in self._postings.items()
+            )
+            docs_bytes = sys.getsizeof(self._docs) + sum(
+                sys.getsizeof(key) + sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+                for key, (values, _) in self._docs.items()
+            )
+            by_type = Counter(entity_type for entity_type, _ in self._docs)
+            return {
+                "ready": self.ready,
+                "entities": len(self._docs),
+                "by_type": {t: by_type.get(t, 0) for t in ENTITY_TYPES},
+                "trigrams": len(self._postings),
+                "postings": sum(len(b) for b in self._postings.values()),
+                "memory_bytes": postings_bytes + docs_bytes,
+                "build_ms": round(self.build_seconds * 1000, 2),
+                "built_at": self.built_at,
+            }
+
+
+typeahead_index = TrigramIndex()
+
+
+def init_typeahead_index() -> None:
+    """Build the typeahead index on startup."""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        typeahead_index.rebuild(db)
+    except Exception as e:
+        logger.error(f"Typeahead index build failed: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,25 @@
+"""Rebuild the global full-text search index for SubTrack."""
+from app.database import SessionLocal, engine
+from app.services.search_index import ensure_search_index, rebuild_search_index
+
+
+def main():
+    """Recreate the search table if needed and reindex every entity."""
+    if not ensure_search_index(engine):
+        print(f"❌ Full-text search is not available on this database ({engine.dialect.name})")
+        return False
+    
+    db = SessionLocal()
+    try:
+        indexed = rebuild_search_index(db)
+        print(f"✅ Search index rebuilt: {indexed:,} records indexed")
+        return True
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Shared fixtures: a fresh in-memory database per test."""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Category, Customer
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(engine):
+    """SQL statements executed on the engine from here on."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def category(db):
+    """A flushed "Software" category."""
+    category = Category(name="Software")
+    db.add(category)
+    db.flush()
+    return category
+
+
+@pytest.fixture
+def customer(db, category):
+    """A flushed customer "Acme" in the "Software" category."""
+    customer = Customer(name="Acme", category_id=category.id)
+    db.add(customer)
+    db.flush()
+    return customer
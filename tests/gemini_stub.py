@@ -0,0 +1,88 @@
+"""Local stand-in for the Gemini REST API, for provider tests and benchmarks."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GeminiStub:
+    """
+    Minimal generateContent server on 127.0.0.1.
+
+    Replies echo the prompt after `delay` seconds. `connections` records the
+    client port of every request, so keep-alive reuse can be asserted.
+    streamGenerateContent answers as SSE, one event per word of the echo,
+    `stream_delay` seconds apart. A 429 status carries a 7s RetryInfo.
+    """
+
+    def __init__(self, delay: float = 0.0, status: int = 200, stream_delay: float = 0.0):
+        self.delay = delay
+        self.status = status
+        self.stream_delay = stream_delay
+        self.connections = []
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # avoid delayed-ACK stalls on kept-alive sockets
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests += 1
+                stub.connections.append(self.client_address[1])
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                if stub.status == 200 and ":streamGenerateContent" in self.path:
+                    self._stream(body["contents"][0]["parts"][0]["text"])
+                    return
+
+                if stub.status == 200:
+                    prompt = body["contents"][0]["parts"][0]["text"]
+                    payload = {"candidates": [{"content": {"parts": [{"text": f"echo: {prompt}"}]}}]}
+                else:
+                    payload = {"error": {"message": "stub error"}}
+                    if stub.status == 429:
+                        payload["error"]["details"] = [
+                            {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "7s"}
+                        ]
+                data = json.dumps(payload).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, prompt):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for word in f"echo: {prompt}".split(" "):
+                    chunk = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                    self.wfile.flush()
+                    time.sleep(stub.stream_delay)
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1beta"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,226 @@
+"""Tests for the two-tier AI response cache."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.ai_cache import AIRequestCache
+from app.ai import cache
+from app.ai.cache import (
+    MemoryCache,
+    evict_cache,
+    flush_hit_counts,
+    generate_cache_key,
+    get_cache_stats,
+    get_cached_response,
+    get_stale_response,
+    memory_cache,
+    single_flight,
+    store_cached_response,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_memory_cache():
+    memory_cache.clear()
+    yield
+    memory_cache.clear()
+
+
+def test_repeat_hits_skip_the_database(db, statements):
+    key = generate_cache_key("budget_surgeon", user=1)
+    store_cached_response(db, key, "budget_surgeon", "prompt", '{"ok": true}')
+    memory_cache.clear()
+
+    assert get_cached_response(db, key) == '{"ok": true}'
+    statements.clear()
+    for _ in range(10):
+        assert get_cached_response(db, key) == '{"ok": true}'
+    assert statements == []
+
+
+def test_hit_counts_are_flushed_in_batches(db, monkeypatch):
+    monkeypatch.setattr(cache.settings, "ai_cache_hit_flush_batch", 5)
+    key = generate_cache_key("forecast", user=1)
+    store_cached_response(db, key, "forecast", "prompt", "answer")
+
+    for _ in range(4):
+        get_cached_response(db, key)
+    assert db.query(AIRequestCache.hit_count).scalar() == 1
+
+    get_cached_response(db, key)
+    assert db.query(AIRequestCache.hit_count).scalar() == 6
+    assert flush_hit_counts(db, force=True) == 0
+
+
+def test_misses_are_remembered_until_stored(db, statements):
+    key = generate_cache_key("link_intelligence", url="https://example.com")
+    assert get_cached_response(db, key) is None
+    statements.clear()
+    assert get_cached_response(db, key) is None
+    assert statements == []
+
+    store_cached_response(db, key, "link_intelligence", "prompt", "fresh")
+    assert get_cached_response(db, key) == "fresh"
+
+
+def test_memory_cache_respects_byte_and_entry_bounds():
+    lru = MemoryCache(max_entries=3, max_bytes=10)
+    lru.put("a", "xxxx", 60)
+    lru.put("b", "xxxx", 60)
+    lru.get("a")
+    lru.put("c", "xxxx", 60)  # over 10 bytes: least recently used "b" goes
+    assert lru.get("b") is None
+    assert lru.get("a") == "xxxx" and lru.get("c") == "xxxx"
+
+    lru.put("big", "x" * 11, 60)  # larger than the whole cache
+    assert lru.get("big") is None
+    assert lru.stats()["bytes"] == 8
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_call():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(single_flight("k", call) for _ in range(5)))
+    assert results == ["result"] * 5
+    assert calls == 1
+    # Once finished, the next caller starts a fresh call
+    assert await single_flight("k", call) == "result"
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_errors_and_survives_cancelled_caller():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("quota")
+
+    results = await asyncio.gather(*(single_flight("e", failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.ensure_future(single_flight("c", slow))
+    second = asyncio.ensure_future(single_flight("c", slow))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_coalesced_result_is_cached_after_leader_session_closes(db, session_factory):
+    from app.ai.provider import AIProvider
+    from app.ai.smart_features import SmartAIFeatures
+
+    release = asyncio.Event()
+
+    class SlowProvider(AIProvider):
+        async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+            await release.wait()
+            return '{"ok": true}'
+
+        def is_available(self):
+            return True
+
+    leader_session = session_factory()
+    leader, follower = SmartAIFeatures(leader_session), SmartAIFeatures(db)
+    leader.provider = follower.provider = SlowProvider()
+    first = asyncio.ensure_future(leader._complete_once("flight", "insights", "prompt"))
+    second = asyncio.ensure_future(follower._complete_once("flight", "insights", "prompt"))
+    await asyncio.sleep(0)
+    # The leading request fails mid-flight, leaving its session unusable
+    first.cancel()
+    leader_session.add(AIRequestCache())
+    with pytest.raises(Exception):
+        leader_session.flush()
+    release.set()
+
+    assert await second == '{"ok": true}'
+    memory_cache.clear()
+    assert get_cached_response(db, "flight") == '{"ok": true}'
+    leader_session.close()
+
+
+def _store(db, request_type, n, response="answer"):
+    key = generate_cache_key(request_type, n=n)
+    store_cached_response(db, key, request_type, "prompt", response)
+    return key
+
+
+def test_eviction_applies_type_quotas_lru_by_last_hit(db, monkeypatch):
+    monkeypatch.setattr(cache.settings, "ai_cache_type_quotas", {"insights": 2})
+    keys = [_store(db, "insights", n) for n in range(4)]
+    _store(db, "budget_surgeon", 0)
+    # Make the first entry the most recently hit
+    memory_cache.clear()
+    get_cached_response(db, keys[0])
+    flush_hit_counts(db, force=True)
+    db.query(AIRequestCache).filter(AIRequestCache.request_hash != keys[0]).update(
+        {AIRequestCache.created_at: datetime.utcnow() - timedelta(hours=1)}, synchronize_session=False
+    )
+    db.query(AIRequestCache).filter(AIRequestCache.request_hash == keys[3]).update(
+        {AIRequestCache.created_at: datetime.utcnow() - timedelta(minutes=1)}, synchronize_session=False
+    )
+    db.commit()
+
+    assert evict_cache(db) == {"expired": 0, "quota": 2, "size": 0}
+    remaining = {row.request_hash for row in db.query(AIRequestCache.request_hash)}
+    assert keys[0] in remaining and keys[3] in remaining
+    assert keys[1] not in remaining and keys[2] not in remaining
+    assert db.query(AIRequestCache).filter(AIRequestCache.request_type == "budget_surgeon").count() == 1
+
+
+def test_eviction_bounds_bytes_and_keeps_recent_stale_rows(db, monkeypatch):
+    keys = [_store(db, "forecast", n, response="x" * 100) for n in range(5)]
+    for age, key in enumerate(reversed(keys)):
+        db.query(AIRequestCache).filter(AIRequestCache.request_hash == key).update(
+            {AIRequestCache.created_at: datetime.utcnow() - timedelta(minutes=age)}, synchronize_session=False
+        )
+    # Expired an hour ago: still kept as a stale fallback
+    db.query(AIRequestCache).filter(AIRequestCache.request_hash == keys[4]).update(
+        {AIRequestCache.expires_at: datetime.utcnow() - timedelta(hours=1)}, synchronize_session=False
+    )
+    db.commit()
+    monkeypatch.setattr(cache.settings, "ai_cache_max_bytes", 350)
+
+    assert evict_cache(db)["size"] == 2
+    assert {row.request_hash for row in db.query(AIRequestCache.request_hash)} == set(keys[2:])
+    assert get_stale_response(db, keys[4]) == "x" * 100
+
+    monkeypatch.setattr(cache.settings, "ai_cache_stale_retention", 60)
+    assert evict_cache(db)["expired"] == 1
+
+
+def test_compressed_entries_round_trip_and_are_smaller(db, monkeypatch):
+    monkeypatch.setattr(cache.settings, "ai_cache_compress", True)
+    response = '{"insights": ["' + "spend is stable " * 200 + '"]}'
+    key = _store(db, "renewal_forecaster", 1, response=response)
+    row = db.query(AIRequestCache).one()
+    assert row.compressed and row.size_bytes < len(response) / 4
+    memory_cache.clear()
+    assert get_cached_response(db, key) == response
+    assert get_stale_response(db, key) == response
+
+
+def test_stats_come_from_one_aggregate_query(db, statements):
+    _store(db, "insights", 1, response="a" * 10)
+    _store(db, "insights", 2, response="b" * 20)
+    _store(db, "budget_surgeon", 1)
+    flush_hit_counts(db, force=True)
+    statements.clear()
+
+    stats = get_cache_stats(db)
+    assert len(statements) == 1
+    assert stats["total_entries"] == 3 and stats["active_entries"] == 3
+    assert stats["by_type"]["insights"]["count"] == 2
+    assert stats["by_type"]["insights"]["bytes"] == 2 * len("prompt") + 30
+    assert stats["total_bytes"] == stats["by_type"]["insights"]["bytes"] + len("prompt") + len("answer")
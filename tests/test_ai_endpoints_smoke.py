@@ -45,3 +45,14 @@ def test_categorize_subscription_accepts_json_and_form():
         data={"vendor_name": "Adobe", "plan_name": "Creative Cloud"},
     )
     assert resp_form.status_code == 200
+
+
+def test_chat_stream_sends_sse_events():
+    client = TestClient(app)
+    login(client)
+
+    resp = client.post("/api/ai/chat/stream", json={"message": "hello"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    # Without an API key the buffered fallback reports that AI is unavailable
+    assert "event: " in resp.text
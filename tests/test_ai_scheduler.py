@@ -0,0 +1,130 @@
+"""Tests for the quota-aware AI call scheduler."""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.ai_usage import AIUsageDaily
+from app.ai import scheduler as scheduler_module
+from app.ai.provider import RateLimitError
+from app.ai.scheduler import AIScheduler, QuotaExceededError
+
+
+def _scheduler(session_factory, monkeypatch, per_minute=600, daily=100):
+    monkeypatch.setattr(scheduler_module.settings, "ai_requests_per_minute", per_minute)
+    monkeypatch.setattr(scheduler_module.settings, "ai_daily_limit", daily)
+    return AIScheduler(session_factory=session_factory)
+
+
+@pytest.mark.asyncio
+async def test_daily_quota_is_persisted_and_enforced(session_factory, monkeypatch):
+    sched = _scheduler(session_factory, monkeypatch, daily=2)
+
+    async def call():
+        return "ok"
+
+    assert await sched.run(call) == "ok"
+    assert await sched.run(call) == "ok"
+    with pytest.raises(QuotaExceededError):
+        await sched.run(call)
+
+    await sched.sync_usage()
+    db = session_factory()
+    assert db.query(AIUsageDaily.request_count).scalar() == 2
+    db.close()
+    # A fresh process picks the counter up from the database
+    fresh = AIScheduler(session_factory=session_factory)
+    await fresh.sync_usage()
+    assert fresh.status()["daily_remaining"] == 0
+
+
+@pytest.mark.asyncio
+async def test_daily_quota_is_shared_between_workers(tmp_path, monkeypatch):
+    # A file database so each worker's writes use their own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(scheduler_module.settings, "ai_usage_sync_seconds", 0)
+    first = _scheduler(session_factory, monkeypatch, daily=5)
+    second = AIScheduler(session_factory=session_factory)
+
+    async def call():
+        return "ok"
+
+    # Both workers start on the same day; neither increment is lost
+    await asyncio.gather(first.run(call), second.run(call), first.run(call))
+    await first.sync_usage()
+    await second.sync_usage()
+    await first.sync_usage()
+    assert first.remaining_today() == second.remaining_today() == 2
+
+    await second.run(call)
+    await second.run(call)
+    await second.sync_usage()
+    # The first worker re-reads the shared row before granting
+    with pytest.raises(QuotaExceededError):
+        await first.run(call)
+    db = session_factory()
+    assert db.query(AIUsageDaily.request_count).scalar() == 5
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_interactive_lane_is_served_before_background(session_factory, monkeypatch):
+    # 60/min refills one request per second; drain the bucket first
+    sched = _scheduler(session_factory, monkeypatch, per_minute=60)
+    sched._requests.level = 0
+    order = []
+
+    async def queued(lane):
+        await sched.acquire(lane)
+        order.append(lane)
+
+    background = asyncio.ensure_future(queued("background"))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(queued("interactive"))
+    await asyncio.wait_for(asyncio.gather(background, interactive), timeout=5)
+    assert order == ["interactive", "background"]
+    await sched.sync_usage()
+
+
+@pytest.mark.asyncio
+async def test_fails_fast_when_slot_is_beyond_deadline(session_factory, monkeypatch):
+    sched = _scheduler(session_factory, monkeypatch, per_minute=1)
+    sched._requests.level = 0
+    monkeypatch.setattr(scheduler_module.settings, "ai_interactive_deadline", 1.0)
+    monkeypatch.setattr(scheduler_module.settings, "ai_usage_sync_seconds", 60)
+    await sched.sync_usage()
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with pytest.raises(RateLimitError, match="busy"):
+        await sched.acquire("interactive")
+    assert loop.time() - started < 0.1
+    assert sched.status()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_429_pauses_and_retries(session_factory, monkeypatch):
+    sched = _scheduler(session_factory, monkeypatch)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RateLimitError("slow down", retry_after=0.05)
+        return "ok"
+
+    assert await sched.run(call) == "ok"
+    assert attempts == 2
+
+    async def always_limited():
+        raise RateLimitError("slow down", retry_after=600)
+
+    with pytest.raises(RateLimitError):
+        await sched.run(always_limited)
+    assert sched.status()["cooldown_seconds"] > 0
+    await sched.sync_usage()
@@ -0,0 +1,74 @@
+"""Tests for the revision-keyed chat context cache."""
+import pytest
+from datetime import date, timedelta
+
+from app.models import Subscription
+from app.models.subscription import BillingCycle
+from app.ai.chat_context import get_chat_context, invalidate_chat_context
+from app.services.data_revision import current_revision
+
+
+@pytest.fixture
+def db(db, customer):
+    db.add_all([
+        Subscription(customer_id=customer.id, category_id=customer.category_id, vendor_name="Adobe", cost=60.0,
+                     billing_cycle=BillingCycle.MONTHLY, next_renewal_date=date.today() + timedelta(days=3)),
+        Subscription(customer_id=customer.id, category_id=customer.category_id, vendor_name="Figma", cost=120.0,
+                     billing_cycle=BillingCycle.YEARLY, next_renewal_date=date.today() + timedelta(days=200)),
+    ])
+    db.commit()
+    invalidate_chat_context()
+    yield db
+    invalidate_chat_context()
+
+
+def test_summary_includes_spend_and_upcoming_renewals(db):
+    summary = get_chat_context(db)
+    assert "Active subscriptions: 2" in summary
+    assert "Estimated monthly spend: $70.00" in summary
+    assert "Software $70.00/mo" in summary
+    assert "Adobe $60.0 on" in summary
+    assert "Figma $120.0 on" not in summary
+
+
+def test_summary_is_reused_until_data_changes(db, statements):
+    first = get_chat_context(db)
+    statements.clear()
+    assert get_chat_context(db) == first
+    assert statements == []
+
+    revision = current_revision()
+    db.query(Subscription).filter(Subscription.vendor_name == "Adobe").first().cost = 90.0
+    db.commit()
+    assert current_revision() > revision
+    assert "Estimated monthly spend: $100.00" in get_chat_context(db)
+
+
+def test_bulk_updates_invalidate(db):
+    get_chat_context(db)
+    db.query(Subscription).update({Subscription.cost: 12.0})
+    db.commit()
+    assert "Estimated monthly spend: $13.00" in get_chat_context(db)
+
+
+def test_rolled_back_writes_keep_the_cache(db):
+    get_chat_context(db)
+    revision = current_revision()
+    db.query(Subscription).first().cost = 1.0
+    db.flush()
+    db.rollback()
+    assert current_revision() == revision
+
+
+def test_savepoint_rollback_keeps_outer_writes(db):
+    get_chat_context(db)
+    revision = current_revision()
+    db.query(Subscription).filter(Subscription.vendor_name == "Adobe").first().cost = 90.0
+    db.flush()
+    savepoint = db.begin_nested()
+    db.query(Subscription).filter(Subscription.vendor_name == "Figma").first().cost = 1.0
+    db.flush()
+    savepoint.rollback()
+    db.commit()
+    assert current_revision() > revision
+    assert "Estimated monthly spend: $100.00" in get_chat_context(db)
@@ -0,0 +1,129 @@
+"""Tests for the AI provider circuit breaker."""
+import asyncio
+import pytest
+
+from app.ai.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerProvider, CircuitOpenError
+)
+from app.ai.insights import InsightsAnalyzer
+from app.ai.provider import AIProvider, AIProviderError, RateLimitError, ServiceUnavailableError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyProvider(AIProvider):
+    def __init__(self, error=None, delay=0.0):
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return "ok"
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setattr("app.config.settings.ai_circuit_min_calls", 4)
+    monkeypatch.setattr("app.config.settings.ai_circuit_failure_rate", 0.5)
+    monkeypatch.setattr("app.config.settings.ai_circuit_open_seconds", 30)
+    monkeypatch.setattr("app.config.settings.ai_circuit_max_open_seconds", 100)
+    clock = Clock()
+    return CircuitBreaker(clock=clock), clock
+
+
+@pytest.mark.asyncio
+async def test_opens_after_failure_rate_and_fails_fast(breaker):
+    circuit, clock = breaker
+    provider = FlakyProvider(error=ServiceUnavailableError("down"), delay=0.05)
+    wrapped = CircuitBreakerProvider(provider, circuit)
+
+    for _ in range(4):
+        with pytest.raises(ServiceUnavailableError):
+            await wrapped.generate_completion("hi")
+    assert circuit.state == OPEN
+
+    # Fails without reaching the (slow) provider
+    with pytest.raises(CircuitOpenError) as info:
+        await wrapped.generate_completion("hi")
+    assert provider.calls == 4
+    assert 0 < info.value.retry_after <= 30
+    assert circuit.status()["short_circuited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_requests_do_not_trip_the_circuit(breaker):
+    circuit, _ = breaker
+    for error in (AIProviderError("Bad request: prompt too long", status_code=400),
+                  AIProviderError("Content blocked: SAFETY", status_code=400)):
+        wrapped = CircuitBreakerProvider(FlakyProvider(error=error), circuit)
+        for _ in range(6):
+            with pytest.raises(AIProviderError):
+                await wrapped.generate_completion("hi")
+    assert circuit.state == CLOSED
+
+    # Server errors and transport failures without a status still count
+    for error in (AIProviderError("HTTP error: 500", status_code=500), AIProviderError("Connection error")):
+        wrapped = CircuitBreakerProvider(FlakyProvider(error=error), circuit)
+        for _ in range(2):
+            with pytest.raises(AIProviderError):
+                await wrapped.generate_completion("hi")
+    assert circuit.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_do_not_trip_the_circuit(breaker):
+    circuit, _ = breaker
+    wrapped = CircuitBreakerProvider(FlakyProvider(error=RateLimitError("busy")), circuit)
+    for _ in range(6):
+        with pytest.raises(RateLimitError):
+            await wrapped.generate_completion("hi")
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens_with_backoff(breaker):
+    circuit, clock = breaker
+    failing = FlakyProvider(error=ServiceUnavailableError("down"))
+    for _ in range(4):
+        with pytest.raises(ServiceUnavailableError):
+            await circuit.call(lambda: failing.generate_completion("hi"))
+
+    clock.now += 31
+    assert circuit.allow() and circuit.state == HALF_OPEN
+    assert not circuit.allow()  # only one probe at a time
+    circuit.record_failure()
+    assert circuit.state == OPEN and circuit.status()["circuit_retry_after"] == 60
+
+    clock.now += 61
+    assert await circuit.call(lambda: FlakyProvider().generate_completion("hi")) == "ok"
+    assert circuit.state == CLOSED
+
+
+class OpenCircuitProvider(AIProvider):
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        raise CircuitOpenError("AI service is temporarily unavailable.", retry_after=10)
+
+    def is_available(self):
+        return True
+
+
+@pytest.mark.asyncio
+async def test_insights_fall_back_to_rule_based_output(db):
+    insights = await InsightsAnalyzer(db, OpenCircuitProvider()).generate_insights()
+    ai = insights["ai_insights"]
+    assert ai["fallback"] is True
+    assert ai["summary"].startswith("0 active subscriptions")
+    assert ai["next_best_actions"] == ["Add your first subscription to start tracking"]
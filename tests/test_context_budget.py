@@ -0,0 +1,121 @@
+"""Tests for token-budgeted prompt data and map-reduce budget analysis."""
+import json
+import pytest
+from datetime import date, timedelta
+
+from app.models import Subscription
+from app.ai.cache import memory_cache
+from app.ai.context_budget import aggregate_rows, chunk_rows, compress_rows, render_rows
+from app.ai.provider import AIProvider
+from app.ai.scheduler import estimate_tokens
+from app.ai.smart_features import SmartAIFeatures
+
+FIELDS = ["id", "vendor", "plan", "cost", "cycle", "monthly_cost", "category"]
+
+
+def _rows(count):
+    return [
+        {"id": i, "vendor": f"Vendor {i % 40}", "plan": "Team", "cost": float(i % 90 + 5),
+         "cycle": "monthly", "monthly_cost": float(i % 90 + 5), "category": f"Category {i % 7}"}
+        for i in range(count)
+    ]
+
+
+def test_small_tables_are_sent_whole():
+    rows = _rows(10)
+    context = compress_rows(rows, FIELDS, budget_tokens=2000)
+    assert not context["sampled"]
+    assert context["text"] == render_rows(rows, FIELDS)
+
+
+def test_large_tables_are_aggregated_and_sampled_within_budget():
+    rows = _rows(3000)
+    context = compress_rows(rows, FIELDS, budget_tokens=1500)
+    assert context["sampled"]
+    assert estimate_tokens(context["text"]) <= 1500
+    assert "Spend by category:" in context["text"]
+    # Every category is represented in the sample
+    assert all(f"Category {i}" in context["text"].split("Representative")[1] for i in range(7))
+    # Aggregates cover all rows, not just the sample
+    total = sum(row["monthly_cost"] for row in rows if row["category"] == "Category 0")
+    assert f"${total:.2f}/mo" in aggregate_rows(rows, "category")
+
+
+def test_chunks_fit_budget_and_keep_vendors_together():
+    rows = _rows(2000)
+    chunked = chunk_rows(rows, FIELDS, budget_tokens=1000, max_chunks=1000)
+    chunks = chunked["chunks"]
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 1000 for chunk in chunks)
+    assert sum(len(chunk.splitlines()) - 1 for chunk in chunks) == len(rows)
+    assert (chunked["rows_shown"], chunked["rows_omitted"]) == (len(rows), 0)
+    capped = chunk_rows(rows, FIELDS, budget_tokens=1000, max_chunks=3)
+    assert len(capped["chunks"]) == 3
+    shown = sum(len(chunk.splitlines()) - 1 for chunk in capped["chunks"])
+    assert capped["rows_shown"] == shown and capped["rows_omitted"] == len(rows) - shown
+    assert "subscriptions" in capped["omitted_summary"]
+
+
+def test_vendor_under_two_categories_shares_a_chunk():
+    rows = _rows(600)
+    rows.append({"id": 9000, "vendor": " zoom ", "plan": "Pro", "cost": 15.0, "cycle": "monthly",
+                 "monthly_cost": 15.0, "category": "Category 0"})
+    rows.append({"id": 9001, "vendor": "Zoom", "plan": "Pro", "cost": 15.0, "cycle": "monthly",
+                 "monthly_cost": 15.0, "category": "Category 6"})
+    chunks = chunk_rows(rows, FIELDS, budget_tokens=400, max_chunks=1000)["chunks"]
+    assert len(chunks) > 2
+    # Every vendor's rows appear in exactly one chunk
+    for vendor in ["9000|", "9001|"] + [f"|Vendor {i}|" for i in range(40)]:
+        holding = [chunk for chunk in chunks if vendor in chunk]
+        assert len(holding) == 1, vendor
+    assert any("9000|" in chunk and "9001|" in chunk for chunk in chunks)
+
+
+class ChunkProvider(AIProvider):
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        self.prompts.append(prompt)
+        first_id = int(prompt.split("category\n")[1].split("|")[0])
+        return json.dumps({
+            "duplicates": [{"subscription_ids": [first_id], "potential_savings": len(self.prompts)}],
+            "total_potential_savings": 10,
+            "summary": f"part {len(self.prompts)}",
+        })
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture
+def db(db, customer):
+    db.add_all([
+        Subscription(customer_id=customer.id, category_id=customer.category_id, vendor_name=f"Vendor {i}",
+                     plan_name="Business", cost=10.0, next_renewal_date=date.today() + timedelta(days=30))
+        for i in range(300)
+    ])
+    db.commit()
+    memory_cache.clear()
+    yield db
+    memory_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_analyze_budget_map_reduces_large_lists(db, monkeypatch):
+    monkeypatch.setattr("app.config.settings.ai_context_token_budget", 1500)
+    features = SmartAIFeatures(db)
+    features.provider = ChunkProvider()
+
+    result = await features.analyze_budget()
+    calls = len(features.provider.prompts)
+    assert calls > 1
+    assert all(estimate_tokens(prompt) < 2500 for prompt in features.provider.prompts)
+    assert result["chunks"] == calls
+    assert result["total_potential_savings"] == 10 * calls
+    assert len(result["duplicates"]) == calls
+    assert result["duplicates"][0]["potential_savings"] == calls
+
+    # The merged result is cached under the whole-list key
+    again = await features.analyze_budget()
+    assert again["cached"] and len(features.provider.prompts) == calls
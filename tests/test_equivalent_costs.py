@@ -0,0 +1,86 @@
+"""Tests for the persisted monthly/annual equivalent cost columns."""
+from datetime import date
+
+import pytest
+from sqlalchemy import func, text, update
+
+from app.models import Subscription
+from app.models.subscription import BillingCycle, monthly_equivalent, monthly_equivalent_case
+
+CYCLES = [
+    (BillingCycle.WEEKLY, None, None, 52),
+    (BillingCycle.MONTHLY, None, None, 12),
+    (BillingCycle.QUARTERLY, None, None, 4),
+    (BillingCycle.BIANNUAL, None, None, 2),
+    (BillingCycle.YEARLY, None, None, 1),
+    (BillingCycle.CUSTOM, 10, "days", 36.5),
+    (BillingCycle.CUSTOM, 2, "Weeks", 26),
+    (BillingCycle.CUSTOM, 18, "months", 12 / 18),
+    (BillingCycle.CUSTOM, 3, "years", 1 / 3),
+    (BillingCycle.CUSTOM, None, None, 12),
+]
+
+
+@pytest.fixture
+def db(db, customer):
+    for cycle, amount, unit, _ in CYCLES:
+        db.add(Subscription(
+            customer_id=customer.id, category_id=customer.category_id, vendor_name=f"{cycle.value} {unit}",
+            cost=120.0, billing_cycle=cycle, custom_billing_amount=amount, custom_billing_unit=unit,
+            next_renewal_date=date.today()
+        ))
+    db.commit()
+    return db
+
+
+def test_normalization_covers_every_cycle():
+    """Test each cycle, including custom units, maps to renewals per year."""
+    for cycle, amount, unit, per_year in CYCLES:
+        assert monthly_equivalent(120.0, cycle, amount, unit) == pytest.approx(120.0 * per_year / 12)
+
+
+def test_columns_maintained_on_write(db):
+    """Test inserts, ORM updates and bulk updates keep the columns current."""
+    for sub in db.query(Subscription):
+        assert sub.monthly_equivalent_cost == pytest.approx(monthly_equivalent(
+            sub.cost, sub.billing_cycle, sub.custom_billing_amount, sub.custom_billing_unit
+        ))
+        assert sub.annual_equivalent_cost == pytest.approx(sub.monthly_equivalent_cost * 12)
+
+    weekly = db.query(Subscription).filter(Subscription.billing_cycle == BillingCycle.WEEKLY).one()
+    weekly.billing_cycle = BillingCycle.YEARLY
+    db.commit()
+    assert weekly.annual_equivalent_cost == 120.0
+
+    # The filter column is rewritten by the update itself
+    db.query(Subscription).filter(Subscription.cost == 120.0, Subscription.billing_cycle == BillingCycle.MONTHLY).update(
+        {Subscription.cost: 30.0}
+    )
+    db.commit()
+    monthly = db.query(Subscription).filter(Subscription.billing_cycle == BillingCycle.MONTHLY).one()
+    assert (monthly.monthly_equivalent_cost, monthly.annual_equivalent_cost) == (30.0, 360.0)
+
+
+def test_sql_backfill_matches_python(db):
+    """Test the backfill expression agrees with the Python normalization."""
+    expected = {sub.id: sub.monthly_equivalent_cost for sub in db.query(Subscription)}
+    db.execute(text("UPDATE subscriptions SET monthly_equivalent_cost = NULL"))
+    monthly = monthly_equivalent_case()
+    db.execute(
+        update(Subscription).values(monthly_equivalent_cost=monthly).execution_options(
+            equivalent_costs_refresh=True, synchronize_session=False
+        )
+    )
+    db.expire_all()
+    for sub_id, value in db.query(Subscription.id, Subscription.monthly_equivalent_cost):
+        assert value == pytest.approx(expected[sub_id])
+
+
+def test_active_spend_sums_from_index(db):
+    """Test the active spend total is answered from the covering index."""
+    total = db.query(func.sum(Subscription.monthly_equivalent_cost)).filter(Subscription.status == "ACTIVE")
+    assert total.scalar() == pytest.approx(sum(120.0 * per_year / 12 for *_, per_year in CYCLES))
+    plan = " ".join(str(row[-1]) for row in db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT SUM(monthly_equivalent_cost) FROM subscriptions WHERE status = 'ACTIVE'"
+    )))
+    assert "COVERING INDEX ix_subscriptions_status_monthly_cost" in plan
@@ -0,0 +1,143 @@
+"""Tests for the pooled Gemini HTTP client, against a local stub server."""
+import asyncio
+import time
+
+import pytest
+
+from app.ai import gemini_provider
+from app.ai.gemini_provider import GeminiProvider, close_http_client, get_http_client
+from app.ai.provider import AIProviderError, RateLimitError
+from tests.gemini_stub import GeminiStub
+
+
+@pytest.fixture
+def stub():
+    with GeminiStub() as server:
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_reuse_one_connection(stub):
+    provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+    try:
+        for i in range(5):
+            assert await provider.generate_completion(f"hello {i}") == f"echo: hello {i}"
+    finally:
+        await close_http_client()
+
+    assert stub.requests == 5
+    assert len(set(stub.connections)) == 1
+
+
+@pytest.mark.asyncio
+async def test_providers_share_the_pool_until_closed(stub):
+    first = GeminiProvider(api_key="test", base_url=stub.base_url)
+    second = GeminiProvider(api_key="test", base_url=stub.base_url)
+    await first.generate_completion("a")
+    await second.generate_completion("b")
+    client = get_http_client()
+    await close_http_client()
+
+    assert client.is_closed
+    assert len(set(stub.connections)) == 1
+    assert get_http_client() is not client
+    await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_bounded_by_pool_limits(monkeypatch):
+    monkeypatch.setattr(gemini_provider.settings, "ai_http_max_connections", 4)
+    with GeminiStub(delay=0.05) as stub:
+        provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(provider.generate_completion(str(i)) for i in range(12)))
+        finally:
+            await close_http_client()
+        elapsed = time.perf_counter() - started
+
+    assert results == [f"echo: {i}" for i in range(12)]
+    assert len(set(stub.connections)) <= 4
+    # 12 calls over 4 connections take about three server round trips
+    assert elapsed >= 0.15
+
+
+@pytest.mark.asyncio
+async def test_error_status_is_still_mapped():
+    with GeminiStub(status=400) as stub:
+        provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+        try:
+            with pytest.raises(AIProviderError, match="Bad request: stub error"):
+                await provider.generate_completion("x")
+        finally:
+            await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_stream_completion_yields_fragments_as_they_arrive():
+    with GeminiStub(stream_delay=0.05) as stub:
+        provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+        started = time.perf_counter()
+        first_at = None
+        fragments = []
+        try:
+            async for fragment in provider.stream_completion("one two three four"):
+                first_at = first_at or time.perf_counter() - started
+                fragments.append(fragment)
+        finally:
+            await close_http_client()
+        total = time.perf_counter() - started
+
+    assert "".join(fragments).strip() == "echo: one two three four"
+    assert len(fragments) == 5
+    assert first_at < total / 2
+
+
+@pytest.mark.asyncio
+async def test_stream_completion_maps_errors():
+    with GeminiStub(status=400) as stub:
+        provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+        try:
+            with pytest.raises(AIProviderError, match="stub error"):
+                async for _ in provider.stream_completion("x"):
+                    pass
+        finally:
+            await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_report_the_server_retry_delay():
+    with GeminiStub(status=429) as stub:
+        provider = GeminiProvider(api_key="test", base_url=stub.base_url)
+        try:
+            with pytest.raises(RateLimitError) as buffered:
+                await provider.generate_completion("x")
+            with pytest.raises(RateLimitError) as streamed:
+                async for _ in provider.stream_completion("x"):
+                    pass
+        finally:
+            await close_http_client()
+    assert buffered.value.retry_after == streamed.value.retry_after == 7
+
+
+@pytest.mark.asyncio
+async def test_client_from_another_loop_is_closed(stub):
+    await GeminiProvider(api_key="test", base_url=stub.base_url).generate_completion("a")
+    old = get_http_client()
+    other_loop = asyncio.new_event_loop()
+    other_loop.close()
+    gemini_provider._shared_loop = other_loop
+    try:
+        assert get_http_client() is not old
+        await asyncio.sleep(0.05)
+        assert old.is_closed
+    finally:
+        await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_buffered_providers_stream_one_fragment():
+    from app.ai.provider import DummyAIProvider
+
+    fragments = [f async for f in DummyAIProvider().stream_completion("hi")]
+    assert len(fragments) == 1 and "not configured" in fragments[0]
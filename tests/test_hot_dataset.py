@@ -0,0 +1,239 @@
+"""Tests for the in-process columnar subscription cache."""
+import asyncio
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+from starlette.requests import Request
+
+from app.ai.insights import InsightsAnalyzer
+from app.models import Category, Customer, Subscription
+from app.models.subscription import BillingCycle, SubscriptionStatus
+from app.routers.analytics_routes import get_analytics_summary
+from app.routers.web_routes import analytics_page, dashboard
+from app.services.hot_dataset import SubscriptionColumns, analytics_summary, hot_dataset, subscription_columns
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def db(db, category, customer, monkeypatch):
+    monkeypatch.setattr("app.config.settings.hot_dataset_enabled", True)
+    monkeypatch.setattr("app.config.settings.hot_dataset_ttl", 0)
+    software, marketing = category, Category(name="Marketing")
+    db.add(marketing)
+    db.flush()
+    for vendor, category, cost, cycle, country, status, renewal in [
+        ("Zoom", software, 15.0, BillingCycle.MONTHLY, "US", SubscriptionStatus.ACTIVE, 10),
+        ("Adobe", software, 600.0, BillingCycle.YEARLY, "DE", SubscriptionStatus.ACTIVE, 90),
+        ("Hubspot", marketing, 30.0, BillingCycle.QUARTERLY, None, SubscriptionStatus.ACTIVE, -3),
+        ("Zoom", marketing, 45.0, BillingCycle.MONTHLY, "US", SubscriptionStatus.ACTIVE, 20),
+        ("Old CRM", marketing, 99.0, BillingCycle.MONTHLY, "US", SubscriptionStatus.CANCELLED, 5),
+    ]:
+        db.add(Subscription(
+            customer_id=customer.id, category_id=category.id, vendor_name=vendor, cost=cost, billing_cycle=cycle,
+            country=country, status=status, next_renewal_date=TODAY + timedelta(days=renewal)
+        ))
+    db.commit()
+    hot_dataset.load(db)
+    yield db
+    hot_dataset.clear()
+
+
+def _snapshot(columns):
+    """Rows keyed by id, comparable across load orders."""
+    return {
+        columns.id[i]: (columns.cost[i], columns.status[i], columns.vendors.values[columns.vendor[i]])
+        for i in range(len(columns))
+    }
+
+
+def test_writes_patch_the_columns(db):
+    """Test committed inserts, updates and deletes are patched in and rollbacks are not."""
+    columns = hot_dataset.columns
+    before = _snapshot(columns)
+    customer_id = db.query(Customer.id).scalar()
+    category_id = db.query(Category.id).first()[0]
+    db.add(Subscription(customer_id=customer_id, category_id=category_id, vendor_name="Slack", cost=8.0,
+                        next_renewal_date=TODAY))
+    zoom = db.query(Subscription).filter(Subscription.cost == 15.0).one()
+    zoom.cost = 20.0
+    db.delete(db.query(Subscription).filter(Subscription.vendor_name == "Hubspot").one())
+    db.commit()
+    assert _snapshot(columns) == before
+    columns = hot_dataset.columns
+    assert _snapshot(columns) == _snapshot(SubscriptionColumns.load(db))
+    assert len(columns) == 5
+
+    zoom.cost = 99.0
+    db.flush()
+    db.rollback()
+    assert hot_dataset.columns is columns
+    assert _snapshot(columns) == _snapshot(SubscriptionColumns.load(db))
+
+
+def test_reads_do_not_wait_for_a_reload(db):
+    """Test a snapshot is stable under commits and reads skip a reload held by another thread."""
+    with subscription_columns(db) as columns:
+        before = _snapshot(columns)
+        db.delete(db.query(Subscription).filter(Subscription.vendor_name == "Adobe").one())
+        db.commit()
+        assert _snapshot(columns) == before
+    assert len(hot_dataset.columns) == 4
+
+    hot_dataset.mark_stale()
+    assert hot_dataset._reload_lock.acquire()
+    try:
+        with subscription_columns(db) as current:
+            assert current is hot_dataset.columns
+    finally:
+        hot_dataset._reload_lock.release()
+    assert hot_dataset.get(db) is not current
+
+
+def test_commits_during_a_reload_are_replayed(db, monkeypatch):
+    """Test a write committed while the table is being scanned is not lost by the swap."""
+    scan = SubscriptionColumns.load.__func__
+    zoom = db.query(Subscription).filter(Subscription.cost == 15.0).one()
+
+    def load_then_commit(cls, session):
+        columns = scan(cls, session)
+        zoom.cost = 25.0
+        db.commit()
+        return columns
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SubscriptionColumns, "load", classmethod(load_then_commit))
+        hot_dataset.load(db)
+    assert 25.0 in hot_dataset.columns.cost
+    assert _snapshot(hot_dataset.columns) == _snapshot(SubscriptionColumns.load(db))
+
+
+def test_savepoint_rollback_keeps_outer_writes(db):
+    """Test a rolled-back savepoint neither drops the outer writes nor leaks its own."""
+    zoom = db.query(Subscription).filter(Subscription.cost == 15.0).one()
+    zoom.cost = 20.0
+    db.flush()
+    savepoint = db.begin_nested()
+    db.query(Subscription).filter(Subscription.vendor_name == "Adobe").one().cost = 1.0
+    db.flush()
+    savepoint.rollback()
+    db.commit()
+    columns = hot_dataset.get(db)
+    assert _snapshot(columns) == _snapshot(SubscriptionColumns.load(db))
+    assert 20.0 in columns.cost and 1.0 not in columns.cost
+
+
+def test_bulk_update_reloads(db):
+    """Test bulk updates mark the copy stale and the next read reloads it."""
+    columns = hot_dataset.columns
+    db.query(Subscription).filter(Subscription.vendor_name == "Zoom").update({Subscription.cost: 1.0})
+    db.commit()
+    assert hot_dataset.stale
+    assert hot_dataset.get(db) is not columns
+    assert {cost for cost, _, vendor in _snapshot(hot_dataset.columns).values() if vendor == "Zoom"} == {1.0}
+
+
+def test_filters_and_groups_match_sql(db):
+    """Test select and group_by agree with the equivalent SQL aggregates."""
+    columns = hot_dataset.columns
+    active = columns.select(status=SubscriptionStatus.ACTIVE)
+    spend = func.sum(Subscription.monthly_equivalent_cost)
+    expected = {
+        category_id: (count, total)
+        for category_id, count, total in db.query(Subscription.category_id, func.count(), spend)
+        .filter(Subscription.status == SubscriptionStatus.ACTIVE).group_by(Subscription.category_id)
+    }
+    assert columns.group_by("category_id", active) == pytest.approx(expected)
+    assert columns.group_by("vendor", active)["Zoom"] == (2, 60.0)
+    expiring = columns.select(active, renewal_from=TODAY, renewal_to=TODAY + timedelta(days=30))
+    assert sorted(columns.cost[i] for i in expiring) == [15.0, 45.0]
+    with pytest.raises(ValueError):
+        columns.group_by("cost")
+
+
+def test_summary_served_without_queries(db, statements):
+    """Test the analytics summary endpoint does not touch the database once loaded."""
+    statements.clear()
+    summary = get_analytics_summary(expiring_days=30, db=db)
+    assert statements == []
+    assert summary["source"] == "memory"
+    assert summary["status_counts"] == {"active": 4, "cancelled": 1}
+    assert summary["active_monthly_spend"] == pytest.approx(15 + 50 + 10 + 45)
+    assert (summary["expiring_soon"], summary["overdue"]) == (2, 1)
+    assert summary["top_vendors"][0] == {"vendor": "Zoom", "count": 2, "monthly_spend": 60.0}
+
+    with subscription_columns(db) as columns:
+        assert analytics_summary(columns) == analytics_summary(SubscriptionColumns.load(db))
+
+
+def test_memory_per_100k_rows():
+    """Test 100k subscriptions fit in a few megabytes."""
+    rng = random.Random(5)
+    vendors = [f"Vendor {i}" for i in range(2000)]
+    columns = SubscriptionColumns()
+    for i in range(1, 100001):
+        columns.upsert((
+            i, rng.randint(5, 500), rng.randint(5, 500), rng.choice(list(BillingCycle)),
+            rng.choice(list(SubscriptionStatus)), TODAY + timedelta(days=rng.randint(-30, 365)), TODAY,
+            rng.randint(1, 5000), rng.randint(1, 40), rng.choice(vendors), rng.choice(["US", "DE", None]), "USD",
+        ))
+    for i in range(1, 100001, 10):
+        columns.remove(i)
+    assert len(columns) == 90000
+    assert columns.id[columns._position[2]] == 2
+    per_100k = columns.nbytes() / len(columns) * 100000
+    assert per_100k < 20 * 1024 * 1024
+
+
+def _request(path):
+    return Request({"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""})
+
+
+def test_insights_match_between_memory_and_database(db, monkeypatch):
+    """Test deterministic insights read from the columns equal the SQL version."""
+    analyzer = InsightsAnalyzer(db, None)
+    category_id = db.query(Category.id).filter(Category.name == "Marketing").scalar()
+    scopes = [(None, None, None), (category_id, None, None), (None, None, 1)]
+    from_memory = [analyzer._get_deterministic_insights(*scope, 30) for scope in scopes]
+    monkeypatch.setattr("app.config.settings.hot_dataset_enabled", False)
+    from_database = [analyzer._get_deterministic_insights(*scope, 30) for scope in scopes]
+    assert from_memory == from_database
+    assert from_memory[0]["total_active_subscriptions"] == 4
+    assert [item["vendor"] for item in from_memory[0]["overdue"]] == ["Hubspot"]
+
+
+def test_analytics_page_reads_columns(db, statements):
+    """Test the analytics page sums monthly equivalents without loading subscription rows."""
+    statements.clear()
+    response = asyncio.run(analytics_page(_request("/analytics"), period="all", db=db))
+    assert not [sql for sql in statements if "FROM subscriptions" in sql]
+    context = response.context
+    assert context["active_count"] == 4
+    assert context["total_spend"] == pytest.approx(15 + 50 + 10 + 45)
+    assert context["renewal_value"] == 15 + 45
+    assert context["status_counts"] == {"active": 4, "paused": 0, "cancelled": 1}
+    assert context["top_vendors"][0] == {"name": "Zoom", "count": 2, "total": 60.0}
+    assert {cat.name: cat.total for cat in context["categories"]} == pytest.approx({"Software": 65.0, "Marketing": 55.0})
+    assert {cycle["name"]: cycle["count"] for cycle in context["billing_cycles"]} == {
+        "Monthly": 2, "Yearly": 1, "Quarterly": 1
+    }
+
+
+def test_dashboard_stats_match_between_memory_and_database(db, monkeypatch):
+    """Test the dashboard stats and renewal lists agree in both modes."""
+    def render():
+        context = asyncio.run(dashboard(_request("/"), db=db)).context
+        return (
+            context["stats"],
+            sorted(sub.id for sub in context["expiring_soon"]),
+            sorted(sub.id for sub in context["overdue"]),
+        )
+
+    from_memory = render()
+    monkeypatch.setattr("app.config.settings.hot_dataset_enabled", False)
+    from_database = render()
+    assert from_memory[0] == pytest.approx(from_database[0])
+    assert from_memory[1:] == from_database[1:]
+    assert from_memory[0]["total_active"] == 4 and from_memory[0]["overdue"] == 1
@@ -0,0 +1,76 @@
+"""Tests for link-graph clustering."""
+from datetime import date
+
+import pytest
+
+from app.models import Customer, Link, Subscription
+from app.models.link import EntityType, UserDecision
+from app.models.subscription import BillingCycle
+from app.services import link_graph
+from app.services.link_graph import UnionFind, cluster_summaries
+
+
+def test_union_find_groups():
+    forest = UnionFind()
+    for a, b in [(1, 2), (3, 4), (2, 3), (5, 6)]:
+        forest.union(a, b)
+    forest.find(7)
+    groups = sorted(sorted(members) for members in forest.groups().values())
+    assert groups == [[1, 2, 3, 4], [5, 6], [7]]
+
+
+@pytest.fixture
+def db(db, category):
+    customers = [Customer(name=f"Org {i}", category_id=category.id) for i in range(6)]
+    db.add_all(customers)
+    db.flush()
+    db.add_all([
+        Subscription(customer_id=customers[i].id, category_id=category.id, vendor_name=f"Tool {i}",
+                     cost=cost, billing_cycle=cycle, next_renewal_date=date.today())
+        for i, cost, cycle in [(0, 10.0, BillingCycle.MONTHLY), (1, 120.0, BillingCycle.YEARLY),
+                               (2, 5.0, BillingCycle.MONTHLY), (4, 7.0, BillingCycle.MONTHLY)]
+    ])
+
+    def link(a, b, confidence, decision=None):
+        return Link(source_type=EntityType.CUSTOMER, source_id=customers[a].id,
+                    target_type=EntityType.CUSTOMER, target_id=customers[b].id,
+                    confidence=confidence, evidence_text="test", user_decision=decision)
+
+    db.add_all([
+        link(0, 1, 0.9),
+        link(1, 2, 0.3, UserDecision.ACCEPTED),
+        link(2, 3, 0.95, UserDecision.REJECTED),
+        link(3, 4, 0.4),
+        link(4, 5, 0.8),
+    ])
+    db.commit()
+    link_graph.invalidate_clusters()
+    yield db
+    link_graph.invalidate_clusters()
+
+
+def test_clusters_use_strong_links_and_sum_spend(db):
+    result = cluster_summaries(db)
+    assert result["total_clusters"] == 2
+    big, small = result["clusters"]
+    assert big["size"] == 3 and big["links"] == 2
+    assert [member["name"] for member in big["members"]] == ["Org 0", "Org 1", "Org 2"]
+    assert big["monthly_spend"] == 25.0 and big["annual_spend"] == 300.0
+    assert small["size"] == 2 and small["monthly_spend"] == 7.0
+
+
+def test_membership_is_cached_until_links_change(db, monkeypatch):
+    calls = []
+    build = link_graph.build_clusters
+    monkeypatch.setattr(link_graph, "build_clusters", lambda session: calls.append(1) or build(session))
+
+    cluster_summaries(db)
+    cluster_summaries(db)
+    assert len(calls) == 1
+
+    weak = db.query(Link).filter(Link.confidence == 0.4).one()
+    weak.user_decision = UserDecision.ACCEPTED
+    db.commit()
+    result = cluster_summaries(db)
+    assert len(calls) == 2
+    assert [cluster["size"] for cluster in result["clusters"]] == [3, 3]
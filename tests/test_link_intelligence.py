@@ -87,3 +87,321 @@ def test_evidence_text_format():
     assert "Similar names" in evidence
     assert "Shared tags" in evidence
     assert evidence.count(";") == 2  # Proper separator
+
+
+class _BatchProvider:
+    """Fake provider answering refinement batches with a JSON array."""
+
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.fail_on_call = fail_on_call
+
+    def is_available(self):
+        return True
+
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        import asyncio
+        import json
+        import re
+        self.calls += 1
+        call = self.calls
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if call == self.fail_on_call:
+            return "not json"
+        items = json.loads(re.search(r"Items:\n(\[.*\])", prompt).group(1))
+        return "Here you go:\n" + json.dumps(
+            [{"id": item["id"], "confidence": 1.0, "explanation": f"link {item['id']}"} for item in items]
+        )
+
+
+def _candidate_links(n):
+    return [
+        {"source_type": "customer", "source_id": i, "target_type": "customer", "target_id": i + 1,
+         "confidence": 0.5, "evidence_text": "Same email domain: example.com; Same country: US"}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_refinement_covers_all_links(monkeypatch):
+    from app.ai import link_intelligence
+    from app.ai.link_intelligence import LinkAnalyzer
+
+    monkeypatch.setattr(link_intelligence.settings, "ai_link_refine_chunk_tokens", 1000)
+    monkeypatch.setattr(link_intelligence.settings, "ai_link_refine_concurrency", 2)
+    provider = _BatchProvider()
+    links = await LinkAnalyzer(None, provider).refine_with_ai(_candidate_links(40))
+
+    assert 1 < provider.calls < 40
+    assert provider.max_active <= 2
+    assert all(link["evidence_text"].endswith(f"| AI: link {i}") for i, link in enumerate(links))
+    assert all(link["confidence"] == 0.75 for link in links)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_leaves_its_links_unrefined(monkeypatch):
+    from app.ai import link_intelligence
+    from app.ai.link_intelligence import LinkAnalyzer
+
+    monkeypatch.setattr(link_intelligence.settings, "ai_link_refine_chunk_tokens", 1000)
+    provider = _BatchProvider(fail_on_call=1)
+    links = await LinkAnalyzer(None, provider).refine_with_ai(_candidate_links(40))
+
+    unrefined = [link for link in links if "| AI:" not in link["evidence_text"]]
+    assert 0 < len(unrefined) < 40
+    assert all(link["confidence"] == 0.5 for link in unrefined)
+
+
+def test_string_ids_in_refinements_are_merged():
+    from app.ai.link_intelligence import LinkAnalyzer
+
+    links = _candidate_links(3)
+    refinements = [
+        {"id": "1", "confidence": "1.0", "explanation": "string id"},
+        {"id": 2, "confidence": 0.0, "explanation": "int id"},
+        {"id": "x", "confidence": 1.0},
+        {"confidence": 1.0},
+    ]
+    assert LinkAnalyzer._merge_refinements(links, {0, 1, 2}, refinements) == 2
+    assert links[1]["evidence_text"].endswith("| AI: string id") and links[1]["confidence"] == 0.75
+    assert links[2]["confidence"] == 0.25
+    assert links[0]["confidence"] == 0.5
+
+
+def _seed_link_fixture(db):
+    from datetime import date, timedelta
+    from app.models import Category, Customer, Group, Subscription
+
+    categories = [Category(name=f"Category {i}") for i in range(12)]
+    db.add_all(categories)
+    db.flush()
+    group = Group(name="Holding", category_id=categories[0].id)
+    db.add(group)
+    db.flush()
+    rows = [
+        ("Acme Corp", "a@acme.com", None, "US", None, False),
+        ("Acme Corporation", "b@acme.com", None, "UK", None, False),
+        ("Globex", None, "555-0100", "DE", None, False),
+        ("Initech", None, "555-0100", "FR", None, False),
+        ("Umbrella", None, None, "JP", "vip", False),
+        ("Hooli", None, None, "BR", "VIP, beta", False),
+        ("Stark Industries", None, None, "US", None, False),
+        ("Stark Industry", None, None, "US", None, False),
+        ("Wayne Enterprises", None, None, "IT", None, True),
+        ("Tyrell", None, None, "ES", None, True),
+        ("Cyberdyne", None, None, "SE", None, False),
+        ("Soylent", None, None, "NO", None, False),
+    ]
+    customers = [
+        Customer(name=name, email=email, phone=phone, country=country, tags=tags,
+                 group_id=group.id if grouped else None, category_id=categories[i].id)
+        for i, (name, email, phone, country, tags, grouped) in enumerate(rows)
+    ]
+    db.add_all(customers)
+    db.flush()
+    subs = [
+        ("Slack", 0, 10.0, 0), ("slack", 3, 12.0, 40), ("Zoom", 0, 20.0, 3),
+        ("Notion", 5, 8.0, 120), ("Figma", 7, 15.0, 160), ("Jira", 9, 7.0, 200),
+    ]
+    db.add_all([
+        Subscription(vendor_name=vendor, customer_id=customers[owner].id, category_id=categories[k].id,
+                     cost=cost, country=f"C{k}", next_renewal_date=date.today() + timedelta(days=days))
+        for k, (vendor, owner, cost, days) in enumerate(subs)
+    ])
+    db.commit()
+
+
+def _exhaustive(items, score, threshold):
+    from itertools import combinations
+    found = []
+    for a, b in combinations(items, 2):
+        confidence, evidence = score(a, b)
+        if confidence > threshold:
+            found.append((a.id, b.id, confidence, evidence))
+    return found
+
+
+def test_blocking_finds_the_same_links_as_exhaustive_scoring(db):
+    from app.ai.link_intelligence import LinkAnalyzer
+    from app.models import Customer, Subscription
+
+    _seed_link_fixture(db)
+    analyzer = LinkAnalyzer(db, None)
+    customers = db.query(Customer).order_by(Customer.id).all()
+    subscriptions = db.query(Subscription).order_by(Subscription.id).all()
+
+    blocked = [(l["source_id"], l["target_id"], l["confidence"], l["evidence_text"])
+               for l in analyzer.analyze_customer_links()]
+    assert blocked == _exhaustive(customers, analyzer._analyze_customer_pair, 0.15)
+    assert len(blocked) == 5
+
+    blocked = [(l["source_id"], l["target_id"], l["confidence"], l["evidence_text"])
+               for l in analyzer.analyze_subscription_links()]
+    assert blocked == _exhaustive(subscriptions, analyzer._analyze_subscription_pair, 0.2)
+    assert len(blocked) == 2
+
+
+def test_oversized_blocks_are_skipped():
+    from app.ai.link_intelligence import candidate_pairs
+
+    items = ["shared"] * 5 + ["pair", "pair"]
+    assert candidate_pairs(items, lambda item: {item}, max_block_size=4) == [(5, 6)]
+    assert len(candidate_pairs(items, lambda item: {item}, max_block_size=10)) == 10 + 1
+
+
+def _synthetic_customers(count):
+    import random
+    import string
+    from types import SimpleNamespace
+
+    rng = random.Random(count)
+    countries = [f"C{i}" for i in range(20)]
+    customers = []
+    for i in range(count):
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(8))
+        customers.append(SimpleNamespace(
+            id=i, name=name.title(), email=f"user{i}@org{i // 4}.com", phone=f"555-{i // 3:06d}",
+            country=rng.choice(countries), tags=f"tag{i % (count // 10)}", category_id=i % 7, group_id=None
+        ))
+    return customers
+
+
+def test_blocking_scales_near_linearly():
+    """Benchmark: candidate pairs and run time grow roughly with the row count, not its square."""
+    import time
+    from app.ai.link_intelligence import LinkAnalyzer, candidate_pairs, customer_blocking_keys
+
+    analyzer = LinkAnalyzer(None, None)
+    timings = {}
+    for count in (500, 1000, 2000, 4000):
+        customers = _synthetic_customers(count)
+        started = time.perf_counter()
+        pairs = candidate_pairs(customers, customer_blocking_keys)
+        for i, j in pairs:
+            analyzer._analyze_customer_pair(customers[i], customers[j])
+        timings[count] = (time.perf_counter() - started, len(pairs))
+
+    # Candidates per customer stay flat as the table grows
+    per_row = {count: pairs / count for count, (_, pairs) in timings.items()}
+    assert per_row[4000] < 2 * per_row[500]
+    # 8x the rows in well under 64x (quadratic) the time
+    assert timings[4000][0] < 20 * timings[500][0]
+
+
+def test_incremental_runs_only_score_changed_entities_and_retire_deleted_links(db):
+    from app.ai.link_intelligence import LinkAnalyzer
+    from app.models import Customer, Link, Subscription
+
+    _seed_link_fixture(db)
+    analyzer = LinkAnalyzer(db, None)
+    plan = analyzer.plan_run()
+    assert plan['full'] and plan['customers_since'] is None
+    links = analyzer.analyze_customer_links(plan['customers_since'])
+    db.add_all([Link(**link) for link in links])
+    analyzer.record_run(plan, len(links), 0)
+    db.commit()
+
+    # Nothing changed: nothing is loaded or scored
+    plan = analyzer.plan_run()
+    assert not plan['full'] and plan['customers_changed'] == plan['subscriptions_changed'] == 0
+    assert analyzer.analyze_customer_links(plan['customers_since']) == []
+    assert analyzer.analyze_subscription_links(plan['subscriptions_since']) == []
+    analyzer.record_run(plan, 0, 0)
+    db.commit()
+
+    cyberdyne = db.query(Customer).filter(Customer.name == "Cyberdyne").one()
+    cyberdyne.email = "c@acme.com"
+    db.commit()
+    plan = analyzer.plan_run()
+    assert plan['customers_changed'] == 1 and plan['subscriptions_changed'] == 0
+    links = analyzer.analyze_customer_links(plan['customers_since'])
+    assert len(links) == 2
+    assert all(cyberdyne.id in (link['source_id'], link['target_id']) for link in links)
+    assert analyzer.plan_run(full=True)['customers_since'] is None
+
+    # Deleting an entity retires its links
+    acme = db.query(Customer).filter(Customer.name == "Acme Corp").one()
+    acme_id = acme.id
+    db.query(Subscription).filter(Subscription.customer_id == acme_id).delete()
+    db.delete(acme)
+    db.commit()
+    assert analyzer.retire_deleted_links() == 1
+    db.commit()
+    assert db.query(Link).filter((Link.source_id == acme_id) | (Link.target_id == acme_id)).count() == 0
+
+
+def test_new_links_are_bulk_inserted_once(db, statements):
+    from sqlalchemy.exc import IntegrityError
+    from app.ai.link_intelligence import save_new_links
+    from app.models import Link
+    from app.models.link import EntityType
+
+    _seed_link_fixture(db)
+    statements.clear()
+    candidates = [
+        {"source_type": EntityType.CUSTOMER, "source_id": i, "target_type": EntityType.CUSTOMER,
+         "target_id": i + 1, "confidence": 0.5, "evidence_text": "Same country: US"}
+        for i in range(1, 201)
+    ]
+    inserted = save_new_links(db, candidates + candidates[:10])
+    assert len(inserted) == 200 and all(link.id for link in inserted)
+    assert len(statements) == 2  # existence query + one INSERT .. RETURNING
+    db.commit()
+
+    # Reruns are idempotent
+    assert save_new_links(db, candidates) == []
+    assert db.query(Link).count() == 200
+
+    db.add(Link(**candidates[0]))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    else:
+        raise AssertionError("duplicate link pair was accepted")
+
+
+def test_parallel_scoring_matches_serial(monkeypatch):
+    from app.ai.link_intelligence import (
+        CustomerSnapshot, LinkAnalyzer, candidate_pairs, customer_blocking_keys, score_pairs, shutdown_scoring_pool
+    )
+
+    customers = _synthetic_customers(600)
+    pairs = candidate_pairs(customers, customer_blocking_keys)
+    scorer = LinkAnalyzer._analyze_customer_pair
+    serial = score_pairs(customers, pairs, scorer, 0.15, CustomerSnapshot, workers=1)
+
+    monkeypatch.setattr("app.config.settings.ai_link_parallel_min_pairs", 0)
+    try:
+        parallel = score_pairs(customers, pairs, scorer, 0.15, CustomerSnapshot, workers=2)
+    finally:
+        shutdown_scoring_pool()
+    assert parallel == serial and len(serial) > 100
+
+
+def test_async_scoring_reuses_one_pool(monkeypatch):
+    import asyncio
+    from app.ai import link_intelligence
+    from app.ai.link_intelligence import (
+        CUSTOMER_SCORING, candidate_pairs, customer_blocking_keys, score_pairs, score_pairs_async,
+        shutdown_scoring_pool
+    )
+
+    customers = _synthetic_customers(600)
+    pairs = candidate_pairs(customers, customer_blocking_keys)
+    serial = score_pairs(customers, pairs, *CUSTOMER_SCORING, workers=1)
+    monkeypatch.setattr("app.config.settings.ai_link_parallel_min_pairs", 0)
+    try:
+        first = asyncio.run(score_pairs_async(customers, pairs, *CUSTOMER_SCORING, workers=2))
+        pool = link_intelligence._pool
+        second = asyncio.run(score_pairs_async(customers, pairs, *CUSTOMER_SCORING, workers=2))
+        assert first == second == serial
+        assert pool is not None and link_intelligence._pool is pool
+    finally:
+        shutdown_scoring_pool()
+    assert link_intelligence._pool is None
@@ -0,0 +1,76 @@
+"""Tests for indexed log-entry search and keyset pagination."""
+import pytest
+from datetime import datetime, timedelta
+
+from app.models.log_entry import LogEntry
+from app.models.user import User
+from app.services.log_search import ensure_log_search_index, page_logs
+
+
+@pytest.fixture
+def db(engine, db):
+    if not ensure_log_search_index(engine):
+        pytest.skip("SQLite build without FTS5")
+    return db
+
+
+def _add_log(db, user_id, created_at, message, check_type="custom", category_name=None):
+    entry = LogEntry(
+        user_id=user_id, created_at=created_at, date_str="1/1/2026", start_time="9:00 a.m",
+        end_time="9:30 a.m", duration_minutes=30, check_type=check_type, category_name=category_name,
+        message=message, full_entry=f"[1/1/2026][{category_name or check_type}] {message}"
+    )
+    db.add(entry)
+    return entry
+
+
+def test_keyset_pages_cover_every_entry_once(db):
+    """Test keyset pages return every entry once, newest first."""
+    base = datetime(2026, 1, 1)
+    for i in range(25):
+        # Pairs share a timestamp so the id tie-break is exercised
+        _add_log(db, 1, base + timedelta(minutes=i // 2), f"entry {i}")
+    _add_log(db, 2, base, "other user")
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = page_logs(db, 1, before=cursor, limit=10)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 25
+    assert len({e.id for e in seen}) == 25
+    keys = [(e.created_at, e.id) for e in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_search_matches_message_and_category(db):
+    """Test prefix search covers messages and category names."""
+    now = datetime(2026, 1, 1)
+    _add_log(db, 1, now, "Replaced the backup drive", check_type="onsite")
+    _add_log(db, 1, now, "Patched firewall", category_name="Networking")
+    _add_log(db, 1, now, "Checked DNS")
+    db.commit()
+
+    assert [e.message for e in page_logs(db, 1, search="backu")[0]] == ["Replaced the backup drive"]
+    assert [e.message for e in page_logs(db, 1, search="networking")[0]] == ["Patched firewall"]
+    assert page_logs(db, 1, search="backup", check_type="custom")[0] == []
+
+
+def test_index_follows_updates_and_deletes(db):
+    """Test the search index tracks edited and deleted entries."""
+    entry = _add_log(db, 1, datetime(2026, 1, 1), "Checked volume shadow copies")
+    db.commit()
+    assert len(page_logs(db, 1, search="shadow")[0]) == 1
+
+    entry.full_entry = "Checked ESET logs"
+    entry.message = "Checked ESET logs"
+    db.commit()
+    assert page_logs(db, 1, search="shadow")[0] == []
+    assert len(page_logs(db, 1, search="eset")[0]) == 1
+
+    db.delete(entry)
+    db.commit()
+    assert page_logs(db, 1, search="eset")[0] == []
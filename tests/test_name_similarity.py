@@ -0,0 +1,68 @@
+"""Tests for MinHash/LSH near-duplicate name matching."""
+import random
+import string
+
+from app.models.subscription import BillingCycle
+from app.routers.templates import TemplateCreate, create_template, delete_template, update_template
+from app.services.name_similarity import MinHasher, NameIndex, name_shingles, name_similarity
+
+
+def test_similarity_scale():
+    """Test the Dice score of shingle sets."""
+    assert name_similarity("Acme Corp", "acme  corp.") == 1.0
+    assert 0.6 < name_similarity("Acme Corporation", "Acme Corp") < 1.0
+    assert name_similarity("Acme Corp", "TechStart Inc") < 0.3
+    assert name_similarity("", "Acme") == 0.0
+
+
+def test_signature_estimates_jaccard():
+    """Test MinHash agreement tracks the exact Jaccard similarity."""
+    hasher = MinHasher(permutations=120, bands=20)
+    a, b = name_shingles("Stark Industries Holdings"), name_shingles("Stark Industry Holdings")
+    exact = len(a & b) / len(a | b)
+    assert abs(MinHasher.estimate(hasher.signature(a), hasher.signature(b)) - exact) < 0.15
+    # Seeded: independent hashers agree
+    assert MinHasher(permutations=120, bands=20).signature(a) == hasher.signature(a)
+
+
+def _random_name(rng):
+    return " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+                    for _ in range(2))
+
+
+def test_index_finds_near_duplicates_without_scanning():
+    """Test lookups only touch a few bucket candidates among thousands of names."""
+    rng = random.Random(7)
+    index = NameIndex()
+    names = [_random_name(rng) for _ in range(5000)]
+    for i, name in enumerate(names):
+        index.upsert(("customer", i), name, scope="customer")
+    index.upsert(("template", 1), names[42], scope="template")
+
+    typo = names[42] + "s"
+    assert len(index.candidates(typo, scope="customer")) < 50
+    matches = index.similar(typo, scope="customer")
+    assert matches[0][0] == ("customer", 42)
+    assert all(key[0] == "customer" for key, _, _ in matches)
+
+    index.remove(("customer", 42))
+    assert index.similar(typo, scope="customer") == []
+    assert index.similar(typo, scope="template")[0][0] == ("template", 1)
+
+
+def test_template_routes_keep_the_index_current(db, monkeypatch):
+    """Test creating, renaming and deleting a template updates its indexed name."""
+    index = NameIndex()
+    monkeypatch.setattr("app.routers.templates.name_index", index)
+
+    template = create_template(TemplateCreate(vendor_name="Slack", plan_name="Pro", cost=8,
+                                              billing_cycle=BillingCycle.MONTHLY), db=db)
+    assert index.similar("Slack Pro", scope="template")[0][0] == ("template", template.id)
+
+    update_template(template.id, TemplateCreate(vendor_name="Zendesk", plan_name="Suite", cost=49,
+                                                billing_cycle=BillingCycle.MONTHLY), db=db)
+    assert index.similar("Slack Pro", scope="template") == []
+    assert index.similar("Zendesk Suite", scope="template")[0][0] == ("template", template.id)
+
+    delete_template(template.id, db=db)
+    assert index.similar("Zendesk Suite", scope="template") == []
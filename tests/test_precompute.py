@@ -0,0 +1,109 @@
+"""Tests for background precomputation of AI insights."""
+import pytest
+from datetime import date, timedelta
+
+from app.models import AIRequestCache, Customer, Subscription
+from app.ai.cache import memory_cache
+from app.ai.insights import InsightsAnalyzer
+from app.ai.precompute import InsightPrecomputer, precompute_targets
+from app.ai.provider import AIProvider
+from app.ai.smart_features import SmartAIFeatures
+
+RESPONSE = '{"duplicates": [], "total_potential_savings": 0, "summary": "ok", "insights": ["i"], "recommendations": ["r"]}'
+
+
+class CountingProvider(AIProvider):
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        self.calls += 1
+        return RESPONSE
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture
+def session_factory(session_factory, db, category, monkeypatch):
+    busy, quiet = Customer(name="Busy", category_id=category.id), Customer(name="Quiet", category_id=category.id)
+    db.add_all([busy, quiet])
+    db.flush()
+    db.add_all(
+        [Subscription(customer_id=busy.id, category_id=category.id, vendor_name=f"Tool {i}", cost=10.0 + i,
+                      next_renewal_date=date.today() + timedelta(days=10 * i)) for i in range(3)]
+        + [Subscription(customer_id=quiet.id, category_id=category.id, vendor_name="Solo", cost=5.0,
+                        next_renewal_date=date.today() + timedelta(days=40))]
+    )
+    db.commit()
+    busy_id = busy.id
+
+    provider = CountingProvider()
+    monkeypatch.setattr("app.ai.precompute.get_ai_provider", lambda lane="default": provider)
+    monkeypatch.setattr("app.ai.precompute.ai_scheduler.remaining_today", lambda: 1000)
+
+    async def no_sync():
+        pass
+
+    monkeypatch.setattr("app.ai.precompute.ai_scheduler.sync_usage", no_sync)
+    monkeypatch.setattr("app.config.settings.ai_precompute_top_customers", 1)
+    memory_cache.clear()
+    session_factory.provider = provider
+    session_factory.busy_id = busy_id
+    yield session_factory
+    memory_cache.clear()
+
+
+def test_targets_are_global_then_busiest_customers(session_factory):
+    db = session_factory()
+    assert precompute_targets(db) == [None, session_factory.busy_id]
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_precompute_warms_cache_and_skips_fresh_entries(session_factory, monkeypatch):
+    provider = session_factory.provider
+    precomputer = InsightPrecomputer(session_factory)
+
+    assert await precomputer.run_once() == 2
+    # forecast + (budget + 2 insight prompts) per scope
+    assert provider.calls == 1 + 2 * 3
+    db = session_factory()
+    assert {row.request_type for row in db.query(AIRequestCache)} == {
+        "renewal_forecaster", "budget_surgeon", "insights"
+    }
+
+    # Page loads now hit the cache
+    memory_cache.clear()
+    features = SmartAIFeatures(db)
+    features.provider = provider
+    assert (await features.analyze_budget(session_factory.busy_id))["cached"] is True
+    insights = await InsightsAnalyzer(db, provider).generate_insights()
+    assert insights["ai_insights"]["cached"] is True
+    db.close()
+
+    # Entries far from expiry are left alone
+    await precomputer.run_once()
+    assert provider.calls == 7
+
+    # Entries about to expire are regenerated
+    monkeypatch.setattr("app.config.settings.ai_precompute_refresh_ahead", 10 ** 9)
+    await precomputer.run_once()
+    assert provider.calls == 14
+
+
+@pytest.mark.asyncio
+async def test_failing_target_does_not_stop_the_cycle(session_factory, monkeypatch):
+    provider = session_factory.provider
+    monkeypatch.setattr("app.config.settings.ai_precompute_forecast_months", [6, 12])
+    analyze_budget = SmartAIFeatures.analyze_budget
+
+    async def failing_for_global(self, customer_id=None, **kwargs):
+        if customer_id is None:
+            raise RuntimeError("boom")
+        return await analyze_budget(self, customer_id, **kwargs)
+
+    monkeypatch.setattr(SmartAIFeatures, "analyze_budget", failing_for_global)
+    assert await InsightPrecomputer(session_factory).run_once() == 1
+    # two forecast horizons + (budget + 2 insight prompts) for the busiest customer
+    assert provider.calls == 2 + 3
@@ -0,0 +1,154 @@
+"""Tests for rule-based search understanding and the natural-language search pre-filter."""
+import asyncio
+import pytest
+from datetime import date, timedelta
+
+from app.models import Category, Customer, Subscription
+from app.models.subscription import BillingCycle, SubscriptionStatus
+from app.ai.features import AIFeatures
+from app.ai.provider import AIProvider
+from app.ai.query_parser import parse_search_query, describe_search_query
+
+TODAY = date(2026, 3, 11)  # a Wednesday
+
+
+def test_extracts_cycles_statuses_and_cost_range():
+    parsed = parse_search_query("active monthly adobe plans over $50", today=TODAY)
+    assert parsed["statuses"] == [SubscriptionStatus.ACTIVE]
+    assert parsed["cycles"] == [BillingCycle.MONTHLY]
+    assert parsed["min_cost"] == 50.0 and parsed["max_cost"] is None
+    assert parsed["terms"] == ["adobe"]
+    assert parsed["structured"]
+
+
+def test_extracts_between_and_dollar_ranges():
+    assert parse_search_query("between 10 and 20.5", today=TODAY)["max_cost"] == 20.5
+    parsed = parse_search_query("slack $30-$10", today=TODAY)
+    assert (parsed["min_cost"], parsed["max_cost"]) == (10.0, 30.0)
+    assert parsed["terms"] == ["slack"]
+
+
+def test_extracts_renewal_windows():
+    parsed = parse_search_query("renewing next month", today=TODAY)
+    assert (parsed["renewal_from"], parsed["renewal_to"]) == (date(2026, 4, 1), date(2026, 4, 30))
+    parsed = parse_search_query("due in the next 10 days", today=TODAY)
+    assert (parsed["renewal_from"], parsed["renewal_to"]) == (TODAY, TODAY + timedelta(days=10))
+    parsed = parse_search_query("this week", today=TODAY)
+    assert parsed["renewal_to"] == date(2026, 3, 15)
+    parsed = parse_search_query("overdue", today=TODAY)
+    assert parsed["renewal_from"] is None and parsed["renewal_to"] == TODAY - timedelta(days=1)
+    assert parsed["terms"] == []
+
+
+def test_plain_words_are_terms_only():
+    parsed = parse_search_query("show me my streaming services")
+    assert parsed["terms"] == ["streaming"]
+    assert not parsed["structured"]
+    assert "'streaming'" in describe_search_query(parsed)
+
+
+class RecordingProvider(AIProvider):
+    def __init__(self, response=""):
+        self.prompts = []
+        self.response = response
+
+    async def generate_completion(self, prompt, system_prompt=None, temperature=0.7, max_tokens=500):
+        self.prompts.append(prompt)
+        return self.response
+
+    def is_available(self):
+        return True
+
+
+@pytest.fixture
+def db(db, category, customer):
+    software, video = category, Category(name="Video")
+    db.add(video)
+    db.flush()
+    soon = date.today() + timedelta(days=5)
+    later = date.today() + timedelta(days=120)
+    db.add_all([
+        Subscription(customer_id=customer.id, category_id=software.id, vendor_name="Adobe", plan_name="CC",
+                     cost=60.0, billing_cycle=BillingCycle.MONTHLY, next_renewal_date=soon),
+        Subscription(customer_id=customer.id, category_id=software.id, vendor_name="Adobe", plan_name="Stock",
+                     cost=20.0, billing_cycle=BillingCycle.MONTHLY, next_renewal_date=later),
+        Subscription(customer_id=customer.id, category_id=video.id, vendor_name="Netflix",
+                     cost=15.0, billing_cycle=BillingCycle.MONTHLY, next_renewal_date=soon),
+        Subscription(customer_id=customer.id, category_id=software.id, vendor_name="Figma",
+                     cost=144.0, billing_cycle=BillingCycle.YEARLY, next_renewal_date=later,
+                     status=SubscriptionStatus.CANCELLED),
+    ])
+    db.commit()
+    return db
+
+
+def _search(db, query, provider):
+    features = AIFeatures(db)
+    features.provider = provider
+    return asyncio.run(features.natural_language_search(query))
+
+
+def test_structured_query_is_answered_without_the_model(db):
+    provider = RecordingProvider()
+    result = _search(db, "monthly adobe over $50", provider)
+    assert [m["vendor"] for m in result["matches"]] == ["Adobe"]
+    assert result["matches"][0]["cost"] == 60.0
+    assert provider.prompts == []
+
+    result = _search(db, "cancelled subscriptions", provider)
+    assert [m["vendor"] for m in result["matches"]] == ["Figma"]
+    result = _search(db, "renewing in the next 7 days", provider)
+    assert sorted(m["vendor"] for m in result["matches"]) == ["Adobe", "Netflix"]
+    assert provider.prompts == []
+
+
+def test_ambiguous_query_sends_only_filtered_candidates(db):
+    netflix_id = db.query(Subscription).filter(Subscription.vendor_name == "Netflix").one().id
+    provider = RecordingProvider(
+        f'{{"matches": [{{"subscription_id": {netflix_id}, "relevance_score": 90, "match_reason": "video"}},'
+        f' {{"subscription_id": 99999, "relevance_score": 50, "match_reason": "unknown"}}],'
+        f' "query_interpretation": "streaming"}}'
+    )
+    result = _search(db, "monthly streaming under $30", provider)
+    assert len(provider.prompts) == 1
+    assert "Netflix" in provider.prompts[0] and "Figma" not in provider.prompts[0]
+    assert "CC" not in provider.prompts[0]  # Adobe CC costs more than $30
+    assert result["matches"] == [
+        {"subscription_id": netflix_id, "relevance_score": 90, "match_reason": "video",
+         "vendor": "Netflix", "cost": 15.0}
+    ]
+
+
+def test_cheap_exact_vendor_match_survives_the_candidate_limit(db, monkeypatch):
+    monkeypatch.setattr("app.config.settings.ai_search_candidate_limit", 3)
+    software_id = db.query(Category.id).filter(Category.name == "Software").scalar()
+    customer_id = db.query(Customer.id).scalar()
+    # Costlier rows that only match the term through their category
+    db.add_all([
+        Subscription(customer_id=customer_id, category_id=software_id, vendor_name=f"Suite {i}",
+                     cost=500.0 + i, next_renewal_date=date.today() + timedelta(days=30))
+        for i in range(5)
+    ])
+    db.add(Subscription(customer_id=customer_id, category_id=software_id, vendor_name="Software Mart",
+                        cost=1.0, next_renewal_date=date.today() + timedelta(days=30)))
+    db.commit()
+    result = _search(db, "software", RecordingProvider())
+    assert result["matches"][0]["vendor"] == "Software Mart"
+
+
+def test_local_matches_reach_the_model_and_the_result(db, monkeypatch):
+    monkeypatch.setattr("app.config.settings.ai_search_candidate_limit", 2)
+    software_id = db.query(Category.id).filter(Category.name == "Software").scalar()
+    customer_id = db.query(Customer.id).scalar()
+    # Costlier rows fill the filter-only candidates
+    db.add_all([
+        Subscription(customer_id=customer_id, category_id=software_id, vendor_name=f"Suite {i}",
+                     cost=500.0 + i, next_renewal_date=date.today() + timedelta(days=30))
+        for i in range(3)
+    ])
+    db.commit()
+    provider = RecordingProvider('{"matches": [], "query_interpretation": "streaming"}')
+    result = _search(db, "netflix streaming", provider)
+    assert len(provider.prompts) == 1
+    assert "Netflix" in provider.prompts[0]
+    assert [m["vendor"] for m in result["matches"]] == ["Netflix"]
@@ -0,0 +1,114 @@
+"""Tests for the renewal projection engine."""
+import calendar
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from app.services.renewal_projection import RenewalProjection, cycle_step
+
+
+def _add_months(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _brute_force(start, months, subs):
+    """Renewal dates stepped one at a time, bucketed by (year, month)."""
+    projection = RenewalProjection(start, months)
+    end = start + timedelta(days=projection.days)
+    totals = {}
+    for cost, cycle, amount, unit, anchor in subs:
+        step_months, step_days = cycle_step(cycle, amount, unit)
+        anchor = anchor or start
+        k = 0
+        while True:
+            when = _add_months(anchor, step_months * k) if step_months else anchor + timedelta(days=step_days * k)
+            if when >= end:
+                break
+            if when >= start:
+                key = (when.year, when.month)
+                totals[key] = totals.get(key, 0) + cost
+            k += 1
+    return [round(totals.get((m.year, m.month), 0), 2) for m in projection.month_starts]
+
+
+def test_every_cycle_is_expanded():
+    """Test quarterly, weekly and custom cycles renew on their real schedules."""
+    start = date(2026, 1, 15)
+    projection = RenewalProjection(start, 12)
+    projection.add(30, "quarterly", next_renewal=date(2026, 2, 1))
+    projection.add(10, "weekly", next_renewal=date(2026, 1, 15))
+    projection.add(100, "custom", 2, "months", next_renewal=date(2026, 1, 31))
+    projection.add(5, "custom", 10, "days", next_renewal=date(2025, 12, 31))
+    projection.add(1200, "yearly", next_renewal=date(2025, 6, 1))
+    buckets = projection.project()
+
+    months = {m.strftime("%Y-%m"): i for i, m in enumerate(projection.month_starts)}
+    assert buckets["month_cost"][months["2026-02"]] == 30 + 10 * 4 + 5 * 2
+    # Jan 31 every two months clamps to Mar 31, May 31, Jul 31, Sep 30, Nov 30
+    assert [buckets["month_cost"][months[f"2026-{m:02d}"]] >= 100 for m in (1, 3, 5, 7, 9, 11)] == [True] * 6
+    assert buckets["month_cost"][months["2026-06"]] == 1200 + 10 * 4 + 5 * 3
+    # Weekly renewals from the start date land one per week
+    assert all(renewals >= 1 for renewals in buckets["week_renewals"])
+    assert sum(buckets["week_cost"]) == sum(buckets["month_cost"])
+    assert sum(buckets["week_renewals"]) == sum(buckets["month_renewals"])
+
+
+def test_matches_stepping_each_renewal():
+    """Test the cohort expansion agrees with stepping every subscription."""
+    rng = random.Random(3)
+    start = date(2026, 10, 18)
+    cycles = [("monthly", None, None), ("quarterly", None, None), ("biannual", None, None),
+              ("yearly", None, None), ("weekly", None, None), ("custom", 3, "weeks"),
+              ("custom", 45, "days"), ("custom", 2, "years"), ("custom", 4, "months")]
+    subs = []
+    for _ in range(400):
+        cycle, amount, unit = rng.choice(cycles)
+        anchor = None if rng.random() < 0.05 else start + timedelta(days=rng.randint(-800, 400))
+        subs.append((rng.randint(1, 500), cycle, amount, unit, anchor))
+
+    projection = RenewalProjection(start, 24)
+    for sub in subs:
+        projection.add(*sub)
+    assert [round(cost, 2) for cost in projection.project()["month_cost"]] == _brute_force(start, 24, subs)
+
+
+def test_top_renewals_are_largest_per_month():
+    """Test each month lists its most expensive renewing subscriptions."""
+    projection = RenewalProjection(date(2026, 3, 1), 3)
+    projection.add(50, "monthly", next_renewal=date(2026, 3, 5), label="monthly")
+    projection.add(900, "yearly", next_renewal=date(2026, 4, 5), label="yearly")
+    projection.add(20, "weekly", next_renewal=date(2026, 3, 2), label="weekly")
+    buckets = projection.project()
+    top = projection.top_renewals(buckets["month_subscriptions"], limit=2)
+    assert top == [[("monthly", 50.0), ("weekly", 20.0)],
+                   [("yearly", 900.0), ("monthly", 50.0)],
+                   [("monthly", 50.0), ("weekly", 20.0)]]
+
+
+def test_projection_benchmark():
+    """
+    Test 100k subscriptions over 36 months expand as a few thousand cohorts.
+
+    The wall-clock bound is only checked with SUBTRACK_BENCHMARK_ASSERTS=1,
+    since shared CI runners are too noisy for it.
+    """
+    rng = random.Random(11)
+    start = date(2026, 10, 18)
+    cycles = ["monthly", "monthly", "yearly", "quarterly", "weekly", "biannual"]
+    projection = RenewalProjection(start, 36)
+    for i in range(100000):
+        projection.add(rng.randint(5, 300), rng.choice(cycles), None, None,
+                       start + timedelta(days=rng.randint(-30, 365)), label=i)
+
+    started = time.perf_counter()
+    buckets = projection.project()
+    projection.top_renewals(buckets["month_subscriptions"])
+    elapsed = time.perf_counter() - started
+    assert len(buckets["month_cost"]) == 36
+    # One cohort per (cycle, first renewal), however many subscriptions share it
+    assert projection.cohorts_expanded <= len(set(cycles)) * (365 + 30 + 1)
+    assert sum(buckets["month_renewals"]) > 100000
+    if os.environ.get("SUBTRACK_BENCHMARK_ASSERTS"):
+        assert elapsed < 0.5
@@ -0,0 +1,106 @@
+"""Tests for the full-text global search index."""
+import pytest
+from datetime import date
+
+from app.models import Category, Customer, Subscription
+from app.services.search_index import (
+    build_match_query,
+    ensure_search_index,
+    index_entity,
+    rebuild_search_index,
+    remove_entity,
+    search_entities,
+    search_ids,
+)
+from app.services.typeahead_index import TrigramIndex
+
+
+@pytest.fixture
+def db(engine, db):
+    if not ensure_search_index(engine):
+        pytest.skip("SQLite build without FTS5")
+    return db
+
+
+def _seed(db):
+    category = Category(name="Software", description="Design and productivity tools")
+    db.add(category)
+    db.flush()
+    customer = Customer(name="Acme Corporation", email="ops@acme.com", tags="vip, enterprise", category_id=category.id)
+    db.add(customer)
+    db.flush()
+    db.add(Subscription(
+        customer_id=customer.id, category_id=category.id, vendor_name="Adobe", plan_name="Creative Cloud",
+        cost=54.99, start_date=date.today(), next_renewal_date=date.today()
+    ))
+    db.commit()
+    return category, customer
+
+
+def test_build_match_query():
+    """Test free text is converted to prefix queries."""
+    assert build_match_query("Acme cor") == '"acme"* "cor"*'
+    assert build_match_query("acme cor", "postgresql") == "acme:* & cor:*"
+    assert build_match_query('"; DROP') == '"drop"*'
+    assert build_match_query("  ") is None
+
+
+def test_prefix_search_after_rebuild(db):
+    """Test typeahead prefixes match names, emails and tags."""
+    _seed(db)
+    assert rebuild_search_index(db) == 3
+
+    assert [c.name for c in search_entities(db, "acm")["customers"]] == ["Acme Corporation"]
+    assert [c.name for c in search_entities(db, "enterpr")["customers"]] == ["Acme Corporation"]
+    assert [s.vendor_name for s in search_entities(db, "creative cl")["subscriptions"]] == ["Adobe"]
+    assert search_entities(db, "productivity")["categories"][0].name == "Software"
+    assert search_entities(db, "zzz")["customers"] == []
+
+
+def test_index_and_remove_entity(db):
+    """Test incremental updates from write paths."""
+    _, customer = _seed(db)
+    rebuild_search_index(db)
+
+    customer.name = "Globex"
+    db.commit()
+    index_entity(db, customer)
+    assert search_entities(db, "acme corp")["customers"] == []
+    assert [c.name for c in search_entities(db, "glob")["customers"]] == ["Globex"]
+
+    remove_entity(db, "customer", customer.id)
+    assert search_entities(db, "glob")["customers"] == []
+
+
+def test_cascaded_deletes_leave_the_indexes(db, monkeypatch):
+    """Test subscriptions removed with their customer drop out of every index."""
+    typeahead = TrigramIndex()
+    monkeypatch.setattr("app.services.search_index.typeahead_index", typeahead)
+    _, customer = _seed(db)
+    rebuild_search_index(db)
+    typeahead.rebuild(db)
+    subscription_id = customer.subscriptions[0].id
+
+    savepoint = db.begin_nested()
+    db.delete(customer)
+    db.flush()
+    savepoint.rollback()
+    db.commit()
+    assert typeahead.search("adobe")["subscription"] == [subscription_id]
+
+    db.delete(customer)
+    db.commit()
+    assert search_ids(db, "adobe")["subscription"] == []
+    assert typeahead.search("adobe")["subscription"] == []
+    assert typeahead.search("acme")["customer"] == []
+
+
+def test_title_matches_rank_first(db):
+    """Test name matches outrank matches in notes."""
+    category, _ = _seed(db)
+    db.add(Customer(name="Initech", notes="Previously with Acme", category_id=category.id))
+    db.commit()
+    rebuild_search_index(db)
+
+    names = [c.name for c in search_entities(db, "acme")["customers"]]
+    assert names == ["Acme Corporation", "Initech"]
@@ -0,0 +1,103 @@
+"""Tests for daily spend snapshots, downsampling and trend queries."""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from app.models import Category, SpendSnapshot, Subscription
+from app.models.subscription import BillingCycle, SubscriptionStatus
+from app.services.spend_history import SpendSnapshotter, downsample, spend_trend, take_snapshot
+
+TODAY = date(2026, 10, 18)
+
+
+@pytest.fixture
+def session_factory(session_factory, db, category, customer):
+    software, marketing = category, Category(name="Marketing")
+    db.add(marketing)
+    db.flush()
+    for vendor, category, cost, cycle, country, currency, status in [
+        ("Zoom", software, 15.0, BillingCycle.MONTHLY, "US", "USD", SubscriptionStatus.ACTIVE),
+        ("Adobe", software, 600.0, BillingCycle.YEARLY, "DE", "EUR", SubscriptionStatus.ACTIVE),
+        ("Hubspot", marketing, 30.0, BillingCycle.QUARTERLY, None, "USD", SubscriptionStatus.ACTIVE),
+        ("Old CRM", marketing, 99.0, BillingCycle.MONTHLY, "US", "USD", SubscriptionStatus.CANCELLED),
+    ]:
+        db.add(Subscription(
+            customer_id=customer.id, category_id=category.id, vendor_name=vendor, cost=cost, billing_cycle=cycle,
+            country=country, currency=currency, status=status, next_renewal_date=TODAY
+        ))
+    db.commit()
+    session_factory.software_id = software.id
+    return session_factory
+
+
+def _series(trend):
+    return {series["label"]: [point["monthly_spend"] for point in series["points"]] for series in trend["series"]}
+
+
+def test_snapshot_groups_active_spend(session_factory):
+    """Test one snapshot writes total, category, country and currency rows."""
+    db = session_factory()
+    assert take_snapshot(db, TODAY) == 1 + 2 + 3 + 2
+    # Rewriting the same day replaces its rows
+    assert take_snapshot(db, TODAY) == 8
+    assert db.query(SpendSnapshot).count() == 8
+
+    assert _series(spend_trend(db, "total", today=TODAY)) == {"All subscriptions": [75.0]}
+    assert _series(spend_trend(db, "category", today=TODAY)) == {"Software": [65.0], "Marketing": [10.0]}
+    assert _series(spend_trend(db, "country", today=TODAY)) == {"US": [15.0], "DE": [50.0], "Not Specified": [10.0]}
+    assert _series(spend_trend(db, "currency", today=TODAY)) == {"USD": [25.0], "EUR": [50.0]}
+    software = spend_trend(db, "category", keys=[str(session_factory.software_id)], today=TODAY)
+    assert [series["label"] for series in software["series"]] == ["Software"]
+    with pytest.raises(ValueError):
+        spend_trend(db, "vendor", today=TODAY)
+    db.close()
+
+
+def test_downsampling_keeps_averages_and_bounds_rows(session_factory, monkeypatch):
+    """Test three years of daily rows shrink to weeks and months with the same mean."""
+    monkeypatch.setattr("app.config.settings.spend_history_daily_days", 90)
+    monkeypatch.setattr("app.config.settings.spend_history_weekly_days", 365)
+    monkeypatch.setattr("app.config.settings.spend_history_retention_days", 3650)
+    db = session_factory()
+    days = [TODAY - timedelta(days=i) for i in range(3 * 365)]
+    db.add_all([
+        SpendSnapshot(dimension="total", dimension_key="", granularity="day", period_start=day,
+                      subscription_count=10, monthly_spend=float(day.toordinal() % 100), samples=1)
+        for day in days
+    ])
+    db.commit()
+    expected_mean = sum(day.toordinal() % 100 for day in days) / len(days)
+
+    result = downsample(db, TODAY)
+    assert result["days_rolled_up"] > 900
+    # Rerunning on the same day has nothing left to roll up
+    assert downsample(db, TODAY) == {"days_rolled_up": 0, "weeks_rolled_up": 0, "months_deleted": 0}
+
+    rows = db.query(SpendSnapshot).all()
+    assert len(rows) < 200
+    assert sum(row.samples for row in rows) == len(days)
+    weighted = sum(row.monthly_spend * row.samples for row in rows) / len(days)
+    assert weighted == pytest.approx(expected_mean)
+    oldest_day = min(row.period_start for row in rows if row.granularity == "day")
+    assert oldest_day >= TODAY - timedelta(days=90 + 6)
+    assert {row.granularity for row in rows} == {"day", "week", "month"}
+
+    trend = spend_trend(db, "total", days=4 * 365, today=TODAY)
+    assert trend["rows_read"] == len(rows)
+    monthly = spend_trend(db, "total", days=3 * 365, granularity="month", today=TODAY)
+    points = monthly["series"][0]["points"]
+    assert {point["granularity"] for point in points} == {"month"}
+    assert 36 <= len(points) <= 38
+    db.close()
+
+
+def test_snapshotter_runs_once_per_day(session_factory):
+    """Test the background job only snapshots a day that is missing."""
+    snapshotter = SpendSnapshotter(session_factory)
+    assert snapshotter.run_once(TODAY)["snapshot_rows"] == 8
+    assert snapshotter.run_once(TODAY)["snapshot_rows"] == 0
+    assert snapshotter.run_once(TODAY + timedelta(days=1))["snapshot_rows"] == 8
+    db = session_factory()
+    assert db.query(func.count(SpendSnapshot.id)).scalar() == 16
+    db.close()
@@ -0,0 +1,52 @@
+"""Tests for the in-memory trigram typeahead index."""
+from app.services.typeahead_index import TrigramIndex, trigrams
+
+
+def _index():
+    index = TrigramIndex()
+    index.ready = True
+    index.upsert("customer", 1, ["Acme Corporation", "ops@acme.com", "vip", "enterprise"])
+    index.upsert("customer", 2, ["Globex", "hello@globex.io"])
+    index.upsert("subscription", 10, ["Adobe", "Creative Cloud"])
+    index.upsert("subscription", 11, ["Atlassian", "Jira"])
+    return index
+
+
+def test_trigrams_partial_last_word():
+    """Test the last word is left open while typing."""
+    assert trigrams("ado") == {"  a", " ad", "ado", "do "}
+    assert trigrams("ado", partial_last_word=True) == {"  a", " ad", "ado"}
+    assert trigrams("") == set()
+
+
+def test_prefix_and_typo_matches():
+    """Test partial words and small typos are found."""
+    index = _index()
+    assert index.search("ado")["subscription"] == [10]
+    assert index.search("adobee")["subscription"] == [10]
+    assert index.search("acme corp")["customer"] == [1]
+    assert index.search("globx")["customer"] == [2]
+    assert index.search("enterprise")["customer"] == [1]
+    assert index.search("xyz") == {"category": [], "group": [], "customer": [], "subscription": []}
+
+
+def test_incremental_updates():
+    """Test upsert replaces old trigrams and remove drops the entity."""
+    index = _index()
+    index.upsert("customer", 2, ["Initech"])
+    assert index.search("globex")["customer"] == []
+    assert index.search("initec")["customer"] == [2]
+
+    index.remove("customer", 2)
+    assert index.search("initech")["customer"] == []
+    assert len(index) == 3
+
+
+def test_not_ready_and_stats():
+    """Test an unbuilt index defers to other search paths and reports its size."""
+    assert TrigramIndex().search("acme") is None
+
+    stats = _index().stats()
+    assert stats["entities"] == 4
+    assert stats["by_type"]["subscription"] == 2
+    assert stats["memory_bytes"] > 0